@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Admission Control
+Bounds how many expensive requests run at once so a burst (e.g. the daily
+batch cron) cannot saturate the CPU / LLM quota and starve interactive
+traffic. Requests over the limit are rejected fast with 429 + Retry-After
+instead of piling up behind the event loop.
+
+Pools (path prefix → pool):
+  compute — /compute-enriched, /compute-match
+  llm     — /generate-* (blocking and /stream variants)
+
+Each pool has a concurrency limit and a bounded wait queue. A request that
+finds no free slot waits in the queue (at most max_wait seconds); a full
+queue or an expired wait → 429.
+
+Priority classes (header X-Destiny-Priority):
+  interactive — default
+  batch       — "batch" or "cron"; may hold at most batch_share of the
+                slots and batch_share of the queue, and queued interactive
+                requests are always admitted first. Interactive latency
+                therefore stays bounded while batch jobs run.
+
+Environment:
+  DESTINY_ADMISSION=0                — disable (default 1)
+  DESTINY_ADMIT_<POOL>_CONCURRENCY   — slots (compute: CPU count, llm: 16)
+  DESTINY_ADMIT_<POOL>_QUEUE         — queued requests (default 4 × slots)
+  DESTINY_ADMIT_BATCH_SHARE          — batch fraction (default 0.5)
+  DESTINY_ADMIT_MAX_WAIT_MS          — max queue wait (default 5000)
+
+Usage:
+    app.add_middleware(AdmissionMiddleware)     # uses get_controller()
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITY_HEADER = "x-destiny-priority"
+_RANK = {INTERACTIVE: 0, BATCH: 1}
+
+DEFAULT_ROUTES: Tuple[Tuple[str, str], ...] = (
+    ("/compute-enriched", "compute"),
+    ("/compute-match", "compute"),
+    ("/generate-", "llm"),
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted (queue full or wait expired)."""
+
+    def __init__(self, pool: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"{pool}: {reason}")
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def priority_of(header_value: Optional[str]) -> str:
+    """Map the X-Destiny-Priority header to a priority class."""
+    value = (header_value or "").strip().lower()
+    return BATCH if value in ("batch", "cron") else INTERACTIVE
+
+
+class _Waiter:
+    __slots__ = ("priority", "loop", "future", "granted")
+
+    def __init__(self, priority: str, loop: asyncio.AbstractEventLoop) -> None:
+        self.priority = priority
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionPool:
+    """Concurrency limit + bounded priority queue for one group of endpoints.
+
+    Thread-safe: waiters may belong to different event loops (TestClient
+    runs each request on its own), so slots are handed over under a lock and
+    waiters are woken with call_soon_threadsafe.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        queue: Optional[int] = None,
+        batch_share: float = 0.5,
+        max_wait: float = 5.0,
+    ) -> None:
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue_limit = max(0, 4 * self.concurrency if queue is None else queue)
+        self.batch_slots = max(1, int(self.concurrency * batch_share))
+        self.batch_queue = int(self.queue_limit * batch_share)
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._active = {INTERACTIVE: 0, BATCH: 0}
+        self._queued = {INTERACTIVE: 0, BATCH: 0}
+        self._heap: List[Tuple[int, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._service_ewma = 0.0
+        self._counters = {cls: {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+                          for cls in (INTERACTIVE, BATCH)}
+
+    # ── slot accounting (caller holds the lock) ──────────────────────────────
+
+    def _has_slot(self, priority: str) -> bool:
+        if sum(self._active.values()) >= self.concurrency:
+            return False
+        return priority == INTERACTIVE or self._active[BATCH] < self.batch_slots
+
+    def _take(self, priority: str) -> None:
+        self._active[priority] += 1
+        self._counters[priority]["admitted"] += 1
+
+    def _dispatch(self) -> None:
+        """Hand free slots to queued waiters, interactive first (FIFO within a class)."""
+        while self._heap:
+            _, _, waiter = self._heap[0]
+            if waiter.future.done():                    # abandoned
+                heapq.heappop(self._heap)
+                continue
+            if not self._has_slot(waiter.priority):
+                return
+            heapq.heappop(self._heap)
+            self._queued[waiter.priority] -= 1
+            self._take(waiter.priority)
+            waiter.granted = True
+            waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: queue depth × mean service time / slots."""
+        depth = sum(self._queued.values()) + 1
+        return max(1, math.ceil(self._service_ewma * depth / self.concurrency))
+
+    # ── public API ───────────────────────────────────────────────────────────
+
+    async def acquire(self, priority: str = INTERACTIVE) -> None:
+        """Take a slot, waiting in the queue if needed; raises AdmissionRejected."""
+        with self._lock:
+            queued_ahead = self._queued[INTERACTIVE] + (
+                self._queued[BATCH] if priority == BATCH else 0)
+            if not queued_ahead and self._has_slot(priority):
+                self._take(priority)
+                return
+            limit = self.queue_limit if priority == INTERACTIVE else self.batch_queue
+            if self._queued[priority] >= limit or sum(self._queued.values()) >= self.queue_limit:
+                self._counters[priority]["rejected"] += 1
+                raise AdmissionRejected(self.name, "queue full", self.retry_after())
+            waiter = _Waiter(priority, asyncio.get_running_loop())
+            heapq.heappush(self._heap, (_RANK[priority], next(self._seq), waiter))
+            self._queued[priority] += 1
+            self._counters[priority]["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.max_wait)
+        except BaseException as exc:
+            with self._lock:
+                if waiter.granted:                      # slot arrived as we gave up
+                    if isinstance(exc, asyncio.TimeoutError):
+                        return
+                    self._active[priority] -= 1
+                    self._dispatch()
+                else:
+                    self._queued[priority] -= 1
+                    if not waiter.future.done():
+                        waiter.future.cancel()
+                if isinstance(exc, asyncio.TimeoutError):
+                    self._counters[priority]["timed_out"] += 1
+                    raise AdmissionRejected(self.name, "queue wait expired",
+                                            self.retry_after()) from None
+            raise
+
+    def release(self, priority: str = INTERACTIVE, service_time: Optional[float] = None) -> None:
+        with self._lock:
+            self._active[priority] -= 1
+            if service_time is not None:
+                self._service_ewma = (service_time if not self._service_ewma
+                                      else 0.8 * self._service_ewma + 0.2 * service_time)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "queue_limit": self.queue_limit,
+                "batch_slots": self.batch_slots,
+                "active": dict(self._active),
+                "queued": dict(self._queued),
+                "mean_service_ms": round(self._service_ewma * 1000, 1),
+                **{cls: dict(c) for cls, c in self._counters.items()},
+            }
+
+
+class AdmissionController:
+    """Routes request paths to pools."""
+
+    def __init__(self, pools: Dict[str, AdmissionPool],
+                 routes: Tuple[Tuple[str, str], ...] = DEFAULT_ROUTES) -> None:
+        self.pools = pools
+        self.routes = tuple((prefix, name) for prefix, name in routes if name in pools)
+
+    def pool_for(self, path: str) -> Optional[AdmissionPool]:
+        for prefix, name in self.routes:
+            if path.startswith(prefix):
+                return self.pools[name]
+        return None
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, "") or default)
+
+
+def from_env() -> AdmissionController:
+    share = float(os.environ.get("DESTINY_ADMIT_BATCH_SHARE", "") or 0.5)
+    max_wait = _env_int("DESTINY_ADMIT_MAX_WAIT_MS", 5000) / 1000
+    defaults = {"compute": os.cpu_count() or 2, "llm": 16}
+    pools = {}
+    for name, slots in defaults.items():
+        slots = _env_int(f"DESTINY_ADMIT_{name.upper()}_CONCURRENCY", slots)
+        queue = _env_int(f"DESTINY_ADMIT_{name.upper()}_QUEUE", 4 * slots)
+        pools[name] = AdmissionPool(name, slots, queue, batch_share=share, max_wait=max_wait)
+    return AdmissionController(pools)
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.environ.get("DESTINY_ADMISSION", "1") not in ("", "0")
+
+
+def get_controller() -> AdmissionController:
+    """Process-wide controller configured from the environment (created on first use)."""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = from_env()
+    return _controller
+
+
+def set_controller(controller: Optional[AdmissionController]) -> Optional[AdmissionController]:
+    """Replace the process-wide controller (tests); None resets to env config."""
+    global _controller
+    with _controller_lock:
+        previous, _controller = _controller, controller
+    return previous
+
+
+async def _reject(send, exc: AdmissionRejected) -> None:
+    body = json.dumps({"detail": f"Server busy ({exc.reason}); retry later",
+                       "pool": exc.pool}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(int(math.ceil(exc.retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: holds a pool slot for the whole request, including a
+    streamed response body, and answers 429 when the pool is saturated."""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None) -> None:
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS" or not enabled():
+            return await self.app(scope, receive, send)
+        pool = (self.controller or get_controller()).pool_for(scope.get("path", ""))
+        if pool is None:
+            return await self.app(scope, receive, send)
+        header = next((v.decode("latin-1") for k, v in scope.get("headers", ())
+                       if k == PRIORITY_HEADER.encode()), None)
+        priority = priority_of(header)
+        try:
+            await pool.acquire(priority)
+        except AdmissionRejected as exc:
+            return await _reject(send, exc)
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release(priority, time.monotonic() - started)
@@ -97,6 +97,7 @@ def format_safe_match_response(
       - tracks (integer scores for 4 tracks)
       - psychological_needs (if available)
       - ai_insight_report (LLM-generated text)
+      - layers (which optional scoring layers ran / were skipped, if reported)
 
     All raw astrology/bazi/zwds data is stripped.
     """
@@ -128,7 +129,10 @@ def format_safe_match_response(
     # 7. High voltage flag (boolean, safe for UI)
     high_voltage = raw_match_data.get("high_voltage", False)
 
-    return {
+    # 8. Layer names that ran / were shed under a deadline (UI shows "partial")
+    layers = raw_match_data.get("layers")
+
+    safe = {
         "status": "success",
         "data": {
             "harmony_score": harmony,
@@ -143,6 +147,13 @@ def format_safe_match_response(
             "ai_insight_report": llm_report_text,
         }
     }
+    if layers:
+        safe["data"]["layers"] = {
+            "ran": list(layers.get("ran", [])),
+            "skipped": list(layers.get("skipped", [])),
+            "degraded": bool(layers.get("degraded")),
+        }
+    return safe
 
 
 def format_safe_onboard_response(
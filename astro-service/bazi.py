@@ -16,45 +16,15 @@ Matching dynamics:
 from __future__ import annotations
 
 import math
-import os
 from datetime import datetime
 from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 
 import swisseph as swe
+from ephemeris import ensure_ephe_path
+from metrics import timed
 
-def _resolve_ephe_path() -> str:
-    """Return an ASCII-safe path to the ephemeris directory.
-
-    pyswisseph passes the path to a C library that cannot handle non-ASCII
-    characters on Windows. If the repo lives inside a directory whose path
-    contains Unicode characters (e.g. Chinese), we copy the small .se1 files
-    to a stable ASCII temp location and use that instead.
-    """
-    ephe_src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ephe")
-    try:
-        ephe_src.encode("ascii")
-        return ephe_src  # All-ASCII — use directly
-    except UnicodeEncodeError:
-        pass
-
-    # Path contains non-ASCII characters; copy files to an ASCII temp location.
-    import shutil, tempfile, atexit
-
-    dest = os.path.join(tempfile.gettempdir(), "destiny_swe_ephe")
-    os.makedirs(dest, exist_ok=True)
-
-    for fname in os.listdir(ephe_src):
-        src_file = os.path.join(ephe_src, fname)
-        dst_file = os.path.join(dest, fname)
-        if not os.path.exists(dst_file):
-            shutil.copy2(src_file, dst_file)
-
-    return dest
-
-
-_EPHE_DIR = _resolve_ephe_path()
-swe.set_ephe_path(_EPHE_DIR)
+# Ephemeris path is resolved and applied on first calculation (ephemeris.py)
 
 # ── Constants ───────────────────────────────────────────────────────
 
@@ -210,6 +180,7 @@ def _get_chinese_year(jd: float, year: int) -> int:
     # Find approximate JD of lichun for this Gregorian year
     # Lichun is around Feb 3-5. Check Sun's longitude at Jan 1 vs target 315°.
     # Simple approach: calculate Sun longitude at the birth JD
+    ensure_ephe_path()
     sun_pos, _ = swe.calc_ut(jd, swe.SUN)
     sun_lng = sun_pos[0]
 
@@ -240,6 +211,7 @@ def _solar_month(jd: float) -> int:
 
     Returns month index 0-11 (0=寅月, 1=卯月, ... 11=丑月).
     """
+    ensure_ephe_path()
     sun_pos, _ = swe.calc_ut(jd, swe.SUN)
     sun_lng = sun_pos[0]  # 0-360
 
@@ -318,6 +290,7 @@ def pillar_to_str(stem_idx: int, branch_idx: int) -> str:
 
 # ── Main Calculation ────────────────────────────────────────────────
 
+@timed("bazi")
 def calculate_bazi(
     birth_date: str,
     birth_time: Optional[str] = None,
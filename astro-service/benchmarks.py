@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Engine Benchmarks
+Times every scoring engine, prompt builder and the DestinyPipeline on
+representative Tier 1 / 2 / 3 inputs, and compares the results against
+stored baselines (benchmark_baseline.json) with a regression threshold.
+
+Each case is timed as best-of-rounds, every round paired with a fixed
+pure-Python calibration workload, and compared as a multiple of that
+workload ("relative"). A baseline recorded on one machine therefore still
+gates runs on another (CI vs laptop); only relative slowdowns count.
+
+A case regresses when its relative cost exceeds the baseline's by more
+than the threshold: per case ("threshold" in its baseline entry), else
+DESTINY_BENCH_THRESHOLD / --threshold, else the baseline file's default.
+run_benchmarks.py re-times a regressed case (--retries) before failing.
+
+Usage:
+    python run_benchmarks.py                 # run + compare, exit 1 on regression
+    python run_benchmarks.py --update        # record a new baseline
+    python run_benchmarks.py --only match    # cases whose name contains "match"
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_THRESHOLD = 0.25
+
+# Representative people per data tier: exact time / time slot / no time
+_PEOPLE = {
+    1: (("1995-06-15", "14:30", "M"), ("1997-03-07", "10:59", "F")),
+    2: (("1992-09-23", "morning", "F"), ("1990-01-30", "evening", "M")),
+    3: (("1998-12-02", None, "M"), ("1996-04-18", None, "F")),
+}
+
+
+def build_cases(tiers=(1, 2, 3)) -> Dict[str, Callable[[], Any]]:
+    """Benchmark name → zero-argument callable, inputs prepared up front."""
+    from bazi import calculate_bazi
+    from chart import calculate_chart
+    from destiny_pipeline import BirthInput, DestinyPipeline
+    from ideal_avatar import extract_ideal_partner_profile
+    from matching import compute_match_v2, compute_quick_score
+    from prompt_manager import (
+        build_synastry_report_prompt, get_ideal_match_prompt, get_match_report_prompt,
+        get_profile_prompt, get_simple_report_prompt,
+    )
+    from shadow_engine import compute_shadow_and_wound
+    from zwds import compute_zwds_chart
+
+    cases: Dict[str, Callable[[], Any]] = {}
+    for tier in tiers:
+        a, b = (BirthInput(*person) for person in _PEOPLE[tier])
+        pipeline = DestinyPipeline(a, b).compute_charts().compute_match().extract_profiles()
+        chart_a, chart_b = pipeline._chart_a, pipeline._chart_b
+        flat_a = pipeline._flat_for_match(a, chart_a)
+        flat_b = pipeline._flat_for_match(b, chart_b)
+        match = pipeline._match
+        prompt_chart = dict(chart_a, zwds=pipeline._zwds_a) if pipeline._zwds_a else chart_a
+        t = f"[t{tier}]"
+
+        cases["calculate_chart" + t] = lambda a=a: calculate_chart(
+            birth_date=a.birth_date, birth_time=a.birth_time_slot,
+            birth_time_exact=a.birth_time_exact, lat=a.lat, lng=a.lng, data_tier=a.tier)
+        cases["calculate_bazi" + t] = lambda a=a: calculate_bazi(
+            a.birth_date, a.birth_time_slot, a.birth_time_exact, a.lat, a.lng, a.tier)
+        if tier == 1:     # Tier 2/3 have no ZWDS chart
+            cases["compute_zwds_chart" + t] = lambda a=a: compute_zwds_chart(
+                *a.parsed_date(), a.birth_time_exact, a.gender)
+        cases["compute_match_v2" + t] = lambda x=flat_a, y=flat_b: compute_match_v2(x, y)
+        cases["compute_quick_score" + t] = lambda x=flat_a, y=flat_b: compute_quick_score(x, y)
+        cases["compute_shadow_and_wound" + t] = (
+            lambda x=flat_a, y=flat_b: compute_shadow_and_wound(x, y))
+        cases["extract_ideal_partner_profile" + t] = (
+            lambda c=chart_a, z=pipeline._zwds_a: extract_ideal_partner_profile(
+                c, c.get("bazi") or {}, z or {}, {}))
+        cases["prompt.match_report" + t] = lambda m=match, c=chart_a, d=chart_b: (
+            get_match_report_prompt(m, user_a_profile=c, user_b_profile=d))
+        cases["prompt.simple_report" + t] = lambda m=match: get_simple_report_prompt(m)
+        cases["prompt.profile" + t] = lambda c=prompt_chart: get_profile_prompt(
+            c, rpv_data={}, attachment_style=c.get("attachment_style", "secure"))
+        cases["prompt.ideal_match" + t] = lambda c=prompt_chart, v=pipeline._avatar_a: (
+            get_ideal_match_prompt(c, v or None))
+        cases["prompt.synastry_report" + t] = lambda m=match, c=chart_a, d=chart_b: (
+            build_synastry_report_prompt(m, user_a_profile=c, user_b_profile=d))
+        cases["destiny_pipeline" + t] = lambda a=a, b=b: (
+            DestinyPipeline(a, b).compute_charts().compute_match()
+            .extract_profiles().build_prompts().to_enriched_dto())
+    return cases
+
+
+def _calibration() -> int:
+    """Fixed pure-Python workload (dict / str / float ops like the engines)."""
+    table = {f"k{i}": i * 0.5 for i in range(200)}
+    total = 0.0
+    for key, value in table.items():
+        total += value * len(key) if key.endswith(("1", "3", "7")) else value
+    return int(total)
+
+
+@dataclass
+class Timing:
+    median_us: float
+    min_us: float
+    relative: float           # min_us in units of the calibration workload
+    calls: int
+
+
+def _loops(fn: Callable[[], Any], budget: float) -> int:
+    """Calls of fn needed to fill roughly `budget` seconds."""
+    n = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(n):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= budget / 4 or n >= 1 << 20:
+            return max(1, int(n * budget / max(elapsed, 1e-9)))
+        n *= 4
+
+
+def _time(fn: Callable[[], Any], n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def measure(fn: Callable[[], Any], min_time: float = 0.2, rounds: int = 7) -> Timing:
+    """Per-call time over `rounds` rounds, each paired with a calibration round.
+
+    Best-of-rounds (min) is the comparison statistic — noise only ever adds
+    time — and it is divided by the calibration measured right next to it,
+    so CPU frequency changes and noisy neighbours largely cancel out.
+    """
+    fn()                                         # warm caches / lazy imports
+    per_round = min_time / rounds
+    n, m = _loops(fn, per_round), _loops(_calibration, per_round / 2)
+    samples, calibration = [], []
+    for _ in range(rounds):
+        calibration.append(_time(_calibration, m))
+        samples.append(_time(fn, n))
+    best = min(samples)
+    return Timing(round(statistics.median(samples), 3), round(best, 3),
+                  round(best / min(calibration), 4), n * rounds)
+
+
+def run(cases: Dict[str, Callable[[], Any]], min_time: float = 0.2,
+        progress: Optional[Callable[[str, Timing], None]] = None) -> dict:
+    """Time all cases; returns a result in baseline-file format."""
+    result = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_us": measure(_calibration, min_time).min_us,
+        "threshold": DEFAULT_THRESHOLD,
+        "cases": {},
+    }
+    for name, fn in cases.items():
+        timing = measure(fn, min_time)
+        result["cases"][name] = {"median_us": timing.median_us, "min_us": timing.min_us,
+                                 "relative": timing.relative}
+        if progress:
+            progress(name, timing)
+    return result
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline_us: float
+    current_us: float         # current relative cost, in baseline-machine µs
+    ratio: float
+    threshold: float
+
+    @property
+    def regressed(self) -> bool:
+        return self.ratio > 1 + self.threshold
+
+
+def compare(current: dict, baseline: dict, threshold: Optional[float] = None) -> List[Comparison]:
+    """Compare a run with a baseline; cases missing from the baseline are skipped."""
+    default = threshold if threshold is not None else baseline.get("threshold", DEFAULT_THRESHOLD)
+    out = []
+    for name, entry in current["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            continue
+        ratio = entry["relative"] / base["relative"]
+        out.append(Comparison(name, base["min_us"], round(base["min_us"] * ratio, 3),
+                              round(ratio, 3), base.get("threshold", default)))
+    return out
+
+
+def recheck(cases: Dict[str, Callable[[], Any]], current: dict, baseline: dict,
+            threshold: Optional[float] = None, retries: int = 2,
+            min_time: float = 0.2) -> List[Comparison]:
+    """compare(), re-timing regressed cases up to `retries` times (best run kept),
+    so only regressions that reproduce are reported."""
+    results = compare(current, baseline, threshold)
+    for _ in range(retries):
+        suspects = {c.name: cases[c.name] for c in results if c.regressed}
+        if not suspects:
+            break
+        retry = run(suspects, min_time)
+        for name, entry in retry["cases"].items():
+            if entry["relative"] < current["cases"][name]["relative"]:
+                current["cases"][name] = entry
+        results = compare(current, baseline, threshold)
+    return results
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(result: dict, path: str = BASELINE_PATH, previous: Optional[dict] = None) -> None:
+    """Write a baseline, keeping per-case thresholds from the previous one."""
+    if previous:
+        result["threshold"] = previous.get("threshold", result["threshold"])
+        for name, entry in result["cases"].items():
+            old = previous["cases"].get(name, {})
+            if "threshold" in old:
+                entry["threshold"] = old["threshold"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def env_threshold() -> Optional[float]:
+    value = os.environ.get("DESTINY_BENCH_THRESHOLD", "")
+    return float(value) if value else None
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Compressed Blob Codec
+Compact binary encoding for the large JSON documents we archive:
+user_natal_data charts (western / bazi / zwds) and matches.raw_result.
+
+Layout (version 1):
+    b"DSB" | version (1 byte) | codec (1 byte) | payload
+    payload = compress(msgpack({top_level_key: msgpack(value)}))
+
+Each top-level field is packed separately, so decode_blob() only
+decompresses and splits the outer map; a field's value is unpacked the
+first time it is read (LazyBlob). Reading raw_result["tracks"] never parses
+raw_result["layers"].
+
+Codecs: zstd (zstandard), zlib (fallback when zstandard is not installed).
+msgpack is required to encode; without it available() is False and callers
+keep writing plain JSON. Encoding follows JSON semantics (non-string map
+keys become strings, tuples become lists) so a decoded blob equals the
+JSONB round trip of the same object.
+
+Enable in db_client / storage with DESTINY_BLOB_ENCODING=1.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import zlib
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+MAGIC = b"DSB"
+VERSION = 1
+CODEC_NONE = 0
+CODEC_ZSTD = 1
+CODEC_ZLIB = 2
+_HEADER_LEN = len(MAGIC) + 2
+
+_local = threading.local()
+
+
+def available() -> bool:
+    """True if blobs can be encoded in this environment."""
+    return msgpack is not None
+
+
+def enabled() -> bool:
+    """True if DESTINY_BLOB_ENCODING asks for blob storage and it is available."""
+    return os.environ.get("DESTINY_BLOB_ENCODING", "0") not in ("", "0") and available()
+
+
+def _normalize(obj: Any) -> Any:
+    """Apply JSON semantics: str map keys, lists for tuples."""
+    if isinstance(obj, Mapping):
+        return {k if isinstance(k, str) else _json_key(k): _normalize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_normalize(v) for v in obj]
+    return obj
+
+
+def _json_key(key: Any) -> str:
+    if key is True:
+        return "true"
+    if key is False:
+        return "false"
+    if key is None:
+        return "null"
+    return str(key)
+
+
+def _compress(data: bytes, codec: int, level: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        cctx = getattr(_local, "cctx", None)
+        if cctx is None or getattr(_local, "level", None) != level:
+            cctx = _local.cctx = zstandard.ZstdCompressor(level=level)
+            _local.level = level
+        return cctx.compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, min(level, 9))
+    return data
+
+
+def _decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but zstandard is not installed")
+        dctx = getattr(_local, "dctx", None)
+        if dctx is None:
+            dctx = _local.dctx = zstandard.ZstdDecompressor()
+        return dctx.decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_NONE:
+        return data
+    raise ValueError(f"Unknown blob codec: {codec}")
+
+
+def encode_blob(obj: Mapping, level: int = 3) -> bytes:
+    """Encode a JSON-like mapping as a versioned, compressed blob."""
+    if msgpack is None:
+        raise RuntimeError("msgpack is required for blob encoding")
+    if not isinstance(obj, Mapping):
+        raise TypeError(f"encode_blob expects a mapping, got {type(obj).__name__}")
+    if isinstance(obj, LazyBlob):
+        fields = obj._packed_fields()
+    else:
+        fields = {k: msgpack.packb(v, use_bin_type=True)
+                  for k, v in _normalize(obj).items()}
+    payload = msgpack.packb(fields, use_bin_type=True)
+    codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+    return MAGIC + bytes((VERSION, codec)) + _compress(payload, codec, level)
+
+
+def is_blob(value: Any) -> bool:
+    if isinstance(value, str):
+        value = from_bytea(value)
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:3]) == MAGIC
+
+
+def decode_blob(value: Any) -> Any:
+    """Decode a blob to a LazyBlob. Plain JSON values (legacy rows) pass through."""
+    if value is None or isinstance(value, (dict, list, LazyBlob)):
+        return value
+    if isinstance(value, str):
+        value = from_bytea(value)
+    data = bytes(value)
+    if data[:3] != MAGIC:
+        raise ValueError("Not a DESTINY blob (bad magic)")
+    version, codec = data[3], data[4]
+    if version != VERSION:
+        raise ValueError(f"Unsupported blob version: {version}")
+    if msgpack is None:
+        raise RuntimeError("msgpack is required to decode blobs")
+    fields = msgpack.unpackb(_decompress(data[_HEADER_LEN:], codec), raw=False)
+    return LazyBlob(fields)
+
+
+class LazyBlob(Mapping):
+    """Read-only mapping whose values are unpacked on first access."""
+
+    __slots__ = ("_raw", "_decoded")
+
+    def __init__(self, fields: Dict[str, bytes]) -> None:
+        self._raw = fields
+        self._decoded: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._decoded[key]
+        except KeyError:
+            value = msgpack.unpackb(self._raw[key], raw=False)
+            self._decoded[key] = value
+            return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._raw
+
+    def __repr__(self) -> str:
+        return f"LazyBlob({list(self._raw)})"
+
+    @property
+    def decoded_fields(self) -> list:
+        """Fields unpacked so far (for tests and diagnostics)."""
+        return list(self._decoded)
+
+    def _packed_fields(self) -> Dict[str, bytes]:
+        return dict(self._raw)
+
+    def to_dict(self) -> dict:
+        """Fully decoded plain dict (e.g. before json.dumps)."""
+        return {k: self[k] for k in self._raw}
+
+
+# ── Transport helpers ─────────────────────────────────────────────────────────
+
+def to_bytea(blob: bytes) -> str:
+    """PostgREST bytea input format (hex)."""
+    return "\\x" + blob.hex()
+
+
+def from_bytea(value: Any) -> Any:
+    """bytes from a PostgREST bytea string ("\\x…"); other values pass through."""
+    if isinstance(value, str) and value.startswith("\\x"):
+        return bytes.fromhex(value[2:])
+    return value
+
+
+def decode_columns(row: dict, columns, suffix: str = "_blob") -> dict:
+    """Replace each <col> with the decoded <col><suffix> when that blob is set."""
+    for col in columns:
+        blob = row.pop(col + suffix, None)
+        if blob:
+            row[col] = decode_blob(blob)
+    return row
+
+
+def encode_columns(row: dict, columns, suffix: str = "_blob") -> dict:
+    """Move each <col> into <col><suffix> as a bytea blob, leaving {} behind."""
+    for col in columns:
+        if col in row and isinstance(row[col], Mapping):
+            row[col + suffix] = to_bytea(encode_blob(row[col]))
+            row[col] = {}
+    return row
+
+
+def plain(value: Any) -> Any:
+    """Recursively convert LazyBlob values to plain dicts (for JSON responses)."""
+    if isinstance(value, LazyBlob):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    return value
@@ -10,45 +10,15 @@ Data Tier behaviour:
 
 from __future__ import annotations
 
-import os
 from datetime import datetime
 from typing import Dict, Optional
 
 import swisseph as swe
+from ephemeris import apply_ephe_path, ensure_ephe_path
+from metrics import timed
 from psychology import extract_sm_dynamics, extract_critical_degrees, compute_element_profile, extract_retrograde_karma, extract_karmic_axis
 
-def _resolve_ephe_path() -> str:
-    """Return an ASCII-safe path to the ephemeris directory.
-
-    pyswisseph passes the path to a C library that cannot handle non-ASCII
-    characters on Windows. If the repo lives inside a directory whose path
-    contains Unicode characters (e.g. Chinese), we copy the small .se1 files
-    to a stable ASCII temp location and use that instead.
-    """
-    ephe_src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ephe")
-    try:
-        ephe_src.encode("ascii")
-        return ephe_src  # All-ASCII — use directly
-    except UnicodeEncodeError:
-        pass
-
-    # Path contains non-ASCII characters; copy files to an ASCII temp location.
-    import shutil, tempfile, atexit
-
-    dest = os.path.join(tempfile.gettempdir(), "destiny_swe_ephe")
-    os.makedirs(dest, exist_ok=True)
-
-    for fname in os.listdir(ephe_src):
-        src_file = os.path.join(ephe_src, fname)
-        dst_file = os.path.join(dest, fname)
-        if not os.path.exists(dst_file):
-            shutil.copy2(src_file, dst_file)
-
-    return dest
-
-
-_EPHE_DIR = _resolve_ephe_path()
-swe.set_ephe_path(_EPHE_DIR)
+# Ephemeris path is resolved and applied on first calculation (ephemeris.py)
 
 # ── Zodiac constants ────────────────────────────────────────────────
 
@@ -318,6 +288,7 @@ def compute_natal_aspects(result: dict, data_tier: int) -> list:
 
 # ── Main calculation ────────────────────────────────────────────────
 
+@timed("chart")
 def calculate_chart(
     birth_date: str,
     birth_time: str | None = None,
@@ -345,6 +316,7 @@ def calculate_chart(
     ut_hour = _resolve_hour(birth_time, birth_time_exact, data_tier)
 
     # Julian Day Number (UT)
+    ensure_ephe_path()
     jd = swe.julday(dt.year, dt.month, dt.day, ut_hour)
 
     # ── Planetary positions ──────────────────────────────────────
@@ -364,7 +336,7 @@ def calculate_chart(
     # ── Asteroids (Chiron, Juno) ─────────────────────────────────
     # Re-apply ephemeris path before asteroid calls — some ASGI server import
     # sequences reset pyswisseph's C-library global path to the default '\sweph\ephe\'.
-    swe.set_ephe_path(_EPHE_DIR)
+    apply_ephe_path()
     for name, asteroid_id in ASTEROIDS.items():
         try:
             pos, _ret = swe.calc_ut(jd, asteroid_id)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Circuit Breaker
+Fail fast against a dependency that is down instead of waiting for its full
+timeout on every call.
+
+States:
+  closed    — calls pass; failure_threshold consecutive failures → open
+  open      — calls are rejected immediately (CircuitOpenError) until
+              reset_timeout seconds have passed → half_open
+  half_open — up to half_open_calls trial calls pass; a success closes the
+              circuit, a failure re-opens it (and restarts the timer)
+
+Only failures that say something about the dependency's health should be
+recorded (timeouts, connection errors, 5xx, 429); a caller's bad request
+is not an outage. llm_gateway.is_provider_failure makes that call for the
+LLM SDK exceptions.
+
+Usage:
+    breaker = CircuitBreaker("gemini")
+    breaker.before_call()          # raises CircuitOpenError while open
+    try:
+        result = do_call()
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Call rejected because the circuit is open."""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"circuit '{name}' is open; retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open trial calls."""
+
+    def __init__(
+        self,
+        name: str = "",
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_calls: int = 1,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+        self._last_failure: Optional[str] = None
+
+    def _refresh(self) -> None:
+        """open → half_open once reset_timeout has elapsed (caller holds the lock)."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trials = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allows(self) -> bool:
+        """True if a call would currently be let through (reserves nothing)."""
+        try:
+            self.check()
+            return True
+        except CircuitOpenError:
+            return False
+
+    def check(self) -> None:
+        """Raise CircuitOpenError if a call would be rejected (reserves nothing)."""
+        with self._lock:
+            self._refresh()
+            if self._state == OPEN or (
+                self._state == HALF_OPEN and self._trials >= self.half_open_calls
+            ):
+                raise CircuitOpenError(self.name, self._retry_after())
+
+    def _retry_after(self) -> float:
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError. Every admitted call must end
+        with record_success, record_failure or release."""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return
+            self._counters["rejected"] += 1
+            raise CircuitOpenError(self.name, self._retry_after())
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._trials = 0
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._counters["failures"] += 1
+            if error is not None:
+                self._last_failure = f"{type(error).__name__}: {error}"[:200]
+            self._failures += 1
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def release(self) -> None:
+        """End an admitted call without a verdict (e.g. the caller cancelled it)."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._trials = 0
+        self._counters["opened"] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trials = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refresh()
+            out = dict(self._counters, state=self._state,
+                       consecutive_failures=self._failures,
+                       last_failure=self._last_failure)
+            if self._state == OPEN:
+                out["retry_after"] = round(self._retry_after(), 1)
+            return out
@@ -7,18 +7,47 @@ psychology profiles, and match result storage.
 Required environment variables (reads from Next.js .env.local convention):
   NEXT_PUBLIC_SUPABASE_URL       — e.g. https://xxxxx.supabase.co
   SUPABASE_SERVICE_ROLE_KEY      — service_role key (NOT anon key)
+
+Optional:
+  DESTINY_DB_POOL_SIZE           — max HTTP connections to Supabase (default 20)
+  DESTINY_DB_KEEPALIVE_EXPIRY    — seconds an idle keep-alive connection is kept (default 30)
+  DESTINY_DB_TIMEOUT             — read/write timeout in seconds (default 10)
+  DESTINY_DB_CONNECT_TIMEOUT     — connect timeout in seconds (default 5)
+  DESTINY_DB_POOL_TIMEOUT        — max seconds to wait for a free connection (default 5)
+  DESTINY_DB_CACHE_TTL           — seconds natal/psychology rows stay cached
+                                   in-process (default 300, 0 disables)
+  DESTINY_DB_CACHE_SIZE          — max cached users per table (default 10000)
+  DESTINY_WRITE_BEHIND           — "0" keeps writes synchronous even when the
+                                   service starts the write-behind queue
+  DESTINY_WB_MAX_BATCH           — rows per multi-row upsert (default 100)
+  DESTINY_WB_FLUSH_INTERVAL      — max seconds a write waits before flush (default 0.5)
+  DESTINY_WB_MAX_RETRIES         — flush retries before a write is dropped (default 5)
+  DESTINY_BLOB_ENCODING          — "1" stores charts / raw_result as compressed
+                                   blobs in the *_blob bytea columns (migration 017)
 """
 
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import Any, Dict, Optional
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
 
-from supabase import create_client, Client
+import httpx
 
+import blob_codec
+from metrics import observe_stage
+from schema import NATAL_COLUMNS, PSYCHOLOGY_FIELDS
 
-def _get_client() -> Client:
-    """Create or return a Supabase client using environment variables."""
+if TYPE_CHECKING:  # supabase / postgrest are imported when the first client is built
+    from supabase import AsyncClient, Client
+
+
+def _credentials() -> tuple:
     url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL", "") or os.environ.get("SUPABASE_URL", "")
     key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "") or os.environ.get("SUPABASE_SERVICE_KEY", "")
     if not url or not key:
@@ -26,7 +55,702 @@ def _get_client() -> Client:
             "NEXT_PUBLIC_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set. "
             "Check your .env.local or environment variables."
         )
-    return create_client(url, key)
+    return url, key
+
+
+# ── Connection pool ──────────────────────────────────────────────────────────
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, "") or default)
+
+
+def _pool_limits() -> httpx.Limits:
+    size = int(_env_float("DESTINY_DB_POOL_SIZE", 20))
+    return httpx.Limits(
+        max_connections=size,
+        max_keepalive_connections=size,
+        keepalive_expiry=_env_float("DESTINY_DB_KEEPALIVE_EXPIRY", 30),
+    )
+
+
+def _pool_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        _env_float("DESTINY_DB_TIMEOUT", 10),
+        connect=_env_float("DESTINY_DB_CONNECT_TIMEOUT", 5),
+        pool=_env_float("DESTINY_DB_POOL_TIMEOUT", 5),
+    )
+
+
+class PoolMetrics:
+    """Counters for one HTTP connection pool.
+
+    in_flight counts requests from send until the response body is closed,
+    i.e. requests holding (or waiting for) a pooled connection.
+    """
+
+    def __init__(self, max_connections: int) -> None:
+        self.max_connections = max_connections
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.pool_timeouts = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if isinstance(error, httpx.PoolTimeout):
+                self.pool_timeouts += 1
+            elif error is not None:
+                self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_connections": self.max_connections,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "saturation": round(self.in_flight / self.max_connections, 3)
+                if self.max_connections else 0.0,
+                "requests": self.requests,
+                "pool_timeouts": self.pool_timeouts,
+                "errors": self.errors,
+            }
+
+
+def _db_stage(request: httpx.Request) -> str:
+    """Stage name for a PostgREST request: db.<table>.<method>."""
+    return f"db.{request.url.path.rstrip('/').rsplit('/', 1)[-1]}.{request.method.lower()}"
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    def __init__(self, stream, metrics: PoolMetrics, stage: str, started: float) -> None:
+        self._stream = stream
+        self._metrics = metrics
+        self._stage = stage
+        self._started = started
+        self._closed = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._metrics.finished()
+            observe_stage(self._stage, time.perf_counter() - self._started)
+        self._stream.close()
+
+
+class _AsyncMeteredStream(httpx.AsyncByteStream):
+    def __init__(self, stream, metrics: PoolMetrics, stage: str, started: float) -> None:
+        self._stream = stream
+        self._metrics = metrics
+        self._stage = stage
+        self._started = started
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._metrics.finished()
+            observe_stage(self._stage, time.perf_counter() - self._started)
+        await self._stream.aclose()
+
+
+class _MeteredTransport(httpx.HTTPTransport):
+    def __init__(self, metrics: PoolMetrics, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.metrics.started()
+        stage, started = _db_stage(request), time.perf_counter()
+        try:
+            response = super().handle_request(request)
+        except BaseException as e:
+            self.metrics.finished(e)
+            observe_stage(stage, time.perf_counter() - started)
+            raise
+        response.stream = _MeteredStream(response.stream, self.metrics, stage, started)
+        return response
+
+
+class _AsyncMeteredTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, metrics: PoolMetrics, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.metrics.started()
+        stage, started = _db_stage(request), time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException as e:
+            self.metrics.finished(e)
+            observe_stage(stage, time.perf_counter() - started)
+            raise
+        response.stream = _AsyncMeteredStream(response.stream, self.metrics, stage, started)
+        return response
+
+
+_client: Optional[Client] = None
+_http: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+_sync_metrics: Optional[PoolMetrics] = None
+
+# event loop → (AsyncClient, httpx.AsyncClient, PoolMetrics); one pool per loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = \
+    weakref.WeakKeyDictionary()
+_async_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = \
+    weakref.WeakKeyDictionary()
+_async_state_lock = threading.Lock()
+_async_metrics: Optional[PoolMetrics] = None
+
+
+def _get_client() -> Client:
+    """Return the process-wide Supabase client (created on first use).
+
+    All calls share one keep-alive httpx connection pool sized by
+    DESTINY_DB_POOL_SIZE, so repeated queries skip the TCP/TLS handshake.
+    """
+    global _client, _http, _sync_metrics
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            from supabase import ClientOptions, create_client
+
+            url, key = _credentials()
+            limits = _pool_limits()
+            metrics = PoolMetrics(limits.max_connections)
+            http = httpx.Client(
+                transport=_MeteredTransport(metrics, limits=limits, http2=True),
+                timeout=_pool_timeout(),
+                follow_redirects=True,
+            )
+            _client = create_client(url, key, options=ClientOptions(httpx_client=http))
+            _http, _sync_metrics = http, metrics
+    return _client
+
+
+async def get_async_client() -> AsyncClient:
+    """Async counterpart of _get_client() for use inside async endpoints.
+
+    Pools are bound to an event loop, so each running loop (the server's,
+    offload threads', asyncio.run in scripts and tests) gets its own client,
+    created once per loop. Pools of loops that have since closed are dropped.
+    """
+    global _async_metrics
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is not None:
+        return entry[0]
+    with _async_state_lock:
+        lock = _async_locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        entry = _async_clients.get(loop)
+        if entry is not None:
+            return entry[0]
+        from supabase import AsyncClientOptions, acreate_client
+
+        url, key = _credentials()
+        limits = _pool_limits()
+        metrics = PoolMetrics(limits.max_connections)
+        http = httpx.AsyncClient(
+            transport=_AsyncMeteredTransport(metrics, limits=limits, http2=True),
+            timeout=_pool_timeout(),
+            follow_redirects=True,
+        )
+        client = await acreate_client(url, key, options=AsyncClientOptions(httpx_client=http))
+        with _async_state_lock:
+            # a closed loop's sockets can't be closed from here; drop the pool
+            # (the entry can outlive its loop through references back to it)
+            for old in [other for other in _async_clients if other.is_closed()]:
+                del _async_clients[old]
+            _async_clients[loop] = (client, http, metrics)
+            _async_metrics = metrics
+    return client
+
+
+def pool_stats() -> dict:
+    """Pool health for /health/db: in-flight requests, saturation, timeouts."""
+    return {
+        "sync": _sync_metrics.snapshot() if _sync_metrics else None,
+        "async": _async_metrics.snapshot() if _async_metrics else None,
+    }
+
+
+def close_clients() -> None:
+    """Close the sync pool (the async one is closed by aclose_clients)."""
+    global _client, _http, _sync_metrics
+    with _client_lock:
+        if _http is not None:
+            _http.close()
+        _client = _http = _sync_metrics = None
+
+
+async def aclose_clients() -> None:
+    """Close the sync pool and every async pool; call from the FastAPI shutdown hook.
+
+    The running loop's pool is closed here; pools of other live loops are
+    closed on their own loop.
+    """
+    global _async_metrics
+    loop = asyncio.get_running_loop()
+    with _async_state_lock:
+        entries = list(_async_clients.items())
+        _async_clients.clear()
+        _async_metrics = None
+    for owner, (_, http, _) in entries:
+        if owner is loop:
+            await http.aclose()
+        elif owner.is_running():
+            asyncio.run_coroutine_threadsafe(http.aclose(), owner)
+    close_clients()
+
+
+# ── In-process cache ─────────────────────────────────────────────────────────
+
+# Column projections come from schema.py — never select("*") on JSONB-heavy tables.
+
+# JSON columns that move to <col>_blob (bytea) when DESTINY_BLOB_ENCODING=1
+_BLOB_COLUMNS = {
+    "user_natal_data": NATAL_COLUMNS,
+    "matches": ("raw_result",),
+}
+_MATCH_COLUMNS = (
+    "user_a_id", "user_b_id", "harmony_score", "tension_level",
+    "badges", "tracks", "llm_insight_report", "created_at",
+)
+
+# PostgREST puts .in_() filters in the URL; keep each request well under limits.
+_IN_CHUNK = 200
+
+
+def _select(columns: Iterable[str], with_user_id: bool = False) -> str:
+    return ", ".join((("user_id",) if with_user_id else ()) + tuple(columns))
+
+
+def _natal_columns() -> tuple:
+    if blob_codec.enabled():
+        return NATAL_COLUMNS + tuple(c + "_blob" for c in NATAL_COLUMNS)
+    return NATAL_COLUMNS
+
+
+def _encode_row(table: str, row: dict) -> dict:
+    """Store the table's large JSON columns as blobs when blob encoding is on."""
+    if table in _BLOB_COLUMNS and blob_codec.enabled():
+        blob_codec.encode_columns(row, _BLOB_COLUMNS[table])
+    return row
+
+
+def _decode_row(table: str, row: dict) -> dict:
+    """Swap any *_blob columns back to (lazily decoded) mappings."""
+    if table in _BLOB_COLUMNS:
+        blob_codec.decode_columns(row, _BLOB_COLUMNS[table])
+    return row
+
+
+class _TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, ttl: float, maxsize: int) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def set(self, key: str, value: dict) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, dict(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_CACHE_TTL = float(os.environ.get("DESTINY_DB_CACHE_TTL", "300"))
+_CACHE_SIZE = int(os.environ.get("DESTINY_DB_CACHE_SIZE", "10000"))
+_natal_cache = _TTLCache(_CACHE_TTL, _CACHE_SIZE)
+_psychology_cache = _TTLCache(_CACHE_TTL, _CACHE_SIZE)
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop cached natal data and psychology profile for one user."""
+    _natal_cache.invalidate(user_id)
+    _psychology_cache.invalidate(user_id)
+
+
+def invalidate_users(user_ids: Iterable[str]) -> None:
+    """Drop cached rows for many users (e.g. a feature_sync.FeatureSync listener)."""
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+
+def clear_caches() -> None:
+    _natal_cache.clear()
+    _psychology_cache.clear()
+
+
+def cache_stats() -> dict:
+    return {"natal": _natal_cache.stats(), "psychology": _psychology_cache.stats()}
+
+
+def _fetch_many(table: str, columns: Iterable[str], user_ids: List[str]) -> Dict[str, dict]:
+    """Fetch rows for user_ids with one .in_() query per _IN_CHUNK ids."""
+    client = _get_client()
+    rows: Dict[str, dict] = {}
+    for i in range(0, len(user_ids), _IN_CHUNK):
+        chunk = user_ids[i:i + _IN_CHUNK]
+        result = client.table(table) \
+            .select(_select(columns, with_user_id=True)) \
+            .in_("user_id", chunk) \
+            .execute()
+        for row in result.data or []:
+            uid = row.pop("user_id")
+            rows[uid] = row
+    return rows
+
+
+async def _afetch_many(table: str, columns: Iterable[str], user_ids: List[str]) -> Dict[str, dict]:
+    """Async _fetch_many over the async pool."""
+    client = await get_async_client()
+    rows: Dict[str, dict] = {}
+    for i in range(0, len(user_ids), _IN_CHUNK):
+        chunk = user_ids[i:i + _IN_CHUNK]
+        result = await client.table(table) \
+            .select(_select(columns, with_user_id=True)) \
+            .in_("user_id", chunk) \
+            .execute()
+        for row in result.data or []:
+            uid = row.pop("user_id")
+            rows[uid] = row
+    return rows
+
+
+def _split_cached(cache: _TTLCache, user_ids: Iterable[str]) -> tuple:
+    found: Dict[str, dict] = {}
+    missing: List[str] = []
+    for uid in dict.fromkeys(user_ids):
+        hit = cache.get(uid)
+        if hit is not None:
+            found[uid] = hit
+        else:
+            missing.append(uid)
+    return found, missing
+
+
+def _get_many_cached(
+    cache: _TTLCache, table: str, columns: Iterable[str], user_ids: Iterable[str],
+) -> Dict[str, dict]:
+    found, missing = _split_cached(cache, user_ids)
+    if missing:
+        fetched = _finish_rows(table, _fetch_many(table, columns, missing), missing)
+        for uid, row in fetched.items():
+            cache.set(uid, row)
+            found[uid] = row
+    return found
+
+
+async def _aget_many_cached(
+    cache: _TTLCache, table: str, columns: Iterable[str], user_ids: Iterable[str],
+) -> Dict[str, dict]:
+    found, missing = _split_cached(cache, user_ids)
+    if missing:
+        fetched = _finish_rows(table, await _afetch_many(table, columns, missing), missing)
+        for uid, row in fetched.items():
+            cache.set(uid, row)
+            found[uid] = row
+    return found
+
+
+# ── Write-behind queue ───────────────────────────────────────────────────────
+
+def _upsert_rows(table: str, rows: List[dict], on_conflict: str = "") -> None:
+    """One multi-row upsert; rows must share the same columns."""
+    from postgrest import ReturnMethod
+
+    _get_client().table(table) \
+        .upsert(rows, on_conflict=on_conflict, returning=ReturnMethod.minimal) \
+        .execute()
+
+
+class WriteBehindQueue:
+    """Takes database writes off the request path.
+
+    enqueue() coalesces writes per (table, key): a later partial row is
+    merged into the pending one, so an onboarding upsert followed by the
+    llm_natal_report update becomes a single row. A daemon thread flushes
+    pending rows as multi-row upserts once max_batch rows are waiting or the
+    oldest has waited flush_interval seconds. Failed batches are re-queued
+    with exponential backoff and dropped after max_retries. close() flushes
+    whatever is left.
+
+    writer(table, rows, on_conflict) performs the upsert (default: Supabase).
+    """
+
+    def __init__(
+        self,
+        writer=None,
+        max_batch: int = 100,
+        flush_interval: float = 0.5,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ) -> None:
+        self._writer = writer or _upsert_rows
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # (table, key) → {"row", "on_conflict", "attempts", "since"}
+        self._pending: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._retry_at = 0.0
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"enqueued": 0, "coalesced": 0, "written": 0,
+                       "batches": 0, "failures": 0, "dropped": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "WriteBehindQueue":
+        if not self.running:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+            self._thread.start()
+        return self
+
+    def enqueue(self, table: str, key: Any, row: dict, on_conflict: str = "") -> None:
+        with self._cond:
+            self._stats["enqueued"] += 1
+            entry = self._pending.get((table, key))
+            if entry is not None:
+                self._stats["coalesced"] += 1
+                entry["row"].update(row)
+            else:
+                self._pending[(table, key)] = {
+                    "row": dict(row), "on_conflict": on_conflict,
+                    "attempts": 0, "since": time.monotonic(),
+                }
+            self._cond.notify()
+
+    def pending_row(self, table: str, key: Any) -> Optional[dict]:
+        """The not-yet-written row for (table, key), for read-your-writes."""
+        with self._cond:
+            entry = self._pending.get((table, key))
+            return dict(entry["row"]) if entry else None
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending), running=self.running)
+
+    # ── flushing ──────────────────────────────────────────────────────────
+
+    def _due(self, now: float) -> Optional[float]:
+        """0 if a flush is due now, else seconds to wait (None = wait for work)."""
+        if not self._pending:
+            return None
+        if now < self._retry_at:
+            return self._retry_at - now
+        if len(self._pending) >= self.max_batch:
+            return 0.0
+        oldest = min(e["since"] for e in self._pending.values())
+        return max(0.0, oldest + self.flush_interval - now)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    wait = self._due(time.monotonic())
+                    if wait == 0.0:
+                        break
+                    self._cond.wait(wait)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything pending now; returns rows written."""
+        with self._cond:
+            batch, self._pending = self._pending, OrderedDict()
+
+        groups: Dict[tuple, List[tuple]] = {}
+        for (table, key), entry in batch.items():
+            cols = tuple(sorted(entry["row"]))
+            groups.setdefault((table, entry["on_conflict"], cols), []).append((key, entry))
+
+        written = 0
+        for (table, on_conflict, _), items in groups.items():
+            for i in range(0, len(items), self.max_batch):
+                chunk = items[i:i + self.max_batch]
+                try:
+                    self._writer(table, [e["row"] for _, e in chunk], on_conflict)
+                except Exception as e:
+                    self._requeue(table, chunk, e)
+                    continue
+                written += len(chunk)
+                with self._cond:
+                    self._stats["written"] += len(chunk)
+                    self._stats["batches"] += 1
+        if written:
+            with self._cond:
+                self._retry_at = 0.0
+        return written
+
+    def _requeue(self, table: str, chunk: List[tuple], error: Exception) -> None:
+        with self._cond:
+            self._stats["failures"] += 1
+            attempts = 0
+            for key, entry in chunk:
+                entry["attempts"] += 1
+                if entry["attempts"] > self.max_retries:
+                    self._stats["dropped"] += 1
+                    print(f"[db_client] write-behind dropped {table} row {key!r}: {error}",
+                          file=sys.stderr)
+                    continue
+                newer = self._pending.get((table, key))
+                if newer is not None:
+                    # Keep the newer values on top of the failed ones
+                    entry["row"].update(newer["row"])
+                self._pending[(table, key)] = entry
+                attempts = max(attempts, entry["attempts"])
+            if attempts:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                self._retry_at = max(self._retry_at, time.monotonic() + delay)
+            self._cond.notify()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop the flusher and write out everything still pending."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        deadline = time.monotonic() + timeout
+        while len(self) and time.monotonic() < deadline:
+            wait = self._retry_at - time.monotonic()
+            if wait > 0:
+                time.sleep(min(wait, max(0.0, deadline - time.monotonic())))
+            self.flush()
+
+
+_write_queue: Optional[WriteBehindQueue] = None
+
+
+def start_write_behind(**kwargs) -> Optional[WriteBehindQueue]:
+    """Route upserts through a WriteBehindQueue (started by SupabaseStorage).
+
+    No-op when DESTINY_WRITE_BEHIND=0 or Supabase is not configured, in
+    which case writes stay synchronous.
+    """
+    global _write_queue
+    if os.environ.get("DESTINY_WRITE_BEHIND", "1") == "0":
+        return None
+    if "writer" not in kwargs:
+        try:
+            _credentials()
+        except RuntimeError:
+            return None
+    if _write_queue is None or not _write_queue.running:
+        config = dict(
+            max_batch=int(_env_float("DESTINY_WB_MAX_BATCH", 100)),
+            flush_interval=_env_float("DESTINY_WB_FLUSH_INTERVAL", 0.5),
+            max_retries=int(_env_float("DESTINY_WB_MAX_RETRIES", 5)),
+        )
+        config.update(kwargs)
+        _write_queue = WriteBehindQueue(**config).start()
+    return _write_queue
+
+
+def stop_write_behind(timeout: float = 10.0) -> None:
+    """Flush and stop the queue (FastAPI shutdown hook); writes become synchronous."""
+    global _write_queue
+    queue, _write_queue = _write_queue, None
+    if queue is not None:
+        queue.close(timeout)
+
+
+def write_behind_stats() -> Optional[dict]:
+    return _write_queue.stats() if _write_queue is not None else None
+
+
+def _write(table: str, key: Any, row: dict, on_conflict: str = "") -> None:
+    """Upsert one row — queued when write-behind is running, else immediately."""
+    queue = _write_queue
+    if queue is not None and queue.running:
+        queue.enqueue(table, key, row, on_conflict)
+    else:
+        _upsert_rows(table, [row], on_conflict)
+
+
+def _finish_rows(table: str, rows: Dict[str, dict], user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Overlay queued writes, then decode blob columns."""
+    rows = _overlay_pending(table, rows, user_ids)
+    for row in rows.values():
+        _decode_row(table, row)
+    return rows
+
+
+def _overlay_pending(table: str, rows: Dict[str, dict], user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Apply queued-but-unwritten rows on top of rows read from the database."""
+    queue = _write_queue
+    if queue is None or not len(queue):
+        return rows
+    for uid in user_ids:
+        pending = queue.pending_row(table, uid)
+        if pending:
+            pending.pop("user_id", None)
+            rows[uid] = {**rows.get(uid, {}), **pending}
+    return rows
 
 
 # ── Natal Data (user_natal_data) ─────────────────────────────────────────────
@@ -41,13 +765,17 @@ def upsert_natal_data(
 
     This data is NEVER exposed to the frontend.
     """
-    client = _get_client()
-    client.table("user_natal_data").upsert({
+    _write("user_natal_data", user_id, _encode_row("user_natal_data", {
         "user_id": user_id,
         "western_chart": western_chart,
         "bazi_chart": bazi_chart,
         "zwds_chart": zwds_chart,
-    }).execute()
+    }))
+    _natal_cache.set(user_id, {
+        "western_chart": western_chart,
+        "bazi_chart": bazi_chart,
+        "zwds_chart": zwds_chart,
+    })
 
 
 def get_natal_data(user_id: str) -> Optional[dict]:
@@ -56,13 +784,34 @@ def get_natal_data(user_id: str) -> Optional[dict]:
     Returns dict with keys: western_chart, bazi_chart, zwds_chart.
     Returns None if no data found.
     """
+    cached = _natal_cache.get(user_id)
+    if cached is not None:
+        return cached
     client = _get_client()
     result = client.table("user_natal_data") \
-        .select("western_chart, bazi_chart, zwds_chart") \
+        .select(_select(_natal_columns())) \
         .eq("user_id", user_id) \
         .maybe_single() \
         .execute()
-    return result.data if result.data else None
+    rows = {user_id: result.data} if result and result.data else {}
+    if user_id not in _finish_rows("user_natal_data", rows, [user_id]):
+        return None
+    _natal_cache.set(user_id, rows[user_id])
+    return rows[user_id]
+
+
+def get_natal_data_many(user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Bulk get_natal_data: {user_id: natal} for every user that has data.
+
+    Cached users cost nothing; the rest are fetched in a single query
+    (one per 200 ids). Users without natal data are absent from the result.
+    """
+    return _get_many_cached(_natal_cache, "user_natal_data", _natal_columns(), user_ids)
+
+
+async def aget_natal_data_many(user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Async get_natal_data_many (shares the same in-process cache)."""
+    return await _aget_many_cached(_natal_cache, "user_natal_data", _natal_columns(), user_ids)
 
 
 # ── Psychology Profiles (user_psychology_profiles) ───────────────────────────
@@ -73,29 +822,47 @@ def upsert_psychology_profile(user_id: str, profile: dict) -> None:
     profile should contain keys from ideal_avatar.extract_ideal_partner_profile:
       relationship_dynamic, psychological_needs, favorable_elements, etc.
     """
-    client = _get_client()
     row = {"user_id": user_id}
     # Map known fields
-    for field in [
-        "relationship_dynamic", "psychological_needs",
-        "favorable_elements", "dominant_elements",
-        "karmic_boss", "llm_natal_report",
-        "attachment_style",
-    ]:
+    for field in PSYCHOLOGY_FIELDS:
         if field in profile:
             row[field] = profile[field]
-    client.table("user_psychology_profiles").upsert(row).execute()
+    _write("user_psychology_profiles", user_id, row)
+    # Partial upserts (e.g. only llm_natal_report) — refetch on next read;
+    # queued fields are overlaid by _overlay_pending until they are written
+    _psychology_cache.invalidate(user_id)
 
 
 def get_psychology_profile(user_id: str) -> Optional[dict]:
     """Retrieve psychology profile for a user."""
+    cached = _psychology_cache.get(user_id)
+    if cached is not None:
+        return cached
     client = _get_client()
     result = client.table("user_psychology_profiles") \
-        .select("*") \
+        .select(_select(PSYCHOLOGY_FIELDS)) \
         .eq("user_id", user_id) \
         .maybe_single() \
         .execute()
-    return result.data if result.data else None
+    rows = {user_id: result.data} if result and result.data else {}
+    if user_id not in _overlay_pending("user_psychology_profiles", rows, [user_id]):
+        return None
+    _psychology_cache.set(user_id, rows[user_id])
+    return rows[user_id]
+
+
+def get_psychology_profiles_many(user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Bulk get_psychology_profile: {user_id: profile} for users that have one."""
+    return _get_many_cached(
+        _psychology_cache, "user_psychology_profiles", PSYCHOLOGY_FIELDS, user_ids,
+    )
+
+
+async def aget_psychology_profiles_many(user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Async get_psychology_profiles_many."""
+    return await _aget_many_cached(
+        _psychology_cache, "user_psychology_profiles", PSYCHOLOGY_FIELDS, user_ids,
+    )
 
 
 def get_or_compute_psychology_profile(user_id: str, natal_data: dict) -> dict:
@@ -129,34 +896,86 @@ def get_or_compute_psychology_profile(user_id: str, natal_data: dict) -> dict:
         return {}
 
 
+def get_or_compute_psychology_profiles_many(natal_by_user: Dict[str, dict]) -> Dict[str, dict]:
+    """Bulk get_or_compute_psychology_profile over {user_id: natal_data}.
+
+    One query for the cached profiles; missing ones are computed and saved
+    individually. Each user maps to {} on error, like the single-user version.
+    """
+    try:
+        profiles = get_psychology_profiles_many(natal_by_user.keys())
+    except Exception:
+        profiles = {}
+    out: Dict[str, dict] = {}
+    for user_id, natal_data in natal_by_user.items():
+        if profiles.get(user_id):
+            out[user_id] = profiles[user_id]
+            continue
+        try:
+            from ideal_avatar import extract_ideal_partner_profile
+            profile = extract_ideal_partner_profile(
+                natal_data.get("western_chart", {}),
+                natal_data.get("bazi_chart", {}),
+                natal_data.get("zwds_chart", {}),
+            )
+            upsert_psychology_profile(user_id, profile)
+            out[user_id] = profile
+        except Exception:
+            out[user_id] = {}
+    return out
+
+
 # ── Match Results (matches) ──────────────────────────────────────────────────
 
 def get_cached_match(user_a_id: str, user_b_id: str) -> Optional[dict]:
     """Check if a match result already exists for this pair.
 
     Returns the cached match row if found, None otherwise.
-    Checks both directions (A→B and B→A).
+    Checks both directions (A→B, then B→A on a miss); raw_result is not
+    selected (use the matches table directly if the archive is needed).
     """
+    pending = _pending_match(user_a_id, user_b_id)
+    if pending:
+        return pending
     client = _get_client()
+    for a, b in ((user_a_id, user_b_id), (user_b_id, user_a_id)):
+        result = _match_query(client, a, b).execute()
+        if result.data:
+            return result.data[0]
+    return None
+
+
+async def aget_cached_match(user_a_id: str, user_b_id: str) -> Optional[dict]:
+    """Async get_cached_match."""
+    pending = _pending_match(user_a_id, user_b_id)
+    if pending:
+        return pending
+    client = await get_async_client()
+    for a, b in ((user_a_id, user_b_id), (user_b_id, user_a_id)):
+        result = await _match_query(client, a, b).execute()
+        if result.data:
+            return result.data[0]
+    return None
+
+
+def _pending_match(user_a_id: str, user_b_id: str) -> Optional[dict]:
+    queue = _write_queue
+    if queue is None:
+        return None
+    row = queue.pending_row("matches", (user_a_id, user_b_id)) \
+        or queue.pending_row("matches", (user_b_id, user_a_id))
+    return {k: v for k, v in row.items() if k in _MATCH_COLUMNS} if row else None
+
 
-    # Check A→B direction
-    result = client.table("matches") \
-        .select("*") \
+def _match_query(client, user_a_id: str, user_b_id: str):
+    # Bound .eq() filters: IDs come from request bodies and must never be
+    # spliced into a PostgREST or=() expression
+    return client.table("matches") \
+        .select(_select(_MATCH_COLUMNS)) \
         .eq("user_a_id", user_a_id) \
         .eq("user_b_id", user_b_id) \
-        .maybe_single() \
-        .execute()
-    if result.data:
-        return result.data
-
-    # Check B→A direction
-    result = client.table("matches") \
-        .select("*") \
-        .eq("user_a_id", user_b_id) \
-        .eq("user_b_id", user_a_id) \
-        .maybe_single() \
-        .execute()
-    return result.data if result.data else None
+        .order("created_at", desc=True) \
+        .limit(1)
 
 
 def save_match_result(
@@ -170,10 +989,9 @@ def save_match_result(
     safe_result: The DTO-sanitized result (what the frontend sees).
     raw_result:  The full compute_match_v2 output (backend-only archive).
     """
-    client = _get_client()
     data = safe_result.get("data", safe_result)
 
-    client.table("matches").upsert({
+    _write("matches", (user_a_id, user_b_id), _encode_row("matches", {
         "user_a_id": user_a_id,
         "user_b_id": user_b_id,
         "harmony_score": data.get("harmony_score"),
@@ -182,4 +1000,52 @@ def save_match_result(
         "tracks": data.get("tracks", {}),
         "llm_insight_report": data.get("ai_insight_report", ""),
         "raw_result": raw_result,
-    }).execute()
+    }), on_conflict="user_a_id,user_b_id")
+
+
+def update_match_report(user_a_id: str, user_b_id: str, report: str) -> None:
+    """Set llm_insight_report on a saved match (background report jobs).
+
+    Merged into the queued row if the match has not been flushed yet, so a
+    later flush cannot overwrite the report with the empty placeholder.
+    """
+    row = {"user_a_id": user_a_id, "user_b_id": user_b_id, "llm_insight_report": report}
+    key = (user_a_id, user_b_id)
+    queue = _write_queue
+    if queue is not None and queue.running and queue.pending_row("matches", key):
+        queue.enqueue("matches", key, row, on_conflict="user_a_id,user_b_id")
+        return
+    _get_client().table("matches") \
+        .update({"llm_insight_report": report}) \
+        .eq("user_a_id", user_a_id) \
+        .eq("user_b_id", user_b_id) \
+        .execute()
+
+
+# ── Ranking cache (ranking_cache) ────────────────────────────────────────────
+
+def get_ranking_cache(user_id: str) -> Optional[dict]:
+    """Return {k, results, profile_hash, computed_at} of the last cached top-K for user_id."""
+    client = _get_client()
+    result = client.table("ranking_cache") \
+        .select("k, results, profile_hash, computed_at") \
+        .eq("user_id", user_id) \
+        .maybe_single() \
+        .execute()
+    return result.data if result and result.data else None
+
+
+def save_ranking_cache(user_id: str, k: int, results: list,
+                       profile_hash: Optional[str] = None) -> None:
+    """Store a top-K ranking for user_id (replaces the previous one).
+
+    profile_hash identifies the profile the ranking was scored for.
+    """
+    from datetime import datetime, timezone
+    _write("ranking_cache", user_id, {
+        "user_id": user_id,
+        "k": k,
+        "results": results,
+        "profile_hash": profile_hash,
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+    })
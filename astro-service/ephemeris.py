@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Swiss Ephemeris Path
+Resolves and applies the ephemeris directory on first use instead of at
+import time, so importing chart / bazi (and main) does no filesystem work.
+Shared by chart.py and bazi.py, which used to resolve it separately.
+
+Usage:
+    ensure_ephe_path()          # before the first swe.calc_ut in a code path
+    apply_ephe_path()           # re-apply unconditionally (cheap C call)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Optional
+
+import swisseph as swe
+
+_lock = threading.Lock()
+_ephe_dir: Optional[str] = None
+_applied = False
+
+
+def _resolve_ephe_path() -> str:
+    """Return an ASCII-safe path to the ephemeris directory.
+
+    pyswisseph passes the path to a C library that cannot handle non-ASCII
+    characters on Windows. If the repo lives inside a directory whose path
+    contains Unicode characters (e.g. Chinese), we copy the small .se1 files
+    to a stable ASCII temp location and use that instead.
+    """
+    ephe_src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ephe")
+    try:
+        ephe_src.encode("ascii")
+        return ephe_src  # All-ASCII — use directly
+    except UnicodeEncodeError:
+        pass
+
+    # Path contains non-ASCII characters; copy files to an ASCII temp location.
+    import shutil, tempfile
+
+    dest = os.path.join(tempfile.gettempdir(), "destiny_swe_ephe")
+    os.makedirs(dest, exist_ok=True)
+
+    for fname in os.listdir(ephe_src):
+        src_file = os.path.join(ephe_src, fname)
+        dst_file = os.path.join(dest, fname)
+        if not os.path.exists(dst_file):
+            shutil.copy2(src_file, dst_file)
+
+    return dest
+
+
+def ephe_dir() -> str:
+    """The ephemeris directory (resolved once)."""
+    global _ephe_dir
+    if _ephe_dir is None:
+        with _lock:
+            if _ephe_dir is None:
+                _ephe_dir = _resolve_ephe_path()
+    return _ephe_dir
+
+
+def apply_ephe_path() -> str:
+    """Set pyswisseph's ephemeris path (unconditionally) and return it."""
+    global _applied
+    path = ephe_dir()
+    swe.set_ephe_path(path)
+    _applied = True
+    return path
+
+
+def ensure_ephe_path() -> None:
+    """Set the ephemeris path once per process."""
+    if not _applied:
+        apply_ephe_path()
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Differential Equivalence Harness
+Proves that an optimized engine (vectorized, table-driven, cached …) gives
+the same answers as today's scalar code before it ships. The reference and
+the candidate run on the same inputs, outputs are compared field by field,
+and any mismatch is shrunk to a minimal input that still reproduces it.
+
+Engines (reference implementations):
+  compute_match_v2     matching.compute_match_v2(user_a, user_b)
+  compute_quick_score  matching.compute_quick_score(user_a, user_b)
+  calculate_chart      chart.calculate_chart(**birth)
+  compute_zwds_chart   zwds.compute_zwds_chart(year, month, day, time, gender)
+
+Inputs: a synthetic population (loadgen.py) as-is, then randomized
+variants — pair profiles with fields dropped, nulled, swapped between
+users or replaced by random signs / degrees / RPV answers; random birth
+data for the chart engines. Same seed → same inputs. randomized=False
+keeps to population-shaped inputs, for candidates that only promise
+equivalence on what onboarding actually produces.
+
+Comparison: dicts key by key, lists element by element, numbers within
+rel_tol / abs_tol (tighter or looser per field with field_tol, keyed by
+fnmatch patterns over paths like "tracks.soul" or "layers.ran[*]"), NaN
+equal to NaN, everything else with ==. An exception counts as an output:
+both raising the same exception type is equal.
+
+Shrinking: greedy — drop dict keys and list items (all, then halves, …
+down to single entries), then simplify leaves (numbers → 0 / rounded, strings →
+"", booleans → False), keeping each step only if the mismatch persists.
+
+Usage:
+    report = check("compute_match_v2", fast_match, n=2000, seed=1)
+    assert report.ok, report.format()
+
+    python run_equivalence.py --engine compute_match_v2 --candidate fast_match:compute_match_v2
+"""
+
+from __future__ import annotations
+
+import copy
+import fnmatch
+import importlib
+import json
+import math
+import numbers
+import random
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+ENGINES = ("compute_match_v2", "compute_quick_score", "calculate_chart", "compute_zwds_chart")
+
+_SIGNS = ("Aries", "Taurus", "Gemini", "Cancer", "Leo", "Virgo",
+          "Libra", "Scorpio", "Sagittarius", "Capricorn", "Aquarius", "Pisces")
+_RPV = {"rpv_conflict": ("cold_war", "argue"), "rpv_power": ("control", "follow"),
+        "rpv_energy": ("home", "out")}
+
+
+def reference(engine: str) -> Callable:
+    """Today's scalar implementation of `engine`."""
+    module = {"compute_match_v2": "matching", "compute_quick_score": "matching",
+              "calculate_chart": "chart", "compute_zwds_chart": "zwds"}.get(engine)
+    if module is None:
+        raise ValueError(f"Unknown engine: {engine!r} (expected one of {', '.join(ENGINES)})")
+    return getattr(importlib.import_module(module), engine)
+
+
+def load_callable(spec: str) -> Callable:
+    """"module:function" (or "module.function") → the callable."""
+    module, sep, name = spec.partition(":")
+    if not sep:
+        module, _, name = spec.rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+# ── inputs ────────────────────────────────────────────────────────────────────
+
+@dataclass
+class Case:
+    args: list
+    kwargs: dict = field(default_factory=dict)
+
+    def call(self, fn: Callable) -> Any:
+        # fresh copies: an implementation that mutates its input must not
+        # change what the other one sees
+        return fn(*copy.deepcopy(self.args), **copy.deepcopy(self.kwargs))
+
+    def to_json(self) -> str:
+        return json.dumps({"args": self.args, "kwargs": self.kwargs},
+                          ensure_ascii=False, sort_keys=True, default=str)
+
+    def size(self) -> int:
+        return len(self.to_json())
+
+
+def _mutate_profile(rng: random.Random, profile: dict, other: dict) -> dict:
+    """A copy of a flat profile with a few fields dropped / nulled / randomized."""
+    out = copy.deepcopy(profile)
+    keys = list(out)
+    for key in rng.sample(keys, min(len(keys), rng.randint(1, 6))):
+        action = rng.random()
+        if action < 0.25:
+            del out[key]
+        elif action < 0.4:
+            out[key] = None
+        elif action < 0.55 and key in other:
+            out[key] = copy.deepcopy(other[key])
+        elif key in _RPV:
+            out[key] = rng.choice(_RPV[key])
+        elif key.endswith("_sign"):
+            out[key] = rng.choice(_SIGNS)
+        elif key.endswith("_degree"):
+            out[key] = round(rng.uniform(0, 360), 2)     # chart.py's precision
+        elif key == "data_tier":
+            out[key] = rng.randint(1, 3)
+    for key, values in _RPV.items():
+        if rng.random() < 0.2:
+            out[key] = rng.choice(values)
+    return out
+
+
+def _random_birth(rng: random.Random) -> dict:
+    tier = rng.randint(1, 3)
+    exact = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}" if tier == 1 else None
+    slot = {1: "precise", 2: rng.choice(("morning", "afternoon", "evening", "unknown")), 3: None}[tier]
+    return {
+        "birth_date": f"{rng.randint(1940, 2010)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "birth_time": slot, "birth_time_exact": exact,
+        "lat": round(rng.uniform(-55, 65), 3), "lng": round(rng.uniform(-180, 180), 3),
+        "data_tier": tier,
+    }
+
+
+def generate_cases(engine: str, n: int, seed: int = 0, population=None,
+                   randomized: bool = True) -> Iterator[Case]:
+    """n inputs for `engine`: population-shaped first (a quarter of them, or all
+    with randomized=False), then randomized variants."""
+    import loadgen
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine!r} (expected one of {', '.join(ENGINES)})")
+    rng = random.Random(seed)
+    if population is None:
+        population = loadgen.generate_population(
+            loadgen.PopulationConfig(n=max(8, min(200, n // 4)), seed=seed))
+    tier1 = [u for u in population if u.tier == 1]
+    plain = n // 4 if randomized else n
+
+    for i in range(n):
+        if engine in ("compute_match_v2", "compute_quick_score"):
+            a, b = rng.sample(population, 2)
+            if i < plain:
+                yield Case([copy.deepcopy(a.flat), copy.deepcopy(b.flat)])
+            else:
+                yield Case([_mutate_profile(rng, a.flat, b.flat), _mutate_profile(rng, b.flat, a.flat)])
+        elif engine == "calculate_chart":
+            if i < plain:
+                onboard = population[i % len(population)].onboard()
+                yield Case([], {k: onboard[k] for k in ("birth_date", "birth_time", "birth_time_exact",
+                                                        "lat", "lng", "data_tier")})
+            else:
+                yield Case([], _random_birth(rng))
+        elif i < plain and tier1:                                   # compute_zwds_chart
+            user = tier1[i % len(tier1)]
+            year, month, day = (int(x) for x in user.birth_date.split("-"))
+            yield Case([year, month, day, user.birth_time, user.gender])
+        else:
+            yield Case([rng.randint(1940, 2010), rng.randint(1, 12), rng.randint(1, 28),
+                        f"{rng.randrange(24):02d}:{rng.randrange(60):02d}", rng.choice(("M", "F"))])
+
+
+# ── comparison ────────────────────────────────────────────────────────────────
+
+@dataclass
+class Tolerance:
+    rel_tol: float = 1e-9
+    abs_tol: float = 1e-9
+    field_tol: Dict[str, float] = field(default_factory=dict)   # path pattern → abs tolerance
+
+    def for_path(self, path: str) -> Tuple[float, float]:
+        for pattern, tol in self.field_tol.items():
+            if fnmatch.fnmatchcase(path, pattern):
+                return 0.0, tol
+        return self.rel_tol, self.abs_tol
+
+
+@dataclass
+class Mismatch:
+    path: str
+    expected: Any
+    actual: Any
+
+    def __str__(self) -> str:
+        return f"{self.path or '<root>'}: expected {self.expected!r}, got {self.actual!r}"
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def diff(expected, actual, tolerance: Optional[Tolerance] = None, path: str = "") -> List[Mismatch]:
+    """Field-by-field differences between two outputs (empty when equivalent)."""
+    tolerance = tolerance or Tolerance()
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        out = []
+        for key in list(expected) + [k for k in actual if k not in expected]:
+            sub = f"{path}.{key}" if path else str(key)
+            if key not in actual:
+                out.append(Mismatch(sub, expected[key], "<missing>"))
+            elif key not in expected:
+                out.append(Mismatch(sub, "<missing>", actual[key]))
+            else:
+                out.extend(diff(expected[key], actual[key], tolerance, sub))
+        return out
+    if isinstance(expected, (list, tuple)) and isinstance(actual, (list, tuple)):
+        if len(expected) != len(actual):
+            return [Mismatch(f"{path}.length" if path else "length", len(expected), len(actual))]
+        out = []
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            out.extend(diff(e, a, tolerance, f"{path}[{i}]"))
+        return out
+    if _is_number(expected) and _is_number(actual):
+        e, a = float(expected), float(actual)
+        if math.isnan(e) or math.isnan(a):
+            return [] if math.isnan(e) and math.isnan(a) else [Mismatch(path, expected, actual)]
+        rel, abs_ = tolerance.for_path(path)
+        return [] if math.isclose(e, a, rel_tol=rel, abs_tol=abs_) else [Mismatch(path, expected, actual)]
+    if type(expected) is not type(actual) or expected != actual:
+        return [Mismatch(path, expected, actual)]
+    return []
+
+
+@dataclass
+class _Raised:
+    error: BaseException
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _Raised) and type(self.error) is type(other.error)
+
+    def __repr__(self) -> str:
+        return f"raised {type(self.error).__name__}({self.error})"
+
+
+def _outcome(fn: Callable, case: Case):
+    try:
+        return case.call(fn)
+    except Exception as e:
+        return _Raised(e)
+
+
+def compare(case: Case, ref: Callable, candidate: Callable,
+            tolerance: Optional[Tolerance] = None) -> List[Mismatch]:
+    expected, actual = _outcome(ref, case), _outcome(candidate, case)
+    if isinstance(expected, _Raised) or isinstance(actual, _Raised):
+        return [] if expected == actual else [Mismatch("<exception>", expected, actual)]
+    return diff(expected, actual, tolerance)
+
+
+# ── shrinking ─────────────────────────────────────────────────────────────────
+
+def _chunks(n: int) -> Iterator[Tuple[int, int]]:
+    """(start, stop) slices to drop: everything, halves, quarters, … singles."""
+    size = n
+    while size >= 1:
+        for start in range(0, n, size):
+            yield start, min(n, start + size)
+        size //= 2
+
+
+def _simpler(value) -> Iterator[Any]:
+    """Smaller variants of a value: fewer entries first, then simpler leaves."""
+    if isinstance(value, dict):
+        keys = list(value)
+        for start, stop in _chunks(len(keys)):
+            drop = set(keys[start:stop])
+            yield {k: v for k, v in value.items() if k not in drop}
+        for key in keys:
+            for simpler in _simpler(value[key]):
+                yield {**value, key: simpler}
+    elif isinstance(value, list):
+        for start, stop in _chunks(len(value)):
+            yield value[:start] + value[stop:]
+        for i, item in enumerate(value):
+            for simpler in _simpler(item):
+                yield value[:i] + [simpler] + value[i + 1:]
+    elif isinstance(value, bool):
+        if value:
+            yield False
+    elif isinstance(value, int):
+        if value:
+            yield 0
+    elif isinstance(value, float):
+        if value:
+            yield 0.0
+        if value != round(value):
+            yield float(round(value))
+    elif isinstance(value, str):
+        if value:
+            yield ""
+
+
+def shrink(case: Case, fails: Callable[[Case], bool], max_steps: int = 5000) -> Case:
+    """Greedily reduce `case` while fails(case) stays true."""
+    steps = 0
+    progress = True
+    while progress and steps < max_steps:
+        progress = False
+        for args, kwargs in _case_variants(case):
+            steps += 1
+            candidate = Case(args, kwargs)
+            if fails(candidate):
+                case, progress = candidate, True
+                break
+            if steps >= max_steps:
+                break
+    return case
+
+
+def _case_variants(case: Case) -> Iterator[Tuple[list, dict]]:
+    # positional arguments keep their count; only their contents shrink
+    for i, arg in enumerate(case.args):
+        for simpler in _simpler(arg):
+            yield case.args[:i] + [simpler] + case.args[i + 1:], case.kwargs
+    for simpler in _simpler(case.kwargs):
+        yield case.args, simpler
+
+
+# ── driver ────────────────────────────────────────────────────────────────────
+
+@dataclass
+class Failure:
+    case: Case
+    shrunk: Case
+    mismatches: List[Mismatch]
+
+    def format(self) -> str:
+        lines = [f"  {m}" for m in self.mismatches[:20]]
+        if len(self.mismatches) > 20:
+            lines.append(f"  … {len(self.mismatches) - 20} more")
+        return ("\n".join(lines) + f"\n  minimal input ({self.case.size()} → {self.shrunk.size()} bytes):"
+                f"\n  {self.shrunk.to_json()}")
+
+
+@dataclass
+class Report:
+    engine: str
+    cases: int
+    failures: List[Failure]
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def format(self) -> str:
+        head = f"{self.engine}: {self.cases} inputs, {len(self.failures)} mismatch(es)"
+        return "\n".join([head] + [f.format() for f in self.failures])
+
+
+def check(engine: str, candidate: Callable, n: int = 500, seed: int = 0,
+          tolerance: Optional[Tolerance] = None, max_failures: int = 3,
+          population=None, randomized: bool = True, ref: Optional[Callable] = None,
+          shrink_steps: int = 5000) -> Report:
+    """Run reference and candidate over n inputs; mismatches come back shrunk.
+
+    Stops after max_failures mismatching inputs (shrinking is the slow part).
+    """
+    ref = ref or reference(engine)
+    failures: List[Failure] = []
+    count = 0
+    for case in generate_cases(engine, n, seed, population, randomized):
+        count += 1
+        if not compare(case, ref, candidate, tolerance):
+            continue
+        shrunk = shrink(case, lambda c: bool(compare(c, ref, candidate, tolerance)), shrink_steps)
+        failures.append(Failure(case, shrunk, compare(shrunk, ref, candidate, tolerance)))
+        if len(failures) >= max_failures:
+            break
+    return Report(engine, count, failures)
+
+
+# ── built-in candidates ───────────────────────────────────────────────────────
+
+def _feature_store_round_trip(profile: dict) -> dict:
+    from feature_store import FeatureStore
+    return FeatureStore.build({"u": profile}).get("u")
+
+
+def _via_feature_store(engine: str) -> Callable:
+    """`engine` on profiles stored in and read back from the columnar feature store."""
+    if engine not in ("compute_match_v2", "compute_quick_score"):
+        raise ValueError(f"feature_store candidate only applies to the match engines, not {engine!r}")
+    fn = reference(engine)
+
+    def run(user_a: dict, user_b: dict, *args, **kwargs):
+        return fn(_feature_store_round_trip(user_a), _feature_store_round_trip(user_b),
+                  *args, **kwargs)
+    return run
+
+
+CANDIDATES: Dict[str, Callable[[str], Callable]] = {
+    "reference": reference,                 # determinism: reference vs itself
+    "feature_store": _via_feature_store,    # match engines only
+}
@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Columnar Population Feature Store
+Holds every field compute_match_v2 / compute_quick_score reads, for the whole
+population, as fixed-width float32 / uint8 columns plus a user_id ↔ row map.
+
+Snapshot layout (one directory):
+  meta.json      version, row count, column typecodes, categorical vocabularies
+  user_ids.lst   one user_id per line (row order)
+  <column>.bin   raw little-endian column data (array typecode "f" or "B")
+  delta.log      append-only JSON lines of profile upserts since the snapshot
+  store.lock     flock target: writers (apply_delta, save, compact) take it
+                 exclusive, readers (open, refresh) shared
+
+open() memory-maps every column read-only, so a snapshot loads in
+milliseconds and several uvicorn workers share the same page cache. Deltas are
+appended to delta.log (never rewriting the snapshot); readers pick them up
+with refresh(). compact() folds the deltas into a fresh snapshot. Writers
+replay other processes' deltas before appending their own, and snapshot
+files are replaced atomically, so concurrent writers and readers never lose
+or half-read an update (POSIX; without fcntl there is no locking).
+
+Encoding:
+  *_degree, numbers  float32, NaN = missing (degrees decoded at 2 decimals —
+                     the precision chart.py stores)
+  *_sign, categories uint8 code into a per-column vocabulary, 255 = missing
+  booleans           uint8 0/1, 255 = missing
+  birth_time         float32 minutes after midnight ("HH:MM")
+  element_profile    4 float32 scores + dominant/deficiency uint8 bitmasks
+  bazi               day master + four pillar stems/branches (enough for
+                     evaluate_day_master_strength)
+
+Usage:
+    store = FeatureStore.build(profiles)          # {user_id: flat profile}
+    store.save("/var/lib/destiny/features")
+    store = FeatureStore.open("/var/lib/destiny/features")
+    store.get("uuid")                             # → flat profile dict
+    store.column("venus_degree")                  # → float32 sequence
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import os
+import sys
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+FORMAT_VERSION = 1
+
+_MISSING_CODE = 255
+_NAN = float("nan")
+
+# ── Column schema ─────────────────────────────────────────────────────────────
+
+_PLANETS = [
+    "sun", "moon", "mercury", "venus", "mars", "jupiter", "saturn",
+    "uranus", "neptune", "pluto", "juno", "chiron",
+    "north_node", "south_node", "ascendant",
+    "house4", "house7", "house8", "house12", "vertex", "lilith",
+]
+
+DEGREE_FIELDS = [f"{p}_degree" for p in _PLANETS]
+SIGN_FIELDS = [f"{p}_sign" for p in _PLANETS]
+BOOL_FIELDS = ["mercury_rx", "venus_rx", "mars_rx"]
+NUMBER_FIELDS = ["data_tier", "emotional_capacity", "birth_year", "birth_month", "birth_day"]
+CATEGORY_FIELDS = [
+    "gender", "bazi_element", "bazi_month_branch", "bazi_day_branch",
+    "rpv_power", "rpv_conflict", "rpv_energy", "attachment_style",
+]
+
+_PILLARS = ("year", "month", "day", "hour")
+BAZI_FIELDS = ["bazi_day_master"] + [
+    f"bazi_{p}_{part}" for p in _PILLARS for part in ("stem", "branch")
+]
+
+_EP_ELEMENTS = ("Fire", "Earth", "Air", "Water")
+EP_SCORE_FIELDS = [f"ep_{e.lower()}" for e in _EP_ELEMENTS]
+EP_MASK_FIELDS = ["ep_dominant", "ep_deficiency"]
+
+_SIGNS = [
+    "aries", "taurus", "gemini", "cancer", "leo", "virgo",
+    "libra", "scorpio", "sagittarius", "capricorn", "aquarius", "pisces",
+]
+_BRANCHES = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
+_STEMS = ["甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸"]
+
+# Seed vocabularies keep codes stable across snapshots; unseen values are
+# appended (up to 255 per column) and persisted in meta.json / delta.log.
+_SEED_VOCAB: Dict[str, List[str]] = {
+    **{f: list(_SIGNS) for f in SIGN_FIELDS},
+    "gender": ["M", "F"],
+    "bazi_element": ["wood", "fire", "earth", "metal", "water"],
+    "bazi_month_branch": list(_BRANCHES),
+    "bazi_day_branch": list(_BRANCHES),
+    "rpv_power": ["control", "follow"],
+    "rpv_conflict": ["cold_war", "argue"],
+    "rpv_energy": ["home", "out"],
+    "attachment_style": ["secure", "anxious", "avoidant", "fearful", "disorganized"],
+    "bazi_day_master": list(_STEMS),
+    **{f"bazi_{p}_stem": list(_STEMS) for p in _PILLARS},
+    **{f"bazi_{p}_branch": list(_BRANCHES) for p in _PILLARS},
+}
+
+_FLOAT_COLUMNS = DEGREE_FIELDS + NUMBER_FIELDS + ["birth_time_minutes"] + EP_SCORE_FIELDS
+_BYTE_COLUMNS = SIGN_FIELDS + CATEGORY_FIELDS + BOOL_FIELDS + BAZI_FIELDS + ["bazi_hour_known"] + EP_MASK_FIELDS
+
+COLUMNS: Dict[str, str] = {
+    **{c: "f" for c in _FLOAT_COLUMNS},
+    **{c: "B" for c in _BYTE_COLUMNS},
+}
+
+
+def flatten_natal(natal: dict) -> dict:
+    """Merge a user_natal_data row (western_chart + bazi_chart) into a flat profile.
+
+    Same shape /api/matches/compute feeds to compute_match_v2.
+    """
+    flat = {}
+    wc = natal.get("western_chart") or {}
+    bc = natal.get("bazi_chart") or {}
+    flat.update(wc)
+    # Add bazi fields that matching.py expects
+    flat["bazi_element"] = bc.get("day_master_element", wc.get("bazi_element"))
+    flat["bazi_month_branch"] = bc.get("bazi_month_branch", wc.get("bazi_month_branch"))
+    flat["bazi_day_branch"] = bc.get("bazi_day_branch", wc.get("bazi_day_branch"))
+    flat["bazi"] = bc
+    # data_tier from western chart
+    flat.setdefault("data_tier", wc.get("data_tier", 3))
+    return flat
+
+
+# ── Encoding ──────────────────────────────────────────────────────────────────
+
+def _num(value) -> float:
+    if value is None or isinstance(value, bool):
+        return _NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return _NAN
+
+
+def _time_to_minutes(value) -> float:
+    if not value or not isinstance(value, str) or ":" not in value:
+        return _NAN
+    try:
+        hh, mm = value.split(":", 1)
+        return float(int(hh) * 60 + int(mm))
+    except ValueError:
+        return _NAN
+
+
+def _mask(names: Optional[Iterable[str]]) -> int:
+    if names is None:
+        return _MISSING_CODE
+    bits = 0
+    for i, e in enumerate(_EP_ELEMENTS):
+        if e in names:
+            bits |= 1 << i
+    return bits
+
+
+class _Vocab:
+    """Per-column categorical code tables (value ↔ uint8)."""
+
+    def __init__(self, tables: Optional[Dict[str, List[str]]] = None) -> None:
+        self.tables: Dict[str, List[str]] = {k: list(v) for k, v in _SEED_VOCAB.items()}
+        for k, v in (tables or {}).items():
+            self.tables[k] = list(v)
+        self._codes = {k: {val: i for i, val in enumerate(v)} for k, v in self.tables.items()}
+
+    def encode(self, column: str, value) -> int:
+        if value is None or value == "":
+            return _MISSING_CODE
+        value = str(value)
+        codes = self._codes.setdefault(column, {})
+        code = codes.get(value)
+        if code is None:
+            table = self.tables.setdefault(column, [])
+            if len(table) >= _MISSING_CODE:
+                raise ValueError(f"Vocabulary for {column!r} exceeds {_MISSING_CODE} values")
+            code = len(table)
+            table.append(value)
+            codes[value] = code
+        return code
+
+    def decode(self, column: str, code: int) -> Optional[str]:
+        if code == _MISSING_CODE:
+            return None
+        return self.tables[column][code]
+
+
+def encode_profile(profile: Mapping, vocab: _Vocab) -> Dict[str, float]:
+    """Encode one flat profile into {column: float32 or uint8 code}."""
+    row: Dict[str, float] = {}
+    for f in DEGREE_FIELDS + NUMBER_FIELDS:
+        row[f] = _num(profile.get(f))
+    row["birth_time_minutes"] = _time_to_minutes(profile.get("birth_time"))
+    for f in SIGN_FIELDS + CATEGORY_FIELDS:
+        row[f] = vocab.encode(f, profile.get(f))
+    for f in BOOL_FIELDS:
+        v = profile.get(f)
+        row[f] = _MISSING_CODE if v is None else int(bool(v))
+
+    bazi = profile.get("bazi") or {}
+    pillars = bazi.get("four_pillars") or {}
+    row["bazi_day_master"] = vocab.encode("bazi_day_master", bazi.get("day_master"))
+    for p in _PILLARS:
+        pillar = pillars.get(p) or {}
+        row[f"bazi_{p}_stem"] = vocab.encode(f"bazi_{p}_stem", pillar.get("stem"))
+        row[f"bazi_{p}_branch"] = vocab.encode(f"bazi_{p}_branch", pillar.get("branch"))
+    hk = bazi.get("hour_known")
+    row["bazi_hour_known"] = _MISSING_CODE if hk is None else int(bool(hk))
+
+    ep = profile.get("element_profile")
+    scores = (ep or {}).get("scores") or {}
+    for e, col in zip(_EP_ELEMENTS, EP_SCORE_FIELDS):
+        row[col] = _num(scores.get(e))
+    row["ep_dominant"] = _mask(ep.get("dominant") if ep else None)
+    row["ep_deficiency"] = _mask(ep.get("deficiency") if ep else None)
+    return row
+
+
+def _decode_number(value: float):
+    if math.isnan(value):
+        return None
+    if value.is_integer():
+        return int(value)
+    return round(value, 4)
+
+
+def decode_row(row: Mapping[str, float], vocab: _Vocab) -> dict:
+    """Inverse of encode_profile; missing values are omitted."""
+    out: dict = {}
+    for f in DEGREE_FIELDS:
+        v = row[f]
+        if not math.isnan(v):
+            out[f] = round(v, 2)
+    for f in NUMBER_FIELDS:
+        v = _decode_number(row[f])
+        if v is not None:
+            out[f] = v
+    minutes = row["birth_time_minutes"]
+    if not math.isnan(minutes):
+        out["birth_time"] = f"{int(minutes) // 60:02d}:{int(minutes) % 60:02d}"
+    for f in SIGN_FIELDS + CATEGORY_FIELDS:
+        v = vocab.decode(f, int(row[f]))
+        if v is not None:
+            out[f] = v
+    for f in BOOL_FIELDS:
+        if row[f] != _MISSING_CODE:
+            out[f] = bool(row[f])
+
+    day_master = vocab.decode("bazi_day_master", int(row["bazi_day_master"]))
+    pillars = {}
+    for p in _PILLARS:
+        stem = vocab.decode(f"bazi_{p}_stem", int(row[f"bazi_{p}_stem"]))
+        branch = vocab.decode(f"bazi_{p}_branch", int(row[f"bazi_{p}_branch"]))
+        if stem or branch:
+            pillars[p] = {"stem": stem or "", "branch": branch or "",
+                          "full": (stem or "") + (branch or "")}
+    if day_master or pillars:
+        bazi = {"day_master": day_master, "four_pillars": pillars}
+        if row["bazi_hour_known"] != _MISSING_CODE:
+            bazi["hour_known"] = bool(row["bazi_hour_known"])
+        out["bazi"] = bazi
+
+    if row["ep_dominant"] != _MISSING_CODE:
+        scores = {e: row[c] for e, c in zip(_EP_ELEMENTS, EP_SCORE_FIELDS)}
+        out["element_profile"] = {
+            "scores": {e: round(v, 4) for e, v in scores.items() if not math.isnan(v)},
+            "deficiency": [e for i, e in enumerate(_EP_ELEMENTS) if row["ep_deficiency"] >> i & 1],
+            "dominant": [e for i, e in enumerate(_EP_ELEMENTS) if row["ep_dominant"] >> i & 1],
+        }
+    return out
+
+
+# ── FeatureStore ──────────────────────────────────────────────────────────────
+
+@contextmanager
+def _locked(path: str, exclusive: bool):
+    """Cross-process lock on a snapshot directory (store.lock)."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "store.lock"), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class FeatureStore:
+    """Population feature columns with a user_id ↔ row mapping.
+
+    Base rows come from a snapshot (memory-mapped, read-only) or build();
+    upserts made after that live in an in-memory tail/patch overlay and,
+    for stores opened from disk, in delta.log.
+    """
+
+    def __init__(self) -> None:
+        self._path: Optional[str] = None
+        self._vocab = _Vocab()
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._n_base = 0
+        self._base: Dict[str, Iterable] = {c: array(t) for c, t in COLUMNS.items()}
+        self._mmaps: List[mmap.mmap] = []
+        self._tail: Dict[str, array] = {c: array(t) for c, t in COLUMNS.items()}
+        self._patch: Dict[int, Dict[str, float]] = {}
+        self._merged: Dict[str, array] = {}
+        self._log_offset = 0
+        self._snapshot_sig: tuple = ()
+
+    # ── construction ──────────────────────────────────────────────────────
+
+    @classmethod
+    def build(cls, profiles: Mapping[str, dict]) -> "FeatureStore":
+        """Encode an in-memory population {user_id: flat profile}."""
+        store = cls()
+        store._append_or_patch(profiles)
+        return store
+
+    @classmethod
+    def from_natal_rows(cls, rows: Iterable[dict]) -> "FeatureStore":
+        """Build from user_natal_data rows ({user_id, western_chart, bazi_chart, ...})."""
+        return cls.build({r["user_id"]: flatten_natal(r) for r in rows})
+
+    @classmethod
+    def open(cls, path: str) -> "FeatureStore":
+        """Memory-map a snapshot directory and replay its delta.log."""
+        with _locked(path, exclusive=False):
+            return cls._load(path)
+
+    @classmethod
+    def _load(cls, path: str) -> "FeatureStore":
+        store = cls()
+        store._path = path
+        store._snapshot_sig = store._meta_signature()
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported feature store version: {meta.get('version')!r}")
+        store._vocab = _Vocab(meta.get("vocab"))
+        with open(os.path.join(path, "user_ids.lst"), encoding="utf-8") as f:
+            store._ids = f.read().splitlines()
+        store._n_base = meta["n_rows"]
+        if len(store._ids) != store._n_base:
+            raise ValueError("user_ids.lst does not match meta.json n_rows")
+        store._index = {uid: i for i, uid in enumerate(store._ids)}
+        for col, typecode in meta["columns"].items():
+            store._base[col] = store._map_column(os.path.join(path, f"{col}.bin"), typecode)
+        store._refresh()
+        return store
+
+    def _meta_signature(self) -> tuple:
+        """Identity of the current meta.json (changes when a snapshot is replaced)."""
+        st = os.stat(os.path.join(self._path, "meta.json"))
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _map_column(self, filename: str, typecode: str):
+        if os.path.getsize(filename) == 0:
+            return array(typecode)
+        with open(filename, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mmaps.append(mm)
+        if typecode == "f" and sys.byteorder != "little":
+            data = array(typecode)
+            data.frombytes(mm[:])
+            data.byteswap()
+            return data
+        return memoryview(mm).cast(typecode)
+
+    # ── persistence ───────────────────────────────────────────────────────
+
+    def save(self, path: str) -> None:
+        """Write a compacted snapshot (base + all deltas) and clear delta.log."""
+        with _locked(path, exclusive=True):
+            self._write_snapshot(path)
+
+    def _write_snapshot(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        for col, typecode in COLUMNS.items():
+            data = array(typecode, self.column(col))
+            if typecode == "f" and sys.byteorder != "little":
+                data.byteswap()
+            tmp = os.path.join(path, f"{col}.bin.tmp")
+            with open(tmp, "wb") as f:
+                data.tofile(f)
+            os.replace(tmp, os.path.join(path, f"{col}.bin"))
+        tmp = os.path.join(path, "user_ids.lst.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(self._ids))
+        os.replace(tmp, os.path.join(path, "user_ids.lst"))
+        meta = {
+            "version": FORMAT_VERSION,
+            "n_rows": len(self._ids),
+            "columns": COLUMNS,
+            "vocab": self._vocab.tables,
+        }
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+        open(os.path.join(path, "delta.log"), "w").close()
+
+    def compact(self) -> "FeatureStore":
+        """Fold delta.log into a new snapshot at the same path and reopen it."""
+        if not self._path:
+            raise RuntimeError("compact() requires a store opened from disk")
+        path = self._path
+        with _locked(path, exclusive=True):
+            self._refresh()            # fold in deltas other writers appended
+            self._write_snapshot(path)
+        self.close()
+        return FeatureStore.open(path)
+
+    def apply_delta(self, profiles: Mapping[str, dict]) -> None:
+        """Upsert profiles {user_id: flat profile} without rewriting the snapshot.
+
+        For stores opened from disk the upserts are appended to delta.log so
+        other processes see them on refresh(). Deltas other processes wrote
+        since the last refresh are replayed first (under the store lock), so
+        the log offset never skips them.
+        """
+        if not profiles:
+            return
+        if self._path:
+            with _locked(self._path, exclusive=True):
+                self._refresh()
+                log = os.path.join(self._path, "delta.log")
+                with open(log, "a", encoding="utf-8") as f:
+                    for uid, profile in profiles.items():
+                        f.write(json.dumps({"user_id": uid, "profile": _jsonable(profile)},
+                                           ensure_ascii=False) + "\n")
+                    self._log_offset = f.tell()
+        self._append_or_patch(profiles)
+
+    def refresh(self) -> int:
+        """Replay delta.log entries written since the last refresh; returns count."""
+        if not self._path:
+            return 0
+        with _locked(self._path, exclusive=False):
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        log = os.path.join(self._path, "delta.log")
+        if not os.path.exists(log):
+            return 0
+        if self._meta_signature() != self._snapshot_sig:
+            # Another process compacted the snapshot — remap it from scratch.
+            fresh = FeatureStore._load(self._path)
+            self.close()
+            self.__dict__.update(fresh.__dict__)
+            return len(self)
+        with open(log, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # Only consume complete lines — a writer may be mid-append.
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return 0
+        self._log_offset += end
+        batch = {}
+        for line in data[:end].decode("utf-8").splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                batch[entry["user_id"]] = entry["profile"]
+        self._append_or_patch(batch)
+        return len(batch)
+
+    def close(self) -> None:
+        self._base = {c: array(t) for c, t in COLUMNS.items()}
+        self._merged = {}
+        for mm in self._mmaps:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # a caller still holds a column view; the map closes with it
+        self._mmaps = []
+
+    # ── access ────────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._index
+
+    @property
+    def path(self) -> Optional[str]:
+        """Snapshot directory for stores opened from disk, else None."""
+        return self._path
+
+    @property
+    def user_ids(self) -> List[str]:
+        return list(self._ids)
+
+    def row_of(self, user_id: str) -> Optional[int]:
+        return self._index.get(user_id)
+
+    def user_id_at(self, row: int) -> str:
+        return self._ids[row]
+
+    def column(self, name: str):
+        """All rows of one column (float32 → "f", uint8 → "B" sequence).
+
+        Zero-copy memoryview over the snapshot when no deltas touch it;
+        otherwise a merged array copy (cached until the next delta).
+        """
+        if name not in COLUMNS:
+            raise KeyError(f"Unknown feature column: {name!r}")
+        if not self._tail[name] and not self._patch:
+            return self._base[name]
+        merged = self._merged.get(name)
+        if merged is None:
+            merged = array(COLUMNS[name], self._base[name])
+            merged.extend(self._tail[name])
+            for row, values in self._patch.items():
+                merged[row] = values[name]
+            self._merged[name] = merged
+        return merged
+
+    def row(self, row: int) -> Dict[str, float]:
+        """Encoded values of one row."""
+        patched = self._patch.get(row)
+        if patched is not None:
+            return dict(patched)
+        if row < self._n_base:
+            return {c: self._base[c][row] for c in COLUMNS}
+        return {c: self._tail[c][row - self._n_base] for c in COLUMNS}
+
+    def get(self, user_id: str) -> Optional[dict]:
+        """Decoded flat profile for user_id (compute_match_v2 input shape)."""
+        r = self._index.get(user_id)
+        return None if r is None else decode_row(self.row(r), self._vocab)
+
+    def iter_profiles(self) -> Iterator[Tuple[str, dict]]:
+        for r, uid in enumerate(self._ids):
+            yield uid, decode_row(self.row(r), self._vocab)
+
+    # ── internals ─────────────────────────────────────────────────────────
+
+    def _append_or_patch(self, profiles: Mapping[str, dict]) -> None:
+        for uid, profile in profiles.items():
+            encoded = encode_profile(profile, self._vocab)
+            r = self._index.get(uid)
+            if r is None:
+                self._index[uid] = len(self._ids)
+                self._ids.append(uid)
+                for col, value in encoded.items():
+                    self._tail[col].append(value)
+            elif r < self._n_base:
+                self._patch[r] = encoded
+            else:
+                for col, value in encoded.items():
+                    self._tail[col][r - self._n_base] = value
+        self._merged = {}
+
+
+def _jsonable(profile: Mapping) -> dict:
+    """Only the fields the store encodes (keeps delta.log small)."""
+    keep = set(DEGREE_FIELDS + SIGN_FIELDS + BOOL_FIELDS + NUMBER_FIELDS + CATEGORY_FIELDS)
+    out = {k: v for k, v in profile.items() if k in keep}
+    if profile.get("birth_time"):
+        out["birth_time"] = profile["birth_time"]
+    bazi = profile.get("bazi") or {}
+    if bazi:
+        out["bazi"] = {k: bazi[k] for k in ("day_master", "four_pillars", "hour_known") if k in bazi}
+    if profile.get("element_profile"):
+        out["element_profile"] = profile["element_profile"]
+    return out
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Feature Store Change-Data-Capture Sync
+Keeps a local feature_store.FeatureStore in step with onboarding updates.
+
+Polls user_natal_data and user_psychology_profiles by a keyset watermark
+(updated_at, user_id), rebuilds the feature record of every changed user from
+both tables, writes the batch as one FeatureStore delta, and notifies
+subscribers so caches keyed on those users can be invalidated.
+
+Change sources:
+  SupabaseChangeSource — production (needs migration 015 so UPDATEs bump updated_at)
+  LocalChangeSource    — in-memory stand-in with the same semantics (tests / offline)
+
+The service (main.py) does not start a sync. Run it as its own process next
+to the feature store; subscribers only see the caches of that process, so the
+service workers' natal/psychology rows still expire by DESTINY_DB_CACHE_TTL.
+
+Usage:
+    sync = FeatureSync(SupabaseChangeSource(), FeatureStore.open(path))
+    sync.subscribe(db_client.invalidate_users)   # drop stale rows in this process
+    sync.run_forever(interval=5.0)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import blob_codec
+from feature_store import FeatureStore, flatten_natal
+
+NATAL_TABLE = "user_natal_data"
+PSYCHOLOGY_TABLE = "user_psychology_profiles"
+TABLES = (NATAL_TABLE, PSYCHOLOGY_TABLE)
+
+# user_psychology_profiles columns that feed matching
+_PSYCHOLOGY_FEATURES = ("attachment_style",)
+
+
+def _quote(value) -> str:
+    """PostgREST filter literal: double-quoted, so ':', '+', ',', '.' and parens are data."""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _after(row: dict, watermark: Optional[dict]) -> bool:
+    """True if row sorts strictly after the (updated_at, user_id) watermark."""
+    if not watermark:
+        return True
+    return (row["updated_at"], row["user_id"]) > (watermark["updated_at"], watermark["user_id"])
+
+
+# ── Change sources ────────────────────────────────────────────────────────────
+
+class LocalChangeSource:
+    """In-memory stand-in for the two Supabase tables.
+
+    upsert() stamps updated_at with a strictly increasing UTC timestamp,
+    mirroring the database trigger from migration 015.
+    """
+
+    def __init__(self) -> None:
+        self._tables: Dict[str, Dict[str, dict]] = {t: {} for t in TABLES}
+        self._lock = threading.Lock()
+        self._last_ts: Optional[datetime] = None
+
+    def _now(self) -> str:
+        now = datetime.now(timezone.utc)
+        if self._last_ts is not None and now <= self._last_ts:
+            now = self._last_ts + timedelta(microseconds=1)  # keep the watermark strict
+        self._last_ts = now
+        return now.isoformat(timespec="microseconds")
+
+    def upsert(self, table: str, row: dict) -> dict:
+        with self._lock:
+            current = dict(self._tables[table].get(row["user_id"], {}))
+            current.update(row)
+            current["updated_at"] = self._now()
+            self._tables[table][row["user_id"]] = current
+            return dict(current)
+
+    def fetch_changes(self, table: str, watermark: Optional[dict], limit: int) -> List[dict]:
+        with self._lock:
+            rows = [r for r in self._tables[table].values() if _after(r, watermark)]
+        rows.sort(key=lambda r: (r["updated_at"], r["user_id"]))
+        return [dict(r) for r in rows[:limit]]
+
+    def fetch_rows(self, table: str, user_ids: Iterable[str]) -> List[dict]:
+        with self._lock:
+            return [dict(self._tables[table][u]) for u in user_ids if u in self._tables[table]]
+
+
+class SupabaseChangeSource:
+    """Reads changes from Supabase via keyset pagination on (updated_at, user_id)."""
+
+    _COLUMNS = {
+        NATAL_TABLE: "user_id, western_chart, bazi_chart, updated_at",
+        PSYCHOLOGY_TABLE: "user_id, " + ", ".join(_PSYCHOLOGY_FEATURES) + ", updated_at",
+    }
+
+    def __init__(self, client=None) -> None:
+        self._client = client
+
+    def _table(self, table: str):
+        if self._client is None:
+            import db_client
+            self._client = db_client._get_client()
+        return self._client.table(table)
+
+    def _columns(self, table: str) -> str:
+        columns = self._COLUMNS[table]
+        if table == NATAL_TABLE and blob_codec.enabled():
+            columns += ", western_chart_blob, bazi_chart_blob"
+        return columns
+
+    @staticmethod
+    def _decode(table: str, rows: List[dict]) -> List[dict]:
+        if table == NATAL_TABLE:
+            for row in rows:
+                blob_codec.decode_columns(row, ("western_chart", "bazi_chart"))
+        return rows
+
+    def fetch_changes(self, table: str, watermark: Optional[dict], limit: int) -> List[dict]:
+        query = self._table(table).select(self._columns(table))
+        if watermark:
+            ts, uid = _quote(watermark["updated_at"]), _quote(watermark["user_id"])
+            query = query.or_(f"updated_at.gt.{ts},and(updated_at.eq.{ts},user_id.gt.{uid})")
+        result = query.order("updated_at").order("user_id").limit(limit).execute()
+        return self._decode(table, result.data or [])
+
+    def fetch_rows(self, table: str, user_ids: Iterable[str]) -> List[dict]:
+        ids = list(user_ids)
+        if not ids:
+            return []
+        result = self._table(table).select(self._columns(table)).in_("user_id", ids).execute()
+        return self._decode(table, result.data or [])
+
+
+# ── Sync ──────────────────────────────────────────────────────────────────────
+
+def build_feature_record(natal: dict, psychology: Optional[dict] = None) -> dict:
+    """Flat profile for the feature store from a natal row + optional psychology row."""
+    profile = flatten_natal(natal)
+    for field in _PSYCHOLOGY_FEATURES:
+        if psychology and psychology.get(field):
+            profile[field] = psychology[field]
+    return profile
+
+
+class FeatureSync:
+    """Polls change sources and applies batched deltas to a FeatureStore.
+
+    state_path: JSON file holding per-table watermarks. Defaults to
+                <store dir>/sync_state.json for stores opened from disk,
+                otherwise watermarks live only in memory.
+    """
+
+    def __init__(
+        self,
+        source,
+        store: FeatureStore,
+        batch_size: int = 500,
+        state_path: Optional[str] = None,
+    ) -> None:
+        self._source = source
+        self._store = store
+        self._batch_size = batch_size
+        store_dir = store.path
+        self._state_path = state_path or (
+            os.path.join(store_dir, "sync_state.json") if store_dir else None
+        )
+        self._watermarks: Dict[str, Optional[dict]] = {t: None for t in TABLES}
+        self._listeners: List[Callable[[Set[str]], None]] = []
+        self._stop = threading.Event()
+        self._load_state()
+
+    # ── subscribers ──────────────────────────────────────────────────────
+
+    def subscribe(self, listener: Callable[[Set[str]], None]) -> None:
+        """Register listener(user_ids) called after each applied batch."""
+        self._listeners.append(listener)
+
+    def _emit(self, user_ids: Set[str]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(set(user_ids))
+            except Exception:
+                pass  # a broken cache must never stall the sync loop
+
+    # ── watermarks ───────────────────────────────────────────────────────
+
+    @property
+    def watermarks(self) -> Dict[str, Optional[dict]]:
+        return {t: (dict(w) if w else None) for t, w in self._watermarks.items()}
+
+    def _load_state(self) -> None:
+        if self._state_path and os.path.exists(self._state_path):
+            with open(self._state_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            for t in TABLES:
+                self._watermarks[t] = saved.get(t)
+
+    def _save_state(self) -> None:
+        if not self._state_path:
+            return
+        tmp = self._state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._watermarks, f)
+        os.replace(tmp, self._state_path)
+
+    # ── polling ──────────────────────────────────────────────────────────
+
+    def poll_once(self) -> Set[str]:
+        """Fetch one batch per table, apply it, and return the changed user_ids."""
+        changed: Set[str] = set()
+        advanced: Dict[str, dict] = {}
+        for table in TABLES:
+            rows = self._source.fetch_changes(table, self._watermarks[table], self._batch_size)
+            if rows:
+                changed.update(r["user_id"] for r in rows)
+                last = rows[-1]
+                advanced[table] = {"updated_at": last["updated_at"], "user_id": last["user_id"]}
+        if not changed:
+            return changed
+
+        natal = {r["user_id"]: r for r in self._source.fetch_rows(NATAL_TABLE, changed)}
+        psych = {r["user_id"]: r for r in self._source.fetch_rows(PSYCHOLOGY_TABLE, changed)}
+        records = {
+            uid: build_feature_record(natal[uid], psych.get(uid))
+            for uid in changed if uid in natal
+        }
+        self._store.apply_delta(records)
+
+        # Advance watermarks only after the delta is durable.
+        self._watermarks.update(advanced)
+        self._save_state()
+        self._emit(changed)
+        return changed
+
+    def run_until_idle(self, max_batches: int = 10_000) -> int:
+        """Drain all pending changes; returns the number of user updates applied."""
+        total = 0
+        for _ in range(max_batches):
+            changed = self.poll_once()
+            if not changed:
+                break
+            total += len(changed)
+        return total
+
+    def run_forever(self, interval: float = 5.0) -> None:
+        """Poll until stop() is called. Errors are retried on the next tick."""
+        while not self._stop.is_set():
+            try:
+                self.run_until_idle()
+            except Exception:
+                import traceback
+                traceback.print_exc()
+            self._stop.wait(interval)
+
+    def start(self, interval: float = 5.0) -> threading.Thread:
+        """Run run_forever() on a daemon thread."""
+        self._stop.clear()
+        thread = threading.Thread(target=self.run_forever, args=(interval,),
+                                  name="feature-sync", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -20,6 +20,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
+from metrics import timed
 from bazi import GENERATION_CYCLE, compute_ten_gods, evaluate_day_master_strength
 from psychology import (
     evaluate_planet_dignity,
@@ -521,6 +522,7 @@ def _extract_classical_astrology_layer(
 
 # ── Public API ────────────────────────────────────────────────────────────────
 
+@timed("psychology")
 def extract_ideal_partner_profile(
     western_chart: dict,
     bazi_chart: dict,
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Lazy Imports
+Keeps heavy or optional modules out of cold start: main.py binds scoring
+engines, prompt builders and storage through lazy_function(), so importing
+main (and serving /health) does not import chart / matching / zwds / …
+The module is imported on the first call.
+
+A LazyFunction is a plain module global, so tests can still monkeypatch
+main.compute_match_v2, and it pickles as the real function, so it can be
+shipped to the process-pool CPU executor (offload.run_cpu).
+
+Usage:
+    compute_match_v2 = lazy_function("matching", "compute_match_v2")
+    compute_match_v2(a, b)           # imports matching on first call
+"""
+
+from __future__ import annotations
+
+import importlib
+from typing import Any, Callable, Optional
+
+
+def _import_attr(module: str, name: str) -> Any:
+    return getattr(importlib.import_module(module), name)
+
+
+class LazyFunction:
+    """Stand-in for module.name that imports the module on first call."""
+
+    __slots__ = ("module", "name", "_fn")
+
+    def __init__(self, module: str, name: str) -> None:
+        self.module = module
+        self.name = name
+        self._fn: Optional[Callable] = None
+
+    def resolve(self) -> Callable:
+        fn = self._fn
+        if fn is None:
+            fn = self._fn = _import_attr(self.module, self.name)
+        return fn
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __reduce__(self):
+        return _import_attr, (self.module, self.name)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._fn is not None else "not loaded"
+        return f"<lazy {self.module}.{self.name} ({state})>"
+
+
+def lazy_function(module: str, name: str) -> LazyFunction:
+    return LazyFunction(module, name)
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — LLM Response Cache
+Content-addressed cache for LLM completions. The prompt builders
+(get_match_report_prompt, get_profile_prompt, build_synastry_report_prompt …)
+are deterministic, so a sandbox re-click, a client retry or a
+force_recompute of the same pair sends a byte-identical prompt. Those calls
+are answered from the cache instead of the provider.
+
+Key: sha256(provider, model, max_tokens, sha256(prompt)). The API key is not
+part of the key — the same prompt to the same model is the same answer no
+matter whose quota pays for it.
+
+Tiers:
+  memory — LRU bounded by entry count, entries expire after ttl seconds
+  disk   — optional SQLite file (WAL) shared across restarts / workers,
+           same TTL; once it grows past disk_size entries it is pruned
+           back to 90% of that by last access
+
+Environment:
+  DESTINY_LLM_CACHE           — 0 disables the cache (default 1)
+  DESTINY_LLM_CACHE_TTL       — seconds (default 86400)
+  DESTINY_LLM_CACHE_SIZE      — memory entries (default 2048)
+  DESTINY_LLM_CACHE_PATH      — SQLite file for the disk tier (default: none)
+  DESTINY_LLM_CACHE_DISK_SIZE — disk entries (default 100000)
+
+Usage:
+    cache = get_llm_cache()
+    key = cache_key("gemini", "gemini-2.0-flash", 600, prompt)
+    text = cache.get(key)
+    if text is None:
+        text = call_provider(...)
+        cache.put(key, text)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# the disk tier is pruned back to this fraction of disk_max_entries, so the
+# exact COUNT(*) runs once per ~10% of the cap in writes, not on every put
+_DISK_LOW_WATER = 0.9
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def cache_key(provider: str, model: str, max_tokens: int, prompt: str) -> str:
+    """Cache key for one completion request."""
+    material = f"{provider}\x00{model}\x00{int(max_tokens)}\x00{prompt_hash(prompt)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier (memory LRU + optional SQLite) TTL cache of completion text."""
+
+    def __init__(
+        self,
+        ttl: float = 86400,
+        max_entries: int = 2048,
+        path: Optional[str] = None,
+        disk_max_entries: int = 100_000,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                       "stores": 0, "evictions": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_count = 0      # upper bound on disk rows written since the last count
+        self.path = path
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)"
+            )
+            self._disk_count = self._count_disk()
+
+    @property
+    def disk_enabled(self) -> bool:
+        return self._conn is not None
+
+    # ── lookups ──────────────────────────────────────────────────────────
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached text for key, or None. Disk hits are promoted to memory."""
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._mem.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._mem[key]
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._conn.execute(
+                        "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+                    self._remember(key, row[0], row[1])
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._disk_count -= 1
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, response: str) -> None:
+        """Store text under key in both tiers."""
+        if self.ttl <= 0 or not response:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self._stats["stores"] += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT INTO llm_cache (key, response, expires_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET response = excluded.response,"
+                    " expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                    (key, response, expires_at, now),
+                )
+                # overwrites are counted too; that only brings the next prune forward
+                self._disk_count += 1
+                if self._disk_count > self.disk_max_entries:
+                    self._prune_disk()
+
+    def _remember(self, key: str, response: str, expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._mem[key] = (expires_at, response)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _count_disk(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def _prune_disk(self) -> None:
+        # other workers may share the file, so resync with the real count first
+        count = self._count_disk()
+        if count > self.disk_max_entries:
+            count -= self._conn.execute(
+                "DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            excess = count - int(self.disk_max_entries * _DISK_LOW_WATER)
+            if excess > 0:
+                count -= self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN"
+                    " (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                ).rowcount
+                self._stats["evictions"] += excess
+        self._disk_count = count
+
+    # ── maintenance ──────────────────────────────────────────────────────
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._mem.pop(key, None)
+            if self._conn is not None:
+                self._disk_count -= self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key = ?", (key,)).rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._disk_count = 0
+            for k in self._stats:
+                self._stats[k] = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats, size=len(self._mem), ttl=self.ttl,
+                       max_entries=self.max_entries)
+            if self._conn is not None:
+                out["disk_size"] = self._count_disk()
+            return out
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.environ.get("DESTINY_LLM_CACHE", "1") not in ("", "0")
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Process-wide cache configured from the environment (created on first use)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(
+                    ttl=float(os.environ.get("DESTINY_LLM_CACHE_TTL", "") or 86400),
+                    max_entries=int(os.environ.get("DESTINY_LLM_CACHE_SIZE", "") or 2048),
+                    path=os.environ.get("DESTINY_LLM_CACHE_PATH") or None,
+                    disk_max_entries=int(os.environ.get("DESTINY_LLM_CACHE_DISK_SIZE", "")
+                                         or 100_000),
+                )
+    return _cache
+
+
+def set_llm_cache(cache: Optional[LLMResponseCache]) -> None:
+    """Replace the process-wide cache (tests); None closes it and resets to env config."""
+    global _cache
+    with _cache_lock:
+        old, _cache = _cache, cache
+    if old is not None and old is not cache:
+        old.close()
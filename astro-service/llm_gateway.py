@@ -0,0 +1,627 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Async LLM Gateway
+Single place where the service talks to Anthropic and Gemini.
+
+- SDK clients are cached per (provider, sha256(api_key)), so per-request
+  keys from the sandbox reuse their connection pool instead of building a
+  new client (and TLS handshake) on every call.
+- Every client sits on its own keep-alive httpx.AsyncClient with HTTP/2.
+- Concurrency is bounded per provider (asyncio.Semaphore); excess calls
+  wait instead of opening more upstream connections.
+- Per-provider metrics: requests, errors, in-flight, waiting, latency
+  percentiles.
+- Routing mode (provider="auto"): every call feeds an EWMA of latency and
+  error rate per (provider, model). Auto calls go to the fastest healthy
+  route; if it has not answered after its p95 latency a hedged request
+  goes to the next route and the first answer wins. A failed primary
+  fails over immediately. Prompts are sent unchanged to either provider.
+- Per-provider circuit breaker (circuit_breaker.py): after consecutive
+  provider failures (timeouts, connection errors, 5xx, 429) calls fail
+  fast with CircuitOpenError instead of waiting for the SDK timeout;
+  half-open trial calls probe for recovery. Auto routing skips open
+  circuits.
+
+All clients live on one gateway event loop running in a daemon thread, so
+sync callers (call) and async callers (acall, from any loop) share the same
+pools.
+
+Environment:
+  DESTINY_LLM_CONCURRENCY_ANTHROPIC / _GEMINI — max concurrent calls (default 16)
+  DESTINY_LLM_TIMEOUT                         — per-request timeout seconds (default 60)
+  ANTHROPIC_BASE_URL / GEMINI_BASE_URL        — override endpoints (stub servers, proxies)
+  DESTINY_LLM_HEDGE                           — 0 disables hedging in auto mode (default 1)
+  DESTINY_LLM_HEDGE_DELAY_MS                  — hedge delay until a route has p95 data (default 2000)
+  DESTINY_LLM_MAX_ERROR_RATE                  — routes above this EWMA error rate are unhealthy (0.5)
+  DESTINY_LLM_CB_FAILURES                     — consecutive failures that open a circuit (default 5)
+  DESTINY_LLM_CB_RESET_SECONDS                — open → half-open after this many seconds (default 30)
+  DESTINY_LLM_CB_HALF_OPEN_CALLS              — concurrent trial calls while half-open (default 1)
+
+Usage:
+    gateway = get_gateway()
+    text = gateway.call(prompt, provider="gemini", max_tokens=400)
+    text = await gateway.acall(prompt, provider="anthropic")
+    text = gateway.call(prompt, provider="auto")     # fastest healthy, hedged
+    async for delta in gateway.astream(prompt, provider="gemini"):
+        ...
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import observe_stage
+
+PROVIDERS = ("anthropic", "gemini")
+AUTO = "auto"
+ANTHROPIC_MODEL = "claude-haiku-4-5-20251001"
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash"
+
+_KEY_ENV = {"anthropic": "ANTHROPIC_API_KEY", "gemini": "GEMINI_API_KEY"}
+
+
+class LLMConfigError(ValueError):
+    """No API key available for the provider, or unknown provider."""
+
+
+def _key_hash(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _anthropic_httpx():
+    """httpx flavour for the anthropic SDK: newer SDKs vendor httpx as httpx2
+    and reject plain httpx clients. Imported on first client, not at startup."""
+    try:
+        import httpx2
+        return httpx2
+    except ImportError:
+        import httpx
+        return httpx
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """True if error says the provider is unhealthy (counts toward its circuit).
+
+    HTTP 4xx answers other than 408 / 429 are the request's fault — the
+    provider responded — so they do not trip the breaker.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    status = getattr(error, "status_code", None)
+    if not isinstance(status, int):
+        status = getattr(error, "code", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in (408, 429)
+    return True
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class ProviderStats:
+    """Counters and a latency reservoir (last 1024 calls) for one provider."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.latencies_ms: deque = deque(maxlen=1024)
+        self.last_error: Optional[str] = None
+
+    def snapshot(self) -> dict:
+        lat = sorted(self.latencies_ms)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "latency_ms": {
+                "p50": round(_percentile(lat, 50), 1),
+                "p95": round(_percentile(lat, 95), 1),
+                "p99": round(_percentile(lat, 99), 1),
+                "mean": round(sum(lat) / len(lat), 1) if lat else 0.0,
+            },
+            "last_error": self.last_error,
+        }
+
+
+class RouteStats:
+    """EWMA latency and error rate for one (provider, model) route.
+
+    The error rate decays toward zero while a route is idle (half-life
+    error_half_life seconds), so an unhealthy route is retried eventually
+    instead of being starved of the traffic that would prove it recovered.
+    """
+
+    def __init__(self, alpha: float = 0.2, error_half_life: float = 30.0) -> None:
+        self.alpha = alpha
+        self.error_half_life = error_half_life
+        self.ewma_ms: Optional[float] = None
+        self._error_rate = 0.0
+        self._updated = time.monotonic()
+        self.samples = 0
+        self.latencies_ms: deque = deque(maxlen=256)
+
+    def record(self, latency_ms: float, ok: bool) -> None:
+        rate = self.error_rate
+        self._error_rate = rate + self.alpha * ((0.0 if ok else 1.0) - rate)
+        self._updated = time.monotonic()
+        self.samples += 1
+        if ok:
+            self.ewma_ms = latency_ms if self.ewma_ms is None \
+                else self.ewma_ms + self.alpha * (latency_ms - self.ewma_ms)
+            self.latencies_ms.append(latency_ms)
+
+    @property
+    def error_rate(self) -> float:
+        idle = time.monotonic() - self._updated
+        return self._error_rate * 0.5 ** (idle / self.error_half_life)
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies_ms) < 5:
+            return None
+        return _percentile(sorted(self.latencies_ms), 95)
+
+    def snapshot(self) -> dict:
+        p95 = self.p95()
+        return {
+            "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "samples": self.samples,
+        }
+
+
+class LLMGateway:
+    """Cached, concurrency-bounded async clients for Anthropic and Gemini.
+
+    concurrency: {provider: max concurrent calls}; defaults from env.
+    base_urls:   {provider: base URL}; defaults from ANTHROPIC_BASE_URL /
+                 GEMINI_BASE_URL, else the SDK defaults.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[Dict[str, int]] = None,
+        base_urls: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        max_connections: int = 100,
+    ) -> None:
+        self._concurrency = {
+            p: int(os.environ.get(f"DESTINY_LLM_CONCURRENCY_{p.upper()}", "") or 16)
+            for p in PROVIDERS
+        }
+        self._concurrency.update(concurrency or {})
+        self._base_urls = {
+            "anthropic": os.environ.get("ANTHROPIC_BASE_URL") or None,
+            "gemini": os.environ.get("GEMINI_BASE_URL") or None,
+        }
+        self._base_urls.update(base_urls or {})
+        self._timeout = timeout or float(os.environ.get("DESTINY_LLM_TIMEOUT", "") or 60)
+        self._max_connections = max_connections
+        self._clients: Dict[tuple, Any] = {}
+        self._http: list = []
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats = {p: ProviderStats() for p in PROVIDERS}
+        self._routes: Dict[tuple, RouteStats] = {}
+        self._max_error_rate = float(os.environ.get("DESTINY_LLM_MAX_ERROR_RATE", "") or 0.5)
+        self._hedge = os.environ.get("DESTINY_LLM_HEDGE", "1") not in ("", "0")
+        self._hedge_delay_ms = float(os.environ.get("DESTINY_LLM_HEDGE_DELAY_MS", "") or 2000)
+        self._routing = {"auto_calls": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0}
+        self._breakers = {
+            p: CircuitBreaker(
+                p,
+                failure_threshold=int(os.environ.get("DESTINY_LLM_CB_FAILURES", "") or 5),
+                reset_timeout=float(os.environ.get("DESTINY_LLM_CB_RESET_SECONDS", "") or 30),
+                half_open_calls=int(os.environ.get("DESTINY_LLM_CB_HALF_OPEN_CALLS", "") or 1),
+            )
+            for p in PROVIDERS
+        }
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ── gateway loop ─────────────────────────────────────────────────────
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    # ── clients ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def resolve_key(provider: str, api_key: str = "") -> str:
+        """Request key, else the server env var; raises LLMConfigError if neither."""
+        if provider not in PROVIDERS:
+            raise LLMConfigError(f"Unknown LLM provider: {provider!r}")
+        key = api_key or os.environ.get(_KEY_ENV[provider], "")
+        if not key:
+            raise LLMConfigError(f"{_KEY_ENV[provider]} not set")
+        return key
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        return self._breakers[provider]
+
+    @staticmethod
+    def model_for(provider: str, gemini_model: str = "") -> str:
+        return (gemini_model or DEFAULT_GEMINI_MODEL) if provider == "gemini" else ANTHROPIC_MODEL
+
+    @staticmethod
+    def auto_keys() -> Dict[str, str]:
+        """{provider: server key} for auto routing; raises LLMConfigError if none is set."""
+        keys = {p: os.environ[_KEY_ENV[p]] for p in PROVIDERS if os.environ.get(_KEY_ENV[p])}
+        if not keys:
+            raise LLMConfigError(
+                "auto routing needs ANTHROPIC_API_KEY or GEMINI_API_KEY on the server"
+            )
+        return keys
+
+    def _http_client(self, module=None):
+        """Keep-alive HTTP/2 pool; module is the httpx flavour the SDK expects."""
+        if module is None:
+            import httpx as module
+        limits = module.Limits(max_connections=self._max_connections,
+                               max_keepalive_connections=self._max_connections)
+        http = module.AsyncClient(http2=True, limits=limits, timeout=self._timeout)
+        self._http.append(http)
+        return http
+
+    def _client(self, provider: str, key: str):
+        """SDK client for (provider, key hash); created on the gateway loop."""
+        cache_key = (provider, _key_hash(key))
+        client = self._clients.get(cache_key)
+        if client is not None:
+            return client
+        if provider == "anthropic":
+            from anthropic import AsyncAnthropic
+            client = AsyncAnthropic(api_key=key, base_url=self._base_urls["anthropic"],
+                                    http_client=self._http_client(_anthropic_httpx()))
+        else:
+            from google import genai
+            from google.genai import types
+            options = types.HttpOptions(httpx_async_client=self._http_client())
+            if self._base_urls["gemini"]:
+                options.base_url = self._base_urls["gemini"]
+            client = genai.Client(api_key=key, http_options=options)
+        self._clients[cache_key] = client
+        return client
+
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    # ── calls ────────────────────────────────────────────────────────────
+
+    async def _generate(self, provider: str, prompt: str, max_tokens: int,
+                        key: str, gemini_model: str) -> str:
+        client = self._client(provider, key)
+        if provider == "gemini":
+            response = await client.aio.models.generate_content(
+                model=gemini_model or DEFAULT_GEMINI_MODEL, contents=prompt,
+            )
+            return response.text
+        message = await client.messages.create(
+            model=ANTHROPIC_MODEL,
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return message.content[0].text
+
+    async def _stream(self, provider: str, prompt: str, max_tokens: int,
+                      key: str, gemini_model: str) -> AsyncIterator[str]:
+        """Text deltas from the provider's streaming API."""
+        client = self._client(provider, key)
+        if provider == "gemini":
+            chunks = await client.aio.models.generate_content_stream(
+                model=gemini_model or DEFAULT_GEMINI_MODEL, contents=prompt,
+            )
+            async for chunk in chunks:
+                if chunk.text:
+                    yield chunk.text
+            return
+        async with client.messages.stream(
+            model=ANTHROPIC_MODEL,
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": prompt}],
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+    def _route_stats(self, provider: str, model: str) -> RouteStats:
+        route = self._routes.get((provider, model))
+        if route is None:
+            route = self._routes[(provider, model)] = RouteStats()
+        return route
+
+    @contextlib.asynccontextmanager
+    async def _metered(self, provider: str, model: str):
+        """Hold a concurrency slot for provider and record latency / errors.
+
+        Calls cancelled by the caller (e.g. the losing side of a hedge) are
+        not recorded, so they never skew the latency estimates.
+        """
+        breaker = self._breakers[provider]
+        breaker.before_call()               # CircuitOpenError while the provider is down
+        stats = self._stats[provider]
+        route = self._route_stats(provider, model)
+        sem = self._semaphores.get(provider)
+        if sem is None:
+            sem = self._semaphores[provider] = asyncio.Semaphore(self._concurrency[provider])
+        stats.waiting += 1
+        try:
+            await sem.acquire()
+        except BaseException:
+            breaker.release()
+            raise
+        finally:
+            stats.waiting -= 1
+        stats.requests += 1
+        stats.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            stats.errors += 1
+            stats.last_error = f"{type(e).__name__}: {e}"[:200]
+            route.record((time.perf_counter() - start) * 1000, ok=False)
+            observe_stage("llm." + provider, time.perf_counter() - start)
+            if is_provider_failure(e):
+                breaker.record_failure(e)
+            else:
+                breaker.record_success()
+            raise
+        else:
+            latency_ms = (time.perf_counter() - start) * 1000
+            stats.latencies_ms.append(latency_ms)
+            observe_stage("llm." + provider, latency_ms / 1000)
+            route.record(latency_ms, ok=True)
+            breaker.record_success()
+        finally:
+            stats.in_flight -= 1
+            sem.release()
+
+    async def _call(self, provider: str, prompt: str, max_tokens: int,
+                    key: str, gemini_model: str) -> str:
+        async with self._metered(provider, self.model_for(provider, gemini_model)):
+            return await self._generate(provider, prompt, max_tokens, key, gemini_model)
+
+    async def _pump(self, provider: str, prompt: str, max_tokens: int, key: str,
+                    gemini_model: str, emit: Callable[[tuple], None]) -> None:
+        """Run a stream on the gateway loop, handing each event to emit()."""
+        try:
+            async with self._metered(provider, self.model_for(provider, gemini_model)):
+                async for delta in self._stream(provider, prompt, max_tokens, key, gemini_model):
+                    emit(("delta", delta))
+        except BaseException as e:
+            emit(("error", e))
+            if not isinstance(e, Exception):
+                raise
+        else:
+            emit(("done", None))
+
+    # ── routing ──────────────────────────────────────────────────────────
+
+    def routes(self, providers, gemini_model: str = "") -> list:
+        """Candidate (provider, model) routes, best first.
+
+        Healthy routes (EWMA error rate below the threshold) come first,
+        fastest EWMA latency first; routes without data yet sort first so
+        they get explored. Unhealthy routes follow, least failing first;
+        routes whose circuit is open come last.
+        """
+        candidates = [(p, self.model_for(p, gemini_model)) for p in PROVIDERS if p in providers]
+
+        def rank(route):
+            if not self._breakers[route[0]].allows():
+                return (2, 0.0)
+            rs = self._route_stats(*route)
+            healthy = rs.error_rate < self._max_error_rate
+            if healthy:
+                return (0, rs.ewma_ms if rs.ewma_ms is not None else -1.0)
+            return (1, rs.error_rate)
+
+        return sorted(candidates, key=rank)
+
+    def hedge_delay(self, provider: str, model: str) -> float:
+        """Seconds to wait on route before hedging: its p95, or the default."""
+        p95 = self._route_stats(provider, model).p95()
+        return (p95 if p95 is not None else self._hedge_delay_ms) / 1000
+
+    async def _route(self, prompt: str, max_tokens: int, keys: Dict[str, str],
+                     gemini_model: str, hedge: bool) -> str:
+        """Auto mode: best route first, hedge after its p95, fail over on error."""
+        order = self.routes(keys, gemini_model)
+        self._routing["auto_calls"] += 1
+        primary = order[0]
+        backup = order[1] if len(order) > 1 else None
+        tasks: Dict[asyncio.Task, tuple] = {}
+
+        def launch(route):
+            provider = route[0]
+            task = asyncio.ensure_future(
+                self._call(provider, prompt, max_tokens, keys[provider], gemini_model)
+            )
+            tasks[task] = route
+
+        launch(primary)
+        pending = set(tasks)
+        delay = self.hedge_delay(*primary) if hedge and backup else None
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:                      # primary slower than its p95
+                    self._routing["hedges"] += 1
+                    launch(backup)
+                    pending = {t for t in tasks if not t.done()}
+                    delay = None
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] != primary:
+                            self._routing["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+                if not pending and backup and backup not in tasks.values():
+                    self._routing["failovers"] += 1
+                    launch(backup)
+                    pending = {t for t in tasks if not t.done()}
+                    delay = None
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _coroutine(self, prompt: str, provider: str, max_tokens: int, api_key: str,
+                   gemini_model: str, hedge: Optional[bool]):
+        if provider == AUTO:
+            return self._route(prompt, max_tokens, self.auto_keys(), gemini_model,
+                               self._hedge if hedge is None else hedge)
+        key = self.resolve_key(provider, api_key)
+        return self._call(provider, prompt, max_tokens, key, gemini_model)
+
+    def submit(self, prompt: str, provider: str = "anthropic", max_tokens: int = 600,
+               api_key: str = "", gemini_model: str = "",
+               hedge: Optional[bool] = None) -> Future:
+        """Schedule a call on the gateway loop; returns a concurrent Future.
+
+        provider="auto" routes across every provider with a server key
+        (api_key is ignored); hedge overrides DESTINY_LLM_HEDGE.
+        """
+        coro = self._coroutine(prompt, provider, max_tokens, api_key, gemini_model, hedge)
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def call(self, prompt: str, provider: str = "anthropic", max_tokens: int = 600,
+             api_key: str = "", gemini_model: str = "", hedge: Optional[bool] = None) -> str:
+        """Blocking call (for sync endpoints / worker threads)."""
+        return self.submit(prompt, provider, max_tokens, api_key, gemini_model, hedge).result()
+
+    async def acall(self, prompt: str, provider: str = "anthropic", max_tokens: int = 600,
+                    api_key: str = "", gemini_model: str = "",
+                    hedge: Optional[bool] = None) -> str:
+        """Awaitable call usable from any event loop."""
+        return await asyncio.wrap_future(
+            self.submit(prompt, provider, max_tokens, api_key, gemini_model, hedge)
+        )
+
+    async def astream(self, prompt: str, provider: str = "anthropic", max_tokens: int = 600,
+                      api_key: str = "", gemini_model: str = "") -> AsyncIterator[str]:
+        """Async iterator of completion text deltas, usable from any event loop.
+
+        The provider stream runs on the gateway loop (shared clients, same
+        concurrency limits); deltas are handed to the caller's loop as they
+        arrive. Closing the iterator early cancels the upstream request.
+        provider="auto" streams from the best route (no hedging: deltas
+        cannot be taken back once forwarded).
+        """
+        if provider == AUTO:
+            keys = self.auto_keys()
+            provider = self.routes(keys, gemini_model)[0][0]
+            api_key = keys[provider]
+        key = self.resolve_key(provider, api_key)
+        caller = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(event: tuple) -> None:
+            try:
+                caller.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:  # caller's loop already closed
+                pass
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._pump(provider, prompt, max_tokens, key, gemini_model, emit),
+            self._ensure_loop(),
+        )
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "delta":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            if not future.done():
+                future.cancel()
+
+    # ── metrics / lifecycle ──────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        out = {p: s.snapshot() for p, s in self._stats.items()}
+        for p in PROVIDERS:
+            out[p]["concurrency"] = self._concurrency[p]
+            out[p]["clients"] = sum(1 for (prov, _) in self._clients if prov == p)
+            out[p]["circuit"] = self._breakers[p].snapshot()
+        out["routing"] = dict(
+            self._routing,
+            routes={f"{p}/{m}": r.snapshot() for (p, m), r in sorted(self._routes.items())},
+        )
+        return out
+
+    def close(self) -> None:
+        """Close all HTTP pools and stop the gateway loop."""
+        with self._lock:
+            loop, thread, self._loop, self._thread = self._loop, self._thread, None, None
+        if loop is None:
+            return
+
+        async def _close():
+            for http in self._http:
+                await http.aclose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout=5)
+        finally:
+            self._http.clear()
+            self._clients.clear()
+            self._semaphores.clear()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Process-wide gateway (created on first use)."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
+
+
+def close_gateway() -> None:
+    global _gateway
+    with _gateway_lock:
+        gateway, _gateway = _gateway, None
+    if gateway is not None:
+        gateway.close()
@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Synthetic Load Generator
+Builds a synthetic user population and replays a traffic mix against the
+API, so hardware can be sized from measured throughput and tail latency
+instead of guesses.
+
+Population: N users with a configurable data-tier mix, birth-year
+distribution (normal, clamped), gender mix, RPV answers and attachment
+styles. Every user goes through calculate_chart (and compute_zwds_chart
+for Tier 1), so payloads have production shape and size.
+
+Traffic: closed-loop workers (--concurrency) each pick an operation from a
+weighted mix and wait for the answer before sending the next request:
+
+  onboard        POST /api/users/onboard      (charts + storage writes)
+  ranking        POST /ranking/top-k          (quick-score over the shard)
+  compute_match  POST /compute-match          (compute_match_v2)
+  enriched       POST /compute-enriched       (DestinyPipeline, synastry)
+  llm            POST /generate-match-report  (LLM via a stub provider)
+
+Targets:
+  in-process — httpx over ASGITransport against main.app, with a temporary
+               SQLite storage backend; the llm operation is routed to a
+               StubLLM server started here.
+  HTTP       — a running service (base URL). Point its ANTHROPIC_BASE_URL
+               at a stub (run_loadtest.py --serve-stub-llm) before sending
+               llm traffic, or the reports hit the real provider.
+
+In-process, the population replaces the ranking shard before traffic starts
+(POST /ranking/shard/load). Against a running service that would wipe its
+shard, and onboard would write synthetic users into its real storage, so
+run_http is read-only unless allow_writes=True: the shard is left as it is
+(ranking scores against whatever the service has loaded) and onboard is
+dropped from the mix.
+
+Report: per operation count, errors, status codes, throughput (req/s) and
+p50 / p95 / p99 latency in ms, plus the total.
+
+Usage:
+    pop = generate_population(PopulationConfig(n=200, seed=7))
+    report = asyncio.run(run_in_process(pop, LoadConfig(concurrency=16, duration=30)))
+    print(report.format())
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field, replace
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+OPERATIONS = ("onboard", "ranking", "compute_match", "enriched", "llm")
+DEFAULT_MIX = {"onboard": 0.10, "ranking": 0.40, "compute_match": 0.30,
+               "enriched": 0.10, "llm": 0.10}
+
+# (lat, lng) of the cities users are born in
+_CITIES = (
+    (25.033, 121.565),    # Taipei
+    (22.627, 120.301),    # Kaohsiung
+    (24.148, 120.674),    # Taichung
+    (22.319, 114.169),    # Hong Kong
+    (1.352, 103.820),     # Singapore
+    (31.230, 121.474),    # Shanghai
+    (37.774, -122.419),   # San Francisco
+)
+_TIME_SLOTS = ("morning", "afternoon", "evening")
+
+
+# ── population ───────────────────────────────────────────────────────────────
+
+@dataclass
+class PopulationConfig:
+    n: int = 200
+    tier_mix: Dict[int, float] = field(default_factory=lambda: {1: 0.3, 2: 0.3, 3: 0.4})
+    birth_year_mean: float = 1994
+    birth_year_sd: float = 6
+    birth_year_range: Tuple[int, int] = (1960, 2006)
+    gender_mix: Dict[str, float] = field(default_factory=lambda: {"M": 0.5, "F": 0.5})
+    rpv_conflict: Dict[str, float] = field(default_factory=lambda: {"cold_war": 0.5, "argue": 0.5})
+    rpv_power: Dict[str, float] = field(default_factory=lambda: {"control": 0.5, "follow": 0.5})
+    rpv_energy: Dict[str, float] = field(default_factory=lambda: {"home": 0.5, "out": 0.5})
+    attachment_mix: Dict[str, float] = field(
+        default_factory=lambda: {"secure": 0.5, "anxious": 0.3, "avoidant": 0.2})
+    seed: int = 0
+
+
+@dataclass
+class SyntheticUser:
+    user_id: str
+    birth_date: str                  # "1995-06-15"
+    birth_time: Optional[str]        # "14:30" (Tier 1) | "morning" … (Tier 2) | None
+    gender: str
+    lat: float
+    lng: float
+    tier: int
+    rpv_conflict: str
+    rpv_power: str
+    rpv_energy: str
+    attachment_style: str
+    flat: dict                       # flat profile, same shape as /quick-score and the shard
+    zwds: dict                       # ZWDS chart (Tier 1), else {}
+
+    def birth(self) -> dict:
+        """Birth data as /compute-enriched takes it."""
+        return {"birth_date": self.birth_date, "birth_time": self.birth_time,
+                "gender": self.gender, "lat": self.lat, "lng": self.lng}
+
+    def onboard(self) -> dict:
+        """/api/users/onboard body."""
+        exact = self.birth_time if self.tier == 1 else None
+        slot = "precise" if self.tier == 1 else self.birth_time
+        return {"user_id": self.user_id, "birth_date": self.birth_date, "birth_time": slot,
+                "birth_time_exact": exact, "lat": self.lat, "lng": self.lng,
+                "data_tier": self.tier, "gender": self.gender}
+
+
+def _pick(rng: random.Random, weights: dict):
+    keys = list(weights)
+    return rng.choices(keys, weights=[weights[k] for k in keys])[0]
+
+
+def _birth_date(rng: random.Random, config: PopulationConfig) -> date:
+    low, high = config.birth_year_range
+    year = int(round(rng.gauss(config.birth_year_mean, config.birth_year_sd)))
+    year = min(high, max(low, year))
+    start = date(year, 1, 1)
+    return start + timedelta(days=rng.randrange((date(year + 1, 1, 1) - start).days))
+
+
+def make_user(index: int, rng: random.Random, config: PopulationConfig) -> SyntheticUser:
+    """One synthetic user, charts computed."""
+    from chart import calculate_chart
+    from feature_store import flatten_natal
+    from zwds import compute_zwds_chart
+
+    tier = _pick(rng, config.tier_mix)
+    born = _birth_date(rng, config)
+    gender = _pick(rng, config.gender_mix)
+    lat, lng = rng.choice(_CITIES)
+    if tier == 1:
+        birth_time = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"
+    elif tier == 2:
+        birth_time = rng.choice(_TIME_SLOTS)
+    else:
+        birth_time = None
+    exact = birth_time if tier == 1 else None
+
+    chart = calculate_chart(
+        birth_date=born.isoformat(), birth_time="precise" if tier == 1 else birth_time,
+        birth_time_exact=exact, lat=lat, lng=lng, data_tier=tier,
+    )
+    zwds = (compute_zwds_chart(born.year, born.month, born.day, exact, gender) or {}) if exact else {}
+
+    user = SyntheticUser(
+        user_id=f"synthetic-{config.seed}-{index:06d}", birth_date=born.isoformat(),
+        birth_time=birth_time, gender=gender, lat=lat, lng=lng, tier=tier,
+        rpv_conflict=_pick(rng, config.rpv_conflict), rpv_power=_pick(rng, config.rpv_power),
+        rpv_energy=_pick(rng, config.rpv_energy),
+        attachment_style=_pick(rng, config.attachment_mix), flat={}, zwds=zwds,
+    )
+    flat = flatten_natal({"western_chart": chart, "bazi_chart": chart.get("bazi") or {}})
+    flat.update(
+        data_tier=tier, gender=gender, birth_year=born.year, birth_month=born.month,
+        birth_day=born.day, birth_time=exact or "",
+        rpv_conflict=user.rpv_conflict, rpv_power=user.rpv_power, rpv_energy=user.rpv_energy,
+        attachment_style=user.attachment_style,
+    )
+    user.flat = flat
+    return user
+
+
+def generate_population(config: PopulationConfig) -> List[SyntheticUser]:
+    """config.n users; the same config (seed included) gives the same population."""
+    rng = random.Random(config.seed)
+    return [make_user(i, rng, config) for i in range(config.n)]
+
+
+# ── stub LLM provider ─────────────────────────────────────────────────────────
+
+STUB_REPORT = {
+    "title": "Synthetic report", "one_liner": "load test",
+    "sparks": ["spark"], "landmines": ["landmine"], "advice": ["advice"], "core": "core",
+}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        time.sleep(self.server.latency)
+        if not self.path.endswith("/v1/messages"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = json.dumps({
+            "id": "msg_loadgen", "type": "message", "role": "assistant",
+            "model": body.get("model", "stub"), "stop_reason": "end_turn", "stop_sequence": None,
+            "content": [{"type": "text", "text": json.dumps(STUB_REPORT)}],
+            "usage": {"input_tokens": 1, "output_tokens": 1},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubLLM:
+    """Anthropic Messages API stand-in: a canned report after `latency` seconds."""
+
+    def __init__(self, latency: float = 0.2, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.server = ThreadingHTTPServer((host, port), _StubHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubLLM":
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        name="loadgen-stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ── traffic ───────────────────────────────────────────────────────────────────
+
+@dataclass
+class LoadConfig:
+    mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    concurrency: int = 8
+    duration: Optional[float] = 10.0     # seconds; None → stop after `requests`
+    requests: Optional[int] = None       # total requests; stops at whichever comes first
+    k: int = 20                          # ranking top-K
+    llm_latency: float = 0.2             # stub LLM latency (in-process target)
+    warmup: bool = True                  # one unrecorded request per operation first
+    seed: int = 0
+
+
+def build_request(op: str, population: List[SyntheticUser], rng: random.Random,
+                  k: int = 20) -> Tuple[str, dict]:
+    """(path, JSON body) of one `op` request over random users."""
+    a, b = rng.sample(population, 2)
+    if op == "onboard":
+        return "/api/users/onboard", a.onboard()
+    if op == "ranking":
+        return "/ranking/top-k", {"user": a.flat, "k": k, "exclude": [a.user_id]}
+    if op == "compute_match":
+        return "/compute-match", {"user_a": a.flat, "user_b": b.flat}
+    if op == "enriched":
+        return "/compute-enriched", {"person_a": a.birth(), "person_b": b.birth()}
+    if op == "llm":
+        match_data = {"harmony_score": rng.randint(40, 95), "primary_track": "soul",
+                      "pair": [a.user_id, b.user_id]}
+        return "/generate-match-report", {"match_data": match_data, "provider": "anthropic",
+                                          "api_key": "loadgen", "use_cache": False}
+    raise ValueError(f"Unknown operation: {op!r}")
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+@dataclass
+class EndpointStats:
+    count: int
+    errors: int
+    statuses: Dict[str, int]
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+@dataclass
+class LoadReport:
+    elapsed: float
+    concurrency: int
+    endpoints: Dict[str, EndpointStats]
+    total: EndpointStats
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def format(self) -> str:
+        lines = [f"  {'operation':<14} {'count':>7} {'errors':>7} {'req/s':>8} "
+                 f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+        rows = list(self.endpoints.items()) + [("total", self.total)]
+        for name, s in rows:
+            lines.append(f"  {name:<14} {s.count:>7} {s.errors:>7} {s.rps:>8.1f} "
+                         f"{s.p50_ms:>9.1f} {s.p95_ms:>9.1f} {s.p99_ms:>9.1f}")
+        lines.append(f"\n  {self.elapsed:.1f}s at concurrency {self.concurrency}")
+        return "\n".join(lines)
+
+
+def _stats(samples: List[Tuple[int, float]], elapsed: float) -> EndpointStats:
+    latencies = sorted(ms for _, ms in samples)
+    statuses: Dict[str, int] = {}
+    for status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for status, _ in samples if not 200 <= status < 400)
+    return EndpointStats(
+        count=len(samples), errors=errors, statuses=statuses,
+        rps=round(len(samples) / elapsed, 2) if elapsed > 0 else 0.0,
+        p50_ms=round(_percentile(latencies, 50), 2), p95_ms=round(_percentile(latencies, 95), 2),
+        p99_ms=round(_percentile(latencies, 99), 2),
+    )
+
+
+async def load_shard(client, population: List[SyntheticUser], batch: int = 100) -> None:
+    """Replace the target's ranking shard with the population."""
+    for start in range(0, len(population), batch):
+        chunk = population[start:start + batch]
+        resp = await client.post("/ranking/shard/load", json={
+            "profiles": {u.user_id: u.flat for u in chunk}, "replace": start == 0})
+        resp.raise_for_status()
+
+
+async def run_load(client, population: List[SyntheticUser], config: LoadConfig) -> LoadReport:
+    """Closed-loop traffic from config.concurrency workers over an httpx.AsyncClient."""
+    if len(population) < 2:
+        raise ValueError("population needs at least 2 users")
+    if config.duration is None and config.requests is None:
+        raise ValueError("set duration or requests")
+    mix = {op: w for op, w in config.mix.items() if w > 0}
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations: {sorted(unknown)}")
+
+    if config.warmup:   # lazy imports, client construction, first-call caches
+        rng = random.Random(config.seed)
+        for op in mix:
+            path, body = build_request(op, population, rng, config.k)
+            with contextlib.suppress(Exception):
+                await client.post(path, json=body)
+
+    samples: Dict[str, List[Tuple[int, float]]] = {op: [] for op in mix}
+    issued = 0
+    started = time.perf_counter()
+    stop_at = started + config.duration if config.duration is not None else None
+
+    async def worker(seed: int) -> None:
+        nonlocal issued
+        rng = random.Random(seed)
+        while True:
+            if stop_at is not None and time.perf_counter() >= stop_at:
+                return
+            if config.requests is not None:
+                if issued >= config.requests:
+                    return
+                issued += 1
+            op = _pick(rng, mix)
+            path, body = build_request(op, population, rng, config.k)
+            sent = time.perf_counter()
+            try:
+                status = (await client.post(path, json=body)).status_code
+            except Exception:
+                status = 0                    # connection error / timeout
+            samples[op].append((status, (time.perf_counter() - sent) * 1000))
+
+    await asyncio.gather(*(worker(config.seed * 10007 + i) for i in range(config.concurrency)))
+    elapsed = time.perf_counter() - started
+    everything = [s for op_samples in samples.values() for s in op_samples]
+    return LoadReport(
+        elapsed=round(elapsed, 3), concurrency=config.concurrency,
+        endpoints={op: _stats(s, elapsed) for op, s in samples.items()},
+        total=_stats(everything, elapsed),
+    )
+
+
+@contextlib.contextmanager
+def _llm_routed_to(url: str):
+    """Send this process's Anthropic calls to `url` (fresh gateway on both ends)."""
+    from llm_gateway import close_gateway
+
+    previous = os.environ.get("ANTHROPIC_BASE_URL")
+    os.environ["ANTHROPIC_BASE_URL"] = url
+    close_gateway()
+    try:
+        yield
+    finally:
+        close_gateway()
+        if previous is None:
+            os.environ.pop("ANTHROPIC_BASE_URL", None)
+        else:
+            os.environ["ANTHROPIC_BASE_URL"] = previous
+
+
+async def run_in_process(population: List[SyntheticUser], config: LoadConfig) -> LoadReport:
+    """Traffic against main.app in this process (temporary SQLite storage, stub LLM)."""
+    import httpx
+
+    import main
+    from storage import SQLiteStorage, set_storage
+
+    with tempfile.TemporaryDirectory(prefix="destiny-loadgen-") as tmp:
+        store = SQLiteStorage(os.path.join(tmp, "loadgen.db"))
+        previous = set_storage(store)
+        stub = StubLLM(config.llm_latency).start()
+        try:
+            with _llm_routed_to(stub.url):
+                transport = httpx.ASGITransport(app=main.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://loadgen",
+                                             timeout=120) as client:
+                    await load_shard(client, population)
+                    return await run_load(client, population, config)
+        finally:
+            stub.stop()
+            set_storage(previous)
+            store.close()
+
+
+async def run_http(base_url: str, population: List[SyntheticUser], config: LoadConfig,
+                   allow_writes: bool = False) -> LoadReport:
+    """Traffic against a running service.
+
+    allow_writes replaces the service's ranking shard with the population and
+    keeps onboard in the mix; without it nothing on the service is modified.
+    """
+    import httpx
+
+    limits = httpx.Limits(max_connections=config.concurrency,
+                          max_keepalive_connections=config.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        return await _run_remote(client, population, config, allow_writes)
+
+
+async def _run_remote(client, population: List[SyntheticUser], config: LoadConfig,
+                      allow_writes: bool) -> LoadReport:
+    if allow_writes:
+        await load_shard(client, population)
+    else:
+        mix = {op: w for op, w in config.mix.items() if op != "onboard"}
+        if not any(w > 0 for w in mix.values()):
+            raise ValueError("only onboard traffic requested; it writes to the target "
+                             "(pass allow_writes)")
+        config = replace(config, mix=mix)
+    return await run_load(client, population, config)
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """"ranking=4,compute_match=3,llm=1" → weights (unlisted operations get 0)."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        op, _, weight = part.partition("=")
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown operation: {op!r} (expected one of {', '.join(OPERATIONS)})")
+        mix[op] = float(weight or 1)
+    return mix
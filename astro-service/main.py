@@ -5,45 +5,78 @@ FastAPI server for natal chart calculation.
 
 Endpoints:
   GET  /health           → health check
+  GET  /health/db        → Supabase connection-pool saturation
+  GET  /health/llm       → LLM gateway latency / error metrics
+  GET  /health/singleflight → duplicate computations collapsed per group
   POST /calculate-chart  → compute zodiac signs from birth data
 """
 
 from __future__ import annotations
 
+import asyncio
 import os
+import sys
+import threading
 import json
-from typing import Optional
+import time
+from typing import Callable, Optional
 
 import pathlib
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
-from pydantic import BaseModel
-from chart import calculate_chart
-from bazi import analyze_element_relation
-from matching import compute_match_score, compute_match_v2, compute_quick_score
-from zwds import compute_zwds_chart
-from prompt_manager import get_match_report_prompt, get_simple_report_prompt, get_profile_prompt, get_ideal_match_prompt, build_synastry_report_prompt
-from api_presenter import format_safe_match_response, format_safe_onboard_response
-from ideal_avatar import extract_ideal_partner_profile
-from anthropic import Anthropic
-from google import genai as google_genai
-
-anthropic_client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", ""))
-
-# Ensure Chinese characters are returned as-is (not escaped as \uXXXX)
-class UTF8JSONResponse(JSONResponse):
-    def render(self, content) -> bytes:
-        import json
-        return json.dumps(content, ensure_ascii=False).encode("utf-8")
-
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from lazy import lazy_function
+from offload import run_cpu, run_io
+import singleflight
+import report_jobs
+from llm_gateway import (
+    AUTO, LLMConfigError, LLMGateway, close_gateway, get_gateway,
+)
+from circuit_breaker import CircuitOpenError
+import llm_cache
+import admission
+import metrics
+import profiling
+from rendering import FastJSONResponse, NegotiationMiddleware
+
+# Scoring engines, prompt builders and storage are imported on first call
+# (lazy.py) so cold start and the first /health skip them.
+calculate_chart = lazy_function("chart", "calculate_chart")
+analyze_element_relation = lazy_function("bazi", "analyze_element_relation")
+compute_match_score = lazy_function("matching", "compute_match_score")
+compute_match_v2 = lazy_function("matching", "compute_match_v2")
+compute_quick_score = lazy_function("matching", "compute_quick_score")
+compute_zwds_chart = lazy_function("zwds", "compute_zwds_chart")
+get_match_report_prompt = lazy_function("prompt_manager", "get_match_report_prompt")
+get_simple_report_prompt = lazy_function("prompt_manager", "get_simple_report_prompt")
+get_profile_prompt = lazy_function("prompt_manager", "get_profile_prompt")
+get_ideal_match_prompt = lazy_function("prompt_manager", "get_ideal_match_prompt")
+build_synastry_report_prompt = lazy_function("prompt_manager", "build_synastry_report_prompt")
+format_safe_match_response = lazy_function("api_presenter", "format_safe_match_response")
+format_safe_onboard_response = lazy_function("api_presenter", "format_safe_onboard_response")
+extract_ideal_partner_profile = lazy_function("ideal_avatar", "extract_ideal_partner_profile")
+flatten_natal = lazy_function("feature_store", "flatten_natal")
+get_storage = lazy_function("storage", "get_storage")
+
+# Chinese characters are returned as-is (not escaped as \uXXXX); orjson when
+# installed, msgpack for clients that send Accept: application/msgpack
 app = FastAPI(
     title="DESTINY Astro Service",
     version="0.3.0",
-    default_response_class=UTF8JSONResponse,
+    default_response_class=FastJSONResponse,
 )
-
+# Sync endpoints attach their worker thread to an opt-in request profile
+app.router.route_class = profiling.ProfiledRoute
+
+# Profiling is innermost: a profiled request is sampled only once admitted
+app.add_middleware(profiling.ProfilingMiddleware)
+# Admission control sits inside CORS so 429s still carry CORS headers
+app.add_middleware(admission.AdmissionMiddleware)
+app.add_middleware(NegotiationMiddleware)
+# Request latency includes time queued by admission control
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -70,6 +103,83 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/health/db")
+def health_db():
+    """Supabase connection-pool health and write-behind queue depth."""
+    import db_client
+    return {**db_client.pool_stats(), "write_behind": db_client.write_behind_stats()}
+
+
+@app.get("/health/llm")
+def health_llm():
+    """Per-provider LLM gateway metrics plus LLM response cache hit/miss counts."""
+    stats = get_gateway().stats()
+    stats["cache"] = llm_cache.get_llm_cache().stats() if llm_cache.enabled() else {"enabled": False}
+    return stats
+
+
+@app.get("/health/singleflight")
+def health_singleflight():
+    """Duplicate-collapse counters per singleflight group (chart / match / llm)."""
+    return singleflight.stats()
+
+
+@app.get("/health/admission")
+def health_admission():
+    """Per-pool concurrency / queue depth and admitted / rejected counts by priority."""
+    return {"enabled": admission.enabled(), **admission.get_controller().stats()}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text format: request / stage latency histograms, cache
+    hit/miss counters, pool saturation gauges (see metrics.py)."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/debug/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """Collapsed stacks of a profiled request (flamegraph.pl / speedscope input).
+
+    404 unless DESTINY_PROFILING=1 and DESTINY_PROFILING_TOKEN are set — see profiling.py.
+    """
+    folded = profiling.load(profile_id) if profiling.enabled() else None
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(folded, media_type="text/plain; charset=utf-8")
+
+
+@app.on_event("startup")
+def _resume_report_jobs():
+    """Restart workers for jobs persisted by a previous process."""
+    path = os.environ.get("DESTINY_REPORT_JOBS_PATH") or "report_jobs.db"
+    if os.path.exists(path):
+        _report_queue().start()
+
+
+@app.on_event("shutdown")
+async def _close_db_pools():
+    db_client = sys.modules.get("db_client")   # never imported → nothing to close
+    if db_client is not None:
+        try:
+            db_client.stop_write_behind()
+            await db_client.aclose_clients()
+        except Exception:
+            pass
+    from storage import set_storage
+    previous = set_storage(None)
+    if previous is not None:
+        previous.close()
+    import offload
+    offload.shutdown(wait=False)
+    close_gateway()
+    llm_cache.set_llm_cache(None)
+    jobs = report_jobs.set_queue(None)
+    if jobs is not None:
+        jobs.stop()
+        jobs.store.close()
+
+
 @app.get("/sandbox")
 def serve_sandbox():
     """Serve sandbox.html at http://localhost:8001/sandbox (same-origin, no CORS needed)."""
@@ -77,34 +187,42 @@ def serve_sandbox():
     return FileResponse(str(html_path), media_type="text/html")
 
 
+def _calc_chart(req: ChartRequest) -> dict:
+    result = calculate_chart(
+        birth_date=req.birth_date,
+        birth_time=req.birth_time,
+        birth_time_exact=req.birth_time_exact,
+        lat=req.lat,
+        lng=req.lng,
+        data_tier=req.data_tier,
+    )
+
+    # For Tier 1, enrich emotional_capacity with ZWDS rules (4-6)
+    if req.data_tier == 1 and req.birth_time_exact:
+        try:
+            from datetime import datetime as _dt
+            dt = _dt.strptime(req.birth_date, "%Y-%m-%d")
+            year = req.birth_year or dt.year
+            month = req.birth_month or dt.month
+            day = req.birth_day or dt.day
+            zwds = compute_zwds_chart(year, month, day, req.birth_time_exact, req.gender)
+            if zwds:
+                from chart import compute_emotional_capacity
+                result["emotional_capacity"] = compute_emotional_capacity(result, zwds)
+        except Exception:
+            pass  # never block the response for ZWDS failure
+
+    return result
+
+
 @app.post("/calculate-chart")
 def calc_chart(req: ChartRequest):
+    metrics.set_tier(req.data_tier)
     try:
-        result = calculate_chart(
-            birth_date=req.birth_date,
-            birth_time=req.birth_time,
-            birth_time_exact=req.birth_time_exact,
-            lat=req.lat,
-            lng=req.lng,
-            data_tier=req.data_tier,
+        # Identical concurrent requests share one computation
+        return singleflight.group("chart").do(
+            singleflight.key_for("calculate-chart", req.model_dump()), _calc_chart, req,
         )
-
-        # For Tier 1, enrich emotional_capacity with ZWDS rules (4-6)
-        if req.data_tier == 1 and req.birth_time_exact:
-            try:
-                from datetime import datetime as _dt
-                dt = _dt.strptime(req.birth_date, "%Y-%m-%d")
-                year = req.birth_year or dt.year
-                month = req.birth_month or dt.month
-                day = req.birth_day or dt.day
-                zwds = compute_zwds_chart(year, month, day, req.birth_time_exact, req.gender)
-                if zwds:
-                    from chart import compute_emotional_capacity
-                    result["emotional_capacity"] = compute_emotional_capacity(result, zwds)
-            except Exception:
-                pass  # never block the response for ZWDS failure
-
-        return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -128,8 +246,20 @@ class MatchRequest(BaseModel):
     user_b: dict
 
 
+def _pair_tier(user_a: dict, user_b: dict) -> int:
+    """Data tier label for a pair: the less precise of the two (3 if unset)."""
+    return max(user_a.get("data_tier") or 3, user_b.get("data_tier") or 3)
+
+
+def _deadline(budget_ms: Optional[float]) -> Optional[float]:
+    """Absolute time.monotonic() deadline from an X-Destiny-Deadline-Ms budget."""
+    if budget_ms is None:
+        return None
+    return time.monotonic() + max(budget_ms, 0.0) / 1000
+
+
 @app.post("/compute-match")
-def compute_match(req: MatchRequest):
+def compute_match(req: MatchRequest, x_destiny_deadline_ms: Optional[float] = Header(None)):
     """Compute Phase G v2 match score between two user profiles.
 
     user_a / user_b should contain flat profile fields:
@@ -147,10 +277,16 @@ def compute_match(req: MatchRequest):
     gracefully to zwds=null and spiciness_level="STABLE".
 
     Returns: lust_score, soul_score, power {rpv, frame_break, viewer_role, target_role},
-             tracks {friend, passion, partner, soul}, primary_track, quadrant, labels
+             tracks {friend, passion, partner, soul}, primary_track, quadrant, labels,
+             layers {ran, skipped, degraded}
+
+    Header X-Destiny-Deadline-Ms: latency budget; optional layers that do not
+    fit are skipped (see matching.OPTIONAL_LAYERS) and listed in layers.skipped.
     """
+    metrics.set_tier(_pair_tier(req.user_a, req.user_b))
     try:
-        result = compute_match_v2(req.user_a, req.user_b)
+        result = compute_match_v2(req.user_a, req.user_b,
+                                  deadline=_deadline(x_destiny_deadline_ms))
 
         # Echo key chart fields for both persons into the result so they are
         # stored in report_json and available for prompt preview / LLM context.
@@ -184,6 +320,117 @@ def quick_score(req: MatchRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# ── Sharded Ranking: scatter-gather over /quick-score ────────────────────────
+# Each host keeps one population shard in memory. A coordinator (any host with
+# DESTINY_RANK_SHARDS set, or shard_ranking.ShardedRanker directly) fans out
+# one-vs-all scoring and merges each shard's local top-K.
+
+_local_shard = None
+_shard_lock = threading.Lock()
+_ranker = None
+
+
+def _get_shard():
+    """This host's population shard (shard_ranking.LocalShard, created on first use)."""
+    global _local_shard
+    if _local_shard is None:
+        with _shard_lock:
+            if _local_shard is None:
+                from shard_ranking import LocalShard
+                _local_shard = LocalShard()
+    return _local_shard
+
+
+def _get_ranker():
+    """Coordinator over DESTINY_RANK_SHARDS (comma-separated base URLs), else this host."""
+    global _ranker
+    if _ranker is None:
+        from shard_ranking import ShardedRanker
+        urls = [u.strip() for u in os.environ.get("DESTINY_RANK_SHARDS", "").split(",") if u.strip()]
+        _ranker = ShardedRanker.with_hosts(urls) if urls else ShardedRanker([_get_shard()])
+    return _ranker
+
+
+class ShardLoadRequest(BaseModel):
+    profiles: dict                               # user_id → flat profile (same shape as /quick-score)
+    replace: bool = False
+
+
+class ShardRemoveRequest(BaseModel):
+    user_ids: list
+
+
+class ShardTopKRequest(BaseModel):
+    user: dict
+    k: int = Field(20, ge=0)
+    exclude: list = []
+
+
+@app.post("/ranking/shard/load")
+def shard_load(req: ShardLoadRequest):
+    """Add/update profiles in this host's population shard."""
+    return {"size": _get_shard().load(req.profiles, replace=req.replace)}
+
+
+@app.post("/ranking/shard/remove")
+def shard_remove(req: ShardRemoveRequest):
+    return {"size": _get_shard().remove(req.user_ids)}
+
+
+@app.get("/ranking/shard/size")
+def shard_size():
+    return {"size": len(_get_shard())}
+
+
+@app.post("/ranking/shard/top-k")
+def shard_top_k(req: ShardTopKRequest):
+    """Local top-K of this host's shard (called by the coordinator)."""
+    return {"results": _get_shard().top_k(req.user, k=req.k, exclude=req.exclude)}
+
+
+class RankingTopKRequest(ShardTopKRequest):
+    user_id: Optional[str] = None                # enables the ranking cache
+    force_recompute: bool = False
+
+
+@app.post("/ranking/top-k")
+def ranking_top_k(req: RankingTopKRequest):
+    """Global top-K across all configured shards.
+
+    With user_id, a ranking cached within DESTINY_RANKING_CACHE_TTL seconds
+    (default 600) is returned instead of re-scoring, as long as it was scored
+    for the same user profile (an edited natal/psychology profile is a miss).
+
+    Returns: {results: [{user_id, harmony, lust, soul, primary_track, ...}], cached}
+    sorted by harmony desc, user_id asc.
+    """
+    max_age = float(os.environ.get("DESTINY_RANKING_CACHE_TTL", "600"))
+    profile_hash = singleflight.key_for("ranking", req.user)
+    if req.user_id and not req.force_recompute:
+        try:
+            cached = get_storage().get_ranking(req.user_id, req.k, max_age=max_age,
+                                               profile_hash=profile_hash)
+            if cached is not None:
+                skip = set(req.exclude)
+                kept = [r for r in cached if r["user_id"] not in skip]
+                if len(kept) == len(cached):   # exclusions hit → rescore for a full k
+                    metrics.CACHE_REQUESTS.inc("ranking", "hit")
+                    return {"results": kept, "cached": True}
+        except Exception:
+            pass  # cache miss path
+        metrics.CACHE_REQUESTS.inc("ranking", "miss")
+    try:
+        results = _get_ranker().rank(req.user, k=req.k, exclude=req.exclude)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    if req.user_id:
+        try:
+            get_storage().save_ranking_cache(req.user_id, req.k, results, profile_hash)
+        except Exception:
+            pass  # cache failure is non-critical
+    return {"results": results, "cached": False}
+
+
 class ZwdsChartRequest(BaseModel):
     birth_year:  int
     birth_month: int
@@ -197,8 +444,12 @@ async def get_zwds_chart(req: ZwdsChartRequest):
     """Compute ZiWei DouShu 12-palace chart (Tier 1 only).
     Returns null chart if birth_time is not provided.
     """
-    chart = compute_zwds_chart(
-        req.birth_year, req.birth_month, req.birth_day, req.birth_time, req.gender
+    chart = await singleflight.group("chart").ado(
+        singleflight.key_for("zwds", req.model_dump()),
+        lambda: run_cpu(
+            compute_zwds_chart,
+            req.birth_year, req.birth_month, req.birth_day, req.birth_time, req.gender,
+        ),
     )
     return {"chart": chart}
 
@@ -206,41 +457,196 @@ async def get_zwds_chart(req: ZwdsChartRequest):
 # ── Algorithm Validation Sandbox Endpoints ─────────────────────────────────
 
 
+def _llm_provider(provider: str) -> str:
+    """"gemini" and "auto" (latency-aware routing) pass through; anything else is Anthropic."""
+    return provider if provider in ("gemini", AUTO) else "anthropic"
+
+
+def _llm_cache_key(prompt: str, provider: str, max_tokens: int, gemini_model: str) -> str:
+    # auto answers may come from either provider, so they share one "auto" entry
+    model = AUTO if provider == AUTO else LLMGateway.model_for(provider, gemini_model)
+    return llm_cache.cache_key(provider, model, max_tokens, prompt)
+
+
+def _llm_flight_key(prompt: str, provider: str, max_tokens: int, gemini_model: str,
+                    api_key: str) -> str:
+    """Singleflight key: the cache key plus the API key, so a caller never
+    inherits an error caused by someone else's key."""
+    return singleflight.key_for(_llm_cache_key(prompt, provider, max_tokens, gemini_model), api_key)
+
+
+def _circuit_open(e: CircuitOpenError) -> HTTPException:
+    """503 with Retry-After while a provider's circuit is open (fail fast)."""
+    return HTTPException(status_code=503, detail=str(e),
+                         headers={"Retry-After": str(max(1, round(e.retry_after)))})
+
+
+def _is_json(text: str) -> bool:
+    """cacheable predicate for endpoints that json.loads the completion."""
+    try:
+        json.loads(text)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _llm_cache_lookup(prompt: str, provider: str, max_tokens: int, gemini_model: str,
+                      use_cache: bool) -> tuple:
+    """(cache or None, key, cached text or None) for one completion request."""
+    if not llm_cache.enabled():
+        return None, "", None
+    cache = llm_cache.get_llm_cache()
+    key = _llm_cache_key(prompt, provider, max_tokens, gemini_model)
+    return cache, key, (cache.get(key) if use_cache else None)
+
+
 def call_llm(
     prompt: str,
     provider: str = "anthropic",
     max_tokens: int = 600,
     api_key: str = "",
     gemini_model: str = "",
+    use_cache: bool = True,
+    cacheable: Optional[Callable[[str], bool]] = None,
 ) -> str:
     """Call Claude (Anthropic) or Gemini based on provider.
 
     api_key: if provided, overrides the server environment variable.
     gemini_model: Gemini model name; defaults to gemini-2.0-flash.
-    Raises HTTPException 400 if no API key is available.
+    provider="auto": route to the fastest healthy provider with a hedged
+               backup request (llm_gateway routing mode, server keys only).
+    use_cache: serve / store the completion in llm_cache (keyed by provider,
+               model, max_tokens and prompt hash); False always calls the LLM
+               but still refreshes the cache.
+    cacheable: predicate on the completion; only matching text is cached
+               (e.g. _is_json so a malformed answer is not replayed).
+    Raises HTTPException 400 if no API key is available, 503 (Retry-After)
+    without calling the provider while its circuit breaker is open.
     Returns raw text from the model.
+
+    Goes through llm_gateway (cached HTTP/2 clients, per-provider limits).
+    Identical concurrent calls share one provider request (singleflight "llm").
     """
-    if provider == "gemini":
-        key = api_key or os.environ.get("GEMINI_API_KEY", "")
-        if not key:
-            raise HTTPException(status_code=400, detail="GEMINI_API_KEY not set")
-        model_name = gemini_model or "gemini-2.0-flash"
-        client = google_genai.Client(api_key=key)
-        response = client.models.generate_content(model=model_name, contents=prompt)
-        return response.text
-    else:  # anthropic (default)
-        key = api_key or os.environ.get("ANTHROPIC_API_KEY", "")
-        if not key:
-            raise HTTPException(status_code=400, detail="ANTHROPIC_API_KEY not set")
-        client = Anthropic(api_key=key) if api_key else anthropic_client
-        message = client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}],
+    provider = _llm_provider(provider)
+    cache, key, hit = _llm_cache_lookup(prompt, provider, max_tokens, gemini_model, use_cache)
+    if hit is not None:
+        return hit
+    try:
+        text = singleflight.group("llm").do(
+            _llm_flight_key(prompt, provider, max_tokens, gemini_model, api_key),
+            get_gateway().call, prompt, provider=provider, max_tokens=max_tokens,
+            api_key=api_key, gemini_model=gemini_model,
         )
-        return message.content[0].text
+    except LLMConfigError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CircuitOpenError as e:
+        raise _circuit_open(e)
+    if cache and (cacheable is None or cacheable(text)):
+        cache.put(key, text)
+    return text
 
 
+async def acall_llm(
+    prompt: str,
+    provider: str = "anthropic",
+    max_tokens: int = 600,
+    api_key: str = "",
+    gemini_model: str = "",
+    use_cache: bool = True,
+    cacheable: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """Async call_llm for async endpoints (same arguments and errors)."""
+    provider = _llm_provider(provider)
+    cache, key, hit = await run_io(_llm_cache_lookup, prompt, provider, max_tokens,
+                                   gemini_model, use_cache)
+    if hit is not None:
+        return hit
+    try:
+        text = await singleflight.group("llm").ado(
+            _llm_flight_key(prompt, provider, max_tokens, gemini_model, api_key),
+            lambda: get_gateway().acall(prompt, provider=provider, max_tokens=max_tokens,
+                                        api_key=api_key, gemini_model=gemini_model),
+        )
+    except LLMConfigError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CircuitOpenError as e:
+        raise _circuit_open(e)
+    if cache and (cacheable is None or cacheable(text)):
+        await run_io(cache.put, key, text)
+    return text
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_llm_report(
+    prompt: str,
+    provider: str = "anthropic",
+    max_tokens: int = 600,
+    api_key: str = "",
+    gemini_model: str = "",
+    use_cache: bool = True,
+    extra: Optional[dict] = None,
+) -> StreamingResponse:
+    """Stream a JSON report completion as Server-Sent Events.
+
+    Events:
+      delta  — {"text": "..."} for each chunk forwarded from the provider
+      result — the parsed JSON report (plus extra), terminal on success
+      error  — {"detail": "..."}, terminal on failure (upstream error or
+               invalid JSON)
+
+    A cached completion is replayed as a single delta. A missing API key
+    (400) or an open provider circuit (503) is reported before the stream
+    starts.
+    """
+    provider = _llm_provider(provider)
+    cache, key, hit = _llm_cache_lookup(prompt, provider, max_tokens, gemini_model, use_cache)
+    if hit is None:
+        try:
+            if provider == AUTO:
+                LLMGateway.auto_keys()
+            else:
+                LLMGateway.resolve_key(provider, api_key)
+                get_gateway().breaker(provider).check()
+        except LLMConfigError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except CircuitOpenError as e:
+            raise _circuit_open(e)
+
+    async def events():
+        text = hit
+        if text is None:
+            parts = []
+            try:
+                async for delta in get_gateway().astream(
+                    prompt, provider=provider, max_tokens=max_tokens,
+                    api_key=api_key, gemini_model=gemini_model,
+                ):
+                    parts.append(delta)
+                    yield _sse("delta", {"text": delta})
+            except Exception as e:
+                yield _sse("error", {"detail": str(e)})
+                return
+            text = "".join(parts)
+        else:
+            yield _sse("delta", {"text": text})
+        try:
+            result = json.loads(text)
+        except json.JSONDecodeError:
+            yield _sse("error", {"detail": f"LLM returned invalid JSON: {text[:300]}"})
+            return
+        if cache and hit is None:
+            await run_io(cache.put, key, text)
+        if extra and isinstance(result, dict):
+            result.update(extra)
+        yield _sse("result", result)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 class ArchetypeRequest(BaseModel):
@@ -249,9 +655,10 @@ class ArchetypeRequest(BaseModel):
     person_b_name: str = "B"
     mode: str = "auto"           # "auto" | "hunt" | "nest" | "abyss" | "friend"
     language: str = "zh-TW"
-    provider: str = "anthropic"  # "anthropic" | "gemini"
+    provider: str = "anthropic"  # "anthropic" | "gemini" | "auto" (fastest healthy, hedged)
     api_key: str = ""            # overrides server env var when provided
     gemini_model: str = "gemini-2.0-flash"  # used only when provider="gemini"
+    use_cache: bool = True       # False bypasses the LLM response cache
 
 
 @app.post("/generate-archetype")
@@ -267,7 +674,8 @@ def generate_archetype(req: ArchetypeRequest):
     )
     raw = ""
     try:
-        raw = call_llm(prompt, provider=req.provider, max_tokens=900, api_key=req.api_key, gemini_model=req.gemini_model)
+        raw = call_llm(prompt, provider=req.provider, max_tokens=900, api_key=req.api_key,
+                       gemini_model=req.gemini_model, use_cache=req.use_cache, cacheable=_is_json)
         result = json.loads(raw)
         result["effective_mode"] = effective_mode
         return result
@@ -279,14 +687,27 @@ def generate_archetype(req: ArchetypeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/generate-archetype/stream")
+def generate_archetype_stream(req: ArchetypeRequest):
+    """Streaming /generate-archetype: SSE deltas, then the parsed report as `result`."""
+    prompt, effective_mode = get_match_report_prompt(
+        req.match_data, mode=req.mode,
+        person_a=req.person_a_name, person_b=req.person_b_name,
+    )
+    return stream_llm_report(prompt, provider=req.provider, max_tokens=900, api_key=req.api_key,
+                             gemini_model=req.gemini_model, use_cache=req.use_cache,
+                             extra={"effective_mode": effective_mode})
+
+
 class ProfileCardRequest(BaseModel):
     chart_data: dict
     rpv_data: dict
     attachment_style: str = "secure"
     person_name: str = "User"
-    provider: str = "anthropic"  # "anthropic" | "gemini"
+    provider: str = "anthropic"  # "anthropic" | "gemini" | "auto" (fastest healthy, hedged)
     api_key: str = ""            # overrides server env var when provided
     gemini_model: str = "gemini-2.0-flash"  # used only when provider="gemini"
+    use_cache: bool = True       # False bypasses the LLM response cache
 
 
 @app.post("/generate-profile-card")
@@ -299,7 +720,8 @@ def generate_profile_card(req: ProfileCardRequest):
 
     raw = ""
     try:
-        raw = call_llm(prompt, provider=req.provider, max_tokens=600, api_key=req.api_key, gemini_model=req.gemini_model)
+        raw = call_llm(prompt, provider=req.provider, max_tokens=600, api_key=req.api_key,
+                       gemini_model=req.gemini_model, use_cache=req.use_cache, cacheable=_is_json)
         return json.loads(raw)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail=f"LLM returned invalid JSON: {raw[:300]}")
@@ -309,6 +731,14 @@ def generate_profile_card(req: ProfileCardRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/generate-profile-card/stream")
+def generate_profile_card_stream(req: ProfileCardRequest):
+    """Streaming /generate-profile-card: SSE deltas, then the parsed card as `result`."""
+    prompt = get_profile_prompt(req.chart_data, req.rpv_data, req.attachment_style)
+    return stream_llm_report(prompt, provider=req.provider, max_tokens=600, api_key=req.api_key,
+                             gemini_model=req.gemini_model, use_cache=req.use_cache)
+
+
 class PreviewPromptRequest(BaseModel):
     match_data: dict
     person_a_name: str = "A"
@@ -338,9 +768,10 @@ class MatchReportRequest(BaseModel):
     person_a_name: str = "A"
     person_b_name: str = "B"
     mode: str = "auto"           # "auto" | "hunt" | "nest" | "abyss" | "friend"
-    provider: str = "anthropic"  # "anthropic" | "gemini"
+    provider: str = "anthropic"  # "anthropic" | "gemini" | "auto" (fastest healthy, hedged)
     api_key: str = ""            # overrides server env var when provided
     gemini_model: str = "gemini-2.0-flash"  # used only when provider="gemini"
+    use_cache: bool = True       # False bypasses the LLM response cache
 
 
 @app.post("/generate-match-report")
@@ -357,7 +788,8 @@ def generate_match_report(req: MatchReportRequest):
 
     raw = ""
     try:
-        raw = call_llm(prompt, provider=req.provider, max_tokens=700, api_key=req.api_key, gemini_model=req.gemini_model)
+        raw = call_llm(prompt, provider=req.provider, max_tokens=700, api_key=req.api_key,
+                       gemini_model=req.gemini_model, use_cache=req.use_cache, cacheable=_is_json)
         return json.loads(raw)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail=f"LLM returned invalid JSON: {raw[:300]}")
@@ -367,11 +799,23 @@ def generate_match_report(req: MatchReportRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/generate-match-report/stream")
+def generate_match_report_stream(req: MatchReportRequest):
+    """Streaming /generate-match-report: SSE deltas, then the parsed report as `result`."""
+    prompt = get_simple_report_prompt(
+        req.match_data, mode=req.mode,
+        person_a=req.person_a_name, person_b=req.person_b_name,
+    )
+    return stream_llm_report(prompt, provider=req.provider, max_tokens=700, api_key=req.api_key,
+                             gemini_model=req.gemini_model, use_cache=req.use_cache)
+
+
 class IdealMatchRequest(BaseModel):
     chart_data: dict
-    provider: str = "anthropic"  # "anthropic" | "gemini"
+    provider: str = "anthropic"  # "anthropic" | "gemini" | "auto" (fastest healthy, hedged)
     api_key: str = ""            # overrides server env var when provided
     gemini_model: str = "gemini-2.0-flash"  # used only when provider="gemini"
+    use_cache: bool = True       # False bypasses the LLM response cache
 
 
 @app.post("/generate-ideal-match")
@@ -384,7 +828,8 @@ def generate_ideal_match(req: IdealMatchRequest):
 
     raw = ""
     try:
-        raw = call_llm(prompt, provider=req.provider, max_tokens=600, api_key=req.api_key, gemini_model=req.gemini_model)
+        raw = call_llm(prompt, provider=req.provider, max_tokens=600, api_key=req.api_key,
+                       gemini_model=req.gemini_model, use_cache=req.use_cache, cacheable=_is_json)
         return json.loads(raw)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail=f"LLM returned invalid JSON: {raw[:300]}")
@@ -394,6 +839,14 @@ def generate_ideal_match(req: IdealMatchRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/generate-ideal-match/stream")
+def generate_ideal_match_stream(req: IdealMatchRequest):
+    """Streaming /generate-ideal-match: SSE deltas, then the parsed profile as `result`."""
+    prompt = get_ideal_match_prompt(req.chart_data)
+    return stream_llm_report(prompt, provider=req.provider, max_tokens=600, api_key=req.api_key,
+                             gemini_model=req.gemini_model, use_cache=req.use_cache)
+
+
 class PreviewIdealMatchRequest(BaseModel):
     chart_data: dict
 
@@ -441,6 +894,7 @@ def compute_enriched(req: EnrichedRequest):
         b = BirthInput(req.person_b.birth_date, req.person_b.birth_time,
                        req.person_b.gender, req.person_b.lat, req.person_b.lng)
 
+    metrics.set_tier(a.tier if b is None else max(a.tier, b.tier))
     try:
         pipeline = DestinyPipeline(a, b)
         pipeline.compute_charts()
@@ -466,8 +920,8 @@ async def extract_ideal_profile(req: dict):
               attachment_style, psychological_conflict, venus_mars_tags,
               favorable_elements}
     """
-    from ideal_avatar import extract_ideal_partner_profile
-    return extract_ideal_partner_profile(
+    return await run_cpu(
+        extract_ideal_partner_profile,
         req.get("western_chart", {}),
         req.get("bazi_chart", {}),
         req.get("zwds_chart", {}),
@@ -487,9 +941,78 @@ class OnboardRequest(BaseModel):
     data_tier: int = 3
     gender: str = "M"
     generate_report: bool = False                # whether to call LLM for natal report
+    async_report: bool = False                   # enqueue the report as a background job
     provider: str = "anthropic"
     api_key: str = ""
     gemini_model: str = "gemini-2.0-flash"
+    use_cache: bool = True                       # False bypasses the LLM response cache
+
+
+_ONBOARD_CHART_FIELDS = {"birth_date", "birth_time", "birth_time_exact", "lat", "lng",
+                         "data_tier", "gender"}
+
+
+def _onboard_charts(req: OnboardRequest) -> tuple:
+    """Steps 1–4 of onboarding (pure CPU): western, bazi, zwds charts + profile."""
+    # 1. Calculate western chart
+    western = calculate_chart(
+        birth_date=req.birth_date,
+        birth_time=req.birth_time,
+        birth_time_exact=req.birth_time_exact,
+        lat=req.lat, lng=req.lng,
+        data_tier=req.data_tier,
+    )
+
+    # 2. BaZi is embedded in the chart result
+    bazi_data = western.get("bazi", {})
+
+    # 3. ZWDS chart (Tier 1 only)
+    zwds_data = {}
+    if req.data_tier == 1 and req.birth_time_exact:
+        try:
+            from datetime import datetime as _dt
+            dt = _dt.strptime(req.birth_date, "%Y-%m-%d")
+            zwds_data = compute_zwds_chart(
+                dt.year, dt.month, dt.day,
+                req.birth_time_exact, req.gender,
+            ) or {}
+        except Exception:
+            zwds_data = {}
+
+    # 4. Extract psychology profile
+    psychology = {}
+    try:
+        from psychology import extract_sm_dynamics, extract_critical_degrees, compute_element_profile
+        psychology = {
+            "sm_tags": western.get("sm_tags", []),
+            "karmic_tags": western.get("karmic_tags", []),
+            "element_profile": western.get("element_profile", {}),
+        }
+    except Exception:
+        pass
+
+    profile = extract_ideal_partner_profile(
+        western_chart=western,
+        bazi_chart=bazi_data,
+        zwds_chart=zwds_data,
+        psychology_data=psychology,
+    )
+    return western, bazi_data, zwds_data, profile
+
+
+def _save_onboard(user_id: str, western: dict, bazi_data: dict, zwds_data: dict, profile: dict) -> None:
+    """Steps 5–6 of onboarding (blocking I/O)."""
+    store = get_storage()
+    store.upsert_natal_data(
+        user_id=user_id,
+        western_chart=western,
+        bazi_chart=bazi_data,
+        zwds_chart=zwds_data,
+    )
+    store.upsert_psychology_profile(
+        user_id=user_id,
+        profile=profile,
+    )
 
 
 @app.post("/api/users/onboard")
@@ -505,72 +1028,29 @@ async def onboard_user(req: OnboardRequest):
       6. Write psychology → user_psychology_profiles
       7. (Optional) LLM → natal report
       8. Return safe DTO (no raw chart data)
+
+    Chart math runs on the offload CPU pool, DB and LLM calls on the I/O
+    pool, so the event loop never blocks.
     """
+    metrics.set_tier(req.data_tier)
     try:
-        # 1. Calculate western chart
-        western = calculate_chart(
-            birth_date=req.birth_date,
-            birth_time=req.birth_time,
-            birth_time_exact=req.birth_time_exact,
-            lat=req.lat, lng=req.lng,
-            data_tier=req.data_tier,
-        )
-
-        # 2. BaZi is embedded in the chart result
-        bazi_data = western.get("bazi", {})
-
-        # 3. ZWDS chart (Tier 1 only)
-        zwds_data = {}
-        if req.data_tier == 1 and req.birth_time_exact:
-            try:
-                from datetime import datetime as _dt
-                dt = _dt.strptime(req.birth_date, "%Y-%m-%d")
-                zwds_data = compute_zwds_chart(
-                    dt.year, dt.month, dt.day,
-                    req.birth_time_exact, req.gender,
-                ) or {}
-            except Exception:
-                zwds_data = {}
-
-        # 4. Extract psychology profile
-        psychology = {}
-        try:
-            from psychology import extract_sm_dynamics, extract_critical_degrees, compute_element_profile
-            psychology = {
-                "sm_tags": western.get("sm_tags", []),
-                "karmic_tags": western.get("karmic_tags", []),
-                "element_profile": western.get("element_profile", {}),
-            }
-        except Exception:
-            pass
-
-        profile = extract_ideal_partner_profile(
-            western_chart=western,
-            bazi_chart=bazi_data,
-            zwds_chart=zwds_data,
-            psychology_data=psychology,
+        # 1–4. Charts + psychology profile
+        chart_key = singleflight.key_for("onboard", req.model_dump(include=_ONBOARD_CHART_FIELDS))
+        western, bazi_data, zwds_data, profile = await singleflight.group("chart").ado(
+            chart_key, lambda: run_cpu(_onboard_charts, req),
         )
 
         # 5 & 6. Write to Supabase (graceful failure)
         try:
-            import db_client
-            db_client.upsert_natal_data(
-                user_id=req.user_id,
-                western_chart=western,
-                bazi_chart=bazi_data,
-                zwds_chart=zwds_data,
-            )
-            db_client.upsert_psychology_profile(
-                user_id=req.user_id,
-                profile=profile,
-            )
+            await run_io(_save_onboard, req.user_id, western, bazi_data, zwds_data, profile)
         except Exception as db_err:
             # Log but don't block — Supabase may not be configured
             import traceback
             traceback.print_exc()
 
-        # 7. Optional LLM natal report
+        # 7. Optional LLM natal report (inline, or as a background job)
         llm_report = ""
+        report_job = None
         if req.generate_report:
             try:
                 prompt = get_profile_prompt(
@@ -578,37 +1058,98 @@ async def onboard_user(req: OnboardRequest):
                     rpv_data={},
                     attachment_style=profile.get("attachment_style", "secure"),
                 )
-                raw = call_llm(prompt, provider=req.provider, max_tokens=600,
-                               api_key=req.api_key, gemini_model=req.gemini_model)
-                llm_report = raw
-                # Update report in DB
-                try:
-                    import db_client as _dbc
-                    _dbc.upsert_psychology_profile(req.user_id, {"llm_natal_report": raw})
-                except Exception:
-                    pass
+                if req.async_report:
+                    report_job = await run_io(_submit_report_job, "natal", req, prompt, 600,
+                                              user_id=req.user_id)
+                else:
+                    raw = await acall_llm(prompt, provider=req.provider, max_tokens=600,
+                                          api_key=req.api_key, gemini_model=req.gemini_model,
+                                          use_cache=req.use_cache)
+                    llm_report = raw
+                    # Update report in DB
+                    try:
+                        await run_io(get_storage().upsert_psychology_profile,
+                                     req.user_id, {"llm_natal_report": raw})
+                    except Exception:
+                        pass
             except Exception:
                 pass
 
         # 8. Return safe DTO
-        return format_safe_onboard_response(profile, llm_report)
+        response = format_safe_onboard_response(profile, llm_report)
+        if report_job:
+            response["report_job"] = report_job
+        return response
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _report_queue() -> report_jobs.ReportJobQueue:
+    return report_jobs.get_queue(llm=call_llm)
+
+
+def _submit_report_job(kind: str, req, prompt: str, max_tokens: int, **target) -> dict:
+    """Enqueue an LLM report for the background workers; returns the job view."""
+    payload = dict(target, prompt=prompt, provider=req.provider, max_tokens=max_tokens,
+                   gemini_model=req.gemini_model, use_cache=req.use_cache)
+    return _report_queue().submit(kind, payload, api_key=req.api_key)
+
+
+@app.get("/api/jobs/{job_id}")
+def get_report_job(job_id: str):
+    """Status of a background report job: queued | running | done | failed.
+
+    Returns: {job_id, kind, status, attempts, target, report, error, created_at, updated_at}
+    """
+    job = _report_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/jobs/{job_id}/events")
+def report_job_events(job_id: str, poll_interval: float = Query(0.25, ge=0.05, le=5)):
+    """Server-Sent Events for one job: a `status` event on every change,
+    ending after the done / failed event."""
+    queue = _report_queue()
+    job = queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        current, last = job, None
+        while True:
+            state = (current["status"], current["attempts"])
+            if state != last:
+                last = state
+                yield _sse("status", current)
+                if current["status"] in report_jobs.TERMINAL:
+                    return
+            await asyncio.sleep(poll_interval)
+            current = await run_io(queue.get, job_id)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 class MatchComputeRequest(BaseModel):
     user_a_id: str
     user_b_id: str
     force_recompute: bool = False                # bypass cache
     generate_report: bool = True                 # whether to call LLM
+    async_report: bool = False                   # enqueue the report as a background job
     provider: str = "anthropic"
     api_key: str = ""
     gemini_model: str = "gemini-2.0-flash"
+    use_cache: bool = True                       # False bypasses the LLM response cache
 
 
 @app.post("/api/matches/compute")
-async def compute_match_cached(req: MatchComputeRequest):
+async def compute_match_cached(req: MatchComputeRequest,
+                               x_destiny_deadline_ms: Optional[float] = Header(None)):
     """Compute pairwise match with caching and DTO sanitization.
 
     Pipeline:
@@ -619,14 +1160,32 @@ async def compute_match_cached(req: MatchComputeRequest):
       5. Sanitize via api_presenter → safe DTO
       6. Cache result in matches table
       7. Return safe DTO
+
+    Concurrent identical requests (same pair and options) share one
+    computation (singleflight "match"). Requests with a deadline are never
+    coalesced: a follower with a larger budget must not get a result
+    degraded to fit the leader's.
+
+    Header X-Destiny-Deadline-Ms: latency budget for the whole request. Under
+    a tight budget compute_match_v2 sheds optional layers; the DTO's
+    data.layers says which ran, and a degraded result is not cached.
     """
+    deadline = _deadline(x_destiny_deadline_ms)
+    if deadline is not None:
+        return await _compute_match(req, deadline)
+    key = singleflight.key_for("match", req.model_dump())
+    return await singleflight.group("match").ado(key, lambda: _compute_match(req))
+
+
+async def _compute_match(req: MatchComputeRequest, deadline: Optional[float] = None) -> dict:
     try:
-        import db_client
+        store = get_storage()
 
         # 1. Cache check
         if not req.force_recompute:
             try:
-                cached = db_client.get_cached_match(req.user_a_id, req.user_b_id)
+                cached = await store.aget_cached_match(req.user_a_id, req.user_b_id)
+                metrics.CACHE_REQUESTS.inc("match", "hit" if cached else "miss")
                 if cached:
                     return {
                         "status": "success",
@@ -642,9 +1201,10 @@ async def compute_match_cached(req: MatchComputeRequest):
             except Exception:
                 pass  # If cache check fails, proceed to compute
 
-        # 2. Load natal data
-        natal_a = db_client.get_natal_data(req.user_a_id)
-        natal_b = db_client.get_natal_data(req.user_b_id)
+        # 2. Load natal data (one bulk query, in-process cache first)
+        natal = await store.aget_natal_data_many([req.user_a_id, req.user_b_id])
+        natal_a = natal.get(req.user_a_id)
+        natal_b = natal.get(req.user_b_id)
 
         if not natal_a or not natal_b:
             raise HTTPException(
@@ -654,44 +1214,35 @@ async def compute_match_cached(req: MatchComputeRequest):
 
         # 3. Flatten chart data for compute_match_v2
         # compute_match_v2 expects flat user dicts with sign keys at top level
-        def _flatten_natal(natal: dict) -> dict:
-            """Merge western_chart + bazi_chart fields into a flat dict."""
-            flat = {}
-            wc = natal.get("western_chart", {})
-            bc = natal.get("bazi_chart", {})
-            flat.update(wc)
-            # Add bazi fields that matching.py expects
-            flat["bazi_element"] = bc.get("day_master_element", wc.get("bazi_element"))
-            flat["bazi_month_branch"] = bc.get("bazi_month_branch", wc.get("bazi_month_branch"))
-            flat["bazi_day_branch"] = bc.get("bazi_day_branch", wc.get("bazi_day_branch"))
-            flat["bazi"] = bc
-            # data_tier from western chart
-            flat.setdefault("data_tier", wc.get("data_tier", 3))
-            return flat
-
-        user_a = _flatten_natal(natal_a)
-        user_b = _flatten_natal(natal_b)
+        user_a = flatten_natal(natal_a)
+        user_b = flatten_natal(natal_b)
+        metrics.set_tier(_pair_tier(user_a, user_b))
 
         # 3.5 Load or compute psychology profiles (non-blocking, cache-first)
         prof_a: dict = {}
         prof_b: dict = {}
         try:
-            prof_a = db_client.get_or_compute_psychology_profile(req.user_a_id, natal_a)
-            prof_b = db_client.get_or_compute_psychology_profile(req.user_b_id, natal_b)
+            profiles = await run_io(
+                store.get_or_compute_psychology_profiles_many,
+                {req.user_a_id: natal_a, req.user_b_id: natal_b},
+            )
+            prof_a = profiles.get(req.user_a_id, {})
+            prof_b = profiles.get(req.user_b_id, {})
         except Exception:
             pass  # Profile enrichment is non-critical; matching still works without it
 
         # 4. Compute match
-        raw_result = compute_match_v2(user_a, user_b)
+        raw_result = await run_cpu(compute_match_v2, user_a, user_b, deadline=deadline)
 
-        # 5. Optional LLM report
+        # 5. Optional LLM report (async_report: queued after the row is saved)
         llm_report = ""
-        if req.generate_report:
+        if req.generate_report and not req.async_report:
             try:
                 prompt = build_synastry_report_prompt(raw_result, prof_a, prof_b)
-                llm_report = call_llm(
+                llm_report = await acall_llm(
                     prompt, provider=req.provider, max_tokens=400,
                     api_key=req.api_key, gemini_model=req.gemini_model,
+                    use_cache=req.use_cache,
                 )
             except Exception:
                 llm_report = ""  # Never block matching for LLM failure
@@ -699,16 +1250,29 @@ async def compute_match_cached(req: MatchComputeRequest):
         # 6. Sanitize
         safe_response = format_safe_match_response(raw_result, llm_report)
 
-        # 7. Cache result (non-blocking)
-        try:
-            db_client.save_match_result(
-                user_a_id=req.user_a_id,
-                user_b_id=req.user_b_id,
-                safe_result=safe_response,
-                raw_result=raw_result,
+        # 7. Cache result (non-blocking); partial (deadline-degraded) results are not cached
+        degraded = bool(raw_result.get("layers", {}).get("degraded"))
+        if not degraded:
+            try:
+                await run_io(
+                    store.save_match_result,
+                    user_a_id=req.user_a_id,
+                    user_b_id=req.user_b_id,
+                    safe_result=safe_response,
+                    raw_result=raw_result,
+                )
+            except Exception:
+                pass  # Cache failure is non-critical
+
+        # 8. Background report job: the worker fills in llm_insight_report.
+        #    Not for a degraded result — it has no saved row to update, and
+        #    the report would describe a partial match.
+        if req.generate_report and req.async_report and not degraded:
+            prompt = build_synastry_report_prompt(raw_result, prof_a, prof_b)
+            safe_response["report_job"] = await run_io(
+                _submit_report_job, "synastry", req, prompt, 400,
+                user_a_id=req.user_a_id, user_b_id=req.user_b_id,
             )
-        except Exception:
-            pass  # Cache failure is non-critical
 
         safe_response["cached"] = False
         return safe_response
@@ -11,8 +11,12 @@ Glitch: Mars/Saturn tension tolerance
 
 from __future__ import annotations
 
+import threading
+import time
+from contextlib import contextmanager
 from typing import Dict, List, Optional
 
+from metrics import observe_stage, timed
 from bazi import analyze_element_relation, compute_bazi_season_complement, check_branch_relations, evaluate_day_master_strength
 from zwds import compute_zwds_chart
 from zwds_synastry import compute_zwds_synastry
@@ -1268,7 +1272,72 @@ def check_synastry_mutual_reception(chart_a: dict, chart_b: dict) -> List[str]:
     return badges
 
 
-def compute_match_v2(user_a: dict, user_b: dict) -> dict:
+# ── Deadline-aware layer budget (compute_match_v2) ───────────────────────────
+# Optional layers, most valuable first. When a caller passes a deadline, the
+# layers are planned in this order against the remaining budget: a layer is
+# kept only if its estimated cost still fits after the ones before it, so the
+# tail of this list is shed first. With no budget left, compute_match_v2
+# degrades to the core lust/soul/power/tracks pass (compute_quick_score
+# semantics).
+OPTIONAL_LAYERS = ("shadow", "zwds", "attachment", "resonance", "elemental", "mutual_reception")
+
+# Per-layer cost estimates in seconds, seeded conservatively and refined with
+# an EWMA of observed run times (so the plan tracks the host's actual load).
+# "core" is the mandatory work left after the layers.
+_LAYER_COST: Dict[str, float] = {
+    "core": 0.002, "zwds": 0.004, "shadow": 0.001, "attachment": 0.0005,
+    "resonance": 0.0005, "elemental": 0.0002, "mutual_reception": 0.0002,
+}
+_LAYER_COST_LOCK = threading.Lock()     # EWMA updates come from concurrent requests
+
+
+class _LayerBudget:
+    """Which optional layers to run before a monotonic-clock deadline."""
+
+    def __init__(self, deadline: Optional[float], applicable: Dict[str, bool]) -> None:
+        self.deadline = deadline
+        self.ran: List[str] = []
+        self.skipped: List[str] = []
+        self._planned = {name for name, ok in applicable.items() if ok}
+        if deadline is not None:
+            remaining = deadline - time.monotonic() - _LAYER_COST["core"]
+            kept = set()
+            for name in OPTIONAL_LAYERS:
+                if name in self._planned and _LAYER_COST[name] <= remaining:
+                    kept.add(name)
+                    remaining -= _LAYER_COST[name]
+            self.skipped = [n for n in OPTIONAL_LAYERS if n in self._planned and n not in kept]
+            self._planned = kept
+
+    def allows(self, name: str) -> bool:
+        """True if the layer is planned and still fits (re-checked when reached)."""
+        if name not in self._planned:
+            return False
+        if self.deadline is not None and time.monotonic() + _LAYER_COST[name] > self.deadline:
+            self.skipped.append(name)
+            return False
+        return True
+
+    @contextmanager
+    def measure(self, name: str):
+        """Time a layer; only a layer that completes counts as ran and feeds its estimate."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            observe_stage("match." + name, elapsed)
+        self.ran.append(name)
+        with _LAYER_COST_LOCK:
+            _LAYER_COST[name] = 0.8 * _LAYER_COST[name] + 0.2 * elapsed
+
+    def summary(self) -> dict:
+        skipped = [n for n in OPTIONAL_LAYERS if n in self.skipped]
+        return {"ran": self.ran, "skipped": skipped, "degraded": bool(skipped)}
+
+
+@timed("match")
+def compute_match_v2(user_a: dict, user_b: dict, deadline: Optional[float] = None) -> dict:
     """Compute full Phase G v2.1 match score.
 
     New in v2.1:
@@ -1290,7 +1359,21 @@ def compute_match_v2(user_a: dict, user_b: dict) -> dict:
       bazi_relation          a_generates_b | b_generates_a | a_restricts_b |
                              b_restricts_a | same | none
       useful_god_complement  seasonal complement score (0.0-1.0)
+      layers                 {ran, skipped, degraded} — optional layers that ran /
+                             were shed to meet the deadline
+
+    deadline: optional time.monotonic() value. Optional layers that would not
+    fit in the remaining budget are skipped in OPTIONAL_LAYERS priority order.
     """
+    budget = _LayerBudget(deadline, {
+        "zwds":       _is_zwds_eligible(user_a) and _is_zwds_eligible(user_b),
+        "shadow":     True,
+        "attachment": bool(user_a.get("attachment_style") and user_b.get("attachment_style")),
+        "elemental":  bool(user_a.get("element_profile") and user_b.get("element_profile")),
+        "resonance":  True,
+        "mutual_reception": True,
+    })
+
     # BaZi relation (computed once, shared)
     elem_a = user_a.get("bazi_element")
     elem_b = user_b.get("bazi_element")
@@ -1346,21 +1429,22 @@ def compute_match_v2(user_a: dict, user_b: dict) -> dict:
 
     # ── ZWDS (紫微斗數) — Tier 1 only ──────────────────────────────────────
     zwds_result = None
-    if _is_zwds_eligible(user_a) and _is_zwds_eligible(user_b):
+    if budget.allows("zwds"):
         try:
-            chart_a = compute_zwds_chart(
-                user_a["birth_year"], user_a["birth_month"], user_a["birth_day"],
-                user_a["birth_time"], user_a.get("gender", "M")
-            )
-            chart_b = compute_zwds_chart(
-                user_b["birth_year"], user_b["birth_month"], user_b["birth_day"],
-                user_b["birth_time"], user_b.get("gender", "F")
-            )
-            if chart_a and chart_b:
-                zwds_result = compute_zwds_synastry(
-                    chart_a, user_a["birth_year"],
-                    chart_b, user_b["birth_year"]
+            with budget.measure("zwds"):
+                chart_a = compute_zwds_chart(
+                    user_a["birth_year"], user_a["birth_month"], user_a["birth_day"],
+                    user_a["birth_time"], user_a.get("gender", "M")
+                )
+                chart_b = compute_zwds_chart(
+                    user_b["birth_year"], user_b["birth_month"], user_b["birth_day"],
+                    user_b["birth_time"], user_b.get("gender", "F")
                 )
+                if chart_a and chart_b:
+                    zwds_result = compute_zwds_synastry(
+                        chart_a, user_a["birth_year"],
+                        chart_b, user_b["birth_year"]
+                    )
         except Exception:
             zwds_result = None  # never block matching for ZWDS failure
 
@@ -1397,64 +1481,71 @@ def compute_match_v2(user_a: dict, user_b: dict) -> dict:
 
     # 1. Shadow & Wound Engine (Chiron + 12th house cross-chart triggers)
     _shadow: dict = {}
-    try:
-        _shadow = compute_shadow_and_wound(user_a, user_b)
-        soul_adj    += _shadow["soul_mod"]
-        lust_adj    += _shadow["lust_mod"]
-        partner_adj += _shadow.get("partner_mod", 0.0)
-        high_voltage = high_voltage or _shadow["high_voltage"]
-        psychological_tags.extend(_shadow["shadow_tags"])
-    except Exception:
-        pass   # never block matching for shadow engine errors
+    if budget.allows("shadow"):
+        try:
+            with budget.measure("shadow"):
+                _shadow = compute_shadow_and_wound(user_a, user_b)
+                soul_adj    += _shadow["soul_mod"]
+                lust_adj    += _shadow["lust_mod"]
+                partner_adj += _shadow.get("partner_mod", 0.0)
+                high_voltage = high_voltage or _shadow["high_voltage"]
+                psychological_tags.extend(_shadow["shadow_tags"])
+        except Exception:
+            pass   # never block matching for shadow engine errors
 
     # 2. Dynamic Attachment + Attachment Dynamics
     _att_a = user_a.get("attachment_style")
     _att_b = user_b.get("attachment_style")
-    if _att_a and _att_b:
+    if budget.allows("attachment"):
         try:
-            _dyn_a, _dyn_b = compute_dynamic_attachment(
-                _att_a, _att_b, user_a, user_b
-            )
-            _att = compute_attachment_dynamics(_dyn_a, _dyn_b)
-            soul_adj    += _att["soul_mod"]
-            lust_adj    += _att["lust_mod"]
-            partner_adj += _att["partner_mod"]
-            high_voltage = high_voltage or _att["high_voltage"]
-            if _att["trap_tag"]:
-                psychological_tags.append(_att["trap_tag"])
+            with budget.measure("attachment"):
+                _dyn_a, _dyn_b = compute_dynamic_attachment(
+                    _att_a, _att_b, user_a, user_b
+                )
+                _att = compute_attachment_dynamics(_dyn_a, _dyn_b)
+                soul_adj    += _att["soul_mod"]
+                lust_adj    += _att["lust_mod"]
+                partner_adj += _att["partner_mod"]
+                high_voltage = high_voltage or _att["high_voltage"]
+                if _att["trap_tag"]:
+                    psychological_tags.append(_att["trap_tag"])
         except Exception:
             pass
 
     # 3. Elemental Fulfillment (from pre-computed element_profile stored in DB)
-    _ep_a = user_a.get("element_profile")
-    _ep_b = user_b.get("element_profile")
-    if _ep_a and _ep_b:
+    if budget.allows("elemental"):
         try:
-            soul_adj += compute_elemental_fulfillment(_ep_a, _ep_b)
+            with budget.measure("elemental"):
+                soul_adj += compute_elemental_fulfillment(
+                    user_a["element_profile"], user_b["element_profile"])
         except Exception:
             pass
 
     # 4. Favorable Element Resonance (Sprint 7)
-    try:
-        _str_a = evaluate_day_master_strength(user_a.get("bazi") or {})
-        _str_b = evaluate_day_master_strength(user_b.get("bazi") or {})
-        if _str_a.get("favorable_elements") or _str_b.get("favorable_elements"):
-            _res = compute_favorable_element_resonance(_str_a, _str_b, current_soul=soul)
-            soul_adj += _res["soul_mod"]
-            resonance_badges.extend(_res["badges"])
-    except Exception:
-        pass
+    if budget.allows("resonance"):
+        try:
+            with budget.measure("resonance"):
+                _str_a = evaluate_day_master_strength(user_a.get("bazi") or {})
+                _str_b = evaluate_day_master_strength(user_b.get("bazi") or {})
+                if _str_a.get("favorable_elements") or _str_b.get("favorable_elements"):
+                    _res = compute_favorable_element_resonance(_str_a, _str_b, current_soul=soul)
+                    soul_adj += _res["soul_mod"]
+                    resonance_badges.extend(_res["badges"])
+        except Exception:
+            pass
 
     # 5. Synastry Mutual Reception (V3 Classical Astrology)
     _synastry_mr_badges: List[str] = []
-    try:
-        _wa = user_a.get("western_chart", user_a)
-        _wb = user_b.get("western_chart", user_b)
-        _synastry_mr_badges = check_synastry_mutual_reception(_wa, _wb)
-        for _ in _synastry_mr_badges:
-            soul_adj += (100.0 - soul) * 0.22   # diminishing returns per badge
-    except Exception:
-        pass
+    if budget.allows("mutual_reception"):
+        try:
+            with budget.measure("mutual_reception"):
+                _wa = user_a.get("western_chart", user_a)
+                _wb = user_b.get("western_chart", user_b)
+                _synastry_mr_badges = check_synastry_mutual_reception(_wa, _wb)
+                for _ in _synastry_mr_badges:
+                    soul_adj += (100.0 - soul) * 0.22   # diminishing returns per badge
+        except Exception:
+            pass
 
     # L-1: Cap shadow modifiers before applying — prevents overflow from multiple simultaneous triggers
     # soul: max +40 (meaningful boost), min -30 (repulsion visible but not fatal)
@@ -1566,6 +1657,7 @@ def compute_match_v2(user_a: dict, user_b: dict) -> dict:
             "target": zwds_result.get("defense_b", []) if zwds_result else [],
         },
         "layered_analysis":        zwds_result.get("layered_analysis", {}) if zwds_result else {},
+        "layers":                  budget.summary(),
     }
 
 
@@ -1574,7 +1666,8 @@ def compute_quick_score(user_a: dict, user_b: dict) -> dict:
 
     Calls core lust/soul/power/tracks but skips ZWDS bridge,
     shadow_engine, attachment dynamics, resonance badges, and
-    psychological tags.  Target: ~50ms per call.
+    psychological tags.  Measured ~0.15ms per call (compute_quick_score[t*]
+    in benchmarks.py; compute_match_v2 is ~0.2–0.35ms).
     """
     # BaZi relation
     elem_a = user_a.get("bazi_element")
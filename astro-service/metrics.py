@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Metrics
+Prometheus text-format metrics for /metrics, without a client library.
+
+Recorded on the hot path (a lock + bisect per observation, ~1µs):
+  destiny_request_duration_seconds{endpoint, method, status, tier}
+      — MetricsMiddleware; endpoint is the route template, tier the data
+        tier an endpoint reported via set_tier() ("none" otherwise)
+  destiny_stage_duration_seconds{stage}
+      — stage() / timed(): chart, bazi, zwds, psychology, match,
+        match.<layer>, prompt.<builder>, llm.<provider>, db.<table>.<method>
+        (stages nest: "chart" includes "bazi")
+  destiny_cache_requests_total{cache, result}
+      — match cache (main.py); other caches are read at scrape time
+
+Read from the existing stats() of loaded modules at scrape time (nothing
+is imported for a scrape): executor / admission / DB pool / LLM gateway
+saturation gauges, natal / psychology / LLM cache hits, singleflight,
+background report jobs.
+
+Stages timed inside a DESTINY_CPU_EXECUTOR=process worker are recorded in
+that worker and not exported. DESTINY_METRICS=0 turns recording off.
+
+Usage:
+    app.add_middleware(MetricsMiddleware)
+    with stage("prompt.synastry"): ...
+    @timed("chart")
+    def calculate_chart(...): ...
+    text = render()
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextvars
+import functools
+import inspect
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = os.environ.get("DESTINY_METRICS", "1") != "0"
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(on: bool) -> None:
+    global _enabled
+    _enabled = on
+
+
+# A family is (name, type, help, samples); a sample is (suffix, labels, value)
+Family = Tuple[str, str, str, List[Tuple[str, Dict[str, str], float]]]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}     # labels → [bucket counts…, +Inf], sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][idx] += 1
+            series[1] += value
+
+    def count(self, *labelvalues: str) -> int:
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return sum(series[0]) if series else 0
+
+    def collect(self) -> Family:
+        with self._lock:
+            snapshot = {k: (list(c), s) for k, (c, s) in self._series.items()}
+        samples = []
+        for labelvalues, (counts, total) in sorted(snapshot.items()):
+            labels = dict(zip(self.labelnames, labelvalues))
+            running = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                running += n
+                samples.append(("_bucket", dict(labels, le=_fmt(bound)), running))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, running))
+        return self.name, "histogram", self.help, samples
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """Monotonic counter with a fixed label set."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0.0)
+
+    def collect(self) -> Family:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.name, "counter", self.help, [
+            ("", dict(zip(self.labelnames, k)), v) for k, v in values]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+REQUEST_SECONDS = Histogram(
+    "destiny_request_duration_seconds", "HTTP request latency by route template and data tier.",
+    ("endpoint", "method", "status", "tier"))
+STAGE_SECONDS = Histogram(
+    "destiny_stage_duration_seconds", "Time spent in one pipeline stage.", ("stage",))
+CACHE_REQUESTS = Counter(
+    "destiny_cache_requests_total", "Cache lookups by cache and result (hit / miss).",
+    ("cache", "result"))
+
+_METRICS = [REQUEST_SECONDS, STAGE_SECONDS, CACHE_REQUESTS]
+_collectors: List[Callable[[], Iterable[Family]]] = []
+
+
+def add_collector(fn: Callable[[], Iterable[Family]]) -> None:
+    """Register a scrape-time collector returning metric families."""
+    _collectors.append(fn)
+
+
+def reset() -> None:
+    """Clear recorded values (tests)."""
+    for metric in _METRICS:
+        metric.clear()
+
+
+# ── stages ────────────────────────────────────────────────────────────────────
+
+def observe_stage(name: str, seconds: float) -> None:
+    if _enabled:
+        STAGE_SECONDS.observe(seconds, name)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as stage `name` (also on error)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def timed(name: str):
+    """Decorator: time every call of a sync or async function as stage `name`."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    observe_stage(name, time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe_stage(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+# ── requests ──────────────────────────────────────────────────────────────────
+
+_request_labels: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    "destiny_request_labels", default=None)
+
+
+def set_tier(tier) -> None:
+    """Label the current request's latency with a data tier (1 / 2 / 3).
+
+    Works from sync endpoints too: they run in a copied context, but share
+    the labels dict the middleware put there.
+    """
+    labels = _request_labels.get()
+    if labels is not None and tier is not None:
+        labels["tier"] = str(tier)
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Not routed (e.g. shed by admission control): match the app's routes
+    from starlette.routing import Match
+    app = scope.get("app")
+    for candidate in getattr(getattr(app, "router", None), "routes", ()):
+        if candidate.matches(scope)[0] == Match.FULL:
+            return candidate.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency by route template, method, status, tier."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled:
+            return await self.app(scope, receive, send)
+        labels = {"tier": "none"}
+        status = []
+        token = _request_labels.set(labels)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_labels.reset(token)
+            REQUEST_SECONDS.observe(time.perf_counter() - started, _route_template(scope),
+                                    scope["method"], str(status[0] if status else 500),
+                                    labels["tier"])
+
+
+# ── exposition ────────────────────────────────────────────────────────────────
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    families: Dict[str, list] = {}
+    sources = [m.collect() for m in _METRICS]
+    for collector in _collectors:
+        try:
+            sources.extend(collector())
+        except Exception:
+            pass                     # a broken collector must not break the scrape
+    for name, kind, help, samples in sources:
+        family = families.setdefault(name, [kind, help, []])
+        family[2].extend(samples)    # same name from a counter and a collector: merged
+    lines = []
+    for name, (kind, help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{suffix}{{{label_text}}} {_fmt(value)}" if label_text
+                         else f"{name}{suffix} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ── scrape-time collectors for this service's modules ────────────────────────
+
+def _gauge(name: str, help: str, samples) -> Family:
+    return name, "gauge", help, [("", labels, float(v)) for labels, v in samples]
+
+
+def _counter(name: str, help: str, samples) -> Family:
+    return name, "counter", help, [("", labels, float(v)) for labels, v in samples]
+
+
+def _collect_offload() -> List[Family]:
+    offload = sys.modules.get("offload")
+    if offload is None:
+        return []
+    stats = offload.stats()
+    return [
+        _gauge("destiny_executor_active", "Tasks running on an offload executor.",
+               [({"pool": p}, s["active"]) for p, s in stats.items()]),
+        _gauge("destiny_executor_workers", "Offload executor size.",
+               [({"pool": p}, s["workers"]) for p, s in stats.items()]),
+        _counter("destiny_executor_submitted_total", "Tasks submitted to an offload executor.",
+                 [({"pool": p}, s["submitted"]) for p, s in stats.items()]),
+    ]
+
+
+def _collect_admission() -> List[Family]:
+    admission = sys.modules.get("admission")
+    if admission is None:
+        return []
+    stats = admission.get_controller().stats()
+    priorities = (admission.INTERACTIVE, admission.BATCH)
+    outcomes = ("admitted", "rejected", "timed_out")
+    return [
+        _gauge("destiny_admission_concurrency", "Admission pool concurrency limit.",
+               [({"pool": p}, s["concurrency"]) for p, s in stats.items()]),
+        _gauge("destiny_admission_active", "Requests holding an admission slot.",
+               [({"pool": p, "priority": q}, s["active"][q])
+                for p, s in stats.items() for q in priorities]),
+        _gauge("destiny_admission_queued", "Requests waiting for an admission slot.",
+               [({"pool": p, "priority": q}, s["queued"][q])
+                for p, s in stats.items() for q in priorities]),
+        _counter("destiny_admission_requests_total", "Admission decisions by outcome.",
+                 [({"pool": p, "priority": q, "outcome": o}, s[q][o])
+                  for p, s in stats.items() for q in priorities for o in outcomes]),
+    ]
+
+
+def _collect_db() -> List[Family]:
+    db_client = sys.modules.get("db_client")
+    if db_client is None:
+        return []
+    pools = [(c, s) for c, s in db_client.pool_stats().items() if s]
+    out = [
+        _gauge("destiny_db_pool_in_flight", "Supabase requests holding a pooled connection.",
+               [({"client": c}, s["in_flight"]) for c, s in pools]),
+        _gauge("destiny_db_pool_saturation", "Supabase pool in-flight / max_connections.",
+               [({"client": c}, s["saturation"]) for c, s in pools]),
+        _counter("destiny_db_pool_timeouts_total", "Supabase pool acquire timeouts.",
+                 [({"client": c}, s["pool_timeouts"]) for c, s in pools]),
+        _counter("destiny_cache_requests_total", "",
+                 [({"cache": name, "result": r}, s[r + "s"])
+                  for name, s in db_client.cache_stats().items() for r in ("hit", "miss")]),
+    ]
+    write_behind = db_client.write_behind_stats()
+    if write_behind:
+        out.append(_gauge("destiny_write_behind_pending", "Upserts queued for write-behind.",
+                          [({}, write_behind["pending"])]))
+    return out
+
+
+def _collect_llm() -> List[Family]:
+    out = []
+    llm_cache = sys.modules.get("llm_cache")
+    cache = getattr(llm_cache, "_cache", None)
+    if cache is not None:
+        s = cache.stats()
+        out.append(_counter("destiny_cache_requests_total", "", [
+            ({"cache": "llm", "result": "hit"}, s["memory_hits"] + s["disk_hits"]),
+            ({"cache": "llm", "result": "miss"}, s["misses"])]))
+    llm_gateway = sys.modules.get("llm_gateway")
+    gateway = getattr(llm_gateway, "_gateway", None)
+    if gateway is not None:
+        stats = gateway.stats()
+        providers = [(p, stats[p]) for p in llm_gateway.PROVIDERS]
+        out += [
+            _gauge("destiny_llm_in_flight", "LLM calls in flight per provider.",
+                   [({"provider": p}, s["in_flight"]) for p, s in providers]),
+            _gauge("destiny_llm_waiting", "LLM calls waiting for a provider slot.",
+                   [({"provider": p}, s["waiting"]) for p, s in providers]),
+            _gauge("destiny_llm_concurrency", "LLM concurrency limit per provider.",
+                   [({"provider": p}, s["concurrency"]) for p, s in providers]),
+            _gauge("destiny_llm_circuit_open", "1 while a provider's circuit breaker is open.",
+                   [({"provider": p}, s["circuit"]["state"] == "open") for p, s in providers]),
+        ]
+    return out
+
+
+def _collect_singleflight() -> List[Family]:
+    singleflight = sys.modules.get("singleflight")
+    if singleflight is None:
+        return []
+    stats = singleflight.stats()
+    return [
+        _counter("destiny_singleflight_calls_total", "Singleflight calls per group.",
+                 [({"group": g}, s["calls"]) for g, s in stats.items()]),
+        _counter("destiny_singleflight_collapsed_total", "Calls that shared another's result.",
+                 [({"group": g}, s["collapsed"]) for g, s in stats.items()]),
+    ]
+
+
+def _collect_report_jobs() -> List[Family]:
+    report_jobs = sys.modules.get("report_jobs")
+    queue = getattr(report_jobs, "_queue", None)
+    if queue is None:
+        return []
+    jobs = queue.stats()["jobs"]
+    return [_gauge("destiny_report_jobs", "Background report jobs by status.",
+                   [({"status": status}, n) for status, n in sorted(jobs.items())])]
+
+
+for _collector in (_collect_offload, _collect_admission, _collect_db, _collect_llm,
+                   _collect_singleflight, _collect_report_jobs):
+    add_collector(_collector)
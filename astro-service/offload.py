@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Event-loop Offloading
+Keeps async endpoints responsive by running chart math and blocking I/O
+(Supabase / SQLite writes, synchronous LLM SDK calls) on bounded executors
+instead of the event loop.
+
+Pools:
+  CPU pool — calculate_chart, compute_zwds_chart, compute_match_v2,
+             extract_ideal_partner_profile. Threads by default; set
+             DESTINY_CPU_EXECUTOR=process for a process pool (true
+             parallelism, arguments and results must be picklable).
+             Size: DESTINY_CPU_WORKERS (default: CPU count).
+  I/O pool — blocking database and HTTP calls, sized separately
+             (DESTINY_IO_WORKERS, default 32) so slow I/O never starves
+             chart math of workers.
+
+Usage (inside an async endpoint):
+    western = await run_cpu(calculate_chart, birth_date=...)
+    await run_io(store.save_match_result, a, b, safe, raw)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import sys
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+_lock = threading.Lock()
+_cpu_pool: Optional[Executor] = None
+_io_pool: Optional[Executor] = None
+_stats: Dict[str, Dict[str, int]] = {
+    "cpu": {"submitted": 0, "active": 0, "peak_active": 0},
+    "io": {"submitted": 0, "active": 0, "peak_active": 0},
+}
+
+
+def _cpu_workers() -> int:
+    return int(os.environ.get("DESTINY_CPU_WORKERS", "") or (os.cpu_count() or 2))
+
+
+def _io_workers() -> int:
+    return int(os.environ.get("DESTINY_IO_WORKERS", "") or 32)
+
+
+def cpu_pool() -> Executor:
+    """The shared CPU executor (created on first use)."""
+    global _cpu_pool
+    if _cpu_pool is None:
+        with _lock:
+            if _cpu_pool is None:
+                if os.environ.get("DESTINY_CPU_EXECUTOR", "thread") == "process":
+                    _cpu_pool = ProcessPoolExecutor(max_workers=_cpu_workers())
+                else:
+                    _cpu_pool = ThreadPoolExecutor(max_workers=_cpu_workers(),
+                                                   thread_name_prefix="destiny-cpu")
+    return _cpu_pool
+
+
+def io_pool() -> Executor:
+    """The shared blocking-I/O executor (created on first use)."""
+    global _io_pool
+    if _io_pool is None:
+        with _lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(max_workers=_io_workers(),
+                                              thread_name_prefix="destiny-io")
+    return _io_pool
+
+
+async def _run(kind: str, pool: Executor, fn: Callable, args, kwargs) -> Any:
+    stats = _stats[kind]
+    with _lock:
+        stats["submitted"] += 1
+        stats["active"] += 1
+        stats["peak_active"] = max(stats["peak_active"], stats["active"])
+    try:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        profiling = sys.modules.get("profiling")   # loaded by main, not imported here
+        session = profiling.current() if profiling is not None else None
+        if session is not None and isinstance(pool, ThreadPoolExecutor):
+            call = session.wrap(call)       # sample this call for a profiled request
+        return await loop.run_in_executor(pool, call)
+    finally:
+        with _lock:
+            stats["active"] -= 1
+
+
+async def run_cpu(fn: Callable, *args, **kwargs) -> Any:
+    """Await fn(*args, **kwargs) on the CPU pool."""
+    return await _run("cpu", cpu_pool(), fn, args, kwargs)
+
+
+async def run_io(fn: Callable, *args, **kwargs) -> Any:
+    """Await fn(*args, **kwargs) on the blocking-I/O pool."""
+    return await _run("io", io_pool(), fn, args, kwargs)
+
+
+def stats() -> dict:
+    """Submitted / in-progress counts per pool (in-progress includes queued work)."""
+    with _lock:
+        return {
+            "cpu": dict(_stats["cpu"], workers=_cpu_workers(),
+                        executor=os.environ.get("DESTINY_CPU_EXECUTOR", "thread")),
+            "io": dict(_stats["io"], workers=_io_workers()),
+        }
+
+
+def shutdown(wait: bool = True) -> None:
+    """Stop both pools (FastAPI shutdown hook); they are recreated on next use."""
+    global _cpu_pool, _io_pool
+    with _lock:
+        pools, _cpu_pool, _io_pool = (_cpu_pool, _io_pool), None, None
+    for pool in pools:
+        if pool is not None:
+            pool.shutdown(wait=wait)
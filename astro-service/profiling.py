@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Per-request Profiling
+Runs one request under a sampling profiler when explicitly asked, so a
+slow payload (say one Tier-1 pair in /compute-match) can be profiled in
+production without profiling anything else.
+
+Off unless DESTINY_PROFILING=1 and DESTINY_PROFILING_TOKEN are both set (the
+folded stacks expose internal code paths and arguments; without a token,
+profiling and /debug/profiles stay off). A request opts in with header
+`X-Destiny-Profile: <token>` (or query `?profile=<token>`). One request is profiled at a time —
+a concurrent opt-in runs unprofiled and gets `X-Destiny-Profile: busy`.
+
+While the request runs, a sampler thread records the stacks of the threads
+doing its work every DESTINY_PROFILE_INTERVAL_MS (default 1): the sync
+endpoint's worker thread (ProfiledRoute) and offloaded run_cpu / run_io
+calls (offload.py). The event-loop thread is shared with other requests
+and is not sampled; LLM calls show up as the caller waiting on them.
+
+The result is stored as collapsed stacks ("root;…;leaf count", the input
+of flamegraph.pl / speedscope) under a profile ID returned in
+`X-Destiny-Profile-Id`, and served by GET /debug/profiles/{id}. The newest
+DESTINY_PROFILE_KEEP (default 50) profiles are kept in DESTINY_PROFILE_DIR.
+
+Usage:
+    app.router.route_class = ProfiledRoute
+    app.add_middleware(ProfilingMiddleware)
+
+    curl -H 'X-Destiny-Profile: 1' -X POST .../compute-match -d @pair.json -D -
+    curl .../debug/profiles/<id> > pair.folded && flamegraph.pl pair.folded > pair.svg
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import hmac
+import inspect
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Optional
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+
+PROFILE_HEADER = "x-destiny-profile"
+PROFILE_ID_HEADER = "x-destiny-profile-id"
+
+_enabled = os.environ.get("DESTINY_PROFILING", "0") == "1"
+
+
+def _token() -> str:
+    return os.environ.get("DESTINY_PROFILING_TOKEN", "")
+
+
+def enabled() -> bool:
+    """DESTINY_PROFILING=1 (or set_enabled) and a DESTINY_PROFILING_TOKEN to opt in with."""
+    return _enabled and bool(_token())
+
+
+def set_enabled(on: bool) -> None:
+    global _enabled
+    _enabled = on
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> str:
+    """One stack as "root;…;leaf" (profiling.py's own frames left out)."""
+    labels = []
+    while frame is not None:
+        if frame.f_code.co_filename != __file__:
+            labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class ProfileSession:
+    """Samples the stacks of the threads attached to one request."""
+
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.id = uuid.uuid4().hex[:16]
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = self.finished = 0.0
+        self._threads: Counter = Counter()          # thread id → attach depth
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self) -> "ProfileSession":
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="destiny-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.finished = time.perf_counter()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for tid in threads:
+                frame = frames.get(tid)
+                if frame is not None:
+                    self.stacks[collapse(frame)] += 1
+                    self.samples += 1
+
+    @contextmanager
+    def attached(self):
+        """Sample the calling thread until the block exits."""
+        tid = threading.get_ident()
+        with self._lock:
+            self._threads[tid] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[tid] -= 1
+                if self._threads[tid] <= 0:
+                    del self._threads[tid]
+
+    def wrap(self, fn: Callable) -> Callable:
+        """fn, sampled on whichever thread runs it."""
+        def run(*args, **kwargs):
+            with self.attached():
+                return fn(*args, **kwargs)
+        return run
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+_session: contextvars.ContextVar[Optional[ProfileSession]] = contextvars.ContextVar(
+    "destiny_profile_session", default=None)
+_busy = threading.Lock()
+
+
+def current() -> Optional[ProfileSession]:
+    """The profile session of the current request, if it is being profiled."""
+    return _session.get()
+
+
+# ── storage ───────────────────────────────────────────────────────────────────
+
+_ID_RE = re.compile(r"^[0-9a-f]{16}$")
+
+
+def profile_dir() -> str:
+    return os.environ.get("DESTINY_PROFILE_DIR") or os.path.join(
+        tempfile.gettempdir(), "destiny_profiles")
+
+
+def save(session: ProfileSession) -> str:
+    """Write the session's collapsed stacks; prunes all but the newest profiles."""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{session.id}.folded")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(session.folded())
+    keep = int(os.environ.get("DESTINY_PROFILE_KEEP", "") or 50)
+    stored = sorted((e for e in os.scandir(directory) if e.name.endswith(".folded")),
+                    key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in stored[keep:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return path
+
+
+def load(profile_id: str) -> Optional[str]:
+    """Collapsed stacks of a stored profile, or None (also for malformed IDs)."""
+    if not _ID_RE.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(profile_dir(), f"{profile_id}.folded"), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+# ── wiring ────────────────────────────────────────────────────────────────────
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose sync endpoints attach their worker thread to a profile."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs) -> None:
+        if not inspect.iscoroutinefunction(endpoint) and inspect.isfunction(endpoint):
+            endpoint = _attaching(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _attaching(endpoint: Callable) -> Callable:
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        session = _session.get()
+        if session is None:
+            return endpoint(*args, **kwargs)
+        with session.attached():
+            return endpoint(*args, **kwargs)
+    return wrapper
+
+
+def _requested(scope) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == b"x-destiny-profile":
+            return value.decode("latin-1")
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [None])[0]
+
+
+def _authorized(value: Optional[str]) -> bool:
+    token = _token()
+    if not value or not token:
+        return False
+    return hmac.compare_digest(value.encode("utf-8"), token.encode("utf-8"))
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: profiles requests that opt in (only when enabled)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not enabled() or scope["type"] != "http" or not _authorized(_requested(scope)):
+            return await self.app(scope, receive, send)
+        if not _busy.acquire(blocking=False):
+            return await self.app(scope, receive, _with_header(send, PROFILE_HEADER, "busy"))
+        try:
+            interval = float(os.environ.get("DESTINY_PROFILE_INTERVAL_MS", "") or 1) / 1000
+            session = ProfileSession(interval).start()
+            token = _session.set(session)
+            saved = []
+
+            def finish():
+                if not saved:
+                    session.stop()
+                    saved.append(save(session))
+
+            async def send_wrapper(message):
+                # Stored before the last body chunk goes out, so the ID is
+                # fetchable as soon as the client has the response
+                if message["type"] == "http.response.body" and not message.get("more_body"):
+                    finish()
+                await send(message)
+
+            try:
+                await self.app(scope, receive,
+                               _with_header(send_wrapper, PROFILE_ID_HEADER, session.id))
+            finally:
+                _session.reset(token)
+                finish()
+        finally:
+            _busy.release()
+
+
+def _with_header(send, name: str, value: str):
+    async def wrapped(message):
+        if message["type"] == "http.response.start":
+            headers = list(message.get("headers", [])) + [(name.encode(), value.encode())]
+            message = dict(message, headers=headers)
+        await send(message)
+    return wrapped
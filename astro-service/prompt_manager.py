@@ -26,6 +26,8 @@ Five public functions:
 
 from __future__ import annotations
 
+from metrics import timed
+
 # ── 世界觀基底 ────────────────────────────────────────────────────────────────
 
 _WORLDVIEW_BASE = """\
@@ -369,6 +371,7 @@ _MATCH_ARCHETYPE_SCHEMA = """\
 }"""
 
 
+@timed("prompt.match_report")
 def get_match_report_prompt(
     match_data: dict,
     mode: str = "auto",
@@ -512,6 +515,7 @@ _MATCH_REPORT_SCHEMA = """\
 }"""
 
 
+@timed("prompt.simple_report")
 def get_simple_report_prompt(
     match_data: dict,
     mode: str = "auto",
@@ -608,6 +612,7 @@ _PROFILE_SCHEMA = """\
 }"""
 
 
+@timed("prompt.profile")
 def get_profile_prompt(
     chart_data: dict,
     rpv_data: dict,
@@ -712,6 +717,7 @@ _IDEAL_MATCH_SCHEMA = """\
 }"""
 
 
+@timed("prompt.ideal_match")
 def get_ideal_match_prompt(
     chart_data: dict,
     avatar_summary: dict = None,
@@ -840,6 +846,7 @@ def get_ideal_match_prompt(
 
 # ── Synastry Report Prompt (for /api/matches/compute, DTO pipeline) ──────────
 
+@timed("prompt.synastry_report")
 def build_synastry_report_prompt(
     raw_match_data: dict,
     user_a_profile: dict = None,
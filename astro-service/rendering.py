@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Response Rendering
+Fast JSON for the default response class and msgpack content negotiation.
+
+/compute-enriched returns several long Chinese prompts; stdlib
+json.dumps(ensure_ascii=False) spends a measurable share of the request
+rendering them. Renderers (DESTINY_JSON_RENDERER):
+  orjson — default when installed (UTF-8 bytes directly, several × faster)
+  json   — stdlib fallback, same output semantics (non-ASCII kept as-is)
+
+Clients that send `Accept: application/msgpack` (internal callers: shard
+ranking, daily jobs) get the same content packed as msgpack instead of
+JSON. Error responses and SSE streams stay JSON / text. Negotiation is
+read from the request by NegotiationMiddleware and applied by
+FastJSONResponse, so endpoints return plain dicts as before.
+
+Usage:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(NegotiationMiddleware)
+
+    resp = client.post(url, json=body, headers={"Accept": ACCEPT_BINARY})
+    data = decode_response(resp)      # msgpack or JSON by content-type
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+from typing import Any, Callable, Dict, Optional
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+# Accept header for internal clients: msgpack if the server can, JSON otherwise
+ACCEPT_BINARY = f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.5"
+
+
+def _dumps_json(content: Any) -> bytes:
+    return json.dumps(content, ensure_ascii=False).encode("utf-8")
+
+
+def _dumps_orjson(content: Any) -> bytes:
+    try:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    except TypeError:
+        return _dumps_json(content)   # e.g. ints beyond 64 bits — stdlib handles them
+
+
+RENDERERS: Dict[str, Callable[[Any], bytes]] = {"json": _dumps_json}
+if orjson is not None:
+    RENDERERS["orjson"] = _dumps_orjson
+
+_renderer: Optional[Callable[[Any], bytes]] = None
+
+
+def json_renderer() -> Callable[[Any], bytes]:
+    """The configured JSON renderer (resolved from the environment on first use)."""
+    global _renderer
+    if _renderer is None:
+        name = os.environ.get("DESTINY_JSON_RENDERER", "") or ("orjson" if orjson else "json")
+        _renderer = RENDERERS.get(name, _dumps_json)
+    return _renderer
+
+
+def set_json_renderer(name: Optional[str]) -> None:
+    """Select a renderer by name (benchmarks / tests); None re-reads the environment."""
+    global _renderer
+    if name is not None and name not in RENDERERS:
+        raise ValueError(f"unknown renderer {name!r}; available: {sorted(RENDERERS)}")
+    _renderer = RENDERERS[name] if name else None
+
+
+def dumps_json(content: Any) -> bytes:
+    return json_renderer()(content)
+
+
+def dumps_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, use_bin_type=True)
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """True if an Accept header asks for msgpack (and msgpack is installed)."""
+    if msgpack is None or not accept:
+        return False
+    for part in accept.split(","):
+        media, _, params = part.strip().partition(";")
+        if media.strip().lower() in _MSGPACK_TYPES:
+            return "q=0" not in params.replace(" ", "").split(";")
+    return False
+
+
+_binary = contextvars.ContextVar("destiny_binary_response", default=False)
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: configured JSON renderer, or msgpack when negotiated."""
+
+    def __init__(self, content: Any, status_code: int = 200, headers=None,
+                 media_type: Optional[str] = None, background=None) -> None:
+        if media_type is None and _binary.get():
+            media_type = MSGPACK_MEDIA_TYPE
+        headers = dict(headers or {})
+        headers.setdefault("vary", "Accept")
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type == MSGPACK_MEDIA_TYPE:
+            return dumps_msgpack(content)
+        return dumps_json(content)
+
+
+class NegotiationMiddleware:
+    """ASGI middleware: records whether the request accepts msgpack."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept = next((v.decode("latin-1") for k, v in scope.get("headers", ())
+                       if k == b"accept"), None)
+        token = _binary.set(wants_msgpack(accept))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _binary.reset(token)
+
+
+def decode_response(resp) -> Any:
+    """Body of an httpx / TestClient response, decoded by its content-type."""
+    content_type = resp.headers.get("content-type", "")
+    if content_type.split(";")[0].strip() in _MSGPACK_TYPES:
+        return msgpack.unpackb(resp.content, raw=False, strict_map_key=False)
+    return resp.json()
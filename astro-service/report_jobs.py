@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Background Report Jobs
+Takes LLM report generation off the request path. /api/users/onboard and
+/api/matches/compute (async_report=true) enqueue a job and return its id
+immediately; a bounded worker pool generates the report and writes it to
+the psychology profile (natal) or the match row (synastry). Clients poll
+GET /api/jobs/{id} or follow GET /api/jobs/{id}/events (SSE).
+
+Jobs live in a local SQLite file (WAL), so queued or half-finished work
+survives a restart: jobs left "running" by a crash are re-queued on start.
+Failed jobs are retried with exponential backoff up to max_attempts.
+
+Per-request API keys are held in memory only (never written to disk); a
+job recovered after a restart uses the server key.
+
+Kinds:
+  natal     — payload {user_id, prompt, ...} → profile.llm_natal_report
+  synastry  — payload {user_a_id, user_b_id, prompt, ...}
+              → matches.llm_insight_report
+
+Environment:
+  DESTINY_REPORT_JOBS_PATH     — SQLite file (default ./report_jobs.db)
+  DESTINY_REPORT_WORKERS       — concurrent jobs (default 4)
+  DESTINY_REPORT_MAX_ATTEMPTS  — tries per job (default 3)
+  DESTINY_LLM_STUB=1           — deterministic offline stub instead of the LLM
+
+Usage:
+    queue = get_queue(llm=call_llm)
+    job = queue.submit("natal", {"user_id": uid, "prompt": prompt})
+    queue.get(job["job_id"])["status"]   # queued → running → done | failed
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+KINDS = ("natal", "synastry")
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+TERMINAL = (DONE, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    result      TEXT,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    run_after   REAL NOT NULL DEFAULT 0,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_report_jobs_queue ON report_jobs (status, run_after);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def stub_llm(prompt: str, provider: str = "", max_tokens: int = 0, **_) -> str:
+    """Deterministic offline stand-in for call_llm (DESTINY_LLM_STUB=1)."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    return f"[stub report {digest}] {prompt[:80]}"
+
+
+class JobStore:
+    """SQLite persistence for report jobs."""
+
+    def __init__(self, path: str = "report_jobs.db") -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def insert(self, kind: str, payload: dict) -> dict:
+        job_id = uuid.uuid4().hex
+        now = _now()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO report_jobs (id, kind, status, payload, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(payload, ensure_ascii=False), now, now),
+            )
+        return self.get(job_id)
+
+    def claim(self) -> Optional[dict]:
+        """Atomically move the oldest runnable queued job to running."""
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE report_jobs SET status = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE id = (SELECT id FROM report_jobs WHERE status = ? AND run_after <= ?"
+                "             ORDER BY created_at LIMIT 1)"
+                " RETURNING *",
+                (RUNNING, _now(), QUEUED, time.time()),
+            ).fetchone()
+        return self._job(row) if row else None
+
+    def finish(self, job_id: str, result: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE report_jobs SET status = ?, result = ?, error = NULL, updated_at = ?"
+                " WHERE id = ?",
+                (DONE, result, _now(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str, retry_in: Optional[float]) -> None:
+        """Mark failed, or re-queue after retry_in seconds when given."""
+        with self._lock:
+            if retry_in is None:
+                self._conn.execute(
+                    "UPDATE report_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (FAILED, error, _now(), job_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE report_jobs SET status = ?, error = ?, run_after = ?, updated_at = ?"
+                    " WHERE id = ?",
+                    (QUEUED, error, time.time() + retry_in, _now(), job_id),
+                )
+
+    def recover(self) -> int:
+        """Re-queue jobs a previous process left running; returns how many."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE report_jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (QUEUED, _now(), RUNNING),
+            )
+            return cur.rowcount
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def next_run_after(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(run_after) FROM report_jobs WHERE status = ?", (QUEUED,)
+            ).fetchone()
+        return row[0]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM report_jobs GROUP BY status"
+            ).fetchall()
+        return {status: n for status, n in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+
+class ReportJobQueue:
+    """Bounded worker pool over a JobStore.
+
+    llm(prompt, provider=, max_tokens=, api_key=, gemini_model=, use_cache=) → text
+    (main.call_llm in the service). storage is a StorageBackend; defaults
+    to storage.get_storage() at write time.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        llm: Callable[..., str],
+        storage=None,
+        workers: int = 4,
+        max_attempts: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ) -> None:
+        self.store = store
+        self._llm = llm
+        self._storage = storage
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._keys: Dict[str, str] = {}
+        self._cond = threading.Condition()
+        self._threads: list = []
+        self._stopping = False
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "retried": 0,
+                       "recovered": 0}
+
+    # ── lifecycle ─────────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self) -> "ReportJobQueue":
+        if self.running:
+            return self
+        self._stopping = False
+        self._stats["recovered"] += self.store.recover()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"report-job-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the workers; a job in progress finishes first (or is recovered next start)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    # ── API ───────────────────────────────────────────────────────────────
+
+    def submit(self, kind: str, payload: dict, api_key: str = "") -> dict:
+        """Persist a job and wake a worker; returns the public job view."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown report job kind: {kind!r}")
+        job = self.store.insert(kind, payload)
+        if api_key:
+            self._keys[job["id"]] = api_key
+        with self._cond:
+            self._stats["submitted"] += 1
+            self._cond.notify()
+        if not self.running:
+            self.start()
+        return public_view(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        return public_view(job) if job else None
+
+    def wait(self, job_id: str, timeout: float = 10.0) -> Optional[dict]:
+        """Block until the job is done or failed (tests, scripts)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in TERMINAL or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.02)
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = dict(self._stats)
+        out.update(workers=self.workers, running=self.running, jobs=self.store.counts())
+        return out
+
+    # ── workers ───────────────────────────────────────────────────────────
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+            job = self.store.claim()
+            if job is None:
+                next_at = self.store.next_run_after()
+                wait = 1.0 if next_at is None else max(0.01, min(1.0, next_at - time.time()))
+                with self._cond:
+                    if not self._stopping:
+                        self._cond.wait(wait)
+                continue
+            self._run(job)
+
+    def _run(self, job: dict) -> None:
+        try:
+            text = self._generate(job)
+            self._write(job, text)
+        except Exception as e:
+            error = f"{type(e).__name__}: {getattr(e, 'detail', None) or e}"[:500]
+            if job["attempts"] < self.max_attempts:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (job["attempts"] - 1))
+                self.store.fail(job["id"], error, retry_in=delay)
+                with self._cond:
+                    self._stats["retried"] += 1
+            else:
+                self.store.fail(job["id"], error, retry_in=None)
+                self._keys.pop(job["id"], None)
+                with self._cond:
+                    self._stats["failed"] += 1
+                print(f"[report_jobs] job {job['id']} failed: {error}", file=sys.stderr)
+            return
+        self.store.finish(job["id"], text)
+        self._keys.pop(job["id"], None)
+        with self._cond:
+            self._stats["completed"] += 1
+
+    def _generate(self, job: dict) -> str:
+        p = job["payload"]
+        return self._llm(
+            p["prompt"],
+            provider=p.get("provider", "anthropic"),
+            max_tokens=p.get("max_tokens", 600),
+            api_key=self._keys.get(job["id"], ""),
+            gemini_model=p.get("gemini_model", ""),
+            use_cache=p.get("use_cache", True),
+        )
+
+    def _write(self, job: dict, text: str) -> None:
+        store = self._storage
+        if store is None:
+            from storage import get_storage
+            store = get_storage()
+        p = job["payload"]
+        if job["kind"] == "natal":
+            store.upsert_psychology_profile(p["user_id"], {"llm_natal_report": text})
+        else:
+            store.update_match_report(p["user_a_id"], p["user_b_id"], text)
+
+
+def public_view(job: dict) -> dict:
+    """Job as returned by the API (no prompt, no provider settings)."""
+    p = job["payload"]
+    target = {k: p[k] for k in ("user_id", "user_a_id", "user_b_id") if k in p}
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "target": target,
+        "report": job["result"] if job["status"] == DONE else None,
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+_queue: Optional[ReportJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_queue(llm: Optional[Callable[..., str]] = None) -> ReportJobQueue:
+    """Process-wide queue configured from the environment (created on first use).
+
+    llm is used by the first call only and is required then, unless
+    DESTINY_LLM_STUB=1 (jobs run against stub_llm).
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                if os.environ.get("DESTINY_LLM_STUB", "0") not in ("", "0"):
+                    llm = stub_llm
+                elif llm is None:
+                    raise ValueError("get_queue() needs llm on first use (or DESTINY_LLM_STUB=1)")
+                _queue = ReportJobQueue(
+                    JobStore(os.environ.get("DESTINY_REPORT_JOBS_PATH") or "report_jobs.db"),
+                    llm,
+                    workers=int(os.environ.get("DESTINY_REPORT_WORKERS", "") or 4),
+                    max_attempts=int(os.environ.get("DESTINY_REPORT_MAX_ATTEMPTS", "") or 3),
+                )
+    return _queue
+
+
+def set_queue(queue: Optional[ReportJobQueue]) -> Optional[ReportJobQueue]:
+    """Replace the process-wide queue (tests / shutdown); returns the previous one."""
+    global _queue
+    with _queue_lock:
+        previous, _queue = _queue, queue
+    return previous
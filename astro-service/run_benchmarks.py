@@ -0,0 +1,54 @@
+"""Benchmark suite: every engine on Tier 1/2/3 inputs vs benchmark_baseline.json.
+
+Exits 1 when a case regresses past its threshold, after re-timing it
+--retries times (see benchmarks.py).
+
+    python run_benchmarks.py [--only NAME] [--threshold 0.25] [--min-time 0.2]
+    python run_benchmarks.py --update        # record a new baseline
+"""
+import argparse
+import sys
+
+import benchmarks
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="rewrite the baseline file")
+    parser.add_argument("--only", default="", help="run cases whose name contains this")
+    parser.add_argument("--threshold", type=float, default=benchmarks.env_threshold())
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per case")
+    parser.add_argument("--retries", type=int, default=2, help="re-time regressed cases")
+    parser.add_argument("--baseline", default=benchmarks.BASELINE_PATH)
+    args = parser.parse_args()
+
+    cases = {k: v for k, v in benchmarks.build_cases().items() if args.only in k}
+    print(f"  {'case':<40} {'median µs':>11} {'min µs':>11}")
+    current = benchmarks.run(cases, args.min_time, progress=lambda name, t: print(
+        f"  {name:<40} {t.median_us:>11.1f} {t.min_us:>11.1f}"))
+
+    baseline = benchmarks.load_baseline(args.baseline)
+    if args.update:
+        if baseline and args.only:   # partial run: merge into the existing baseline
+            current["cases"] = {**baseline["cases"], **current["cases"]}
+            current["calibration_us"] = baseline["calibration_us"]
+        benchmarks.save_baseline(current, args.baseline, previous=baseline)
+        print(f"\nbaseline written: {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\nno baseline at {args.baseline}; run with --update to record one")
+        return 0
+
+    results = benchmarks.recheck(cases, current, baseline, args.threshold,
+                                 args.retries, args.min_time)
+    print(f"\n  {'case':<40} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for c in results:
+        flag = "  REGRESSED" if c.regressed else ""
+        print(f"  {c.name:<40} {c.baseline_us:>10.1f} {c.current_us:>10.1f} {c.ratio:>6.2f}×{flag}")
+    regressed = [c for c in results if c.regressed]
+    print(f"\n{len(regressed)} regression(s) out of {len(results)} case(s)")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
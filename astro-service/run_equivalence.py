@@ -0,0 +1,56 @@
+"""Differential check: an optimized engine vs today's reference implementation.
+
+Exits 1 when any input gives a different answer; each mismatch is printed
+with the minimal input that still reproduces it (see equivalence.py).
+
+    python run_equivalence.py --engine compute_match_v2 --candidate fast_match:compute_match_v2
+    python run_equivalence.py --engine calculate_chart --candidate chart_cache.calculate_chart -n 5000
+    python run_equivalence.py --engine compute_quick_score --candidate feature_store --population-only
+    python run_equivalence.py --field-tol 'tracks.*=0.05' --rel-tol 1e-6 ...
+"""
+import argparse
+import sys
+
+import equivalence
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=equivalence.ENGINES, action="append",
+                        help="engine(s) to check (default: all)")
+    parser.add_argument("--candidate", default="reference",
+                        help="module:function, or a built-in: "
+                             + ", ".join(equivalence.CANDIDATES))
+    parser.add_argument("-n", type=int, default=1000, help="inputs per engine")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rel-tol", type=float, default=1e-9)
+    parser.add_argument("--abs-tol", type=float, default=1e-9)
+    parser.add_argument("--field-tol", action="append", default=[], metavar="PATTERN=TOL",
+                        help="absolute tolerance for matching output paths (repeatable)")
+    parser.add_argument("--population-only", action="store_true",
+                        help="only population-shaped inputs (no randomized variants)")
+    parser.add_argument("--max-failures", type=int, default=3)
+    args = parser.parse_args()
+
+    field_tol = {}
+    for item in args.field_tol:
+        pattern, _, tol = item.rpartition("=")
+        field_tol[pattern] = float(tol)
+    tolerance = equivalence.Tolerance(args.rel_tol, args.abs_tol, field_tol)
+
+    failed = False
+    for engine in args.engine or equivalence.ENGINES:
+        if args.candidate in equivalence.CANDIDATES:
+            candidate = equivalence.CANDIDATES[args.candidate](engine)
+        else:
+            candidate = equivalence.load_callable(args.candidate)
+        report = equivalence.check(engine, candidate, n=args.n, seed=args.seed,
+                                   tolerance=tolerance, max_failures=args.max_failures,
+                                   randomized=not args.population_only)
+        print(report.format())
+        failed = failed or not report.ok
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
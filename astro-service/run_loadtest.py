@@ -0,0 +1,103 @@
+"""Load test: synthetic population + traffic mix, throughput and p50/p95/p99 per operation.
+
+In-process against main.app (default), or over HTTP with --url. For llm
+traffic over HTTP, start a stub provider and run the service with
+ANTHROPIC_BASE_URL pointing at it (see loadgen.py).
+
+With --url the run is read-only by default: onboard is dropped from the mix
+and ranking scores against the shard the service already has. --allow-writes
+REPLACES the service's ranking shard with the synthetic population and lets
+onboard write synthetic users into its storage — only use it on a throwaway
+deployment.
+
+    python run_loadtest.py --users 500 --concurrency 32 --duration 60
+    python run_loadtest.py --mix ranking=4,compute_match=3,enriched=1 --tiers 1=0.2,2=0.3,3=0.5
+    python run_loadtest.py --url http://localhost:8001 --json report.json
+    python run_loadtest.py --url http://staging:8001 --allow-writes
+    python run_loadtest.py --serve-stub-llm 8099 --llm-latency 0.8
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import loadgen
+
+
+def _weights(text: str, key=str) -> dict:
+    out = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        out[key(name)] = float(weight or 1)
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200, help="population size")
+    parser.add_argument("--tiers", default="1=0.3,2=0.3,3=0.4", help="data tier mix")
+    parser.add_argument("--birth-year", default="1994,6",
+                        help="mean,sd of birth years (normal, clamped to 1960–2006)")
+    parser.add_argument("--attachment", default="secure=0.5,anxious=0.3,avoidant=0.2")
+    parser.add_argument("--rpv-power", default="control=0.5,follow=0.5")
+    parser.add_argument("--rpv-conflict", default="cold_war=0.5,argue=0.5")
+    parser.add_argument("--rpv-energy", default="home=0.5,out=0.5")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in loadgen.DEFAULT_MIX.items()),
+                        help=f"operation weights ({', '.join(loadgen.OPERATIONS)})")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds (0 with --requests: no time limit)")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    parser.add_argument("--k", type=int, default=20, help="ranking top-K")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub LLM seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", default="", help="target a running service instead")
+    parser.add_argument("--allow-writes", action="store_true",
+                        help="with --url: replace the service's ranking shard and send onboard")
+    parser.add_argument("--json", default="", help="also write the report here")
+    parser.add_argument("--serve-stub-llm", type=int, default=None, metavar="PORT",
+                        help="only run the stub LLM provider on PORT")
+    args = parser.parse_args()
+
+    if args.serve_stub_llm is not None:
+        stub = loadgen.StubLLM(args.llm_latency, port=args.serve_stub_llm).start()
+        print(f"stub LLM at {stub.url} — run the service with ANTHROPIC_BASE_URL={stub.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stub.stop()
+        return 0
+
+    mean, sd = (float(x) for x in args.birth_year.split(","))
+    population_config = loadgen.PopulationConfig(
+        n=args.users, tier_mix=_weights(args.tiers, int), birth_year_mean=mean, birth_year_sd=sd,
+        attachment_mix=_weights(args.attachment), rpv_power=_weights(args.rpv_power),
+        rpv_conflict=_weights(args.rpv_conflict), rpv_energy=_weights(args.rpv_energy),
+        seed=args.seed,
+    )
+    load_config = loadgen.LoadConfig(
+        mix=loadgen.parse_mix(args.mix), concurrency=args.concurrency,
+        duration=None if args.requests and args.duration <= 0 else args.duration,
+        requests=args.requests, k=args.k, llm_latency=args.llm_latency, seed=args.seed,
+    )
+
+    started = time.perf_counter()
+    population = loadgen.generate_population(population_config)
+    print(f"{len(population)} synthetic users in {time.perf_counter() - started:.1f}s")
+
+    if args.url:
+        report = asyncio.run(loadgen.run_http(args.url, population, load_config,
+                                              allow_writes=args.allow_writes))
+    else:
+        report = asyncio.run(loadgen.run_in_process(population, load_config))
+    print(report.format())
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
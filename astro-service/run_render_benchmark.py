@@ -0,0 +1,68 @@
+"""Benchmark: response render time and payload size — stdlib json vs orjson vs msgpack.
+
+Payloads are real endpoint outputs: a /compute-enriched synastry DTO (long
+Chinese prompts) and a /ranking/top-k result.
+
+    python run_render_benchmark.py [--repeat 2000]
+"""
+import argparse
+import time
+
+import rendering
+from destiny_pipeline import BirthInput, DestinyPipeline
+from shard_ranking import LocalShard
+
+
+def enriched_payload() -> dict:
+    pipeline = DestinyPipeline(BirthInput("1995-06-15", "14:30", "M", 25.033, 121.565),
+                               BirthInput("1997-03-07", "10:59", "F", 25.033, 121.565))
+    pipeline.compute_charts()
+    pipeline.compute_match()
+    pipeline.extract_profiles().build_prompts()
+    return pipeline.to_enriched_dto()
+
+
+def ranking_payload(n: int = 2000, k: int = 100) -> dict:
+    signs = ["aries", "taurus", "gemini", "cancer", "leo", "virgo",
+             "libra", "scorpio", "sagittarius", "capricorn", "aquarius", "pisces"]
+    elements = ["wood", "fire", "earth", "metal", "water"]
+    profiles = {f"user-{i:05d}": {"sun_sign": signs[i % 12], "moon_sign": signs[(i * 7) % 12],
+                                  "venus_sign": signs[(i * 5) % 12], "bazi_element": elements[i % 5]}
+                for i in range(n)}
+    shard = LocalShard(profiles)
+    return {"results": shard.top_k({"sun_sign": "leo", "bazi_element": "fire"}, k=k)}
+
+
+def _time(fn, payload, repeat: int) -> float:
+    fn(payload)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(payload)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    codecs = {"json (stdlib)": rendering.RENDERERS["json"]}
+    if "orjson" in rendering.RENDERERS:
+        codecs["orjson"] = rendering.RENDERERS["orjson"]
+    if rendering.msgpack is not None:
+        codecs["msgpack"] = rendering.dumps_msgpack
+
+    for name, payload in (("compute-enriched", enriched_payload()),
+                          ("ranking top-100", ranking_payload())):
+        print(f"\n{name}")
+        print(f"  {'codec':<14} {'render µs':>10} {'bytes':>9} {'vs json':>8}")
+        base = None
+        for codec, fn in codecs.items():
+            us = _time(fn, payload, args.repeat)
+            size = len(fn(payload))
+            base = base or us
+            print(f"  {codec:<14} {us:>10.1f} {size:>9} {base / us:>7.1f}×")
+
+
+if __name__ == "__main__":
+    main()
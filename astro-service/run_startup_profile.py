@@ -0,0 +1,76 @@
+"""Profile: cold start — import time of main, time to first /health, first compute.
+
+Each phase runs in a fresh interpreter, so nothing is warm from a previous
+run. The import breakdown comes from `python -X importtime`.
+
+    python run_startup_profile.py [--runs 5] [--top 15]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Modules that must stay out of cold start (loaded on first use instead)
+DEFERRED = ["swisseph", "chart", "bazi", "zwds", "matching", "shadow_engine", "prompt_manager",
+            "storage", "db_client", "supabase", "postgrest", "httpx", "anthropic", "google.genai"]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+loaded = [m for m in DEFERRED if m in sys.modules]
+from fastapi.testclient import TestClient      # imports httpx itself — not timed
+t2 = time.perf_counter()
+with TestClient(main.app) as client:
+    t3 = time.perf_counter()
+    assert client.get("/health").status_code == 200
+    t4 = time.perf_counter()
+    client.post("/compute-match", json={"user_a": {"sun_sign": "leo"}, "user_b": {"sun_sign": "aries"}})
+    t5 = time.perf_counter()
+print(json.dumps({"import main": t1 - t0, "startup hooks": t3 - t2, "first /health": t4 - t3,
+                  "first /compute-match": t5 - t4, "loaded": loaded}))
+"""
+
+
+def probe() -> dict:
+    code = f"DEFERRED = {DEFERRED!r}\n{_PROBE}"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_breakdown(top: int) -> list:
+    """(cumulative µs, module) of the slowest top-level imports under `import main`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("   ") and not name.startswith("    "):   # direct imports of main
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    results = [probe() for _ in range(args.runs)]
+    print(f"cold start, median of {args.runs} fresh interpreters")
+    for phase in ("import main", "startup hooks", "first /health", "first /compute-match"):
+        print(f"  {phase:<22} {statistics.median(r[phase] for r in results) * 1000:>8.1f} ms")
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    print(f"  deferred modules loaded by import main: {', '.join(loaded) or 'none'}")
+
+    print(f"\nslowest imports under main (cumulative)")
+    for us, name in import_breakdown(args.top):
+        print(f"  {name:<28} {us / 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Shared Table Columns
+Column lists of the user tables, shared by every storage backend
+(db_client for Supabase, storage.SQLiteStorage) so they cannot drift.
+
+Dependency-free on purpose: storage imports it at cold start without
+pulling in db_client (supabase / httpx).
+"""
+
+# user_natal_data chart columns (JSON documents)
+NATAL_COLUMNS = ("western_chart", "bazi_chart", "zwds_chart")
+
+# user_psychology_profiles columns read and written by the service
+PSYCHOLOGY_FIELDS = (
+    "relationship_dynamic", "psychological_needs",
+    "favorable_elements", "dominant_elements",
+    "karmic_boss", "llm_natal_report",
+    "attachment_style",
+)
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Sharded Ranking (scatter-gather)
+Scales one-vs-all compute_quick_score ranking across worker processes or hosts.
+
+The population (user_id → flat profile dict, same shape as /quick-score input)
+is partitioned by a stable hash of user_id. Every shard scores the query user
+against its own slice and returns only its local top-K; the coordinator merges
+those sorted lists into the global top-K.
+
+Because every shard orders results by the same key (harmony desc, user_id asc),
+the merged top-K is identical to ranking the whole population in one process.
+
+Shard kinds:
+  LocalShard   — in-process (also used inside worker processes and by the
+                 /ranking/shard/* endpoints in main.py)
+  ProcessShard — LocalShard living in a child process, driven over a Pipe
+  HttpShard    — a remote astro-service host reached over HTTP
+
+Usage (local worker processes):
+    with ShardedRanker.with_processes(4) as ranker:
+        ranker.load(population)        # or dict(FeatureStore.open(path).iter_profiles())
+        top = ranker.rank(user, k=20, exclude={user_id})
+
+Usage (remote hosts):
+    ranker = ShardedRanker.with_hosts(["http://10.0.0.2:8001", "http://10.0.0.3:8001"])
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import multiprocessing as mp
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from matching import compute_quick_score
+
+
+def shard_for(user_id: str, n_shards: int) -> int:
+    """Return the shard index owning user_id (stable across processes and hosts)."""
+    return zlib.crc32(str(user_id).encode("utf-8")) % n_shards
+
+
+def _rank_key(entry: dict) -> tuple:
+    """Sort key shared by every shard and the coordinator: harmony desc, user_id asc."""
+    return (-entry["harmony"], entry["user_id"])
+
+
+# ── LocalShard ───────────────────────────────────────────────────────────────
+
+class LocalShard:
+    """A slice of the population scored in the current process.
+
+    Thread-safe: the /ranking/shard/* endpoints load and query it from
+    concurrent threadpool requests.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, dict]] = None) -> None:
+        self._profiles: Dict[str, dict] = dict(profiles or {})
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def load(self, profiles: Dict[str, dict], replace: bool = False) -> int:
+        """Add or update profiles; returns the shard size afterwards."""
+        if replace:
+            fresh = dict(profiles)     # built outside the lock, swapped in whole
+            with self._lock:
+                self._profiles = fresh
+                return len(self._profiles)
+        with self._lock:
+            self._profiles.update(profiles)
+            return len(self._profiles)
+
+    def remove(self, user_ids: Iterable[str]) -> int:
+        with self._lock:
+            for uid in user_ids:
+                self._profiles.pop(uid, None)
+            return len(self._profiles)
+
+    def top_k(self, user: dict, k: int = 20, exclude: Iterable[str] = ()) -> List[dict]:
+        """Score user against every local candidate and return the best k.
+
+        Each entry is the compute_quick_score output plus "user_id".
+        Candidates whose profile fails to score are skipped.
+        """
+        skip = set(exclude)
+        with self._lock:
+            candidates = list(self._profiles.items())
+        scored: List[dict] = []
+        for uid, candidate in candidates:
+            if uid in skip:
+                continue
+            try:
+                result = compute_quick_score(user, candidate)
+            except Exception:
+                continue
+            result["user_id"] = uid
+            scored.append(result)
+        return heapq.nsmallest(k, scored, key=_rank_key)
+
+    def close(self) -> None:
+        pass
+
+
+# ── ProcessShard ─────────────────────────────────────────────────────────────
+
+def _shard_worker(conn) -> None:
+    """Child-process loop: owns one LocalShard and answers (op, *args) messages."""
+    shard = LocalShard()
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        op, args = msg[0], msg[1:]
+        if op == "stop":
+            conn.send(("ok", None))
+            break
+        try:
+            if op == "load":
+                payload = shard.load(*args)
+            elif op == "remove":
+                payload = shard.remove(*args)
+            elif op == "top_k":
+                payload = shard.top_k(*args)
+            elif op == "size":
+                payload = len(shard)
+            else:
+                raise ValueError(f"Unknown shard op: {op!r}")
+            conn.send(("ok", payload))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+    conn.close()
+
+
+class ProcessShard:
+    """A LocalShard running in a dedicated worker process."""
+
+    def __init__(self, start_method: Optional[str] = None) -> None:
+        ctx = mp.get_context(start_method)
+        self._conn, child = ctx.Pipe()
+        self._proc = ctx.Process(target=_shard_worker, args=(child,), daemon=True)
+        self._proc.start()
+        child.close()
+        self._lock = threading.Lock()
+
+    def _call(self, *msg):
+        with self._lock:
+            self._conn.send(msg)
+            status, payload = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Shard worker failed: {payload}")
+        return payload
+
+    def __len__(self) -> int:
+        return self._call("size")
+
+    def load(self, profiles: Dict[str, dict], replace: bool = False) -> int:
+        return self._call("load", profiles, replace)
+
+    def remove(self, user_ids: Iterable[str]) -> int:
+        return self._call("remove", list(user_ids))
+
+    def top_k(self, user: dict, k: int = 20, exclude: Iterable[str] = ()) -> List[dict]:
+        return self._call("top_k", user, k, list(exclude))
+
+    def close(self) -> None:
+        if not self._proc.is_alive():
+            return
+        try:
+            self._call("stop")
+        except Exception:
+            pass
+        self._proc.join(timeout=5)
+        if self._proc.is_alive():
+            self._proc.terminate()
+
+
+# ── HttpShard ────────────────────────────────────────────────────────────────
+
+class HttpShard:
+    """A remote astro-service host serving the /ranking/shard/* endpoints.
+
+    client: optional httpx.Client (e.g. fastapi.testclient.TestClient) —
+            when omitted a keep-alive client is created for base_url.
+    Responses are requested as msgpack (falls back to JSON transparently).
+    """
+
+    def __init__(self, base_url: str = "", client=None, timeout: float = 30.0) -> None:
+        import httpx
+
+        self._base = base_url.rstrip("/")
+        self._owns_client = client is None
+        self._client = client or httpx.Client(timeout=timeout)
+
+    def _post(self, path: str, body: dict):
+        from rendering import ACCEPT_BINARY, decode_response
+
+        resp = self._client.post(f"{self._base}{path}", json=body,
+                                 headers={"Accept": ACCEPT_BINARY})
+        resp.raise_for_status()
+        return decode_response(resp)
+
+    def __len__(self) -> int:
+        from rendering import ACCEPT_BINARY, decode_response
+
+        resp = self._client.get(f"{self._base}/ranking/shard/size",
+                                headers={"Accept": ACCEPT_BINARY})
+        resp.raise_for_status()
+        return decode_response(resp)["size"]
+
+    def load(self, profiles: Dict[str, dict], replace: bool = False) -> int:
+        return self._post("/ranking/shard/load", {"profiles": profiles, "replace": replace})["size"]
+
+    def remove(self, user_ids: Iterable[str]) -> int:
+        return self._post("/ranking/shard/remove", {"user_ids": list(user_ids)})["size"]
+
+    def top_k(self, user: dict, k: int = 20, exclude: Iterable[str] = ()) -> List[dict]:
+        return self._post("/ranking/shard/top-k",
+                          {"user": user, "k": k, "exclude": list(exclude)})["results"]
+
+    def close(self) -> None:
+        if self._owns_client:
+            self._client.close()
+
+
+# ── Coordinator ──────────────────────────────────────────────────────────────
+
+class ShardedRanker:
+    """Scatter-gather coordinator over a fixed list of shards.
+
+    Shards are addressed by shard_for(user_id, len(shards)), so the shard list
+    order must stay the same between load() and later updates.
+    """
+
+    def __init__(self, shards: Sequence) -> None:
+        if not shards:
+            raise ValueError("ShardedRanker needs at least one shard")
+        self._shards = list(shards)
+        self._pool = ThreadPoolExecutor(max_workers=len(self._shards),
+                                        thread_name_prefix="rank-shard")
+
+    @classmethod
+    def with_processes(cls, n_workers: int, start_method: Optional[str] = None) -> "ShardedRanker":
+        """Spawn n_workers local worker processes, one shard each."""
+        return cls([ProcessShard(start_method) for _ in range(n_workers)])
+
+    @classmethod
+    def with_hosts(cls, base_urls: Sequence[str], timeout: float = 30.0) -> "ShardedRanker":
+        """Use one remote astro-service host per shard."""
+        return cls([HttpShard(url, timeout=timeout) for url in base_urls])
+
+    @property
+    def n_shards(self) -> int:
+        return len(self._shards)
+
+    def __len__(self) -> int:
+        return sum(self._pool.map(len, self._shards))
+
+    def partition(self, profiles: Dict[str, dict]) -> List[Dict[str, dict]]:
+        """Split profiles into one dict per shard."""
+        parts: List[Dict[str, dict]] = [{} for _ in self._shards]
+        for uid, profile in profiles.items():
+            parts[shard_for(uid, len(self._shards))][uid] = profile
+        return parts
+
+    def load(self, profiles: Dict[str, dict], replace: bool = False) -> int:
+        """Distribute profiles to their owning shards; returns total population size."""
+        parts = self.partition(profiles)
+        futures = [self._pool.submit(s.load, part, replace)
+                   for s, part in zip(self._shards, parts)]
+        return sum(f.result() for f in futures)
+
+    def remove(self, user_ids: Iterable[str]) -> None:
+        by_shard: List[List[str]] = [[] for _ in self._shards]
+        for uid in user_ids:
+            by_shard[shard_for(uid, len(self._shards))].append(uid)
+        futures = [self._pool.submit(s.remove, ids)
+                   for s, ids in zip(self._shards, by_shard) if ids]
+        for f in futures:
+            f.result()
+
+    def rank(self, user: dict, k: int = 20, exclude: Iterable[str] = ()) -> List[dict]:
+        """Fan out one-vs-all quick scoring and merge each shard's local top-K."""
+        exclude = list(exclude)
+        futures = [self._pool.submit(s.top_k, user, k, exclude) for s in self._shards]
+        partials = [f.result() for f in futures]
+        return list(itertools.islice(heapq.merge(*partials, key=_rank_key), k))
+
+    def close(self) -> None:
+        for s in self._shards:
+            s.close()
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> "ShardedRanker":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Singleflight Request Coalescing
+Concurrent calls with the same key share one in-flight computation: the
+first caller (leader) runs it, duplicates that arrive while it is running
+wait for the leader's result instead of computing it again. Once the call
+finishes the key is forgotten — this is not a cache, it only collapses
+overlapping work (fan-out jobs, retries, sandbox double-clicks).
+
+Sync callers (do) and async callers (ado, any event loop) of the same
+group share in-flight entries. Errors propagate to every waiter — except
+the leader's own cancellation (e.g. its client disconnected): then the key
+is dropped and waiting followers retry, one of them becoming the new leader.
+
+Followers get a deep copy of the leader's result (copy_result=True) so a
+caller that mutates its response cannot corrupt another's.
+
+Groups used by main.py:
+  chart — calculate_chart / compute_zwds_chart / onboarding charts
+  match — /api/matches/compute per (pair, options)
+  llm   — provider calls per (provider, model, max_tokens, prompt, key)
+
+Usage:
+    charts = group("chart")
+    key = key_for("calculate-chart", req.model_dump())
+    result = charts.do(key, calculate_chart, **kwargs)
+    report = await group("llm").ado(key, lambda: gateway.acall(prompt))
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict
+
+
+def key_for(*parts: Any) -> str:
+    """Stable key for normalized request content (dict order does not matter)."""
+    material = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Abandoned(Exception):
+    """The leader was cancelled before finishing; followers retry."""
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one execution."""
+
+    def __init__(self, name: str = "", copy_result: bool = True) -> None:
+        self.name = name
+        self.copy_result = copy_result
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+        self.errors = 0
+
+    def _join(self, key: str, retry: bool = False) -> tuple:
+        """(future, is_leader) for key."""
+        with self._lock:
+            if not retry:
+                self.calls += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self.collapsed += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.executions += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None,
+                error: BaseException = None) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+            if error is not None:
+                self.errors += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _abandon(self, key: str, future: Future) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+        future.set_exception(_Abandoned())
+
+    def _share(self, result: Any) -> Any:
+        return copy.deepcopy(result) if self.copy_result else result
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        """fn(*args, **kwargs), or the result of an identical call already running."""
+        future, leader = self._join(key)
+        while not leader:
+            try:
+                return self._share(future.result())
+            except _Abandoned:
+                future, leader = self._join(key, retry=True)
+        try:
+            result = fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            self._abandon(key, future)
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def ado(self, key: str, factory: Callable[[], Awaitable]) -> Any:
+        """await factory(), or the result of an identical call already running.
+
+        factory is only invoked by the leader, so duplicates never create
+        their coroutine.
+        """
+        future, leader = self._join(key)
+        while not leader:
+            try:
+                return self._share(await asyncio.shield(asyncio.wrap_future(future)))
+            except _Abandoned:
+                future, leader = self._join(key, retry=True)
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            self._abandon(key, future)
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "collapsed": self.collapsed,
+                "errors": self.errors,
+                "in_flight": len(self._calls),
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.calls = self.executions = self.collapsed = self.errors = 0
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def group(name: str) -> SingleFlight:
+    """Process-wide SingleFlight for name (created on first use)."""
+    with _groups_lock:
+        flight = _groups.get(name)
+        if flight is None:
+            flight = _groups[name] = SingleFlight(name)
+        return flight
+
+
+def stats() -> dict:
+    """{group: {calls, executions, collapsed, errors, in_flight}}."""
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: flight.stats() for name, flight in sorted(groups.items())}
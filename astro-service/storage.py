@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+"""
+DESTINY — Pluggable Storage Backend
+One interface over natal data, psychology profiles, match results and the
+ranking cache, so the production endpoints can run against Supabase or an
+embedded SQLite file.
+
+Backends:
+  SupabaseStorage — delegates to db_client (pooled client, in-process cache,
+                    write-behind queue)
+  SQLiteStorage   — single-file embedded database (WAL mode). Used for
+                    end-to-end tests, offline benchmarks and small
+                    deployments without Supabase. Also a feature_sync change
+                    source (same fetch_changes / fetch_rows contract).
+
+Selection (environment):
+  DESTINY_STORAGE=supabase          (default)
+  DESTINY_STORAGE=sqlite            → DESTINY_SQLITE_PATH (default ./destiny.db)
+  DESTINY_STORAGE=sqlite:/path/to.db
+
+Usage:
+    from storage import get_storage
+    store = get_storage()
+    natal = store.get_natal_data_many([user_a_id, user_b_id])
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import blob_codec
+from schema import NATAL_COLUMNS, PSYCHOLOGY_FIELDS
+
+# Psychology columns stored as JSON (the rest are plain text)
+_PSYCHOLOGY_JSON = {"psychological_needs", "favorable_elements", "dominant_elements"}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _match_row(user_a_id: str, user_b_id: str, safe_result: dict, raw_result: dict) -> dict:
+    """Same column mapping as db_client.save_match_result."""
+    data = safe_result.get("data", safe_result)
+    return {
+        "user_a_id": user_a_id,
+        "user_b_id": user_b_id,
+        "harmony_score": data.get("harmony_score"),
+        "tension_level": data.get("tension_level"),
+        "badges": data.get("badges", []),
+        "tracks": data.get("tracks", {}),
+        "llm_insight_report": data.get("ai_insight_report", ""),
+        "raw_result": raw_result,
+    }
+
+
+# ── Interface ─────────────────────────────────────────────────────────────────
+
+class StorageBackend(ABC):
+    """Persistence used by /api/users/onboard, /api/matches/compute and /ranking/top-k.
+
+    Row shapes follow db_client: natal rows are {western_chart, bazi_chart,
+    zwds_chart}; psychology rows hold PSYCHOLOGY_FIELDS; match rows hold the
+    matches table columns. Async methods default to running the sync method
+    in a worker thread.
+    """
+
+    # natal data
+    @abstractmethod
+    def upsert_natal_data(self, user_id: str, western_chart: dict,
+                          bazi_chart: dict, zwds_chart: dict) -> None: ...
+
+    @abstractmethod
+    def get_natal_data_many(self, user_ids: Iterable[str]) -> Dict[str, dict]: ...
+
+    def get_natal_data(self, user_id: str) -> Optional[dict]:
+        return self.get_natal_data_many([user_id]).get(user_id)
+
+    # psychology profiles
+    @abstractmethod
+    def upsert_psychology_profile(self, user_id: str, profile: dict) -> None: ...
+
+    @abstractmethod
+    def get_psychology_profiles_many(self, user_ids: Iterable[str]) -> Dict[str, dict]: ...
+
+    def get_psychology_profile(self, user_id: str) -> Optional[dict]:
+        return self.get_psychology_profiles_many([user_id]).get(user_id)
+
+    def get_or_compute_psychology_profiles_many(self, natal_by_user: Dict[str, dict]) -> Dict[str, dict]:
+        """Stored profile per user, computing and saving missing ones ({} on error)."""
+        try:
+            profiles = self.get_psychology_profiles_many(natal_by_user.keys())
+        except Exception:
+            profiles = {}
+        out: Dict[str, dict] = {}
+        for user_id, natal_data in natal_by_user.items():
+            if profiles.get(user_id):
+                out[user_id] = profiles[user_id]
+                continue
+            try:
+                from ideal_avatar import extract_ideal_partner_profile
+                profile = extract_ideal_partner_profile(
+                    natal_data.get("western_chart", {}),
+                    natal_data.get("bazi_chart", {}),
+                    natal_data.get("zwds_chart", {}),
+                )
+                self.upsert_psychology_profile(user_id, profile)
+                out[user_id] = profile
+            except Exception:
+                out[user_id] = {}
+        return out
+
+    # matches
+    @abstractmethod
+    def get_cached_match(self, user_a_id: str, user_b_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def save_match_result(self, user_a_id: str, user_b_id: str,
+                          safe_result: dict, raw_result: dict) -> None: ...
+
+    @abstractmethod
+    def update_match_report(self, user_a_id: str, user_b_id: str, report: str) -> None:
+        """Set llm_insight_report on an already saved match row."""
+
+    # ranking cache
+    @abstractmethod
+    def get_ranking_cache(self, user_id: str) -> Optional[dict]:
+        """{k, results, computed_at (ISO UTC), profile_hash} or None."""
+
+    @abstractmethod
+    def save_ranking_cache(self, user_id: str, k: int, results: list,
+                           profile_hash: Optional[str] = None) -> None: ...
+
+    def get_ranking(self, user_id: str, k: int, max_age: Optional[float] = None,
+                    profile_hash: Optional[str] = None) -> Optional[list]:
+        """Cached top-k for user_id if it covers k entries and is younger than max_age seconds.
+
+        With profile_hash, a ranking computed for a different profile is a miss.
+        """
+        cached = self.get_ranking_cache(user_id)
+        if not cached or cached["k"] < k:
+            return None
+        if profile_hash is not None and cached.get("profile_hash") != profile_hash:
+            return None
+        if max_age is not None:
+            computed = datetime.fromisoformat(str(cached["computed_at"]).replace("Z", "+00:00"))
+            if (datetime.now(timezone.utc) - computed).total_seconds() > max_age:
+                return None
+        return list(cached["results"])[:k]
+
+    # async variants
+    async def aget_natal_data_many(self, user_ids: Iterable[str]) -> Dict[str, dict]:
+        return await asyncio.to_thread(self.get_natal_data_many, list(user_ids))
+
+    async def aget_cached_match(self, user_a_id: str, user_b_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.get_cached_match, user_a_id, user_b_id)
+
+    def close(self) -> None:
+        pass
+
+
+# ── Supabase ──────────────────────────────────────────────────────────────────
+
+class SupabaseStorage(StorageBackend):
+    """Production backend — thin delegation to db_client."""
+
+    def __init__(self) -> None:
+        import db_client
+        self._db = db_client
+        # Started here rather than at app startup so cold start never imports
+        # db_client (supabase / httpx) unless Supabase storage is in use.
+        db_client.start_write_behind()
+
+    def upsert_natal_data(self, user_id, western_chart, bazi_chart, zwds_chart) -> None:
+        self._db.upsert_natal_data(user_id, western_chart, bazi_chart, zwds_chart)
+
+    def get_natal_data(self, user_id):
+        return self._db.get_natal_data(user_id)
+
+    def get_natal_data_many(self, user_ids):
+        return self._db.get_natal_data_many(user_ids)
+
+    def upsert_psychology_profile(self, user_id, profile) -> None:
+        self._db.upsert_psychology_profile(user_id, profile)
+
+    def get_psychology_profile(self, user_id):
+        return self._db.get_psychology_profile(user_id)
+
+    def get_psychology_profiles_many(self, user_ids):
+        return self._db.get_psychology_profiles_many(user_ids)
+
+    def get_or_compute_psychology_profiles_many(self, natal_by_user):
+        return self._db.get_or_compute_psychology_profiles_many(natal_by_user)
+
+    def get_cached_match(self, user_a_id, user_b_id):
+        return self._db.get_cached_match(user_a_id, user_b_id)
+
+    def save_match_result(self, user_a_id, user_b_id, safe_result, raw_result) -> None:
+        self._db.save_match_result(user_a_id, user_b_id, safe_result, raw_result)
+
+    def update_match_report(self, user_a_id, user_b_id, report) -> None:
+        self._db.update_match_report(user_a_id, user_b_id, report)
+
+    def get_ranking_cache(self, user_id):
+        return self._db.get_ranking_cache(user_id)
+
+    def save_ranking_cache(self, user_id, k, results, profile_hash=None) -> None:
+        self._db.save_ranking_cache(user_id, k, results, profile_hash)
+
+    async def aget_natal_data_many(self, user_ids):
+        return await self._db.aget_natal_data_many(user_ids)
+
+    async def aget_cached_match(self, user_a_id, user_b_id):
+        return await self._db.aget_cached_match(user_a_id, user_b_id)
+
+
+# ── SQLite ────────────────────────────────────────────────────────────────────
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_natal_data (
+    user_id       TEXT PRIMARY KEY,
+    western_chart TEXT NOT NULL DEFAULT '{}',
+    bazi_chart    TEXT NOT NULL DEFAULT '{}',
+    zwds_chart    TEXT NOT NULL DEFAULT '{}',
+    updated_at    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_psychology_profiles (
+    user_id              TEXT PRIMARY KEY,
+    relationship_dynamic TEXT,
+    psychological_needs  TEXT,
+    favorable_elements   TEXT,
+    dominant_elements    TEXT,
+    karmic_boss          TEXT,
+    llm_natal_report     TEXT,
+    attachment_style     TEXT,
+    updated_at           TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    user_a_id          TEXT NOT NULL,
+    user_b_id          TEXT NOT NULL,
+    harmony_score      INTEGER,
+    tension_level      INTEGER,
+    badges             TEXT DEFAULT '[]',
+    tracks             TEXT DEFAULT '{}',
+    llm_insight_report TEXT,
+    raw_result         TEXT DEFAULT '{}',
+    created_at         TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_matches_pair ON matches(user_a_id, user_b_id);
+CREATE INDEX IF NOT EXISTS idx_matches_user_b ON matches(user_b_id, user_a_id);
+CREATE TABLE IF NOT EXISTS ranking_cache (
+    user_id     TEXT PRIMARY KEY,
+    k           INTEGER NOT NULL,
+    results     TEXT NOT NULL DEFAULT '[]',
+    profile_hash TEXT,
+    computed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_natal_updated_at ON user_natal_data(updated_at, user_id);
+CREATE INDEX IF NOT EXISTS idx_psychology_updated_at ON user_psychology_profiles(updated_at, user_id);
+"""
+
+_MATCH_SELECT = ("user_a_id, user_b_id, harmony_score, tension_level, badges, tracks, "
+                 "llm_insight_report, created_at")
+_MATCH_JSON = ("badges", "tracks")
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER is 999 on older builds
+_IN_CHUNK = 500
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _loads(value):
+    """Column value → object: compressed blobs decode lazily, text is JSON."""
+    if isinstance(value, bytes):
+        return blob_codec.decode_blob(value)
+    return json.loads(value) if value is not None else None
+
+
+class SQLiteStorage(StorageBackend):
+    """Embedded backend on a single SQLite file (":memory:" for a throwaway store).
+
+    One connection shared across threads behind a lock; WAL mode lets other
+    processes read the file while this one writes.
+
+    blob_encoding: store charts and raw_result as blob_codec blobs (SQLite
+                   BLOB values in the same columns). Defaults to
+                   DESTINY_BLOB_ENCODING; rows written either way stay readable.
+    """
+
+    def __init__(self, path: str = "destiny.db", blob_encoding: Optional[bool] = None) -> None:
+        self.path = path
+        self.blob_encoding = blob_codec.enabled() if blob_encoding is None else blob_encoding
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SQLITE_SCHEMA)
+        self._last_ts = ""
+
+    def _stamp(self) -> str:
+        """Strictly increasing updated_at so feature_sync watermarks never tie."""
+        with self._lock:
+            ts = _now()
+            if ts <= self._last_ts:
+                last = datetime.fromisoformat(self._last_ts)
+                ts = (last + timedelta(microseconds=1)).isoformat(timespec="microseconds")
+            self._last_ts = ts
+            return ts
+
+    def _rows(self, sql: str, params: Iterable = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def _select_many(self, table: str, columns: Iterable[str], user_ids: Iterable[str]) -> List[sqlite3.Row]:
+        ids = list(dict.fromkeys(user_ids))
+        out: List[sqlite3.Row] = []
+        for i in range(0, len(ids), _IN_CHUNK):
+            chunk = ids[i:i + _IN_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            out.extend(self._rows(
+                f"SELECT user_id, {', '.join(columns)} FROM {table} WHERE user_id IN ({marks})", chunk))
+        return out
+
+    # natal data
+    def upsert_natal_data(self, user_id, western_chart, bazi_chart, zwds_chart) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO user_natal_data (user_id, western_chart, bazi_chart, zwds_chart, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+                "western_chart=excluded.western_chart, bazi_chart=excluded.bazi_chart, "
+                "zwds_chart=excluded.zwds_chart, updated_at=excluded.updated_at",
+                (user_id, self._pack(western_chart), self._pack(bazi_chart),
+                 self._pack(zwds_chart), self._stamp()),
+            )
+
+    def _pack(self, value):
+        """Large JSON document → blob (if enabled) or JSON text."""
+        if self.blob_encoding and isinstance(value, dict):
+            return blob_codec.encode_blob(value)
+        return _dumps(value)
+
+    @staticmethod
+    def _natal_from_row(row: sqlite3.Row) -> dict:
+        return {c: _loads(row[c]) for c in NATAL_COLUMNS}
+
+    def get_natal_data_many(self, user_ids):
+        return {r["user_id"]: self._natal_from_row(r)
+                for r in self._select_many("user_natal_data", NATAL_COLUMNS, user_ids)}
+
+    # psychology profiles
+    def upsert_psychology_profile(self, user_id, profile) -> None:
+        fields = [f for f in PSYCHOLOGY_FIELDS if f in profile]
+        values = [_dumps(profile[f]) if f in _PSYCHOLOGY_JSON else profile[f] for f in fields]
+        cols = ["user_id", *fields, "updated_at"]
+        updates = ", ".join(f"{c}=excluded.{c}" for c in cols[1:])
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO user_psychology_profiles ({', '.join(cols)}) "
+                f"VALUES ({','.join('?' * len(cols))}) "
+                f"ON CONFLICT(user_id) DO UPDATE SET {updates}",
+                (user_id, *values, self._stamp()),
+            )
+
+    @staticmethod
+    def _psychology_from_row(row: sqlite3.Row) -> dict:
+        out = {}
+        for f in PSYCHOLOGY_FIELDS:
+            value = row[f]
+            out[f] = json.loads(value) if f in _PSYCHOLOGY_JSON and value is not None else value
+        return out
+
+    def get_psychology_profiles_many(self, user_ids):
+        return {r["user_id"]: self._psychology_from_row(r)
+                for r in self._select_many("user_psychology_profiles", PSYCHOLOGY_FIELDS, user_ids)}
+
+    # matches
+    def get_cached_match(self, user_a_id, user_b_id):
+        rows = self._rows(
+            f"SELECT {_MATCH_SELECT} FROM matches "
+            "WHERE (user_a_id = ? AND user_b_id = ?) OR (user_a_id = ? AND user_b_id = ?) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (user_a_id, user_b_id, user_b_id, user_a_id),
+        )
+        if not rows:
+            return None
+        match = dict(rows[0])
+        for c in _MATCH_JSON:
+            match[c] = json.loads(match[c]) if match[c] is not None else None
+        return match
+
+    def get_raw_result(self, user_a_id: str, user_b_id: str) -> Optional[dict]:
+        """Backend-only compute_match_v2 archive for the pair (A→B as stored)."""
+        rows = self._rows("SELECT raw_result FROM matches WHERE user_a_id = ? AND user_b_id = ?",
+                          (user_a_id, user_b_id))
+        return _loads(rows[0]["raw_result"]) if rows else None
+
+    def save_match_result(self, user_a_id, user_b_id, safe_result, raw_result) -> None:
+        row = _match_row(user_a_id, user_b_id, safe_result, raw_result)
+        for c in _MATCH_JSON:
+            row[c] = _dumps(row[c])
+        row["raw_result"] = self._pack(row["raw_result"])
+        row["created_at"] = _now()
+        cols = list(row)
+        updates = ", ".join(f"{c}=excluded.{c}" for c in cols[2:])
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO matches ({', '.join(cols)}) VALUES ({','.join('?' * len(cols))}) "
+                f"ON CONFLICT(user_a_id, user_b_id) DO UPDATE SET {updates}",
+                tuple(row.values()),
+            )
+
+    def update_match_report(self, user_a_id, user_b_id, report) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE matches SET llm_insight_report = ? WHERE user_a_id = ? AND user_b_id = ?",
+                (report, user_a_id, user_b_id),
+            )
+
+    # ranking cache
+    def get_ranking_cache(self, user_id):
+        rows = self._rows("SELECT k, results, profile_hash, computed_at FROM ranking_cache "
+                          "WHERE user_id = ?", (user_id,))
+        if not rows:
+            return None
+        return {"k": rows[0]["k"], "results": json.loads(rows[0]["results"]),
+                "profile_hash": rows[0]["profile_hash"], "computed_at": rows[0]["computed_at"]}
+
+    def save_ranking_cache(self, user_id, k, results, profile_hash=None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO ranking_cache (user_id, k, results, profile_hash, computed_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET k=excluded.k, results=excluded.results, "
+                "profile_hash=excluded.profile_hash, computed_at=excluded.computed_at",
+                (user_id, k, _dumps(results), profile_hash, _now()),
+            )
+
+    # feature_sync change source
+    def fetch_changes(self, table: str, watermark: Optional[dict], limit: int) -> List[dict]:
+        columns = NATAL_COLUMNS if table == "user_natal_data" else PSYCHOLOGY_FIELDS
+        sql = f"SELECT user_id, {', '.join(columns)}, updated_at FROM {table}"
+        params: list = []
+        if watermark:
+            sql += " WHERE (updated_at, user_id) > (?, ?)"
+            params += [watermark["updated_at"], watermark["user_id"]]
+        sql += " ORDER BY updated_at, user_id LIMIT ?"
+        params.append(limit)
+        return [self._change_row(table, r) for r in self._rows(sql, params)]
+
+    def fetch_rows(self, table: str, user_ids: Iterable[str]) -> List[dict]:
+        columns = NATAL_COLUMNS if table == "user_natal_data" else PSYCHOLOGY_FIELDS
+        return [self._change_row(table, r)
+                for r in self._select_many(table, (*columns, "updated_at"), user_ids)]
+
+    def _change_row(self, table: str, row: sqlite3.Row) -> dict:
+        body = self._natal_from_row(row) if table == "user_natal_data" else self._psychology_from_row(row)
+        return {"user_id": row["user_id"], **body, "updated_at": row["updated_at"]}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ── Selection ─────────────────────────────────────────────────────────────────
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+
+def storage_from_env() -> StorageBackend:
+    """Build the backend named by DESTINY_STORAGE (see module docstring)."""
+    kind = os.environ.get("DESTINY_STORAGE", "supabase").strip()
+    if kind == "supabase" or not kind:
+        return SupabaseStorage()
+    if kind == "sqlite" or kind.startswith("sqlite:"):
+        path = kind[len("sqlite:"):] if ":" in kind else ""
+        return SQLiteStorage(path or os.environ.get("DESTINY_SQLITE_PATH", "destiny.db"))
+    raise ValueError(f"Unknown DESTINY_STORAGE: {kind!r}")
+
+
+def get_storage() -> StorageBackend:
+    """Process-wide storage backend (created from the environment on first use)."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = storage_from_env()
+    return _storage
+
+
+def set_storage(backend: Optional[StorageBackend]) -> Optional[StorageBackend]:
+    """Swap the process-wide backend (tests, load harnesses); returns the previous one."""
+    global _storage
+    with _storage_lock:
+        previous, _storage = _storage, backend
+    return previous
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Tests for admission.py — per-endpoint concurrency limits, priority classes, 429 shedding."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import admission
+import main
+from admission import (
+    BATCH, INTERACTIVE, AdmissionController, AdmissionPool, AdmissionRejected, priority_of,
+)
+
+
+def test_priority_header_mapping():
+    assert priority_of(None) == INTERACTIVE
+    assert priority_of("interactive") == INTERACTIVE
+    assert priority_of(" Batch ") == BATCH
+    assert priority_of("cron") == BATCH
+
+
+def test_routes_map_paths_to_pools():
+    ctl = AdmissionController({"compute": AdmissionPool("compute", 1), "llm": AdmissionPool("llm", 1)})
+    assert ctl.pool_for("/compute-enriched").name == "compute"
+    assert ctl.pool_for("/compute-match").name == "compute"
+    assert ctl.pool_for("/generate-profile-card/stream").name == "llm"
+    assert ctl.pool_for("/calculate-chart") is None
+
+
+def test_waiter_gets_slot_on_release_and_full_queue_is_rejected():
+    pool = AdmissionPool("p", concurrency=1, queue=1)
+
+    async def run():
+        await pool.acquire()
+        waiting = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.01)
+        assert pool.stats()["queued"][INTERACTIVE] == 1
+        with pytest.raises(AdmissionRejected) as rejected:
+            await pool.acquire()
+        assert rejected.value.reason == "queue full" and rejected.value.retry_after >= 1
+        pool.release(service_time=0.01)
+        await asyncio.wait_for(waiting, 1)
+        pool.release()
+
+    asyncio.run(run())
+    stats = pool.stats()
+    assert stats["active"] == {INTERACTIVE: 0, BATCH: 0}
+    assert stats[INTERACTIVE]["admitted"] == 2 and stats[INTERACTIVE]["rejected"] == 1
+
+
+def test_queue_wait_expires_with_rejection():
+    pool = AdmissionPool("p", concurrency=1, queue=4, max_wait=0.05)
+
+    async def run():
+        await pool.acquire()
+        with pytest.raises(AdmissionRejected, match="wait expired"):
+            await pool.acquire()
+        pool.release()
+        await pool.acquire()                      # the expired waiter left no slot behind
+        pool.release()
+
+    asyncio.run(run())
+    assert pool.stats()["queued"][INTERACTIVE] == 0
+
+
+def test_batch_is_capped_so_interactive_keeps_headroom():
+    pool = AdmissionPool("p", concurrency=2, queue=4, batch_share=0.5, max_wait=0.05)
+
+    async def run():
+        await pool.acquire(BATCH)
+        with pytest.raises(AdmissionRejected):
+            await pool.acquire(BATCH)              # batch share (1 slot) used up
+        await asyncio.wait_for(pool.acquire(INTERACTIVE), 0.01)
+
+    asyncio.run(run())
+    assert pool.stats()["active"] == {INTERACTIVE: 1, BATCH: 1}
+
+
+def test_queued_interactive_requests_jump_ahead_of_batch():
+    pool = AdmissionPool("p", concurrency=1, queue=8, batch_share=1.0)
+    order = []
+
+    async def worker(priority, tag):
+        await pool.acquire(priority)
+        order.append(tag)
+        await asyncio.sleep(0.01)
+        pool.release(priority)
+
+    async def run():
+        await pool.acquire(INTERACTIVE)
+        tasks = [asyncio.create_task(worker(BATCH, "b1")),
+                 asyncio.create_task(worker(BATCH, "b2"))]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(worker(INTERACTIVE, "i1")))
+        await asyncio.sleep(0.01)
+        pool.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["i1", "b1", "b2"]
+
+
+# ── middleware ───────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def slow_compute(monkeypatch):
+    gate = threading.Event()
+    entered = threading.Event()
+
+    def blocking(a, b, deadline=None):
+        entered.set()
+        gate.wait(5)
+        return {"lust_score": 1}
+
+    monkeypatch.setattr(main, "compute_match_v2", blocking)
+    ctl = AdmissionController({"compute": AdmissionPool("compute", 2, queue=0, max_wait=0.1)})
+    previous = admission.set_controller(ctl)
+    yield ctl, gate, entered
+    gate.set()
+    admission.set_controller(previous)
+
+
+def _post(client, priority=None):
+    headers = {"X-Destiny-Priority": priority} if priority else {}
+    return client.post("/compute-match", json={"user_a": {}, "user_b": {}}, headers=headers)
+
+
+def test_saturated_pool_returns_fast_429_with_retry_after(slow_compute):
+    ctl, gate, entered = slow_compute
+    client = TestClient(main.app)
+    with ThreadPoolExecutor(2) as pool:
+        running = [pool.submit(_post, client), pool.submit(_post, client)]
+        while ctl.pools["compute"].stats()["active"][INTERACTIVE] < 2:
+            time.sleep(0.005)
+        started = time.monotonic()
+        resp = _post(client)
+        assert time.monotonic() - started < 1
+        assert resp.status_code == 429
+        assert int(resp.headers["retry-after"]) >= 1
+        assert client.get("/health").status_code == 200         # unpooled path unaffected
+        gate.set()
+        assert all(f.result().status_code == 200 for f in running)
+    assert client.get("/health/admission").json()["compute"][INTERACTIVE]["rejected"] == 1
+
+
+def test_batch_traffic_cannot_starve_interactive(slow_compute):
+    ctl, gate, entered = slow_compute
+    client = TestClient(main.app)
+    with ThreadPoolExecutor(2) as pool:
+        batch = pool.submit(_post, client, "cron")
+        entered.wait(5)
+        assert _post(client, "batch").status_code == 429       # batch share exhausted
+        interactive = pool.submit(_post, client)
+        while ctl.pools["compute"].stats()["active"][INTERACTIVE] < 1:
+            time.sleep(0.005)
+        gate.set()
+        assert interactive.result().status_code == 200
+        assert batch.result().status_code == 200
+
+
+def test_disabled_by_env(slow_compute, monkeypatch):
+    ctl, gate, _ = slow_compute
+    gate.set()
+    monkeypatch.setenv("DESTINY_ADMISSION", "0")
+    assert _post(TestClient(main.app)).status_code == 200
+    assert ctl.pools["compute"].stats()[INTERACTIVE]["admitted"] == 0
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Tests for benchmarks.py — suite coverage, baseline comparison, thresholds."""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import benchmarks
+
+ENGINES = ["calculate_chart", "calculate_bazi", "compute_zwds_chart", "compute_match_v2",
+           "compute_quick_score", "compute_shadow_and_wound", "extract_ideal_partner_profile",
+           "prompt.match_report", "prompt.simple_report", "prompt.profile",
+           "prompt.ideal_match", "prompt.synastry_report", "destiny_pipeline"]
+
+
+@pytest.fixture(scope="module")
+def cases():
+    return benchmarks.build_cases()
+
+
+def test_suite_covers_every_engine_and_tier(cases):
+    for engine in ENGINES:
+        tiers = (1,) if engine == "compute_zwds_chart" else (1, 2, 3)
+        for tier in tiers:
+            assert f"{engine}[t{tier}]" in cases
+
+
+def test_every_case_runs(cases):
+    for name, fn in cases.items():
+        assert fn() is not None, name
+
+
+def test_committed_baseline_covers_the_suite(cases):
+    baseline = benchmarks.load_baseline()
+    assert baseline is not None
+    assert set(cases) <= set(baseline["cases"])
+
+
+def _result(relative: dict) -> dict:
+    return {"calibration_us": 100.0, "threshold": 0.25,
+            "cases": {k: {"median_us": v * 100, "min_us": v * 100, "relative": v}
+                      for k, v in relative.items()}}
+
+
+def test_compare_uses_relative_cost_and_thresholds():
+    baseline = _result({"fast": 1.0, "slow": 1.0, "loose": 1.0})
+    baseline["cases"]["loose"]["threshold"] = 1.0
+    current = _result({"fast": 1.1, "slow": 1.5, "loose": 1.5, "new": 9.0})
+    by_name = {c.name: c for c in benchmarks.compare(current, baseline)}
+    assert set(by_name) == {"fast", "slow", "loose"}          # new cases are not gated
+    assert not by_name["fast"].regressed
+    assert by_name["slow"].regressed and by_name["slow"].ratio == 1.5
+    assert not by_name["loose"].regressed                    # per-case threshold wins
+    assert not benchmarks.compare(current, baseline, threshold=0.6)[1].regressed
+
+
+def test_measure_reports_cost_relative_to_calibration(monkeypatch):
+    clock = {"now": 0.0}
+
+    def costs(seconds):
+        def fn():
+            clock["now"] += seconds
+            return seconds
+        return fn
+
+    monkeypatch.setattr(benchmarks, "time", SimpleNamespace(perf_counter=lambda: clock["now"]))
+    monkeypatch.setattr(benchmarks, "_calibration", costs(10e-6))
+    base = benchmarks.measure(costs(10e-6), min_time=0.05)
+    now = benchmarks.measure(costs(25e-6), min_time=0.05)
+    assert base.min_us == pytest.approx(10.0) and base.relative == pytest.approx(1.0)
+    assert now.min_us == pytest.approx(25.0) and now.relative == pytest.approx(2.5)
+    current = {"cases": {"c": {"min_us": now.min_us, "relative": now.relative}}}
+    baseline = {"threshold": 0.25, "cases": {"c": {"min_us": base.min_us, "relative": base.relative}}}
+    assert benchmarks.compare(current, baseline)[0].regressed
+
+
+def test_save_baseline_keeps_thresholds(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    previous = _result({"a": 1.0})
+    previous["threshold"] = 0.4
+    previous["cases"]["a"]["threshold"] = 0.8
+    benchmarks.save_baseline(_result({"a": 2.0}), path, previous=previous)
+    saved = benchmarks.load_baseline(path)
+    assert saved["threshold"] == 0.4
+    assert saved["cases"]["a"] == {"median_us": 200.0, "min_us": 200.0, "relative": 2.0,
+                                   "threshold": 0.8}
+
+
+@pytest.mark.skipif(os.environ.get("DESTINY_BENCH") != "1",
+                    reason="set DESTINY_BENCH=1 to gate on the committed baseline")
+def test_no_regressions_against_baseline(cases):
+    baseline = benchmarks.load_baseline()
+    current = benchmarks.run(cases)
+    regressed = [c for c in benchmarks.recheck(cases, current, baseline, benchmarks.env_threshold())
+                 if c.regressed]
+    assert not regressed, regressed
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Tests for blob_codec.py — versioned compressed blobs with lazy decode."""
+import json
+
+import pytest
+
+import blob_codec
+from blob_codec import LazyBlob, decode_blob, encode_blob, from_bytea, to_bytea
+from chart import calculate_chart
+from feature_store import flatten_natal
+from matching import compute_match_v2
+
+
+@pytest.fixture(scope="module")
+def charts():
+    a = calculate_chart(birth_date="1995-06-15", birth_time="precise",
+                        birth_time_exact="14:30", data_tier=1)
+    b = calculate_chart(birth_date="1997-03-07")
+    return a, b
+
+
+def _json_round_trip(obj):
+    return json.loads(json.dumps(obj, ensure_ascii=False))
+
+
+def test_round_trip_equals_jsonb_semantics(charts):
+    western, _ = charts
+    decoded = decode_blob(encode_blob(western))
+    assert isinstance(decoded, LazyBlob)
+    assert decoded.to_dict() == _json_round_trip(western)
+
+
+def test_raw_result_round_trip_and_smaller_than_json(charts):
+    a, b = charts
+    raw = compute_match_v2(
+        flatten_natal({"western_chart": a, "bazi_chart": a["bazi"]}),
+        flatten_natal({"western_chart": b, "bazi_chart": b["bazi"]}),
+    )
+    blob = encode_blob(raw)
+    assert decode_blob(blob) == _json_round_trip(raw)
+    assert len(blob) < len(json.dumps(raw, ensure_ascii=False).encode("utf-8"))
+
+
+def test_chart_blob_is_less_than_half_of_json(charts):
+    western, _ = charts
+    assert len(encode_blob(western)) < len(json.dumps(western, ensure_ascii=False).encode("utf-8")) / 2
+
+
+def test_decode_is_lazy_per_field(charts):
+    western, _ = charts
+    decoded = decode_blob(encode_blob(western))
+    assert decoded.decoded_fields == []
+    assert decoded["sun_sign"] == western["sun_sign"]
+    assert decoded.decoded_fields == ["sun_sign"]
+    assert "bazi" in decoded and "bazi" not in decoded.decoded_fields
+
+
+def test_header_and_version():
+    blob = encode_blob({"a": 1})
+    assert blob[:3] == b"DSB" and blob[3] == blob_codec.VERSION
+    assert blob[4] == blob_codec.CODEC_ZSTD
+    with pytest.raises(ValueError):
+        decode_blob(b"DSB\x09\x01" + blob[5:])
+    with pytest.raises(ValueError):
+        decode_blob(b"{}")
+
+
+def test_non_string_keys_follow_json():
+    data = {"houses": {1: "aries", 2: "taurus"}, "pair": (1, 2)}
+    assert decode_blob(encode_blob(data)).to_dict() == {"houses": {"1": "aries", "2": "taurus"}, "pair": [1, 2]}
+
+
+def test_legacy_json_passes_through():
+    assert decode_blob({"sun_sign": "leo"}) == {"sun_sign": "leo"}
+    assert decode_blob(None) is None
+
+
+def test_bytea_hex_transport():
+    blob = encode_blob({"x": [1.5, "火"]})
+    assert blob_codec.is_blob(to_bytea(blob))
+    assert from_bytea(to_bytea(blob)) == blob
+    assert decode_blob(to_bytea(blob))["x"] == [1.5, "火"]
+
+
+def test_reencode_lazy_blob_without_decoding():
+    lazy = decode_blob(encode_blob({"a": {"deep": 1}, "b": 2}))
+    again = decode_blob(encode_blob(lazy))
+    assert lazy.decoded_fields == []
+    assert again == {"a": {"deep": 1}, "b": 2}
+
+
+def test_column_helpers():
+    row = {"user_id": "u", "western_chart": {"sun_sign": "leo"}}
+    blob_codec.encode_columns(row, ("western_chart", "bazi_chart"))
+    assert row["western_chart"] == {} and row["western_chart_blob"].startswith("\\x")
+    blob_codec.decode_columns(row, ("western_chart", "bazi_chart"))
+    assert row["western_chart"] == {"sun_sign": "leo"} and "western_chart_blob" not in row
+
+
+def test_enabled_flag(monkeypatch):
+    monkeypatch.setenv("DESTINY_BLOB_ENCODING", "1")
+    assert blob_codec.enabled()
+    monkeypatch.setenv("DESTINY_BLOB_ENCODING", "0")
+    assert not blob_codec.enabled()
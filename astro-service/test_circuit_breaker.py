@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Tests for circuit_breaker.py — closed / open / half-open state machine."""
+import time
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def _fail(breaker, n=1):
+    for _ in range(n):
+        breaker.before_call()
+        breaker.record_failure(RuntimeError("down"))
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("p", failure_threshold=3, reset_timeout=60)
+    _fail(breaker, 2)
+    breaker.before_call()
+    breaker.record_success()            # success resets the streak
+    _fail(breaker, 2)
+    assert breaker.state == CLOSED
+    _fail(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.before_call()
+    assert 0 < exc.value.retry_after <= 60
+    snap = breaker.snapshot()
+    assert snap["opened"] == 1 and snap["rejected"] == 1 and snap["last_failure"]
+
+
+def test_half_open_trial_closes_on_success():
+    breaker = CircuitBreaker("p", failure_threshold=1, reset_timeout=0.05, half_open_calls=1)
+    _fail(breaker)
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()               # the single trial slot
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = CircuitBreaker("p", failure_threshold=1, reset_timeout=0.05)
+    _fail(breaker)
+    time.sleep(0.06)
+    _fail(breaker)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["opened"] == 2
+
+
+def test_release_frees_a_trial_slot():
+    breaker = CircuitBreaker("p", failure_threshold=1, reset_timeout=0.05)
+    _fail(breaker)
+    time.sleep(0.06)
+    breaker.before_call()
+    assert not breaker.allows()
+    breaker.release()
+    assert breaker.allows()
+    breaker.check()
@@ -44,3 +44,307 @@ def test_returns_empty_dict_on_exception():
         from db_client import get_or_compute_psychology_profile
         result = get_or_compute_psychology_profile("user-789", {})
         assert result == {}
+
+
+# ── Bulk fetch + in-process cache ────────────────────────────────────────────
+
+import time
+from unittest.mock import MagicMock
+
+import db_client
+
+
+@pytest.fixture
+def fake_client():
+    db_client.clear_caches()
+    client = MagicMock()
+    with patch("db_client._get_client", return_value=client):
+        yield client
+    db_client.clear_caches()
+
+
+def _natal_row(uid):
+    return {"user_id": uid, "western_chart": {"sun_sign": "aries"},
+            "bazi_chart": {}, "zwds_chart": {}}
+
+
+def test_get_natal_data_many_uses_one_projected_query(fake_client):
+    query = fake_client.table.return_value.select.return_value
+    query.in_.return_value.execute.return_value.data = [_natal_row("a"), _natal_row("b")]
+
+    rows = db_client.get_natal_data_many(["a", "b", "c"])
+    assert set(rows) == {"a", "b"}
+    assert "user_id" not in rows["a"]
+    fake_client.table.return_value.select.assert_called_once_with(
+        "user_id, western_chart, bazi_chart, zwds_chart")
+    query.in_.assert_called_once_with("user_id", ["a", "b", "c"])
+
+    # Second call is served from cache; only the unknown user is refetched
+    query.in_.return_value.execute.return_value.data = []
+    assert set(db_client.get_natal_data_many(["a", "b", "c"])) == {"a", "b"}
+    assert query.in_.call_args[0] == ("user_id", ["c"])
+
+
+def test_get_natal_data_many_chunks_large_batches(fake_client):
+    query = fake_client.table.return_value.select.return_value
+    query.in_.return_value.execute.return_value.data = []
+    db_client.get_natal_data_many([f"u{i}" for i in range(500)])
+    assert query.in_.call_count == 3
+
+
+def test_single_get_is_cached_and_invalidated(fake_client):
+    single = fake_client.table.return_value.select.return_value.eq.return_value.maybe_single.return_value
+    single.execute.return_value.data = {"western_chart": {}, "bazi_chart": {}, "zwds_chart": {}}
+    assert db_client.get_natal_data("a") is not None
+    assert db_client.get_natal_data("a") is not None
+    assert single.execute.call_count == 1
+    db_client.invalidate_users(["a"])
+    db_client.get_natal_data("a")
+    assert single.execute.call_count == 2
+
+
+def test_upsert_natal_writes_through_cache(fake_client):
+    db_client.upsert_natal_data("a", {"sun_sign": "leo"}, {}, {})
+    assert db_client.get_natal_data("a")["western_chart"] == {"sun_sign": "leo"}
+    fake_client.table.return_value.select.assert_not_called()
+
+
+def test_psychology_upsert_invalidates_cache(fake_client):
+    single = fake_client.table.return_value.select.return_value.eq.return_value.maybe_single.return_value
+    single.execute.return_value.data = {"attachment_style": "secure"}
+    db_client.get_psychology_profile("a")
+    db_client.upsert_psychology_profile("a", {"llm_natal_report": "hi"})
+    db_client.get_psychology_profile("a")
+    assert single.execute.call_count == 2
+    assert "*" not in fake_client.table.return_value.select.call_args[0][0]
+
+
+def test_ttl_expiry():
+    cache = db_client._TTLCache(ttl=0.01, maxsize=10)
+    cache.set("a", {"x": 1})
+    assert cache.get("a") == {"x": 1}
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_lru_bound():
+    cache = db_client._TTLCache(ttl=60, maxsize=2)
+    for k in "abc":
+        cache.set(k, {})
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 2
+
+
+def test_get_or_compute_many_computes_only_missing(fake_client):
+    fake_profile = {"relationship_dynamic": "stable"}
+    with patch("db_client.get_psychology_profiles_many", return_value={"a": {"karmic_boss": "Pluto"}}), \
+         patch("db_client.upsert_psychology_profile") as mock_upsert, \
+         patch("ideal_avatar.extract_ideal_partner_profile", return_value=fake_profile):
+        out = db_client.get_or_compute_psychology_profiles_many({"a": {}, "b": {}})
+    assert out == {"a": {"karmic_boss": "Pluto"}, "b": fake_profile}
+    mock_upsert.assert_called_once_with("b", fake_profile)
+
+
+def test_get_cached_match_checks_both_directions_with_bound_filters(fake_client):
+    select = fake_client.table.return_value.select.return_value
+    chain = select.eq.return_value.eq.return_value.order.return_value.limit.return_value
+    chain.execute.return_value.data = []
+    assert db_client.get_cached_match("a", "b") is None
+    assert [c.args for c in select.eq.call_args_list] == [("user_a_id", "a"), ("user_a_id", "b")]
+    select.or_.assert_not_called()
+
+    hostile = "x),or(user_a_id.neq.0"
+    chain.execute.return_value.data = [{"harmony_score": 80}]
+    assert db_client.get_cached_match(hostile, "b") == {"harmony_score": 80}
+    assert select.eq.call_args_list[-1].args == ("user_a_id", hostile)   # passed as a bound value
+    select.or_.assert_not_called()
+
+
+# ── Pooled client ────────────────────────────────────────────────────────────
+
+import asyncio
+
+import httpx
+
+
+@pytest.fixture
+def supabase_env(monkeypatch):
+    monkeypatch.setenv("NEXT_PUBLIC_SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "service-role-key")
+    monkeypatch.setenv("DESTINY_DB_POOL_SIZE", "7")
+    db_client.close_clients()
+    yield
+    asyncio.run(db_client.aclose_clients())
+
+
+def test_client_is_created_once_and_pooled(supabase_env):
+    client = db_client._get_client()
+    assert db_client._get_client() is client
+    pool = db_client._http._transport._pool
+    assert pool._max_connections == 7
+    assert db_client.pool_stats()["sync"]["max_connections"] == 7
+
+
+def test_async_client_is_reused_within_loop(supabase_env):
+    async def run():
+        first = await db_client.get_async_client()
+        return first, await db_client.get_async_client()
+
+    first, second = asyncio.run(run())
+    assert first is second
+    assert db_client.pool_stats()["async"]["in_flight"] == 0
+
+
+def test_async_client_is_created_once_per_loop(supabase_env):
+    loops = []
+
+    async def run():
+        loops.append(asyncio.get_running_loop())     # keep the loop alive after it closes
+        clients = await asyncio.gather(*(db_client.get_async_client() for _ in range(5)))
+        return set(map(id, clients))
+
+    assert len(asyncio.run(run())) == 1
+    asyncio.run(run())
+    assert list(db_client._async_clients) == [loops[1]]   # the closed loop's pool was dropped
+
+
+def test_metered_transport_tracks_in_flight_until_close():
+    metrics = db_client.PoolMetrics(max_connections=2)
+    transport = db_client._MeteredTransport(metrics)
+    with patch.object(httpx.HTTPTransport, "handle_request",
+                      return_value=httpx.Response(200, stream=httpx.ByteStream(b"[]"))):
+        response = transport.handle_request(httpx.Request("GET", "https://x/rest"))
+        assert metrics.snapshot()["in_flight"] == 1
+        assert metrics.snapshot()["saturation"] == 0.5
+        response.read()
+        response.close()
+    snap = metrics.snapshot()
+    assert snap["in_flight"] == 0 and snap["requests"] == 1 and snap["peak_in_flight"] == 1
+
+
+def test_metered_transport_counts_pool_timeouts():
+    metrics = db_client.PoolMetrics(max_connections=1)
+    transport = db_client._MeteredTransport(metrics)
+    with patch.object(httpx.HTTPTransport, "handle_request",
+                      side_effect=httpx.PoolTimeout("pool exhausted")):
+        with pytest.raises(httpx.PoolTimeout):
+            transport.handle_request(httpx.Request("GET", "https://x/rest"))
+    assert metrics.snapshot()["pool_timeouts"] == 1
+    assert metrics.snapshot()["in_flight"] == 0
+
+
+def test_missing_credentials_raise(monkeypatch):
+    for var in ("NEXT_PUBLIC_SUPABASE_URL", "SUPABASE_URL",
+                "SUPABASE_SERVICE_ROLE_KEY", "SUPABASE_SERVICE_KEY"):
+        monkeypatch.delenv(var, raising=False)
+    db_client.close_clients()
+    with pytest.raises(RuntimeError):
+        db_client._get_client()
+
+
+# ── Write-behind queue ───────────────────────────────────────────────────────
+
+class _RecordingWriter:
+    def __init__(self, fail_times=0):
+        self.calls = []
+        self.fail_times = fail_times
+
+    def __call__(self, table, rows, on_conflict):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("supabase down")
+        self.calls.append((table, [dict(r) for r in rows], on_conflict))
+
+
+def test_write_behind_coalesces_per_key():
+    writer = _RecordingWriter()
+    queue = db_client.WriteBehindQueue(writer)
+    queue.enqueue("user_psychology_profiles", "u1", {"user_id": "u1", "karmic_boss": "Pluto"})
+    queue.enqueue("user_psychology_profiles", "u1", {"user_id": "u1", "llm_natal_report": "hi"})
+    assert len(queue) == 1
+    assert queue.flush() == 1
+    assert writer.calls == [("user_psychology_profiles",
+                             [{"user_id": "u1", "karmic_boss": "Pluto", "llm_natal_report": "hi"}], "")]
+    assert queue.stats()["coalesced"] == 1
+
+
+def test_write_behind_groups_multi_row_upserts_by_columns():
+    writer = _RecordingWriter()
+    queue = db_client.WriteBehindQueue(writer, max_batch=2)
+    for uid in ("a", "b", "c"):
+        queue.enqueue("user_natal_data", uid, {"user_id": uid, "western_chart": {}})
+    queue.enqueue("user_natal_data", "d", {"user_id": "d"})
+    queue.flush()
+    sizes = sorted(len(rows) for _, rows, _ in writer.calls)
+    assert sizes == [1, 1, 2]   # 3 same-shaped rows in batches of 2, odd-shaped row alone
+
+
+def test_write_behind_background_flush_on_interval():
+    writer = _RecordingWriter()
+    queue = db_client.WriteBehindQueue(writer, flush_interval=0.01).start()
+    queue.enqueue("matches", ("a", "b"), {"user_a_id": "a", "user_b_id": "b"}, "user_a_id,user_b_id")
+    deadline = time.monotonic() + 2
+    while not writer.calls and time.monotonic() < deadline:
+        time.sleep(0.005)
+    queue.close()
+    assert writer.calls[0][2] == "user_a_id,user_b_id"
+
+
+def test_write_behind_retries_with_backoff_then_succeeds():
+    writer = _RecordingWriter(fail_times=2)
+    queue = db_client.WriteBehindQueue(writer, flush_interval=0.0, backoff_base=0.01).start()
+    queue.enqueue("user_natal_data", "u1", {"user_id": "u1"})
+    deadline = time.monotonic() + 2
+    while not writer.calls and time.monotonic() < deadline:
+        time.sleep(0.005)
+    queue.close()
+    assert len(writer.calls) == 1
+    assert queue.stats()["failures"] == 2
+
+
+def test_write_behind_drops_after_max_retries():
+    queue = db_client.WriteBehindQueue(_RecordingWriter(fail_times=10), max_retries=1)
+    queue.enqueue("user_natal_data", "u1", {"user_id": "u1"})
+    queue.flush()
+    queue.flush()
+    assert len(queue) == 0
+    assert queue.stats()["dropped"] == 1
+
+
+def test_write_behind_close_flushes_pending():
+    writer = _RecordingWriter()
+    queue = db_client.WriteBehindQueue(writer, flush_interval=60).start()
+    queue.enqueue("user_natal_data", "u1", {"user_id": "u1"})
+    queue.close()
+    assert writer.calls and len(queue) == 0
+
+
+def test_upserts_are_queued_and_readable_before_flush(fake_client):
+    writer = _RecordingWriter()
+    db_client.start_write_behind(writer=writer, flush_interval=60)
+    try:
+        db_client.upsert_psychology_profile("u1", {"llm_natal_report": "report"})
+        db_client.save_match_result("a", "b", {"data": {"harmony_score": 77}}, {})
+        fake_client.table.return_value.upsert.assert_not_called()
+
+        single = fake_client.table.return_value.select.return_value.eq.return_value.maybe_single.return_value
+        single.execute.return_value.data = {"karmic_boss": "Pluto"}
+        assert db_client.get_psychology_profile("u1") == {"karmic_boss": "Pluto", "llm_natal_report": "report"}
+        assert db_client.get_cached_match("b", "a")["harmony_score"] == 77
+    finally:
+        db_client.stop_write_behind()
+    assert {table for table, _, _ in writer.calls} == {"user_psychology_profiles", "matches"}
+
+
+def test_blob_encoding_writes_bytea_and_reads_back(fake_client, monkeypatch):
+    monkeypatch.setenv("DESTINY_BLOB_ENCODING", "1")
+    db_client.upsert_natal_data("u1", {"sun_sign": "leo"}, {"day_master": "甲"}, {})
+    row = fake_client.table.return_value.upsert.call_args[0][0][0]
+    assert row["western_chart"] == {} and row["western_chart_blob"].startswith("\\x")
+
+    db_client.clear_caches()
+    query = fake_client.table.return_value.select.return_value
+    query.in_.return_value.execute.return_value.data = [dict(row)]
+    natal = db_client.get_natal_data_many(["u1"])["u1"]
+    assert natal["western_chart"]["sun_sign"] == "leo"
+    assert "western_chart_blob" in fake_client.table.return_value.select.call_args[0][0]
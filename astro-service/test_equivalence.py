@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Tests for equivalence.py — differential reference-vs-candidate harness."""
+import math
+
+import pytest
+
+import equivalence
+from equivalence import Case, Tolerance, diff
+from matching import compute_quick_score
+
+
+def test_diff_reports_paths_and_honours_tolerances():
+    expected = {"score": 1.0, "tracks": {"soul": 50.0, "friend": 40}, "tags": ["a", "b"], "x": None}
+    assert diff(expected, {"score": 1.0 + 1e-12, "tracks": {"soul": 50.0, "friend": 40.0},
+                           "tags": ("a", "b"), "x": None}) == []
+    found = diff(expected, {"score": 1.01, "tracks": {"soul": 50.0}, "tags": ["a", "c"], "y": 1})
+    assert [m.path for m in found] == ["score", "tracks.friend", "tags[1]", "x", "y"]
+    loose = Tolerance(field_tol={"score": 0.05})
+    assert [m.path for m in diff({"score": 1.0}, {"score": 1.01}, loose)] == []
+    assert diff([math.nan], [math.nan]) == []
+    assert diff({"flag": True}, {"flag": 1})[0].path == "flag"
+    assert diff([1, 2], [1])[0].path == "length"
+
+
+def test_reference_matches_itself_on_every_engine():
+    for engine in equivalence.ENGINES:
+        report = equivalence.check(engine, equivalence.reference(engine), n=40, seed=2)
+        assert report.ok and report.cases == 40, report.format()
+
+
+def test_mismatch_is_shrunk_to_minimal_input():
+    def buggy(user_a, user_b):
+        result = compute_quick_score(user_a, user_b)
+        if user_a.get("rpv_power") == "control":
+            result["tracks"]["soul"] += 1
+        return result
+
+    report = equivalence.check("compute_quick_score", buggy, n=200, seed=5, max_failures=1)
+    assert not report.ok
+    failure = report.failures[0]
+    assert [m.path for m in failure.mismatches] == ["tracks.soul"]
+    assert failure.shrunk.args == [{"rpv_power": "control"}, {}]
+    assert failure.shrunk.size() < failure.case.size() / 10
+
+
+def test_exceptions_are_outputs():
+    def raises_value_error(*args):
+        raise ValueError("bad")
+
+    case = Case([1, 2])
+    assert equivalence.compare(case, raises_value_error, raises_value_error) == []
+    found = equivalence.compare(case, raises_value_error, lambda *a: {"ok": True})
+    assert found[0].path == "<exception>"
+
+
+def test_float_tolerance_is_configurable():
+    def drifted(user_a, user_b):
+        result = compute_quick_score(user_a, user_b)
+        result["tracks"]["soul"] += 0.01
+        return result
+
+    assert not equivalence.check("compute_quick_score", drifted, n=8, seed=1,
+                                 randomized=False, max_failures=1).ok
+    assert equivalence.check("compute_quick_score", drifted, n=8, seed=1, randomized=False,
+                             tolerance=Tolerance(field_tol={"tracks.*": 0.02})).ok
+
+
+def test_feature_store_round_trip_is_equivalent_on_population():
+    for engine in ("compute_match_v2", "compute_quick_score"):
+        candidate = equivalence.CANDIDATES["feature_store"](engine)
+        report = equivalence.check(engine, candidate, n=60, seed=4, randomized=False)
+        assert report.ok, report.format()
+    with pytest.raises(ValueError):
+        equivalence.CANDIDATES["feature_store"]("calculate_chart")
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Tests for feature_store.py — columnar population features + mmap snapshots."""
+import math
+
+import pytest
+
+from chart import calculate_chart
+from feature_store import COLUMNS, FeatureStore, flatten_natal
+from matching import compute_match_v2, compute_quick_score
+
+
+def _natal(birth_date, tier=3, exact=None):
+    chart = calculate_chart(
+        birth_date=birth_date,
+        birth_time="precise" if exact else None,
+        birth_time_exact=exact,
+        data_tier=tier,
+    )
+    return {"western_chart": chart, "bazi_chart": chart["bazi"], "zwds_chart": {}}
+
+
+@pytest.fixture(scope="module")
+def population():
+    rows = {
+        "u1": _natal("1995-06-15", tier=1, exact="14:30"),
+        "u2": _natal("1997-03-07", tier=1, exact="10:59"),
+        "u3": _natal("1990-12-01"),
+        "u4": _natal("1988-08-08"),
+    }
+    profiles = {uid: flatten_natal(n) for uid, n in rows.items()}
+    profiles["u2"]["attachment_style"] = "anxious"
+    profiles["u3"]["rpv_power"] = "control"
+    return profiles
+
+
+def test_round_trip_preserves_match_results(population):
+    store = FeatureStore.build(population)
+    assert len(store) == 4
+    for a in population:
+        for b in population:
+            if a == b:
+                continue
+            assert compute_match_v2(store.get(a), store.get(b)) == \
+                compute_match_v2(population[a], population[b])
+            assert compute_quick_score(store.get(a), store.get(b)) == \
+                compute_quick_score(population[a], population[b])
+
+
+def test_columns_are_float32_or_uint8(population):
+    store = FeatureStore.build(population)
+    assert set(COLUMNS.values()) == {"f", "B"}
+    venus = store.column("venus_degree")
+    assert len(venus) == 4
+    assert venus[store.row_of("u1")] == pytest.approx(population["u1"]["venus_degree"], abs=1e-3)
+    # Tier 3 has no moon → NaN; missing sign → 255
+    assert math.isnan(store.column("moon_degree")[store.row_of("u3")])
+    assert store.column("ascendant_sign")[store.row_of("u3")] == 255
+
+
+def test_user_id_row_mapping(population):
+    store = FeatureStore.build(population)
+    for uid in population:
+        assert store.user_id_at(store.row_of(uid)) == uid
+    assert store.row_of("nobody") is None
+    assert store.get("nobody") is None
+    assert "u1" in store and "nobody" not in store
+
+
+def test_snapshot_is_memory_mapped(population, tmp_path):
+    FeatureStore.build(population).save(str(tmp_path))
+    store = FeatureStore.open(str(tmp_path))
+    assert isinstance(store.column("sun_degree"), memoryview)
+    assert store.column("sun_degree").readonly
+    assert store.get("u2") == FeatureStore.build(population).get("u2")
+    store.close()
+
+
+def test_deltas_append_without_rewriting_snapshot(population, tmp_path):
+    FeatureStore.build(population).save(str(tmp_path))
+    snapshot_bytes = (tmp_path / "sun_degree.bin").read_bytes()
+
+    writer = FeatureStore.open(str(tmp_path))
+    reader = FeatureStore.open(str(tmp_path))
+    updated = dict(population["u1"], attachment_style="avoidant")
+    writer.apply_delta({"u1": updated, "u5": population["u4"]})
+
+    assert (tmp_path / "sun_degree.bin").read_bytes() == snapshot_bytes
+    assert writer.get("u1")["attachment_style"] == "avoidant"
+    assert len(writer) == 5
+
+    assert "u5" not in reader
+    assert reader.refresh() == 2
+    assert reader.get("u1")["attachment_style"] == "avoidant"
+    assert reader.get("u5") == writer.get("u5")
+    assert len(reader.column("sun_degree")) == 5
+    writer.close()
+    reader.close()
+
+
+def test_reopen_replays_delta_log(population, tmp_path):
+    FeatureStore.build(population).save(str(tmp_path))
+    FeatureStore.open(str(tmp_path)).apply_delta({"u9": population["u3"]})
+    store = FeatureStore.open(str(tmp_path))
+    assert store.get("u9") == store.get("u3")
+
+
+def test_compact_folds_deltas(population, tmp_path):
+    FeatureStore.build(population).save(str(tmp_path))
+    store = FeatureStore.open(str(tmp_path))
+    reader = FeatureStore.open(str(tmp_path))
+    store.apply_delta({"u6": population["u2"]})
+    store = store.compact()
+    assert (tmp_path / "delta.log").read_text() == ""
+    assert isinstance(store.column("sun_degree"), memoryview)
+    assert store.get("u6") == store.get("u2")
+    # A reader that predates compaction remaps on refresh
+    reader.refresh()
+    assert "u6" in reader
+
+
+def test_writer_replays_other_writers_deltas_before_appending(population, tmp_path):
+    FeatureStore.build(population).save(str(tmp_path))
+    a = FeatureStore.open(str(tmp_path))
+    b = FeatureStore.open(str(tmp_path))
+    b.apply_delta({"from_b": population["u2"]})
+    a.apply_delta({"from_a": population["u3"]})
+    a.refresh()
+    assert "from_b" in a and a.get("from_b") == FeatureStore.open(str(tmp_path)).get("from_b")
+    assert b.refresh() == 1 and "from_a" in b
+
+
+def test_compact_keeps_deltas_from_other_writers(population, tmp_path):
+    FeatureStore.build(population).save(str(tmp_path))
+    compactor = FeatureStore.open(str(tmp_path))
+    other = FeatureStore.open(str(tmp_path))
+    other.apply_delta({"late": population["u1"]})      # compactor never refreshed
+    compactor = compactor.compact()
+    assert "late" in compactor
+    assert "late" in FeatureStore.open(str(tmp_path))
+    assert not list(tmp_path.glob("*.tmp"))            # every file replaced atomically
+
+
+def test_unseen_category_values_extend_vocab(population, tmp_path):
+    profiles = {"x": dict(population["u1"], rpv_energy="wander")}
+    FeatureStore.build(profiles).save(str(tmp_path))
+    assert FeatureStore.open(str(tmp_path)).get("x")["rpv_energy"] == "wander"
+
+
+def test_from_natal_rows():
+    rows = [{"user_id": "a", **_natal("1995-06-15")}]
+    store = FeatureStore.from_natal_rows(rows)
+    assert store.get("a")["sun_sign"] == "gemini"
+    assert store.get("a")["bazi_element"] == rows[0]["bazi_chart"]["day_master_element"]
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Tests for feature_sync.py — watermark CDC into the feature store (offline)."""
+from unittest.mock import MagicMock
+
+import pytest
+
+from chart import calculate_chart
+from feature_store import FeatureStore
+from feature_sync import (
+    NATAL_TABLE,
+    PSYCHOLOGY_TABLE,
+    FeatureSync,
+    LocalChangeSource,
+    SupabaseChangeSource,
+    build_feature_record,
+)
+
+
+@pytest.fixture(scope="module")
+def charts():
+    out = {}
+    for uid, date in (("u1", "1995-06-15"), ("u2", "1997-03-07"), ("u3", "1990-12-01")):
+        c = calculate_chart(birth_date=date)
+        out[uid] = {"user_id": uid, "western_chart": c, "bazi_chart": c["bazi"], "zwds_chart": {}}
+    return out
+
+
+def _source(charts):
+    src = LocalChangeSource()
+    for row in charts.values():
+        src.upsert(NATAL_TABLE, row)
+    return src
+
+
+def test_initial_sync_loads_every_user(charts):
+    src = _source(charts)
+    store = FeatureStore()
+    sync = FeatureSync(src, store)
+    assert sync.run_until_idle() == 3
+    assert set(store.user_ids) == {"u1", "u2", "u3"}
+    assert store.get("u1")["sun_sign"] == charts["u1"]["western_chart"]["sun_sign"]
+    assert sync.poll_once() == set()
+
+
+def test_small_batches_page_through_all_rows(charts):
+    sync = FeatureSync(_source(charts), FeatureStore(), batch_size=1)
+    assert sync.poll_once() == {"u1"}
+    assert sync.run_until_idle() == 2
+    assert sync.watermarks[NATAL_TABLE]["user_id"] == "u3"
+
+
+def test_psychology_update_merges_attachment_and_emits(charts):
+    src = _source(charts)
+    store = FeatureStore()
+    sync = FeatureSync(src, store)
+    sync.run_until_idle()
+
+    events = []
+    sync.subscribe(events.append)
+    src.upsert(PSYCHOLOGY_TABLE, {"user_id": "u2", "attachment_style": "avoidant"})
+    assert sync.poll_once() == {"u2"}
+    assert store.get("u2")["attachment_style"] == "avoidant"
+    assert events == [{"u2"}]
+
+
+def test_psychology_without_natal_is_skipped(charts):
+    src = _source(charts)
+    store = FeatureStore()
+    sync = FeatureSync(src, store)
+    src.upsert(PSYCHOLOGY_TABLE, {"user_id": "ghost", "attachment_style": "secure"})
+    sync.run_until_idle()
+    assert "ghost" not in store
+
+
+def test_failing_listener_does_not_stop_sync(charts):
+    sync = FeatureSync(_source(charts), FeatureStore())
+    sync.subscribe(MagicMock(side_effect=RuntimeError("cache down")))
+    ok = []
+    sync.subscribe(ok.append)
+    sync.run_until_idle()
+    assert ok and ok[0] == {"u1", "u2", "u3"}
+
+
+def test_watermark_persists_with_disk_store(charts, tmp_path):
+    FeatureStore().save(str(tmp_path))
+    src = _source(charts)
+    sync = FeatureSync(src, FeatureStore.open(str(tmp_path)))
+    sync.run_until_idle()
+    assert (tmp_path / "sync_state.json").exists()
+
+    # A restarted syncer resumes from the saved watermark
+    resumed = FeatureSync(src, FeatureStore.open(str(tmp_path)))
+    assert resumed.poll_once() == set()
+    src.upsert(NATAL_TABLE, charts["u1"])
+    assert resumed.poll_once() == {"u1"}
+    # Deltas reached delta.log, so a fresh reader sees all users
+    assert len(FeatureStore.open(str(tmp_path))) == 3
+
+
+def test_build_feature_record_ignores_empty_psychology(charts):
+    rec = build_feature_record(charts["u1"], {"attachment_style": None})
+    assert "attachment_style" not in rec
+
+
+def test_supabase_source_uses_keyset_filter():
+    client = MagicMock()
+    query = client.table.return_value.select.return_value
+    query.or_.return_value.order.return_value.order.return_value.limit.return_value \
+        .execute.return_value.data = [{"user_id": "u9"}]
+    src = SupabaseChangeSource(client)
+    rows = src.fetch_changes(NATAL_TABLE, {"updated_at": "2026-01-01T00:00:00+00:00", "user_id": "u1"}, 50)
+    assert rows == [{"user_id": "u9"}]
+    filt = query.or_.call_args[0][0]
+    assert filt == ('updated_at.gt."2026-01-01T00:00:00+00:00",'
+                    'and(updated_at.eq."2026-01-01T00:00:00+00:00",user_id.gt."u1")')
+    src.fetch_changes(NATAL_TABLE, {"updated_at": "t", "user_id": 'a,b")'}, 50)
+    assert query.or_.call_args[0][0].endswith('user_id.gt."a,b\\")")')
+    assert src.fetch_rows(NATAL_TABLE, []) == []
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Tests for llm_cache.py — content-addressed LLM response cache."""
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import llm_cache
+import main
+from llm_cache import LLMResponseCache, cache_key
+
+
+class _CountingGateway:
+    def __init__(self, reply='{"headline": "h"}'):
+        self.reply = reply
+        self.calls = []
+
+    def call(self, prompt, provider, max_tokens, api_key, gemini_model):
+        self.calls.append((prompt, provider, max_tokens))
+        return self.reply
+
+    async def acall(self, prompt, provider, max_tokens, api_key, gemini_model):
+        return self.call(prompt, provider, max_tokens, api_key, gemini_model)
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    gw = _CountingGateway()
+    monkeypatch.setattr(main, "get_gateway", lambda: gw)
+    monkeypatch.delenv("DESTINY_LLM_CACHE", raising=False)
+    llm_cache.set_llm_cache(LLMResponseCache(ttl=60, max_entries=16))
+    yield gw
+    llm_cache.set_llm_cache(None)
+
+
+def test_key_covers_provider_model_max_tokens_and_prompt():
+    base = cache_key("gemini", "gemini-2.0-flash", 600, "prompt")
+    assert base == cache_key("gemini", "gemini-2.0-flash", 600, "prompt")
+    assert base != cache_key("anthropic", "gemini-2.0-flash", 600, "prompt")
+    assert base != cache_key("gemini", "gemini-2.5-pro", 600, "prompt")
+    assert base != cache_key("gemini", "gemini-2.0-flash", 700, "prompt")
+    assert base != cache_key("gemini", "gemini-2.0-flash", 600, "prompt ")
+
+
+def test_memory_tier_ttl_and_lru():
+    cache = LLMResponseCache(ttl=0.05, max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"          # a is now most recent
+    cache.put("c", "C")                   # evicts b
+    assert cache.get("b") is None
+    assert cache.get("c") == "C"
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["memory_hits"] == 2 and stats["evictions"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "llm.db")
+    first = LLMResponseCache(ttl=60, max_entries=4, path=path)
+    first.put("k", "report")
+    first.close()
+
+    second = LLMResponseCache(ttl=60, max_entries=4, path=path)
+    assert second.get("k") == "report"
+    assert second.get("k") == "report"
+    stats = second.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1
+    second.close()
+
+
+def test_disk_tier_is_size_bounded(tmp_path):
+    cache = LLMResponseCache(ttl=60, max_entries=1, path=str(tmp_path / "llm.db"),
+                             disk_max_entries=3)
+    for i in range(5):
+        cache.put(f"k{i}", f"v{i}")
+    assert cache.stats()["disk_size"] == 3
+    assert cache.get("k0") is None and cache.get("k4") == "v4"
+    cache.close()
+
+
+def test_disk_prune_does_not_count_on_every_put(tmp_path):
+    cache = LLMResponseCache(ttl=60, max_entries=1, path=str(tmp_path / "llm.db"),
+                             disk_max_entries=100)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    for i in range(150):
+        cache.put(f"k{i}", f"v{i}")
+    counts = [s for s in statements if "COUNT(*)" in s]
+    assert 0 < len(counts) <= 6
+    assert cache.stats()["disk_size"] <= 100
+    assert cache.get("k0") is None and cache.get("k149") == "v149"
+    cache.close()
+
+
+def test_call_llm_serves_repeat_prompts_from_cache(gateway):
+    assert main.call_llm("same", provider="gemini", max_tokens=600) == gateway.reply
+    assert main.call_llm("same", provider="gemini", max_tokens=600) == gateway.reply
+    assert len(gateway.calls) == 1
+    main.call_llm("same", provider="gemini", max_tokens=700)
+    main.call_llm("same", provider="anthropic", max_tokens=600)
+    assert len(gateway.calls) == 3
+
+
+def test_use_cache_false_bypasses_but_refreshes(gateway):
+    main.call_llm("p", provider="gemini")
+    gateway.reply = '{"headline": "new"}'
+    assert main.call_llm("p", provider="gemini", use_cache=False) == gateway.reply
+    assert main.call_llm("p", provider="gemini") == '{"headline": "new"}'
+    assert len(gateway.calls) == 2
+
+
+def test_uncacheable_completion_is_not_replayed(gateway):
+    gateway.reply = "not json"
+    main.call_llm("p", provider="gemini", cacheable=main._is_json)
+    main.call_llm("p", provider="gemini", cacheable=main._is_json)
+    assert len(gateway.calls) == 2
+
+
+def test_cache_can_be_disabled(gateway, monkeypatch):
+    monkeypatch.setenv("DESTINY_LLM_CACHE", "0")
+    main.call_llm("p", provider="gemini")
+    main.call_llm("p", provider="gemini")
+    assert len(gateway.calls) == 2
+
+
+def test_endpoint_repeat_and_bypass(gateway):
+    body = {"chart_data": {"sun_sign": "leo"}, "rpv_data": {}, "provider": "gemini"}
+    client = TestClient(main.app)
+    first = client.post("/generate-profile-card", json=body)
+    second = client.post("/generate-profile-card", json=body)
+    assert first.json() == second.json() == json.loads(gateway.reply)
+    assert len(gateway.calls) == 1
+    client.post("/generate-profile-card", json=dict(body, use_cache=False))
+    assert len(gateway.calls) == 2
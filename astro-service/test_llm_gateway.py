@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""Tests for llm_gateway.py — run against a local stub LLM server (no network)."""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from circuit_breaker import CircuitOpenError
+from llm_gateway import (
+    ANTHROPIC_MODEL, DEFAULT_GEMINI_MODEL, LLMConfigError, LLMGateway, RouteStats,
+    is_provider_failure,
+)
+
+
+class _StubLLM(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, so connection reuse is observable
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.client_address[1], self.headers.get("x-api-key")))
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        provider = "anthropic" if "/v1/messages" in self.path else "gemini"
+        time.sleep(server.delays.get(provider, server.delay))
+        with server.lock:
+            server.active -= 1
+        if provider in server.failing:
+            data = json.dumps({"type": "error", "error": {"type": "invalid_request_error",
+                                                          "message": "stub failure"}}).encode()
+            self.send_response(server.fail_status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if self.path.endswith("/v1/messages") and body.get("stream"):
+            return self._sse(_anthropic_events(body))
+        if ":streamGenerateContent" in self.path:
+            prompt = body["contents"][0]["parts"][0]["text"]
+            return self._sse(("", {"candidates": [{"content": {"role": "model", "parts": [{"text": w}]}}]})
+                             for w in _words(f"gemini:{prompt}"))
+        if self.path.endswith("/v1/messages"):
+            prompt = body["messages"][0]["content"]
+            payload = {
+                "id": "msg_stub", "type": "message", "role": "assistant",
+                "model": body["model"], "stop_reason": "end_turn", "stop_sequence": None,
+                "content": [{"type": "text", "text": f"claude:{prompt}"}],
+                "usage": {"input_tokens": 1, "output_tokens": 1},
+            }
+        elif ":generateContent" in self.path:
+            prompt = body["contents"][0]["parts"][0]["text"]
+            payload = {"candidates": [{"content": {"role": "model",
+                                                   "parts": [{"text": f"gemini:{prompt}"}]}}]}
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def _sse(self, events):
+        data = "".join((f"event: {name}\n" if name else "") + f"data: {json.dumps(payload)}\n\n"
+                       for name, payload in events).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _words(text):
+    """Split text into deltas that keep their separators ("a b" → ["a", " b"])."""
+    parts = text.split(" ")
+    return [parts[0]] + [" " + p for p in parts[1:]]
+
+
+def _anthropic_events(body):
+    prompt = body["messages"][0]["content"]
+    yield "message_start", {"type": "message_start", "message": {
+        "id": "msg_stub", "type": "message", "role": "assistant", "model": body["model"],
+        "content": [], "stop_reason": None, "stop_sequence": None,
+        "usage": {"input_tokens": 1, "output_tokens": 0}}}
+    yield "content_block_start", {"type": "content_block_start", "index": 0,
+                                  "content_block": {"type": "text", "text": ""}}
+    for word in _words(f"claude:{prompt}"):
+        yield "content_block_delta", {"type": "content_block_delta", "index": 0,
+                                      "delta": {"type": "text_delta", "text": word}}
+    yield "content_block_stop", {"type": "content_block_stop", "index": 0}
+    yield "message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn",
+                                                               "stop_sequence": None},
+                            "usage": {"output_tokens": 1}}
+    yield "message_stop", {"type": "message_stop"}
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubLLM)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests, server.active, server.peak, server.delay = [], 0, 0, 0.0
+    server.delays, server.failing, server.fail_status = {}, set(), 400
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def gateway(stub):
+    base = f"http://127.0.0.1:{stub.server_address[1]}"
+    gw = LLMGateway(base_urls={"anthropic": base, "gemini": base},
+                    concurrency={"anthropic": 2, "gemini": 2}, timeout=10)
+    yield gw
+    gw.close()
+
+
+def test_anthropic_and_gemini_round_trip(gateway, stub):
+    assert gateway.call("hi", provider="anthropic", api_key="k1") == "claude:hi"
+    assert gateway.call("yo", provider="gemini", api_key="k1", gemini_model="gemini-x") == "gemini:yo"
+    assert any("gemini-x:generateContent" in path for path, _, _ in stub.requests)
+
+
+def test_clients_cached_per_provider_and_key(gateway, stub):
+    for _ in range(3):
+        gateway.call("a", provider="anthropic", api_key="key-1")
+    gateway.call("b", provider="anthropic", api_key="key-2")
+    assert gateway.stats()["anthropic"]["clients"] == 2
+    ports = {port for _, port, key in stub.requests if key == "key-1"}
+    assert len(ports) == 1   # one keep-alive connection served all three calls
+
+
+def test_async_callers_share_the_gateway(gateway):
+    async def run():
+        return await asyncio.gather(*(gateway.acall(f"p{i}", provider="anthropic", api_key="k")
+                                      for i in range(4)))
+
+    assert asyncio.run(run()) == [f"claude:p{i}" for i in range(4)]
+    assert gateway.client_count() == 1
+
+
+def test_concurrency_is_bounded_per_provider(gateway, stub):
+    stub.delay = 0.05
+    futures = [gateway.submit(f"p{i}", provider="anthropic", api_key="k") for i in range(6)]
+    assert [f.result() for f in futures] == [f"claude:p{i}" for i in range(6)]
+    assert stub.peak == 2
+
+
+def test_metrics_record_latency_and_errors(gateway, stub):
+    gateway.call("ok", provider="gemini", api_key="k")
+    stub.server_close()   # subsequent connections fail
+    stub.shutdown()
+    with pytest.raises(Exception):
+        gateway.call("fail", provider="gemini", api_key="other-key")
+    stats = gateway.stats()["gemini"]
+    assert stats["requests"] == 2 and stats["errors"] == 1
+    assert stats["latency_ms"]["p50"] > 0
+    assert stats["in_flight"] == 0 and stats["last_error"]
+
+
+@pytest.mark.parametrize("provider", ["anthropic", "gemini"])
+def test_astream_yields_deltas(gateway, provider):
+    async def run():
+        return [d async for d in gateway.astream("a b c", provider=provider, api_key="k")]
+
+    deltas = asyncio.run(run())
+    prefix = "claude" if provider == "anthropic" else "gemini"
+    assert deltas == [f"{prefix}:a", " b", " c"]
+    stats = gateway.stats()[provider]
+    assert stats["requests"] == 1 and stats["in_flight"] == 0
+
+
+def test_astream_surfaces_upstream_errors(gateway, stub):
+    stub.server_close()
+    stub.shutdown()
+
+    async def run():
+        return [d async for d in gateway.astream("x", provider="gemini", api_key="k")]
+
+    with pytest.raises(Exception):
+        asyncio.run(run())
+    assert gateway.stats()["gemini"]["errors"] == 1
+
+
+# ── routing mode ─────────────────────────────────────────────────────────────
+
+ANTHROPIC = ("anthropic", ANTHROPIC_MODEL)
+GEMINI = ("gemini", DEFAULT_GEMINI_MODEL)
+
+
+@pytest.fixture
+def server_keys(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "ka")
+    monkeypatch.setenv("GEMINI_API_KEY", "kg")
+
+
+def _seed(gateway, route, latency_ms, n=10, ok=True):
+    for _ in range(n):
+        gateway._route_stats(*route).record(latency_ms, ok=ok)
+
+
+def test_routes_prefer_fast_healthy_and_explore_unknown(gateway):
+    keys = {"anthropic": "k", "gemini": "k"}
+    _seed(gateway, ANTHROPIC, 50)
+    assert gateway.routes(keys) == [GEMINI, ANTHROPIC]      # gemini has no data yet
+    _seed(gateway, GEMINI, 400)
+    assert gateway.routes(keys) == [ANTHROPIC, GEMINI]
+    _seed(gateway, ANTHROPIC, 50, ok=False)                  # anthropic now failing
+    assert gateway.routes(keys) == [GEMINI, ANTHROPIC]
+
+
+def test_error_rate_decays_while_idle():
+    route = RouteStats(alpha=0.5, error_half_life=0.05)
+    route.record(10, ok=False)
+    assert route.error_rate == pytest.approx(0.5, abs=0.05)
+    time.sleep(0.15)
+    assert route.error_rate < 0.1
+
+
+def test_auto_routes_to_fastest_provider(gateway, stub, server_keys):
+    _seed(gateway, ANTHROPIC, 300)
+    _seed(gateway, GEMINI, 20)
+    assert gateway.call("hi", provider="auto", hedge=False) == "gemini:hi"
+
+
+def test_auto_hedges_after_p95_and_takes_first_answer(gateway, stub, server_keys):
+    _seed(gateway, ANTHROPIC, 20)          # looks fast: p95 = 20 ms
+    _seed(gateway, GEMINI, 60)
+    stub.delays = {"anthropic": 0.5}       # but is slow right now
+    start = time.perf_counter()
+    assert gateway.call("hi", provider="auto", hedge=True) == "gemini:hi"
+    assert time.perf_counter() - start < 0.45
+    routing = gateway.stats()["routing"]
+    assert routing["hedges"] == 1 and routing["hedge_wins"] == 1
+
+
+def test_auto_fails_over_on_error(gateway, stub, server_keys):
+    _seed(gateway, ANTHROPIC, 20)
+    _seed(gateway, GEMINI, 60)
+    stub.failing = {"anthropic"}
+    assert gateway.call("hi", provider="auto", hedge=False) == "gemini:hi"
+    routing = gateway.stats()["routing"]
+    assert routing["failovers"] == 1
+    assert routing["routes"][f"anthropic/{ANTHROPIC_MODEL}"]["error_rate"] > 0
+
+
+def test_auto_needs_a_server_key(gateway, monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    with pytest.raises(LLMConfigError, match="auto routing"):
+        gateway.call("x", provider="auto")
+
+
+# ── circuit breaker ──────────────────────────────────────────────────────────
+
+@pytest.fixture
+def fragile_gateway(stub):
+    base = f"http://127.0.0.1:{stub.server_address[1]}"
+    gw = LLMGateway(base_urls={"anthropic": base, "gemini": base}, timeout=10)
+    gw.breaker("gemini").failure_threshold = 2
+    gw.breaker("gemini").reset_timeout = 0.2
+    yield gw
+    gw.close()
+
+
+def test_open_circuit_fails_fast_then_recovers(fragile_gateway, stub):
+    stub.failing, stub.fail_status = {"gemini"}, 503
+    for _ in range(2):
+        with pytest.raises(Exception):
+            fragile_gateway.call("x", provider="gemini", api_key="k")
+    sent = len(stub.requests)
+    start = time.perf_counter()
+    with pytest.raises(CircuitOpenError):
+        fragile_gateway.call("x", provider="gemini", api_key="k")
+    assert time.perf_counter() - start < 0.05
+    assert len(stub.requests) == sent              # provider not contacted
+    circuit = fragile_gateway.stats()["gemini"]["circuit"]
+    assert circuit["state"] == "open" and circuit["rejected"] == 1
+
+    stub.failing = set()
+    time.sleep(0.25)                               # half-open: one trial call
+    assert fragile_gateway.call("x", provider="gemini", api_key="k") == "gemini:x"
+    assert fragile_gateway.stats()["gemini"]["circuit"]["state"] == "closed"
+
+
+def test_client_errors_do_not_trip_the_circuit(fragile_gateway, stub):
+    stub.failing = {"gemini"}                      # 400: the request's fault
+    for _ in range(3):
+        with pytest.raises(Exception):
+            fragile_gateway.call("x", provider="gemini", api_key="k")
+    assert fragile_gateway.stats()["gemini"]["circuit"]["state"] == "closed"
+
+
+def test_is_provider_failure_classification():
+    class _Status(Exception):
+        def __init__(self, status):
+            self.status_code = status
+
+    assert is_provider_failure(TimeoutError())
+    assert is_provider_failure(_Status(503)) and is_provider_failure(_Status(429))
+    assert not is_provider_failure(_Status(400))
+    assert not is_provider_failure(CircuitOpenError("p", 1.0))
+
+
+def test_auto_routes_around_open_circuit(gateway, stub, server_keys):
+    _seed(gateway, ANTHROPIC, 20)
+    _seed(gateway, GEMINI, 200)
+    gateway.breaker("anthropic").failure_threshold = 1
+    gateway.breaker("anthropic").record_failure()
+    assert gateway.routes({"anthropic": "k", "gemini": "k"})[0] == GEMINI
+    assert gateway.call("hi", provider="auto", hedge=False) == "gemini:hi"
+
+
+def test_main_maps_open_circuit_to_503(monkeypatch):
+    from fastapi import HTTPException
+    import main
+
+    class _Gateway:
+        def call(self, *args, **kwargs):
+            raise CircuitOpenError("gemini", 12.0)
+
+    monkeypatch.setattr(main, "get_gateway", lambda: _Gateway())
+    monkeypatch.setenv("DESTINY_LLM_CACHE", "0")
+    with pytest.raises(HTTPException) as exc:
+        main.call_llm("x", provider="gemini", api_key="k")
+    assert exc.value.status_code == 503 and exc.value.headers["Retry-After"] == "12"
+
+
+def test_missing_key_raises_config_error(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    gw = LLMGateway()
+    with pytest.raises(LLMConfigError, match="ANTHROPIC_API_KEY"):
+        gw.call("x", provider="anthropic")
+    with pytest.raises(LLMConfigError):
+        gw.call("x", provider="openai", api_key="k")
+    gw.close()
+
+
+def test_main_call_llm_maps_missing_key_to_400(monkeypatch):
+    from fastapi import HTTPException
+    import main
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    with pytest.raises(HTTPException) as exc:
+        main.call_llm("x", provider="gemini")
+    assert exc.value.status_code == 400
+
+
+def test_main_call_llm_passes_auto_through(monkeypatch):
+    import main
+    seen = []
+
+    class _Gateway:
+        def call(self, prompt, provider, max_tokens, api_key, gemini_model):
+            seen.append(provider)
+            return "ok"
+
+    monkeypatch.setattr(main, "get_gateway", lambda: _Gateway())
+    monkeypatch.setenv("DESTINY_LLM_CACHE", "0")
+    main.call_llm("x", provider="auto")
+    main.call_llm("x", provider="openai")
+    assert seen == ["auto", "anthropic"]
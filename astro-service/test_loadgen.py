@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Tests for loadgen.py — synthetic population and load-test harness."""
+import asyncio
+from collections import Counter
+
+import httpx
+import pytest
+
+import loadgen
+import storage
+
+
+@pytest.fixture(scope="module")
+def population():
+    return loadgen.generate_population(loadgen.PopulationConfig(n=24, seed=3))
+
+
+def test_population_is_reproducible_and_follows_config():
+    config = loadgen.PopulationConfig(n=40, tier_mix={1: 1.0}, attachment_mix={"anxious": 1.0},
+                                      birth_year_mean=1990, birth_year_sd=0, seed=11)
+    users = loadgen.generate_population(config)
+    again = loadgen.generate_population(config)
+    assert [u.birth_date for u in users] == [u.birth_date for u in again]
+    assert all(u.tier == 1 and u.zwds for u in users)
+    assert all(u.birth_date.startswith("1990-") for u in users)
+    assert {u.flat["attachment_style"] for u in users} == {"anxious"}
+
+
+def test_population_profiles_have_match_shape(population):
+    tiers = Counter(u.tier for u in population)
+    assert set(tiers) <= {1, 2, 3} and len(tiers) > 1
+    for user in population:
+        assert user.flat["sun_sign"] and user.flat["bazi_element"]
+        assert user.flat["data_tier"] == user.tier
+        assert user.flat["rpv_power"] in ("control", "follow")
+        assert bool(user.zwds) == (user.tier == 1)
+
+
+def test_in_process_run_reports_every_operation(population):
+    before = storage._storage
+    report = asyncio.run(loadgen.run_in_process(population, loadgen.LoadConfig(
+        concurrency=2, duration=None, requests=60, llm_latency=0.01, seed=1)))
+    assert set(report.endpoints) == set(loadgen.OPERATIONS)
+    assert report.total.count == 60
+    assert report.total.errors == 0, {op: s.statuses for op, s in report.endpoints.items()}
+    for stats in report.endpoints.values():
+        assert stats.p50_ms <= stats.p95_ms <= stats.p99_ms
+    assert report.total.rps > 0
+    assert storage._storage is before       # temporary SQLite backend swapped back out
+
+
+def test_http_target_is_read_only_unless_allowed(population):
+    def run(allow_writes, mix=None):
+        paths = []
+
+        def handler(request):
+            paths.append(request.url.path)
+            return httpx.Response(200, json={})
+
+        config = loadgen.LoadConfig(mix=mix or dict(loadgen.DEFAULT_MIX), concurrency=2,
+                                    duration=None, requests=40, warmup=False)
+
+        async def go():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler),
+                                         base_url="http://target") as client:
+                return await loadgen._run_remote(client, population, config, allow_writes)
+
+        report = asyncio.run(go())
+        return paths, report
+
+    paths, report = run(False)
+    assert "/ranking/shard/load" not in paths and "/api/users/onboard" not in paths
+    assert "onboard" not in report.endpoints and report.total.count == 40
+    paths, _ = run(True)
+    assert paths[0] == "/ranking/shard/load"
+    with pytest.raises(ValueError):
+        run(False, {"onboard": 1.0})
+
+
+def test_stub_llm_answers_anthropic_messages():
+    stub = loadgen.StubLLM(latency=0).start()
+    try:
+        resp = httpx.post(f"{stub.url}/v1/messages", json={"model": "m", "messages": []})
+        assert resp.status_code == 200
+        assert resp.json()["content"][0]["text"].startswith('{"title"')
+    finally:
+        stub.stop()
+
+
+def test_mix_parsing_and_validation(population):
+    assert loadgen.parse_mix("ranking=3,llm") == {"ranking": 3.0, "llm": 1.0}
+    with pytest.raises(ValueError):
+        loadgen.parse_mix("ranking=1,checkout=2")
+    with pytest.raises(ValueError):
+        asyncio.run(loadgen.run_load(None, population, loadgen.LoadConfig(duration=None)))
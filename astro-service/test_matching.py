@@ -3,6 +3,8 @@ DESTINY — Matching Algorithm Tests
 pytest suite for astro-service/matching.py
 """
 
+import time
+
 import pytest
 from matching import (
     compute_sign_aspect,
@@ -16,6 +18,8 @@ from matching import (
     compute_quick_score,
     HARMONY_ASPECTS,
     TENSION_ASPECTS,
+    OPTIONAL_LAYERS,
+    _LAYER_COST,
 )
 
 
@@ -3605,3 +3609,46 @@ class TestComputeQuickScore:
         r = compute_quick_score(a, b)
         expected = max(r["tracks"], key=lambda k: r["tracks"][k])
         assert r["primary_track"] == expected
+
+
+# ════════════════════════════════════════════════════════════════
+# Request deadlines: optional layers shed in priority order
+# ════════════════════════════════════════════════════════════════
+
+class TestMatchDeadline:
+    def test_no_deadline_runs_every_applicable_layer(self):
+        layers = compute_match_v2(T1_ZWDS_A, T1_ZWDS_B)["layers"]
+        assert layers["skipped"] == [] and layers["degraded"] is False
+        assert {"zwds", "shadow", "attachment", "resonance", "mutual_reception"} <= set(layers["ran"])
+        assert "elemental" not in layers["ran"]          # no element_profile → not applicable
+
+    def test_expired_deadline_degrades_to_quick_score(self):
+        a = {**T1_ZWDS_A, "bazi_month_branch": "午"}
+        b = {**T1_ZWDS_B, "bazi_month_branch": "卯"}
+        r = compute_match_v2(a, b, deadline=time.monotonic() - 1)
+        assert r["layers"]["ran"] == [] and r["layers"]["degraded"] is True
+        assert r["layers"]["skipped"] == [n for n in OPTIONAL_LAYERS if n != "elemental"]
+        assert r["zwds"] is None and r["psychological_tags"] == []
+        quick = compute_quick_score(a, b)
+        assert round(r["lust_score"]) == quick["lust"] and round(r["soul_score"]) == quick["soul"]
+        assert {k: round(v) for k, v in r["tracks"].items()} == quick["tracks"]
+
+    def test_tight_budget_sheds_lowest_priority_layers_first(self):
+        costs = {"core": 0.0, "shadow": 10.0, "zwds": 10.0, "attachment": 10.0,
+                 "resonance": 10.0, "elemental": 10.0, "mutual_reception": 10.0}
+        with patch.dict(_LAYER_COST, costs):
+            r = compute_match_v2(T1_ZWDS_A, T1_ZWDS_B, deadline=time.monotonic() + 25.0)
+        assert r["layers"]["ran"] == ["zwds", "shadow"]
+        assert r["layers"]["skipped"] == ["attachment", "resonance", "mutual_reception"]
+
+    def test_failed_layer_is_not_reported_as_ran(self):
+        before = dict(_LAYER_COST)
+        with patch("matching.compute_shadow_and_wound", side_effect=RuntimeError("boom")):
+            layers = compute_match_v2(T1_ZWDS_A, T1_ZWDS_B)["layers"]
+        assert "shadow" not in layers["ran"] and "zwds" in layers["ran"]
+        assert _LAYER_COST["shadow"] == before["shadow"]
+
+    def test_generous_deadline_matches_full_result(self):
+        full = compute_match_v2(T1_ZWDS_A, T1_ZWDS_B)
+        timed = compute_match_v2(T1_ZWDS_A, T1_ZWDS_B, deadline=time.monotonic() + 60)
+        assert timed == full
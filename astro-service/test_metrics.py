@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Tests for metrics.py — histograms, stage timers, /metrics exposition."""
+import asyncio
+import re
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import db_client
+import main
+import metrics
+
+client = TestClient(main.app)
+
+
+@pytest.fixture(autouse=True)
+def _fresh():
+    metrics.reset()
+    yield
+    metrics.set_enabled(True)
+
+
+def _samples(text: str, name: str) -> dict:
+    """{label string: value} for one metric name (with suffix) in exposition text."""
+    out = {}
+    for line in text.splitlines():
+        m = re.match(rf"^{re.escape(name)}(\{{.*\}})? (\S+)$", line)
+        if m:
+            out[m.group(1) or ""] = float(m.group(2))
+    return out
+
+
+def test_histogram_buckets_are_cumulative_and_le_inclusive():
+    hist = metrics.Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        hist.observe(value, "x")
+    name, kind, _, samples = hist.collect()
+    buckets = [(labels["le"], v) for suffix, labels, v in samples if suffix == "_bucket"]
+    assert kind == "histogram"
+    assert buckets == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert hist.count("x") == 4
+
+
+def test_timed_records_sync_async_and_errors():
+    @metrics.timed("unit.sync")
+    def boom():
+        raise ValueError
+
+    @metrics.timed("unit.async")
+    async def ok():
+        return 1
+
+    with pytest.raises(ValueError):
+        boom()
+    assert asyncio.run(ok()) == 1
+    assert metrics.STAGE_SECONDS.count("unit.sync") == 1
+    assert metrics.STAGE_SECONDS.count("unit.async") == 1
+
+    metrics.set_enabled(False)
+    asyncio.run(ok())
+    assert metrics.STAGE_SECONDS.count("unit.async") == 1
+
+
+def test_request_latency_labelled_by_route_template_and_tier():
+    client.post("/calculate-chart", json={"birth_date": "1995-06-15", "data_tier": 3})
+    client.get("/api/jobs/does-not-exist")
+    text = client.get("/metrics").text
+    counts = _samples(text, "destiny_request_duration_seconds_count")
+    assert counts['{endpoint="/calculate-chart",method="POST",status="200",tier="3"}'] == 1
+    assert counts['{endpoint="/api/jobs/{job_id}",method="GET",status="404",tier="none"}'] == 1
+
+
+def test_match_stages_and_layers_exported():
+    client.post("/compute-match", json={"user_a": {"sun_sign": "leo"}, "user_b": {"sun_sign": "aries"}})
+    counts = _samples(client.get("/metrics").text, "destiny_stage_duration_seconds_count")
+    assert counts['{stage="match"}'] == 1
+    assert counts['{stage="match.shadow"}'] == 1
+
+
+def test_exposition_format_and_gauges():
+    resp = client.get("/metrics")
+    assert resp.headers["content-type"] == metrics.CONTENT_TYPE
+    text = resp.text
+    assert "# TYPE destiny_request_duration_seconds histogram" in text
+    assert _samples(text, "destiny_executor_workers")['{pool="io"}'] > 0
+    assert '{pool="compute"}' in _samples(text, "destiny_admission_concurrency")
+    # every family is declared once, even when a counter and a collector share it
+    types = re.findall(r"^# TYPE (\S+)", text, re.M)
+    assert len(types) == len(set(types))
+
+
+def test_broken_collector_does_not_break_scrape(monkeypatch):
+    def broken():
+        raise RuntimeError("down")
+    monkeypatch.setattr(metrics, "_collectors", [broken])
+    assert "destiny_stage_duration_seconds" in metrics.render()
+
+
+def test_supabase_transport_times_each_call_by_table():
+    transport = db_client._MeteredTransport(db_client.PoolMetrics(max_connections=2))
+    with patch.object(httpx.HTTPTransport, "handle_request",
+                      return_value=httpx.Response(200, stream=httpx.ByteStream(b"[]"))):
+        request = httpx.Request("GET", "https://db.example/rest/v1/user_natal_data?select=*")
+        response = transport.handle_request(request)
+        assert metrics.STAGE_SECONDS.count("db.user_natal_data.get") == 0   # until the body is read
+        response.read()
+        response.close()
+    assert metrics.STAGE_SECONDS.count("db.user_natal_data.get") == 1
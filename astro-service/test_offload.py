@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Tests for offload.py — CPU / blocking I/O kept off the event loop."""
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import offload
+
+
+def _thread_name():
+    return threading.current_thread().name
+
+
+def _square(x):
+    return x * x
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    offload.shutdown()
+    yield
+    offload.shutdown()
+
+
+def test_run_cpu_and_run_io_use_their_own_pools():
+    async def run():
+        return await offload.run_cpu(_thread_name), await offload.run_io(_thread_name)
+
+    cpu_thread, io_thread = asyncio.run(run())
+    assert cpu_thread.startswith("destiny-cpu")
+    assert io_thread.startswith("destiny-io")
+
+
+def test_kwargs_are_forwarded():
+    async def run():
+        return await offload.run_cpu(sorted, [3, 1, 2], reverse=True)
+
+    assert asyncio.run(run()) == [3, 2, 1]
+
+
+def test_event_loop_stays_responsive_during_cpu_work():
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.create_task(ticker())
+        await offload.run_cpu(time.sleep, 0.2)
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+
+
+def test_cpu_pool_is_bounded(monkeypatch):
+    monkeypatch.setenv("DESTINY_CPU_WORKERS", "2")
+    active, peak = 0, 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+
+    async def run():
+        await asyncio.gather(*(offload.run_cpu(work) for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
+    assert offload.stats()["cpu"]["workers"] == 2
+
+
+def test_process_executor(monkeypatch):
+    monkeypatch.setenv("DESTINY_CPU_EXECUTOR", "process")
+    monkeypatch.setenv("DESTINY_CPU_WORKERS", "1")
+
+    async def run():
+        return await offload.run_cpu(_square, 7)
+
+    assert asyncio.run(run()) == 49
+
+
+def test_onboard_runs_chart_math_off_the_loop(monkeypatch):
+    import main
+    from storage import SQLiteStorage, set_storage
+
+    seen = {}
+    real = main.calculate_chart
+
+    def spy(**kwargs):
+        seen["chart"] = threading.current_thread().name
+        return real(**kwargs)
+
+    monkeypatch.setattr(main, "calculate_chart", spy)
+    previous = set_storage(SQLiteStorage(":memory:"))
+    try:
+        resp = TestClient(main.app).post("/api/users/onboard", json={
+            "user_id": "u1", "birth_date": "1995-06-15",
+        })
+    finally:
+        set_storage(previous)
+    assert resp.status_code == 200
+    assert seen["chart"].startswith("destiny-cpu")
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Tests for profiling.py — opt-in per-request sampling profiles."""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import offload
+import profiling
+
+client = TestClient(main.app)
+
+TOKEN = "s3cret"
+PAIR = {"user_a": {"sun_sign": "leo"}, "user_b": {"sun_sign": "aries"}}
+
+
+def slow_match(user_a, user_b, deadline=None):
+    time.sleep(0.05)
+    return {"lust_score": 50.0}
+
+
+@pytest.fixture
+def profiles(monkeypatch, tmp_path):
+    monkeypatch.setenv("DESTINY_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("DESTINY_PROFILING_TOKEN", TOKEN)
+    monkeypatch.setattr(main, "compute_match_v2", slow_match)
+    profiling.set_enabled(True)
+    yield tmp_path
+    profiling.set_enabled(False)
+
+
+def test_never_profiles_unless_enabled(monkeypatch, tmp_path):
+    monkeypatch.setenv("DESTINY_PROFILE_DIR", str(tmp_path))
+    assert not profiling.enabled()
+    resp = client.post("/compute-match?profile=1", json=PAIR, headers={"X-Destiny-Profile": "1"})
+    assert resp.status_code == 200
+    assert profiling.PROFILE_ID_HEADER not in resp.headers
+    assert list(tmp_path.iterdir()) == []
+    assert client.get("/debug/profiles/0123456789abcdef").status_code == 404
+
+
+def test_header_profiles_sync_endpoint(profiles):
+    resp = client.post("/compute-match", json=PAIR, headers={"X-Destiny-Profile": TOKEN})
+    assert resp.status_code == 200 and resp.json()["lust_score"] == 50.0
+    profile_id = resp.headers[profiling.PROFILE_ID_HEADER]
+    folded = client.get(f"/debug/profiles/{profile_id}")
+    assert folded.status_code == 200
+    lines = folded.text.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("compute_match (main.py" in line and "slow_match" in line for line in lines)
+
+
+def test_unflagged_requests_are_not_profiled(profiles):
+    resp = client.post("/compute-match", json=PAIR)
+    assert profiling.PROFILE_ID_HEADER not in resp.headers
+    assert list(profiles.iterdir()) == []
+
+
+def test_token_required(profiles, monkeypatch):
+    resp = client.post("/compute-match?profile=1", json=PAIR)
+    assert profiling.PROFILE_ID_HEADER not in resp.headers
+    resp = client.post("/compute-match?profile=s3cret", json=PAIR)
+    assert profiling.PROFILE_ID_HEADER in resp.headers
+    profile_id = resp.headers[profiling.PROFILE_ID_HEADER]
+    assert not profiling._authorized("s3cre\u00e9")     # non-ASCII compares, no TypeError
+
+    monkeypatch.delenv("DESTINY_PROFILING_TOKEN")     # enabled without a token: stays off
+    assert not profiling.enabled()
+    resp = client.post("/compute-match", json=PAIR, headers={"X-Destiny-Profile": "1"})
+    assert profiling.PROFILE_ID_HEADER not in resp.headers
+    assert client.get(f"/debug/profiles/{profile_id}").status_code == 404
+
+
+def test_one_profile_at_a_time(profiles):
+    with profiling._busy:
+        resp = client.post("/compute-match", json=PAIR, headers={"X-Destiny-Profile": TOKEN})
+    assert resp.status_code == 200
+    assert resp.headers[profiling.PROFILE_HEADER] == "busy"
+    assert profiling.PROFILE_ID_HEADER not in resp.headers
+
+
+def test_offloaded_work_is_sampled():
+    session = profiling.ProfileSession(interval=0.001).start()
+
+    async def run():
+        token = profiling._session.set(session)
+        try:
+            await offload.run_cpu(slow_match, {}, {})
+        finally:
+            profiling._session.reset(token)
+
+    asyncio.run(run())
+    session.stop()
+    assert session.samples > 0
+    assert all("slow_match" in stack for stack in session.stacks)
+
+
+def test_keeps_newest_profiles_and_rejects_bad_ids(profiles, monkeypatch):
+    monkeypatch.setenv("DESTINY_PROFILE_KEEP", "2")
+    ids = []
+    for _ in range(3):
+        resp = client.post("/compute-match", json=PAIR, headers={"X-Destiny-Profile": TOKEN})
+        ids.append(resp.headers[profiling.PROFILE_ID_HEADER])
+        time.sleep(0.01)
+    assert len(list(profiles.glob("*.folded"))) == 2
+    assert profiling.load(ids[-1]) is not None
+    assert profiling.load("../../etc/passwd") is None
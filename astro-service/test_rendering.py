@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Tests for rendering.py — fast JSON renderer and msgpack content negotiation."""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import rendering
+from rendering import ACCEPT_BINARY, MSGPACK_MEDIA_TYPE, decode_response, wants_msgpack
+from shard_ranking import HttpShard
+
+msgpack = pytest.importorskip("msgpack")
+
+client = TestClient(main.app)
+
+PAYLOAD = {"labels": ["✦ 激情型連結"], "tracks": {"soul": 71.5}, "nested": [{"a": None, "b": True}]}
+
+
+@pytest.fixture
+def renderer():
+    yield rendering.set_json_renderer
+    rendering.set_json_renderer(None)
+
+
+@pytest.mark.parametrize("name", sorted(rendering.RENDERERS))
+def test_renderers_agree_and_keep_chinese_unescaped(name):
+    body = rendering.RENDERERS[name](PAYLOAD)
+    assert json.loads(body) == PAYLOAD
+    assert "激情型連結".encode("utf-8") in body
+
+
+def test_orjson_handles_non_string_keys_like_stdlib():
+    if "orjson" not in rendering.RENDERERS:
+        pytest.skip("orjson not installed")
+    content = {1: "a", "big": 2 ** 70}
+    assert json.loads(rendering.RENDERERS["orjson"](content)) == json.loads(
+        rendering.RENDERERS["json"](content))
+
+
+def test_unknown_renderer_rejected(renderer):
+    with pytest.raises(ValueError):
+        renderer("yaml")
+
+
+@pytest.mark.parametrize("accept,expected", [
+    (None, False),
+    ("application/json", False),
+    ("application/msgpack", True),
+    ("application/x-msgpack, application/json;q=0.5", True),
+    ("application/msgpack;q=0, application/json", False),
+    (ACCEPT_BINARY, True),
+])
+def test_accept_header_negotiation(accept, expected):
+    assert wants_msgpack(accept) is expected
+
+
+def test_default_response_is_json_with_vary(renderer):
+    for name in rendering.RENDERERS:
+        renderer(name)
+        resp = client.post("/compute-match", json={"user_a": {"sun_sign": "leo"},
+                                                   "user_b": {"sun_sign": "aries"}})
+        assert resp.headers["content-type"] == "application/json"
+        assert "Accept" in resp.headers["vary"]
+        assert "labels" in resp.json()
+
+
+def test_msgpack_response_round_trips():
+    body = {"user_a": {"sun_sign": "leo"}, "user_b": {"sun_sign": "aries"}}
+    as_json = client.post("/compute-match", json=body).json()
+    resp = client.post("/compute-match", json=body, headers={"Accept": MSGPACK_MEDIA_TYPE})
+    assert resp.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert msgpack.unpackb(resp.content) == as_json
+    assert decode_response(resp) == as_json
+
+
+def test_errors_stay_json_when_msgpack_requested():
+    resp = client.get("/api/jobs/unknown", headers={"Accept": MSGPACK_MEDIA_TYPE})
+    assert resp.status_code == 404
+    assert resp.headers["content-type"] == "application/json"
+
+
+def test_http_shard_uses_msgpack():
+    seen = []
+
+    class _Recording(TestClient):
+        def request(self, *args, **kwargs):
+            resp = super().request(*args, **kwargs)
+            seen.append(resp.headers["content-type"])
+            return resp
+
+    shard = HttpShard(client=_Recording(main.app))
+    shard.load({"u1": {"sun_sign": "leo"}}, replace=True)
+    assert len(shard) == 1
+    assert shard.top_k({"sun_sign": "aries"}, k=1)[0]["user_id"] == "u1"
+    assert seen and all(ct == MSGPACK_MEDIA_TYPE for ct in seen)
+    shard.remove(["u1"])
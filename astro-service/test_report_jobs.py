@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Tests for report_jobs.py — persistent background LLM report jobs (offline stub LLM)."""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import report_jobs
+from report_jobs import DONE, FAILED, QUEUED, RUNNING, JobStore, ReportJobQueue, stub_llm
+from storage import SQLiteStorage, set_storage
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    store = SQLiteStorage(str(tmp_path / "destiny.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def job_store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+class _FlakyLLM:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, prompt, provider, max_tokens, api_key, gemini_model, use_cache=True):
+        self.calls.append({"prompt": prompt, "provider": provider, "api_key": api_key})
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("provider down")
+        return f"report for {prompt}"
+
+
+def test_store_claim_is_fifo_and_recover_requeues(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = JobStore(path)
+    first = store.insert("natal", {"user_id": "a", "prompt": "p1"})
+    store.insert("natal", {"user_id": "b", "prompt": "p2"})
+    claimed = store.claim()
+    assert claimed["id"] == first["id"] and claimed["status"] == RUNNING
+    assert claimed["attempts"] == 1
+    store.close()                                   # "crash" with a job running
+
+    reopened = JobStore(path)
+    assert reopened.recover() == 1
+    assert reopened.get(first["id"])["status"] == QUEUED
+    assert reopened.counts() == {QUEUED: 2}
+    reopened.close()
+
+
+def test_natal_job_writes_profile(job_store, sqlite_store):
+    queue = ReportJobQueue(job_store, stub_llm, storage=sqlite_store, workers=2)
+    job = queue.submit("natal", {"user_id": "u1", "prompt": "natal prompt"})
+    assert job["status"] == QUEUED and job["target"] == {"user_id": "u1"}
+    done = queue.wait(job["job_id"])
+    queue.stop()
+    assert done["status"] == DONE
+    assert done["report"] == stub_llm("natal prompt")
+    profile = sqlite_store.get_psychology_profile("u1")
+    assert profile["llm_natal_report"] == done["report"]
+
+
+def test_synastry_job_updates_match_row(job_store, sqlite_store):
+    sqlite_store.save_match_result("a", "b", {"data": {"harmony_score": 70}}, {"tracks": {}})
+    queue = ReportJobQueue(job_store, _FlakyLLM(), storage=sqlite_store)
+    job = queue.submit("synastry", {"user_a_id": "a", "user_b_id": "b", "prompt": "pair"})
+    assert queue.wait(job["job_id"])["status"] == DONE
+    queue.stop()
+    assert sqlite_store.get_cached_match("a", "b")["llm_insight_report"] == "report for pair"
+
+
+def test_failed_jobs_retry_with_backoff_then_give_up(job_store, sqlite_store):
+    llm = _FlakyLLM(failures=1)
+    queue = ReportJobQueue(job_store, llm, storage=sqlite_store, backoff_base=0.05)
+    job = queue.submit("natal", {"user_id": "u1", "prompt": "p"})
+    done = queue.wait(job["job_id"])
+    assert done["status"] == DONE and done["attempts"] == 2
+
+    llm.failures = 100
+    job = queue.submit("natal", {"user_id": "u2", "prompt": "p2"})
+    failed = queue.wait(job["job_id"])
+    queue.stop()
+    assert failed["status"] == FAILED and failed["attempts"] == 3
+    assert "provider down" in failed["error"]
+    assert queue.stats()["failed"] == 1 and queue.stats()["retried"] >= 3
+
+
+def test_api_key_is_used_but_never_persisted(job_store, sqlite_store, tmp_path):
+    llm = _FlakyLLM()
+    queue = ReportJobQueue(job_store, llm, storage=sqlite_store)
+    job = queue.submit("natal", {"user_id": "u1", "prompt": "p"}, api_key="sk-secret")
+    queue.wait(job["job_id"])
+    queue.stop()
+    assert llm.calls[0]["api_key"] == "sk-secret"
+    raw = job_store._conn.execute("SELECT payload FROM report_jobs").fetchone()[0]
+    assert "sk-secret" not in raw
+
+
+def test_unknown_kind_is_rejected(job_store):
+    queue = ReportJobQueue(job_store, stub_llm)
+    with pytest.raises(ValueError):
+        queue.submit("horoscope", {"prompt": "p"})
+
+
+def test_get_queue_requires_llm_unless_stubbed(tmp_path, monkeypatch):
+    monkeypatch.setenv("DESTINY_REPORT_JOBS_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.delenv("DESTINY_LLM_STUB", raising=False)
+    previous = report_jobs.set_queue(None)
+    try:
+        with pytest.raises(ValueError):
+            report_jobs.get_queue()
+        monkeypatch.setenv("DESTINY_LLM_STUB", "1")
+        assert report_jobs.get_queue()._llm is stub_llm
+    finally:
+        queue = report_jobs.set_queue(previous)
+        if queue is not None:
+            queue.stop()
+            queue.store.close()
+
+
+# ── endpoints ────────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def service(tmp_path, sqlite_store, monkeypatch):
+    import main
+    queue = ReportJobQueue(JobStore(str(tmp_path / "jobs.db")), stub_llm, workers=2)
+    previous_queue = report_jobs.set_queue(queue)
+    previous_store = set_storage(sqlite_store)
+    monkeypatch.setattr(main, "acall_llm", pytest.fail)   # inline LLM must not run
+    yield TestClient(main.app), queue
+    queue.stop()
+    queue.store.close()
+    report_jobs.set_queue(previous_queue)
+    set_storage(previous_store)
+
+
+def _onboard(client, uid, date, **extra):
+    body = {"user_id": uid, "birth_date": date, "data_tier": 3}
+    body.update(extra)
+    resp = client.post("/api/users/onboard", json=body)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def test_onboard_async_report_returns_job_and_fills_profile(service, sqlite_store):
+    client, queue = service
+    data = _onboard(client, "u1", "1995-06-15", generate_report=True, async_report=True)
+    assert data["data"]["ai_natal_report"] == ""
+    job_id = data["report_job"]["job_id"]
+    queue.wait(job_id)
+    job = client.get(f"/api/jobs/{job_id}").json()
+    assert job["status"] == DONE and job["report"].startswith("[stub report")
+    assert sqlite_store.get_psychology_profile("u1")["llm_natal_report"] == job["report"]
+
+
+def test_match_async_report_lands_in_cached_match(service):
+    client, queue = service
+    _onboard(client, "a", "1995-06-15")
+    _onboard(client, "b", "1997-03-07")
+    first = client.post("/api/matches/compute", json={
+        "user_a_id": "a", "user_b_id": "b", "async_report": True,
+    }).json()
+    assert first["cached"] is False and first["data"]["ai_insight_report"] == ""
+    queue.wait(first["report_job"]["job_id"])
+    second = client.post("/api/matches/compute", json={"user_a_id": "a", "user_b_id": "b"}).json()
+    assert second["cached"] is True
+    assert second["data"]["ai_insight_report"].startswith("[stub report")
+
+
+def test_degraded_match_does_not_queue_a_report(service):
+    client, queue = service
+    _onboard(client, "a", "1995-06-15")
+    _onboard(client, "b", "1997-03-07")
+    rushed = client.post("/api/matches/compute", json={
+        "user_a_id": "a", "user_b_id": "b", "async_report": True,
+    }, headers={"X-Destiny-Deadline-Ms": "0"}).json()
+    assert rushed["data"]["layers"]["degraded"] is True
+    assert "report_job" not in rushed        # no saved row for a job to update
+
+
+def test_job_events_stream_until_done(service):
+    client, queue = service
+    data = _onboard(client, "u2", "1990-01-01", generate_report=True, async_report=True)
+    job_id = data["report_job"]["job_id"]
+    resp = client.get(f"/api/jobs/{job_id}/events", params={"poll_interval": 0.05})
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    statuses = [json.loads(line[len("data: "):])["status"]
+                for line in resp.text.splitlines() if line.startswith("data: ")]
+    assert statuses[-1] == DONE
+
+
+def test_unknown_job_is_404(service):
+    client, _ = service
+    assert client.get("/api/jobs/nope").status_code == 404
+    assert client.get("/api/jobs/nope/events").status_code == 404
+    assert client.get("/api/jobs/nope/events", params={"poll_interval": 0}).status_code == 422
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Tests for the SSE streaming variants of the /generate-* endpoints."""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import llm_cache
+import main
+from circuit_breaker import CircuitBreaker
+from llm_cache import LLMResponseCache
+
+client = TestClient(main.app)
+
+CARD = {"headline": "H", "shadow_trait": "S", "avoid_types": [], "evolution": "E", "core": "C"}
+MATCH_DATA = {"lust_score": 80, "soul_score": 65, "primary_track": "passion",
+              "tracks": {"friend": 50, "passion": 80, "partner": 60, "soul": 65}}
+
+
+class _StreamingGateway:
+    def __init__(self, text):
+        self.chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+        self.streams = 0
+        self.fail = None
+        self.breakers = {}
+
+    def breaker(self, provider):
+        return self.breakers.setdefault(provider, CircuitBreaker(provider))
+
+    async def astream(self, prompt, provider, max_tokens, api_key, gemini_model):
+        self.streams += 1
+        for chunk in self.chunks:
+            yield chunk
+        if self.fail:
+            raise self.fail
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    gw = _StreamingGateway(json.dumps(CARD))
+    monkeypatch.setattr(main, "get_gateway", lambda: gw)
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    llm_cache.set_llm_cache(LLMResponseCache(ttl=60, max_entries=16))
+    yield gw
+    llm_cache.set_llm_cache(None)
+
+
+def _events(resp):
+    events = []
+    for block in resp.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _post(path, body):
+    return client.post(path, json=dict(body, provider="gemini"))
+
+
+def test_profile_card_stream_forwards_deltas_then_result(gateway):
+    resp = _post("/generate-profile-card/stream", {"chart_data": {"sun_sign": "leo"}, "rpv_data": {}})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _events(resp)
+    deltas = [data["text"] for name, data in events if name == "delta"]
+    assert deltas == gateway.chunks
+    assert events[-1] == ("result", CARD)
+
+
+def test_archetype_stream_adds_effective_mode(gateway):
+    events = _events(_post("/generate-archetype/stream", {"match_data": MATCH_DATA}))
+    name, result = events[-1]
+    assert name == "result"
+    assert result["effective_mode"] and result["headline"] == "H"
+
+
+@pytest.mark.parametrize("path,body", [
+    ("/generate-match-report/stream", {"match_data": MATCH_DATA}),
+    ("/generate-ideal-match/stream", {"chart_data": {"sun_sign": "aries"}}),
+])
+def test_other_report_streams(gateway, path, body):
+    assert _events(_post(path, body))[-1] == ("result", CARD)
+
+
+def test_stream_replays_cache_and_respects_bypass(gateway):
+    body = {"chart_data": {"sun_sign": "leo"}, "rpv_data": {}}
+    _post("/generate-profile-card/stream", body)
+    events = _events(_post("/generate-profile-card/stream", body))
+    assert gateway.streams == 1
+    assert events == [("delta", {"text": json.dumps(CARD)}), ("result", CARD)]
+    _post("/generate-profile-card/stream", dict(body, use_cache=False))
+    assert gateway.streams == 2
+
+
+def test_stream_shares_cache_with_blocking_endpoint(gateway, monkeypatch):
+    body = {"chart_data": {"sun_sign": "virgo"}, "rpv_data": {}}
+    _post("/generate-profile-card/stream", body)
+    monkeypatch.setattr(main, "get_gateway", lambda: pytest.fail("LLM should not be called"))
+    assert _post("/generate-profile-card", body).json() == CARD
+
+
+def test_invalid_json_ends_with_error_event_and_is_not_cached(gateway):
+    gateway.chunks = ["not ", "json"]
+    body = {"chart_data": {"sun_sign": "leo"}, "rpv_data": {}}
+    events = _events(_post("/generate-profile-card/stream", body))
+    assert events[-1][0] == "error" and "invalid JSON" in events[-1][1]["detail"]
+    _post("/generate-profile-card/stream", body)
+    assert gateway.streams == 2
+
+
+def test_upstream_failure_mid_stream_ends_with_error_event(gateway):
+    gateway.fail = RuntimeError("upstream reset")
+    events = _events(_post("/generate-ideal-match/stream", {"chart_data": {"sun_sign": "aries"}}))
+    assert [name for name, _ in events[:-1]] == ["delta"] * len(gateway.chunks)
+    assert events[-1] == ("error", {"detail": "upstream reset"})
+
+
+def test_missing_key_is_400_before_streaming(gateway, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY")
+    resp = _post("/generate-ideal-match/stream", {"chart_data": {"sun_sign": "taurus"}})
+    assert resp.status_code == 400
+    assert gateway.streams == 0
+
+
+def test_open_circuit_is_503_before_streaming(gateway):
+    gateway.breakers["gemini"] = CircuitBreaker("gemini", failure_threshold=1)
+    gateway.breaker("gemini").record_failure()
+    resp = _post("/generate-ideal-match/stream", {"chart_data": {"sun_sign": "gemini"}})
+    assert resp.status_code == 503
+    assert int(resp.headers["retry-after"]) >= 1
+    assert gateway.streams == 0
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Tests for shard_ranking.py — scatter-gather quick-score ranking."""
+import random
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from matching import SIGNS, compute_quick_score
+from shard_ranking import (
+    HttpShard,
+    LocalShard,
+    ProcessShard,
+    ShardedRanker,
+    shard_for,
+)
+
+_ELEMENTS = ["wood", "fire", "earth", "metal", "water"]
+_BRANCHES = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
+
+
+def _population(n: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    pop = {}
+    for i in range(n):
+        profile = {"data_tier": 3}
+        for planet in ("sun", "venus", "mars", "mercury", "jupiter", "saturn", "pluto", "chiron"):
+            deg = rng.uniform(0, 360)
+            profile[f"{planet}_sign"] = SIGNS[int(deg // 30)]
+            profile[f"{planet}_degree"] = round(deg, 2)
+        profile["bazi_element"] = rng.choice(_ELEMENTS)
+        profile["bazi_month_branch"] = rng.choice(_BRANCHES)
+        profile["bazi_day_branch"] = rng.choice(_BRANCHES)
+        profile["rpv_power"] = rng.choice(["control", "follow", None])
+        pop[f"user-{i:04d}"] = profile
+    return pop
+
+
+def _reference_top_k(user, population, k, exclude=()):
+    scored = []
+    for uid, cand in population.items():
+        if uid in exclude:
+            continue
+        r = compute_quick_score(user, cand)
+        scored.append((-r["harmony"], uid))
+    return [uid for _, uid in sorted(scored)[:k]]
+
+
+POP = _population(120)
+QUERY = POP["user-0000"]
+
+
+def test_shard_for_is_stable_and_in_range():
+    assert shard_for("user-1", 4) == shard_for("user-1", 4)
+    assert all(0 <= shard_for(uid, 3) < 3 for uid in POP)
+
+
+def test_local_shard_top_k_sorted_and_excludes():
+    shard = LocalShard(POP)
+    top = shard.top_k(QUERY, k=10, exclude=["user-0000"])
+    assert len(top) == 10
+    assert all(e["user_id"] != "user-0000" for e in top)
+    harmonies = [e["harmony"] for e in top]
+    assert harmonies == sorted(harmonies, reverse=True)
+    assert {"harmony", "lust", "soul", "tracks"} <= set(top[0])
+
+
+def test_local_shard_skips_unscorable_candidates():
+    shard = LocalShard({"bad": {"bazi_element": "plasma"}, "good": POP["user-0001"]})
+    top = shard.top_k(QUERY, k=5)
+    assert [e["user_id"] for e in top] == ["good"]
+
+
+def test_local_shard_top_k_survives_concurrent_loads():
+    shard = LocalShard(POP)
+    stop = threading.Event()
+
+    def loader():
+        i = 0
+        while not stop.is_set():
+            shard.load({f"extra-{i}": POP["user-0001"]}, replace=i % 50 == 0)
+            i += 1
+
+    thread = threading.Thread(target=loader)
+    thread.start()
+    try:
+        for _ in range(20):
+            assert len(shard.top_k(QUERY, k=3)) <= 3
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_sharded_merge_matches_single_process():
+    ranker = ShardedRanker([LocalShard() for _ in range(4)])
+    assert ranker.load(POP) == len(POP)
+    top = ranker.rank(QUERY, k=15, exclude=["user-0000"])
+    assert [e["user_id"] for e in top] == _reference_top_k(QUERY, POP, 15, {"user-0000"})
+    ranker.close()
+
+
+def test_remove_routes_to_owning_shard():
+    ranker = ShardedRanker([LocalShard() for _ in range(3)])
+    ranker.load(POP)
+    ranker.remove(["user-0001", "user-0002"])
+    assert len(ranker) == len(POP) - 2
+    ranked = {e["user_id"] for e in ranker.rank(QUERY, k=len(POP))}
+    assert "user-0001" not in ranked and "user-0002" not in ranked
+    ranker.close()
+
+
+def test_empty_shard_list_rejected():
+    with pytest.raises(ValueError):
+        ShardedRanker([])
+
+
+def test_process_workers_match_single_process():
+    with ShardedRanker.with_processes(3) as ranker:
+        ranker.load(POP)
+        assert len(ranker) == len(POP)
+        top = ranker.rank(QUERY, k=10, exclude=["user-0000"])
+    assert [e["user_id"] for e in top] == _reference_top_k(QUERY, POP, 10, {"user-0000"})
+
+
+def test_process_shard_surfaces_worker_errors():
+    shard = ProcessShard()
+    try:
+        with pytest.raises(RuntimeError):
+            shard._call("explode")
+    finally:
+        shard.close()
+
+
+def test_http_shards_via_endpoints():
+    import main
+
+    main._get_shard().load({}, replace=True)
+    client = TestClient(main.app)
+    ranker = ShardedRanker([HttpShard(client=client)])
+    ranker.load(POP)
+    top = ranker.rank(QUERY, k=5, exclude=["user-0000"])
+    assert [e["user_id"] for e in top] == _reference_top_k(QUERY, POP, 5, {"user-0000"})
+
+    resp = client.post("/ranking/top-k", json={"user": QUERY, "k": 5, "exclude": ["user-0000"]})
+    assert resp.status_code == 200
+    assert [e["user_id"] for e in resp.json()["results"]] == [e["user_id"] for e in top]
+    assert client.post("/ranking/top-k", json={"user": QUERY, "k": -1}).status_code == 422
+    assert client.post("/ranking/shard/top-k", json={"user": QUERY, "k": -1}).status_code == 422
+    main._get_shard().load({}, replace=True)
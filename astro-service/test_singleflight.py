@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Tests for singleflight.py — concurrent duplicate calls share one execution."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+import singleflight
+from singleflight import SingleFlight, key_for
+
+
+def test_key_ignores_dict_order():
+    assert key_for("x", {"a": 1, "b": 2}) == key_for("x", {"b": 2, "a": 1})
+    assert key_for("x", {"a": 1}) != key_for("y", {"a": 1})
+
+
+def test_sync_duplicates_collapse():
+    flight = SingleFlight()
+    runs = []
+
+    def slow(x):
+        runs.append(x)
+        time.sleep(0.1)
+        return {"value": x}
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: flight.do("k", slow, 7), range(8)))
+
+    assert runs == [7]
+    assert all(r == {"value": 7} for r in results)
+    stats = flight.stats()
+    assert stats["executions"] == 1 and stats["collapsed"] == 7 and stats["in_flight"] == 0
+
+
+def test_followers_get_independent_copies():
+    flight = SingleFlight()
+    gate = threading.Event()
+
+    def leader_fn():
+        gate.wait()
+        return {"tags": ["a"]}
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(flight.do, "k", leader_fn)
+        while flight.in_flight() == 0:
+            time.sleep(0.001)
+        second = pool.submit(flight.do, "k", leader_fn)
+        while flight.stats()["collapsed"] == 0:
+            time.sleep(0.001)
+        gate.set()
+        a, b = first.result(), second.result()
+    a["tags"].append("mutated")
+    assert b == {"tags": ["a"]}
+
+
+def test_async_duplicates_collapse_and_errors_propagate():
+    flight = SingleFlight()
+    runs = 0
+
+    async def compute():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(*(flight.ado("k", compute) for _ in range(5)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert runs == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.stats()["errors"] == 1
+
+
+def test_key_is_released_after_completion():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.do("k", lambda: 2) == 2
+    assert flight.stats()["collapsed"] == 0
+
+
+def test_sync_caller_joins_async_leader():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    async def compute():
+        started.set()
+        await asyncio.sleep(0.1)
+        return "shared"
+
+    with ThreadPoolExecutor(1) as pool:
+        leader = pool.submit(asyncio.run, flight.ado("k", compute))
+        started.wait()
+        assert flight.do("k", lambda: "own") == "shared"
+        assert leader.result() == "shared"
+
+
+def test_follower_cancellation_does_not_cancel_leader():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        leader = asyncio.create_task(flight.ado("k", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("k", compute))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_leader_cancellation_hands_off_to_follower():
+    flight = SingleFlight()
+    runs = []
+
+    async def compute():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        leader = asyncio.create_task(flight.ado("k", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("k", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "done"
+    assert len(runs) == 2                       # the follower re-ran it as the new leader
+    assert flight.in_flight() == 0 and flight.stats()["errors"] == 0
+
+
+# ── main.py integration ──────────────────────────────────────────────────────
+
+class _SlowGateway:
+    def __init__(self):
+        self.calls = 0
+
+    async def acall(self, prompt, provider, max_tokens, api_key, gemini_model):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return "report"
+
+
+@pytest.fixture
+def no_llm_cache(monkeypatch):
+    monkeypatch.setenv("DESTINY_LLM_CACHE", "0")
+    singleflight.group("llm").reset_stats()
+
+
+def test_concurrent_identical_llm_calls_hit_provider_once(monkeypatch, no_llm_cache):
+    gw = _SlowGateway()
+    monkeypatch.setattr(main, "get_gateway", lambda: gw)
+
+    async def run():
+        return await asyncio.gather(*(main.acall_llm("same prompt", provider="gemini", api_key="k")
+                                      for _ in range(4)))
+
+    assert asyncio.run(run()) == ["report"] * 4
+    assert gw.calls == 1
+    assert singleflight.stats()["llm"]["collapsed"] == 3
+
+
+def test_llm_calls_with_different_keys_are_not_merged(monkeypatch, no_llm_cache):
+    gw = _SlowGateway()
+    monkeypatch.setattr(main, "get_gateway", lambda: gw)
+
+    async def run():
+        return await asyncio.gather(main.acall_llm("p", provider="gemini", api_key="k1"),
+                                    main.acall_llm("p", provider="gemini", api_key="k2"))
+
+    asyncio.run(run())
+    assert gw.calls == 2
+
+
+def test_concurrent_identical_chart_requests_compute_once(monkeypatch):
+    from fastapi.testclient import TestClient
+    runs = []
+    real = main._calc_chart
+
+    def counting(req):
+        runs.append(req.birth_date)
+        time.sleep(0.1)
+        return real(req)
+
+    monkeypatch.setattr(main, "_calc_chart", counting)
+    client = TestClient(main.app)
+    body = {"birth_date": "1995-06-15", "data_tier": 3}
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(lambda _: client.post("/calculate-chart", json=body), range(4)))
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.text for r in responses}) == 1
+    assert len(runs) < 4
+    assert "chart" in client.get("/health/singleflight").json()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Tests for cold start — import budget of main and lazy loading (lazy.py, ephemeris.py)."""
+import json
+import os
+import pickle
+import subprocess
+import sys
+
+import lazy
+from run_startup_profile import DEFERRED
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Generous wall-clock budget for `import main` in a fresh interpreter; the
+# module check below is the precise guard, this one catches gross regressions.
+IMPORT_BUDGET_S = float(os.environ.get("DESTINY_IMPORT_BUDGET_S", "3.0"))
+
+
+def _run(code: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("SUPABASE_", "DESTINY_STORAGE"))}
+    out = subprocess.run([sys.executable, "-c", f"DEFERRED = {DEFERRED!r}\n{code}"], cwd=HERE,
+                         env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_import_main_stays_within_budget_and_defers_heavy_modules():
+    result = _run("""
+import json, sys, time
+t = time.perf_counter()
+import main
+print(json.dumps({"seconds": time.perf_counter() - t,
+                  "loaded": [m for m in DEFERRED if m in sys.modules]}))
+""")
+    assert result["loaded"] == []
+    assert result["seconds"] < IMPORT_BUDGET_S
+
+
+def test_health_does_not_load_engines_but_first_compute_does():
+    result = _run("""
+import json, sys
+import main
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    assert client.get("/health").status_code == 200
+    after_health = [m for m in ("chart", "matching", "zwds", "db_client") if m in sys.modules]
+    resp = client.post("/compute-match", json={"user_a": {"sun_sign": "leo"},
+                                               "user_b": {"sun_sign": "aries"}})
+print(json.dumps({"after_health": after_health, "status": resp.status_code,
+                  "matching": "matching" in sys.modules}))
+""")
+    assert result["after_health"] == []
+    assert result["status"] == 200
+    assert result["matching"] is True
+
+
+def test_lazy_function_resolves_on_call_and_pickles_as_target():
+    fn = lazy.lazy_function("textwrap", "dedent")
+    assert "not loaded" in repr(fn)
+    assert fn("  x") == "x"
+    assert "loaded" in repr(fn) and "not" not in repr(fn)
+    import textwrap
+    assert pickle.loads(pickle.dumps(fn)) is textwrap.dedent
+
+
+def test_ephemeris_path_applied_once():
+    import ephemeris
+    from chart import calculate_chart
+
+    calculate_chart("1995-06-15", "14:30", lat=25.033, lng=121.565)
+    assert ephemeris._applied
+    assert os.path.isdir(ephemeris.ephe_dir())
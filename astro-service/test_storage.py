@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Tests for storage.py — SQLite backend and end-to-end endpoints without Supabase."""
+import pytest
+from fastapi.testclient import TestClient
+
+from chart import calculate_chart
+from feature_store import FeatureStore
+from feature_sync import FeatureSync
+from storage import SQLiteStorage, SupabaseStorage, set_storage, storage_from_env
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    store = SQLiteStorage(str(tmp_path / "destiny.db"))
+    yield store
+    store.close()
+
+
+def _natal(date):
+    chart = calculate_chart(birth_date=date)
+    return chart, chart["bazi"], {}
+
+
+def test_wal_mode_and_pair_index(sqlite_store):
+    mode = sqlite_store._rows("PRAGMA journal_mode")[0][0]
+    assert mode == "wal"
+    indexes = {r["name"]: r for r in sqlite_store._rows("PRAGMA index_list(matches)")}
+    assert indexes["idx_matches_pair"]["unique"] == 1
+    cols = [r["name"] for r in sqlite_store._rows("PRAGMA index_info(idx_matches_pair)")]
+    assert cols == ["user_a_id", "user_b_id"]
+    plan = " ".join(r[3] for r in sqlite_store._rows(
+        "EXPLAIN QUERY PLAN SELECT * FROM matches WHERE user_a_id = ? AND user_b_id = ?", ("a", "b")))
+    assert "idx_matches_pair" in plan
+
+
+def test_natal_round_trip_and_bulk(sqlite_store):
+    western, bazi, zwds = _natal("1995-06-15")
+    sqlite_store.upsert_natal_data("u1", western, bazi, zwds)
+    sqlite_store.upsert_natal_data("u2", western, bazi, zwds)
+    assert sqlite_store.get_natal_data("u1")["western_chart"] == western
+    assert set(sqlite_store.get_natal_data_many(["u1", "u2", "u3"])) == {"u1", "u2"}
+    assert sqlite_store.get_natal_data("u3") is None
+
+
+def test_psychology_partial_upsert_keeps_other_fields(sqlite_store):
+    sqlite_store.upsert_psychology_profile("u1", {
+        "relationship_dynamic": "stable", "favorable_elements": ["火", "木"], "ignored": 1,
+    })
+    sqlite_store.upsert_psychology_profile("u1", {"llm_natal_report": "報告"})
+    prof = sqlite_store.get_psychology_profile("u1")
+    assert prof["relationship_dynamic"] == "stable"
+    assert prof["favorable_elements"] == ["火", "木"]
+    assert prof["llm_natal_report"] == "報告"
+
+
+def test_match_cache_both_directions_and_overwrite(sqlite_store):
+    sqlite_store.save_match_result("a", "b", {"data": {"harmony_score": 70, "badges": ["x"]}}, {"raw": 1})
+    sqlite_store.save_match_result("a", "b", {"data": {"harmony_score": 80}}, {"raw": 2})
+    match = sqlite_store.get_cached_match("b", "a")
+    assert match["harmony_score"] == 80 and match["badges"] == []
+    assert "raw_result" not in match
+    assert sqlite_store.get_raw_result("a", "b") == {"raw": 2}
+    assert sqlite_store.get_cached_match("a", "c") is None
+
+
+def test_ranking_cache_respects_k_and_age(sqlite_store):
+    results = [{"user_id": "x", "harmony": 90}, {"user_id": "y", "harmony": 80}]
+    sqlite_store.save_ranking_cache("u1", 2, results)
+    assert sqlite_store.get_ranking("u1", 1) == results[:1]
+    assert sqlite_store.get_ranking("u1", 5) is None
+    assert sqlite_store.get_ranking("u1", 2, max_age=-1) is None
+    sqlite_store.save_ranking_cache("u1", 2, results, profile_hash="h1")
+    assert sqlite_store.get_ranking("u1", 2, profile_hash="h1") == results
+    assert sqlite_store.get_ranking("u1", 2, profile_hash="h2") is None
+
+
+def test_ranking_cache_misses_after_profile_change(sqlite_store, monkeypatch):
+    import main
+
+    class Ranker:
+        calls = 0
+
+        def rank(self, user, k, exclude=()):
+            Ranker.calls += 1
+            return [{"user_id": "x", "harmony": 90, "sun_sign": user["sun_sign"]}]
+
+    monkeypatch.setattr(main, "_get_ranker", lambda: Ranker())
+    previous = set_storage(sqlite_store)
+    try:
+        client = TestClient(main.app)
+        body = {"user_id": "u1", "user": {"sun_sign": "aries"}, "k": 1}
+        assert client.post("/ranking/top-k", json=body).json()["cached"] is False
+        assert client.post("/ranking/top-k", json=body).json()["cached"] is True
+        body["user"] = {"sun_sign": "leo"}
+        resp = client.post("/ranking/top-k", json=body).json()
+        assert resp["cached"] is False and resp["results"][0]["sun_sign"] == "leo"
+        assert Ranker.calls == 2
+    finally:
+        set_storage(previous)
+
+
+def test_sqlite_feeds_feature_sync(sqlite_store):
+    western, bazi, zwds = _natal("1995-06-15")
+    sqlite_store.upsert_natal_data("u1", western, bazi, zwds)
+    sqlite_store.upsert_psychology_profile("u1", {"attachment_style": "anxious"})
+    fs = FeatureStore()
+    sync = FeatureSync(sqlite_store, fs, batch_size=1)
+    assert sync.run_until_idle() == 1
+    assert fs.get("u1")["attachment_style"] == "anxious"
+
+
+def test_storage_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("DESTINY_STORAGE", f"sqlite:{tmp_path / 'x.db'}")
+    backend = storage_from_env()
+    assert isinstance(backend, SQLiteStorage)
+    backend.close()
+    monkeypatch.setenv("DESTINY_STORAGE", "supabase")
+    assert isinstance(storage_from_env(), SupabaseStorage)
+    monkeypatch.setenv("DESTINY_STORAGE", "mongo")
+    with pytest.raises(ValueError):
+        storage_from_env()
+
+
+def test_endpoints_end_to_end_on_sqlite(sqlite_store, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "call_llm", lambda *a, **kw: "")
+    previous = set_storage(sqlite_store)
+    try:
+        client = TestClient(main.app)
+        for uid, date in (("a", "1995-06-15"), ("b", "1997-03-07")):
+            resp = client.post("/api/users/onboard", json={
+                "user_id": uid, "birth_date": date, "data_tier": 3, "generate_report": False,
+            })
+            assert resp.status_code == 200, resp.text
+        assert set(sqlite_store.get_psychology_profiles_many(["a", "b"])) == {"a", "b"}
+
+        body = {"user_a_id": "a", "user_b_id": "b", "generate_report": False}
+        first = client.post("/api/matches/compute", json=body).json()
+        assert first["cached"] is False
+        second = client.post("/api/matches/compute", json=body).json()
+        assert second["cached"] is True
+        assert second["data"]["harmony_score"] == first["data"]["harmony_score"]
+    finally:
+        set_storage(previous)
+
+
+def test_deadline_header_sheds_layers_and_skips_match_cache(sqlite_store, monkeypatch):
+    import main
+    previous = set_storage(sqlite_store)
+    try:
+        client = TestClient(main.app)
+        for uid, date in (("a", "1995-06-15"), ("b", "1997-03-07")):
+            client.post("/api/users/onboard", json={
+                "user_id": uid, "birth_date": date, "data_tier": 3, "generate_report": False,
+            })
+        body = {"user_a_id": "a", "user_b_id": "b", "generate_report": False}
+        rushed = client.post("/api/matches/compute", json=body,
+                             headers={"X-Destiny-Deadline-Ms": "0"}).json()
+        assert rushed["data"]["layers"]["degraded"] is True
+        assert rushed["data"]["layers"]["ran"] == []
+        assert sqlite_store.get_cached_match("a", "b") is None      # partial result not cached
+
+        full = client.post("/api/matches/compute", json=body).json()
+        assert full["cached"] is False and full["data"]["layers"]["degraded"] is False
+        assert sqlite_store.get_cached_match("a", "b") is not None
+
+        raw = client.post("/compute-match", json={"user_a": {"sun_sign": "leo"}, "user_b": {}},
+                          headers={"X-Destiny-Deadline-Ms": "0"}).json()
+        assert raw["layers"]["degraded"] is True
+    finally:
+        set_storage(previous)
+
+
+def test_deadline_requests_are_not_coalesced(sqlite_store, monkeypatch):
+    import asyncio
+    import main
+    previous = set_storage(sqlite_store)
+    try:
+        client = TestClient(main.app)
+        for uid, date in (("a", "1995-06-15"), ("b", "1997-03-07")):
+            client.post("/api/users/onboard", json={
+                "user_id": uid, "birth_date": date, "data_tier": 3, "generate_report": False,
+            })
+        req = main.MatchComputeRequest(user_a_id="a", user_b_id="b", generate_report=False,
+                                       force_recompute=True)
+
+        async def both():
+            return await asyncio.gather(main.compute_match_cached(req, 0),
+                                        main.compute_match_cached(req, 60_000))
+
+        rushed, relaxed = asyncio.run(both())
+        assert rushed["data"]["layers"]["degraded"] is True
+        assert relaxed["data"]["layers"]["degraded"] is False
+    finally:
+        set_storage(previous)
+
+
+def test_sqlite_blob_encoding_is_transparent(tmp_path):
+    store = SQLiteStorage(str(tmp_path / "blob.db"), blob_encoding=True)
+    western, bazi, zwds = _natal("1995-06-15")
+    store.upsert_natal_data("u1", western, bazi, zwds)
+    store.save_match_result("u1", "u2", {"data": {"harmony_score": 60}}, {"tracks": {"soul": 70}})
+    raw_type = store._rows("SELECT typeof(western_chart) FROM user_natal_data")[0][0]
+    assert raw_type == "blob"
+    natal = store.get_natal_data("u1")
+    assert natal["western_chart"]["sun_sign"] == western["sun_sign"]
+    assert store.get_raw_result("u1", "u2")["tracks"] == {"soul": 70}
+    store.close()
+
+    # Rows written as blobs stay readable with encoding switched off
+    plain = SQLiteStorage(str(tmp_path / "blob.db"), blob_encoding=False)
+    assert plain.get_natal_data("u1")["bazi_chart"]["day_master"] == bazi["day_master"]
+    plain.close()
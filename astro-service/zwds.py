@@ -12,6 +12,8 @@ from __future__ import annotations
 from typing import Optional
 from lunardate import LunarDate
 
+from metrics import timed
+
 # ── Constants ─────────────────────────────────────────────────────────────────
 HEAVENLY_STEMS   = ["甲","乙","丙","丁","戊","己","庚","辛","壬","癸"]
 EARTHLY_BRANCHES = ["子","丑","寅","卯","辰","巳","午","未","申","酉","戌","亥"]
@@ -145,6 +147,7 @@ def get_four_transforms(birth_year: int) -> dict:
 
 # ── Main Chart Computation ────────────────────────────────────────────────────
 
+@timed("zwds")
 def compute_zwds_chart(
     birth_year: int, birth_month: int, birth_day: int,
     birth_time: Optional[str], gender: str = "M"
@@ -0,0 +1,24 @@
+-- ============================================================
+-- Migration 015: updated_at maintenance for feature-store sync
+-- astro-service/feature_sync.py polls user_natal_data and
+-- user_psychology_profiles by (updated_at, user_id) watermark.
+-- Upserts only set updated_at on INSERT (column DEFAULT), so
+-- bump it on every UPDATE as well and index the watermark.
+-- ============================================================
+
+DROP TRIGGER IF EXISTS on_user_natal_data_updated ON public.user_natal_data;
+CREATE TRIGGER on_user_natal_data_updated
+  BEFORE UPDATE ON public.user_natal_data
+  FOR EACH ROW
+  EXECUTE FUNCTION public.handle_updated_at();
+
+DROP TRIGGER IF EXISTS on_user_psychology_profiles_updated ON public.user_psychology_profiles;
+CREATE TRIGGER on_user_psychology_profiles_updated
+  BEFORE UPDATE ON public.user_psychology_profiles
+  FOR EACH ROW
+  EXECUTE FUNCTION public.handle_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_natal_updated_at
+  ON public.user_natal_data(updated_at, user_id);
+CREATE INDEX IF NOT EXISTS idx_psychology_updated_at
+  ON public.user_psychology_profiles(updated_at, user_id);
@@ -0,0 +1,24 @@
+-- ============================================================
+-- Migration 016: ranking cache
+-- Stores the last /ranking/top-k result per user so repeated
+-- feed requests skip the one-vs-all scoring pass.
+-- Written by astro-service (storage.py / db_client.py).
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS public.ranking_cache (
+    user_id     UUID PRIMARY KEY REFERENCES public.users(id) ON DELETE CASCADE,
+    k           INTEGER NOT NULL,                -- number of entries in results
+    results     JSONB NOT NULL DEFAULT '[]',     -- [{user_id, harmony, lust, soul, primary_track, ...}]
+    profile_hash TEXT,                           -- hash of the profile the ranking was scored for
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE public.ranking_cache IS 'Cached top-K quick-score ranking per user. Backend-only.';
+
+ALTER TABLE public.ranking_cache ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role can manage ranking cache" ON public.ranking_cache;
+CREATE POLICY "Service role can manage ranking cache"
+  ON public.ranking_cache FOR ALL
+  USING (true)
+  WITH CHECK (true);
@@ -0,0 +1,27 @@
+-- ============================================================
+-- Migration 017: compressed blob columns
+-- With DESTINY_BLOB_ENCODING=1, astro-service (blob_codec.py)
+-- writes charts and raw_result as versioned zstd-compressed
+-- msgpack in these bytea columns and leaves the JSONB columns
+-- as '{}'. Readers prefer the blob when it is set, so old JSONB
+-- rows stay readable and the flag can be enabled at any time.
+-- ============================================================
+
+ALTER TABLE public.user_natal_data
+  ADD COLUMN IF NOT EXISTS western_chart_blob BYTEA,
+  ADD COLUMN IF NOT EXISTS bazi_chart_blob    BYTEA,
+  ADD COLUMN IF NOT EXISTS zwds_chart_blob    BYTEA;
+
+ALTER TABLE public.matches
+  ADD COLUMN IF NOT EXISTS raw_result_blob BYTEA;
+
+COMMENT ON COLUMN public.user_natal_data.western_chart_blob IS 'blob_codec v1 (DSB header + zstd msgpack) of western_chart; NULL = use JSONB column';
+COMMENT ON COLUMN public.matches.raw_result_blob IS 'blob_codec v1 of raw_result; NULL = use JSONB column';
+
+-- Blobs are already compressed; skip TOAST pglz attempts
+ALTER TABLE public.user_natal_data
+  ALTER COLUMN western_chart_blob SET STORAGE EXTERNAL,
+  ALTER COLUMN bazi_chart_blob    SET STORAGE EXTERNAL,
+  ALTER COLUMN zwds_chart_blob    SET STORAGE EXTERNAL;
+ALTER TABLE public.matches
+  ALTER COLUMN raw_result_blob SET STORAGE EXTERNAL;